@@ -0,0 +1,473 @@
+"""
+LLM 调用审计存储
+
+记录每次 LLM 调用的提示词、原始回复、token 用量和延迟，用于复盘决策:
+- 提示词的固定模板（和系统提示词）按内容哈希只存一次，调用记录只引用哈希
+- 每个周期变化的部分（行情、指标、持仓等）和原始回复序列化后用字典压缩:
+  安装 zstandard 时用历史样本训练 zstd 字典，否则用 zlib 预置字典（最近样本拼接）
+- 按时间保留，后台线程定期维护: 删除过期记录；新字典的压缩率明显更好时才启用，
+  并分批（每批之间释放锁，不阻塞写入）用新字典重新压缩旧记录；清理不再引用的模板和字典
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from frame_codec import COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD
+from serialization import dumps, loads
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+KIND_VARIABLES = "variables"
+KIND_COMPLETION = "completion"
+
+ZLIB_MAX_DICT = 32 * 1024  # zlib 窗口大小，预置字典超出部分无效
+DICT_MIN_GAIN = 0.05  # 新字典在最新样本上至少小 5% 才替换当前字典
+RECOMPRESS_BATCH = 200  # 每批重新压缩的记录数
+VACUUM_FREE_RATIO = 0.25  # 空闲页超过此比例才 VACUUM
+
+
+@dataclass
+class LLMCall:
+    """一次 LLM 调用（由分析器收集，分析记录保存后写入审计存储）"""
+    stage: str  # single / fast / big
+    template: str
+    variables: Dict[str, Any]
+    system_prompt: str = ""
+    completion: Optional[Dict[str, Any]] = None
+    latency: float = 0.0
+    error: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def usage(self) -> Dict[str, int]:
+        return (self.completion or {}).get('usage') or {}
+
+
+def template_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class DictionaryCodec:
+    """带字典的压缩（zstd 训练字典或 zlib 预置字典）"""
+
+    def __init__(self, compression: int, dictionary: Optional[bytes] = None):
+        self.compression = compression
+        self.dictionary = dictionary
+        self._zstd_dict = None
+        if compression == COMPRESSION_ZSTD and dictionary:
+            self._zstd_dict = zstandard.ZstdCompressionDict(dictionary)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.compression == COMPRESSION_ZSTD:
+            return zstandard.ZstdCompressor(level=9, dict_data=self._zstd_dict).compress(data)
+        if self.compression == COMPRESSION_ZLIB:
+            compressor = zlib.compressobj(9, zdict=self.dictionary) if self.dictionary else zlib.compressobj(9)
+            return compressor.compress(data) + compressor.flush()
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.compression == COMPRESSION_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("审计记录使用zstd压缩，但未安装zstandard")
+            return zstandard.ZstdDecompressor(dict_data=self._zstd_dict).decompress(data)
+        if self.compression == COMPRESSION_ZLIB:
+            decompressor = zlib.decompressobj(zdict=self.dictionary) if self.dictionary else zlib.decompressobj()
+            return decompressor.decompress(data) + decompressor.flush()
+        return data
+
+
+def train_dictionary(samples: List[bytes], compression: int, dict_size: int) -> bytes:
+    """用历史样本生成压缩字典"""
+    if compression == COMPRESSION_ZSTD:
+        try:
+            return zstandard.train_dictionary(dict_size, samples).as_bytes()
+        except zstandard.ZstdError as e:
+            logger.debug(f"zstd 字典训练失败，改用样本拼接: {e}")
+    # zlib 只使用字典末尾 32KB，越靠后的内容匹配距离越近，因此最新样本放在最后
+    limit = min(dict_size, ZLIB_MAX_DICT) if compression == COMPRESSION_ZLIB else dict_size
+    return b"".join(samples)[-limit:]
+
+
+class AuditStore:
+    """LLM 调用审计（SQLite）"""
+
+    def __init__(self, db_path: str = "llm_audit.db", retention_days: float = 30.0,
+                 maintenance_interval: float = 6 * 3600, train_samples: int = 100, dict_size: int = 16 * 1024,
+                 compression: Optional[int] = None):
+        """
+        Args:
+            db_path: 审计数据库路径（与分析记录分开，避免主库膨胀）
+            retention_days: 保留天数
+            maintenance_interval: 后台维护（过期清理、重新压缩）的间隔（秒）
+            train_samples: 训练字典使用的最近样本数（首个字典在样本数达到后训练，之后在维护时更新）
+            dict_size: 字典大小（字节）
+            compression: 压缩方式，默认有 zstandard 时用 zstd，否则 zlib
+        """
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.maintenance_interval = maintenance_interval
+        self.train_samples = train_samples
+        self.dict_size = dict_size
+        if compression is None:
+            compression = COMPRESSION_ZSTD if zstandard is not None else COMPRESSION_ZLIB
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._known_templates: set = set()
+        self._codecs: Dict[int, DictionaryCodec] = {}
+        self._current_dict: Dict[str, int] = {}  # kind -> 最新字典ID（0 表示无字典）
+        self._samples: Dict[str, Deque[bytes]] = {kind: deque(maxlen=train_samples)
+                                                   for kind in (KIND_VARIABLES, KIND_COMPLETION)}
+        self._stop = threading.Event()
+        self._maintainer: Optional[threading.Thread] = None
+        self._init_database()
+        logger.info(f"LLM审计存储初始化完成: {db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA synchronous=NORMAL')  # 审计数据允许断电时丢失最后几条
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS prompt_templates (
+                hash TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                first_seen REAL,
+                last_seen REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS compression_dicts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                compression INTEGER NOT NULL,
+                created_at REAL,
+                content BLOB NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp REAL NOT NULL,
+                inst_id TEXT NOT NULL,
+                record_id INTEGER,
+                stage TEXT,
+                model TEXT,
+                template_hash TEXT,
+                system_hash TEXT,
+                variables BLOB,
+                variables_codec TEXT,
+                completion BLOB,
+                completion_codec TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                total_tokens INTEGER,
+                latency_ms REAL,
+                error TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_llm_calls_time ON llm_calls (timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_llm_calls_record ON llm_calls (record_id)')
+        conn.commit()
+
+        for kind in (KIND_VARIABLES, KIND_COMPLETION):
+            row = cursor.execute('SELECT MAX(id) FROM compression_dicts WHERE kind = ? AND compression = ?',
+                                 (kind, self.compression)).fetchone()
+            self._current_dict[kind] = row[0] or 0
+        conn.close()
+
+    # ---- 编解码 ----
+
+    def _codec(self, conn: sqlite3.Connection, dict_id: int, compression: int) -> DictionaryCodec:
+        if dict_id == 0:
+            return DictionaryCodec(compression)
+        if dict_id not in self._codecs:
+            row = conn.execute('SELECT compression, content FROM compression_dicts WHERE id = ?', (dict_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"压缩字典 {dict_id} 不存在")
+            self._codecs[dict_id] = DictionaryCodec(row[0], row[1])
+        return self._codecs[dict_id]
+
+    def _encode(self, conn: sqlite3.Connection, kind: str, obj: Any) -> Tuple[Optional[bytes], Optional[str]]:
+        """返回 (压缩数据, 编码标记 "压缩方式:字典ID")"""
+        if obj is None:
+            return None, None
+        data = dumps(obj).encode('utf-8')
+        self._add_sample(conn, kind, data)
+        dict_id = self._current_dict[kind]
+        return self._codec(conn, dict_id, self.compression).compress(data), f"{self.compression}:{dict_id}"
+
+    def _decode(self, conn: sqlite3.Connection, blob: Optional[bytes], codec: Optional[str]) -> Any:
+        if blob is None:
+            return None
+        compression, dict_id = (int(part) for part in codec.split(':'))
+        return loads(self._codec(conn, dict_id, compression).decompress(blob))
+
+    def _add_sample(self, conn: sqlite3.Connection, kind: str, data: bytes):
+        """保留最近的样本；还没有字典时，样本数量足够后立即训练第一个字典"""
+        if self.compression == COMPRESSION_NONE:
+            return
+        samples = self._samples[kind]
+        samples.append(data)
+        if self._current_dict[kind] == 0 and len(samples) >= self.train_samples:
+            self._train(conn, kind)
+
+    def _train(self, conn: sqlite3.Connection, kind: str):
+        self._save_dictionary(conn, kind, train_dictionary(list(self._samples[kind]), self.compression, self.dict_size))
+
+    def _save_dictionary(self, conn: sqlite3.Connection, kind: str, dictionary: bytes):
+        cursor = conn.execute('INSERT INTO compression_dicts (kind, compression, created_at, content) VALUES (?, ?, ?, ?)',
+                              (kind, self.compression, time.time(), dictionary))
+        self._current_dict[kind] = cursor.lastrowid
+        logger.info(f"审计存储启用了新的{kind}压缩字典 #{cursor.lastrowid} ({len(dictionary)} 字节)")
+
+    def _store_template(self, conn: sqlite3.Connection, text: str) -> Optional[str]:
+        if not text:
+            return None
+        digest = template_hash(text)
+        now = time.time()
+        if digest in self._known_templates:
+            return digest
+        conn.execute('INSERT OR IGNORE INTO prompt_templates (hash, content, first_seen, last_seen) VALUES (?, ?, ?, ?)',
+                     (digest, text, now, now))
+        conn.execute('UPDATE prompt_templates SET last_seen = ? WHERE hash = ?', (now, digest))
+        self._known_templates.add(digest)
+        return digest
+
+    # ---- 写入与读取 ----
+
+    def record_calls(self, inst_id: str, calls: List[LLMCall], record_id: Optional[int] = None) -> List[int]:
+        """保存一个分析周期内的 LLM 调用，返回审计记录ID"""
+        return self.record_batch([(inst_id, calls, record_id)])
+
+    def record_batch(self, cycles: List[Tuple[str, List[LLMCall], Optional[int]]]) -> List[int]:
+        """在一个事务中保存多个周期的 LLM 调用: [(inst_id, calls, record_id)]，返回审计记录ID"""
+        if not any(calls for _, calls, _ in cycles):
+            return []
+        ids = []
+        with self._lock:
+            conn = self._connect()
+            try:
+                for inst_id, calls, record_id in cycles:
+                    for call in calls:
+                        ids.append(self._insert_call(conn, inst_id, call, record_id))
+                conn.commit()
+            finally:
+                conn.close()
+        logger.debug(f"已保存 {len(ids)} 条LLM审计记录")
+        return ids
+
+    def _insert_call(self, conn: sqlite3.Connection, inst_id: str, call: LLMCall, record_id: Optional[int]) -> int:
+        variables, variables_codec = self._encode(conn, KIND_VARIABLES, call.variables)
+        completion, completion_codec = self._encode(conn, KIND_COMPLETION, call.completion)
+        usage = call.usage
+        cursor = conn.execute('''
+            INSERT INTO llm_calls (
+                timestamp, inst_id, record_id, stage, model, template_hash, system_hash,
+                variables, variables_codec, completion, completion_codec,
+                prompt_tokens, completion_tokens, total_tokens, latency_ms, error
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            call.timestamp, inst_id, record_id, call.stage, (call.completion or {}).get('model'),
+            self._store_template(conn, call.template), self._store_template(conn, call.system_prompt),
+            variables, variables_codec, completion, completion_codec,
+            usage.get('prompt_tokens'), usage.get('completion_tokens'), usage.get('total_tokens'),
+            round(call.latency * 1000, 1), call.error,
+        ))
+        return cursor.lastrowid
+
+    def get_call(self, call_id: int) -> Optional[Dict[str, Any]]:
+        """读取一条审计记录，还原完整提示词和原始回复"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute('''
+                    SELECT c.timestamp, c.inst_id, c.record_id, c.stage, c.model, c.template_hash,
+                           t.content, s.content, c.variables, c.variables_codec, c.completion, c.completion_codec,
+                           c.prompt_tokens, c.completion_tokens, c.total_tokens, c.latency_ms, c.error
+                    FROM llm_calls c
+                    LEFT JOIN prompt_templates t ON t.hash = c.template_hash
+                    LEFT JOIN prompt_templates s ON s.hash = c.system_hash
+                    WHERE c.id = ?
+                ''', (call_id,)).fetchone()
+                if row is None:
+                    return None
+                variables = self._decode(conn, row[8], row[9])
+                completion = self._decode(conn, row[10], row[11])
+            finally:
+                conn.close()
+        template = row[6]
+        return {
+            'id': call_id, 'timestamp': row[0], 'inst_id': row[1], 'record_id': row[2], 'stage': row[3],
+            'model': row[4], 'template_hash': row[5],
+            'prompt': template.format(**variables) if template and variables is not None else None,
+            'system_prompt': row[7], 'variables': variables, 'completion': completion,
+            'prompt_tokens': row[12], 'completion_tokens': row[13], 'total_tokens': row[14],
+            'latency_ms': row[15], 'error': row[16],
+        }
+
+    # ---- 维护 ----
+
+    def start_background_maintenance(self):
+        """后台定期维护（守护线程），不占用分析周期和写入线程"""
+        if self._maintainer is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(self.maintenance_interval):
+                try:
+                    self.run_maintenance()
+                except Exception as e:
+                    logger.error(f"审计存储维护失败: {e}")
+
+        self._maintainer = threading.Thread(target=loop, name="audit-maintenance", daemon=True)
+        self._maintainer.start()
+        logger.info(f"审计存储后台维护已启动，间隔 {self.maintenance_interval:.0f} 秒")
+
+    def stop_background_maintenance(self):
+        self._stop.set()
+
+    def run_maintenance(self) -> Dict[str, int]:
+        """
+        删除过期记录，必要时更新字典并分批重新压缩旧记录，清理不再引用的模板和字典。
+        每一步只在短时间内持有锁，维护期间仍可写入新的调用记录。
+        """
+        stats = {'expired': 0, 'recompressed': 0, 'templates': 0, 'dicts': 0}
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock:
+            conn = self._connect()
+            try:
+                stats['expired'] = conn.execute('DELETE FROM llm_calls WHERE timestamp < ?', (cutoff,)).rowcount
+                conn.commit()
+            finally:
+                conn.close()
+
+        if self.compression != COMPRESSION_NONE:
+            for kind in (KIND_VARIABLES, KIND_COMPLETION):
+                self._rotate_dictionary(kind)
+        stats['recompressed'] = self._recompress()
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                stats['templates'] = conn.execute('''
+                    DELETE FROM prompt_templates WHERE hash NOT IN (
+                        SELECT template_hash FROM llm_calls WHERE template_hash IS NOT NULL
+                        UNION SELECT system_hash FROM llm_calls WHERE system_hash IS NOT NULL)
+                ''').rowcount
+                in_use = set(self._current_dict.values())
+                for column in ('variables_codec', 'completion_codec'):
+                    for (codec,) in conn.execute(f'SELECT DISTINCT {column} FROM llm_calls WHERE {column} IS NOT NULL'):
+                        in_use.add(int(codec.split(':')[1]))
+                for (dict_id,) in conn.execute('SELECT id FROM compression_dicts').fetchall():
+                    if dict_id not in in_use:
+                        conn.execute('DELETE FROM compression_dicts WHERE id = ?', (dict_id,))
+                        self._codecs.pop(dict_id, None)
+                        stats['dicts'] += 1
+                conn.commit()
+                self._known_templates.clear()
+                # 删除的数据不多时空闲页留给后续写入复用，不必每次重写整个文件
+                free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                pages = conn.execute('PRAGMA page_count').fetchone()[0]
+                if pages and free / pages >= VACUUM_FREE_RATIO:
+                    conn.execute('VACUUM')
+            finally:
+                conn.close()
+        logger.info(f"审计存储维护完成: 过期 {stats['expired']} 条，重新压缩 {stats['recompressed']} 条，"
+                     f"清理模板 {stats['templates']} 个、字典 {stats['dicts']} 个")
+        return stats
+
+    def _rotate_dictionary(self, kind: str) -> bool:
+        """
+        用较早的样本训练候选字典，在最新的样本上与当前字典比较压缩后大小，
+        明显更小时才启用（之后旧记录才需要重新压缩）。返回是否启用了新字典
+        """
+        with self._lock:
+            samples = list(self._samples[kind])
+            current_id = self._current_dict[kind]
+        if len(samples) < self.train_samples:
+            return False
+        holdout = max(1, len(samples) // 4)
+        candidate = train_dictionary(samples[:-holdout], self.compression, self.dict_size)
+        conn = self._connect()
+        try:
+            current = self._codec(conn, current_id, self.compression)
+        finally:
+            conn.close()
+        trial = DictionaryCodec(self.compression, candidate)
+        current_size = sum(len(current.compress(sample)) for sample in samples[-holdout:])
+        trial_size = sum(len(trial.compress(sample)) for sample in samples[-holdout:])
+        if current_id and trial_size > current_size * (1 - DICT_MIN_GAIN):
+            logger.debug(f"{kind}候选字典压缩后 {trial_size} 字节，当前 {current_size} 字节，不替换")
+            return False
+        with self._lock:
+            conn = self._connect()
+            try:
+                self._save_dictionary(conn, kind, candidate)
+                conn.commit()
+            finally:
+                conn.close()
+        return True
+
+    def _recompress(self) -> int:
+        """
+        把使用旧字典（或无字典）压缩的记录改用当前字典，之后旧字典即可删除。
+        每批在锁外解压和压缩，只在写回时加锁；写回时编码标记已变化的记录跳过
+        """
+        count = 0
+        for kind, column in ((KIND_VARIABLES, 'variables'), (KIND_COMPLETION, 'completion')):
+            last_id = 0
+            while True:
+                dict_id = self._current_dict[kind]
+                current = f"{self.compression}:{dict_id}"
+                conn = self._connect()
+                try:
+                    rows = conn.execute(f'SELECT id, {column}, {column}_codec FROM llm_calls '
+                                        f'WHERE id > ? AND {column} IS NOT NULL AND {column}_codec != ? '
+                                        f'ORDER BY id LIMIT ?', (last_id, current, RECOMPRESS_BATCH)).fetchall()
+                    if not rows:
+                        break
+                    target = self._codec(conn, dict_id, self.compression)
+                    updates = [(target.compress(dumps(self._decode(conn, blob, codec)).encode('utf-8')),
+                                current, call_id, codec) for call_id, blob, codec in rows]
+                finally:
+                    conn.close()
+                last_id = rows[-1][0]
+                with self._lock:
+                    conn = self._connect()
+                    try:
+                        count += conn.executemany(f'UPDATE llm_calls SET {column} = ?, {column}_codec = ? '
+                                                  f'WHERE id = ? AND {column}_codec = ?', updates).rowcount
+                        conn.commit()
+                    finally:
+                        conn.close()
+        return count
+
+    def size_stats(self) -> Dict[str, int]:
+        """各部分占用的字节数"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                calls, variables, completions = conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(LENGTH(variables)), 0), COALESCE(SUM(LENGTH(completion)), 0) '
+                    'FROM llm_calls').fetchone()
+                templates = conn.execute('SELECT COALESCE(SUM(LENGTH(content)), 0) FROM prompt_templates').fetchone()[0]
+                dicts = conn.execute('SELECT COALESCE(SUM(LENGTH(content)), 0) FROM compression_dicts').fetchone()[0]
+            finally:
+                conn.close()
+        return {'calls': calls, 'variables': variables, 'completions': completions,
+                'templates': templates, 'dicts': dicts}
@@ -0,0 +1,93 @@
+"""
+检查点基准测试
+
+用录制的行情和 LLM 回复运行若干周期使增量状态（多周期聚合、成交流窗口、市场状态）填满，然后测量:
+- save: 导出状态并原子写入检查点的耗时和文件大小
+- restore: 新建机器人后从检查点恢复的耗时
+- cold: 冷启动时启动自检（一次完整分析周期，按 --okx-latency / --llm-latency 模拟网络延迟）的耗时
+
+用法:
+    python benchmarks/bench_checkpoint.py --warm-cycles 20 --okx-latency 0.15 --llm-latency 3
+"""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import regime_detector
+from config import get_config
+from db import TradingAnalysisDB
+from fakes import NullEmailNotifier, fake_components
+from frame_codec import (COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD, SERIALIZER_JSON, SERIALIZER_MSGPACK,
+                         default_compression, default_serializer)
+from trading_bot import TradingAnalysisBot
+
+INST_ID = "ETH-USDT-SWAP"
+SERIALIZERS = {SERIALIZER_JSON: "json", SERIALIZER_MSGPACK: "msgpack"}
+COMPRESSIONS = {COMPRESSION_NONE: "不压缩", COMPRESSION_ZLIB: "zlib", COMPRESSION_ZSTD: "zstd"}
+
+
+def _bot(config, workdir: str) -> TradingAnalysisBot:
+    components = fake_components(INST_ID, config)
+    return TradingAnalysisBot(INST_ID, config=config, database=TradingAnalysisDB(os.path.join(workdir, "bench.db")),
+                              email_notifier=NullEmailNotifier(config), candle_store=None, **components)
+
+
+def _timed(op, rounds: int) -> float:
+    """平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        op()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查点基准测试")
+    parser.add_argument('--warm-cycles', type=int, default=20, help="保存前运行的周期数")
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--okx-latency', type=float, default=0.15, help="冷启动时每次 OKX 请求的模拟延迟（秒）")
+    parser.add_argument('--llm-latency', type=float, default=3.0, help="冷启动时 LLM 请求的模拟延迟（秒）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    with tempfile.TemporaryDirectory(prefix="bench_ckpt_") as workdir:
+        os.environ['CHECKPOINT_PATH'] = os.path.join(workdir, "bot_state.ckpt")
+        os.environ['AUDIT_ENABLED'] = 'false'
+        os.environ['CANDLE_STORE_PATH'] = ''
+        config = get_config()
+        bot = _bot(config, workdir)
+        with contextlib.redirect_stdout(io.StringIO()):  # 周期结果的控制台输出
+            for _ in range(args.warm_cycles):
+                bot.run_analysis_cycle()
+
+        save_ms = _timed(bot.save_checkpoint, args.rounds)
+        size = os.path.getsize(config.checkpoint.path)
+
+        def restore():
+            regime_detector._shared_tracker = None  # 与新进程一样从空的跟踪器开始
+            _bot(config, workdir).restore_checkpoint()
+        build_ms = _timed(lambda: _bot(config, workdir), args.rounds)
+        restore_ms = _timed(restore, args.rounds) - build_ms
+
+        cold = _bot(config, workdir)
+        cold.market_data.latency = args.okx_latency
+        cold.analyzer._call_deepseek_api.latency = args.llm_latency
+        with contextlib.redirect_stdout(io.StringIO()):
+            cold_ms = _timed(cold.run_analysis_cycle, 1)
+
+    print(f"编码: {SERIALIZERS[default_serializer()]} / {COMPRESSIONS[default_compression()]}")
+    print(f"保存检查点: {save_ms:>9.2f} 毫秒  ({size / 1024:.1f}KB, {args.warm_cycles} 个周期后)")
+    print(f"恢复检查点: {restore_ms:>9.2f} 毫秒")
+    print(f"冷启动自检: {cold_ms:>9.2f} 毫秒  (OKX {args.okx_latency}s × 4, LLM {args.llm_latency}s)")
+
+
+if __name__ == "__main__":
+    main()
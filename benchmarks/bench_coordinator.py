@@ -0,0 +1,77 @@
+"""
+协调模式扩展性基准测试
+
+用录制的行情和 LLM 回复（fakes.fake_components）在 1/2/4 个工作进程下运行同一组交易对，
+分析间隔远小于单个周期耗时，使各进程始终满载，测量协调进程每秒收到的周期数。
+理想情况下吞吐量随进程数线性增长，直到达到 CPU 核数或数据库写入线程的上限。
+
+用法:
+    python benchmarks/bench_coordinator.py --workers 1 2 4 --instruments 64 --seconds 10
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from audit_store import AuditStore
+from candle_store import CandleStore
+from config import get_config
+from coordinator import Coordinator
+from db import TradingAnalysisDB
+from fakes import NullEmailNotifier, fake_components
+
+
+def _run(n_workers: int, inst_ids, seconds: float, interval: float, warmup: float, workdir: str) -> float:
+    """返回稳定运行期间每秒完成的周期数"""
+    config = get_config()
+    coordinator = Coordinator(
+        config, inst_ids=inst_ids, workers=n_workers, component_factory=fake_components,
+        database=TradingAnalysisDB(os.path.join(workdir, f"coord_{n_workers}.db")),
+        email_notifier=NullEmailNotifier(config),
+        audit_store=AuditStore(os.path.join(workdir, f"audit_{n_workers}.db")),
+        candle_store=CandleStore(os.path.join(workdir, f"candles_{n_workers}.db")),
+        interval=interval, immediate=True, quiet=True,
+    )
+    coordinator.start()
+    try:
+        time.sleep(warmup)  # 进程启动和首次导入
+        start_cycles, started = coordinator.cycles, time.perf_counter()
+        time.sleep(seconds)
+        return (coordinator.cycles - start_cycles) / (time.perf_counter() - started)
+    finally:
+        coordinator.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="协调模式扩展性基准测试")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--instruments', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=5.0)
+    parser.add_argument('--interval', type=float, default=0.05, help="每个交易对的分析间隔（秒）")
+    args = parser.parse_args()
+
+    os.environ['SCHEDULE_ALIGN_TO_BAR'] = 'false'  # 工作进程按继承的环境变量构建配置
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    logging.basicConfig(level=logging.ERROR)
+    inst_ids = [f"BENCH{i}-USDT-SWAP" for i in range(args.instruments)]
+
+    print(f"CPU 核数: {os.cpu_count()} | 交易对: {args.instruments} | 间隔: {args.interval}s | 测量: {args.seconds}s")
+    print(f"{'进程数':>6} {'周期/秒':>10} {'加速比':>8} {'效率':>8}")
+    baseline = None
+    with tempfile.TemporaryDirectory(prefix="bench_coord_") as workdir:
+        for n_workers in args.workers:
+            rate = _run(n_workers, inst_ids, args.seconds, args.interval, args.warmup, workdir)
+            baseline = baseline or rate
+            speedup = rate / baseline if baseline else 0.0
+            print(f"{n_workers:>6} {rate:>10.1f} {speedup:>7.2f}x {speedup / n_workers * 100:>7.0f}%")
+
+
+if __name__ == "__main__":
+    main()
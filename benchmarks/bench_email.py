@@ -0,0 +1,90 @@
+"""
+邮件渲染基准测试
+
+用录制的 LLM 回复构造提醒数据，测量:
+- render: 单条提醒渲染主题 + 纯文本 + HTML（每秒渲染次数）
+- mime: 构建 multipart/alternative 并序列化为待发送的字节（send_message 前的全部本地开销）
+- burst: N 个交易对同时触发时，逐条渲染发送 N 封 vs 合并为一封摘要邮件
+
+用法:
+    python benchmarks/bench_email.py --rounds 2000 --burst 20
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from email_templates import RECOMMENDATIONS, build_message, render_alert, render_digest
+from fakes import LLM_FIXTURE, load_fixture
+from serialization import decode_decision
+
+
+def _time_per_op(op: Callable[[], object], rounds: int) -> float:
+    """单次操作的平均耗时（微秒）"""
+    op()  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        op()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def _alerts(n: int) -> List[Dict]:
+    """按录制的回复构造 n 条提醒，轮流使用全部建议类型，部分带紧急/持仓/止盈止损区块"""
+    completions = load_fixture(LLM_FIXTURE)
+    recommendations = list(RECOMMENDATIONS)
+    alerts = []
+    for i in range(n):
+        content = completions[i % len(completions)]['choices'][0]['message']['content']
+        decision = decode_decision(content[content.find('{'):content.rfind('}') + 1]).to_dict()
+        alerts.append({
+            'inst_id': f"BENCH{i}-USDT-SWAP", 'current_price': 2500.0 + i,
+            'recommendation': recommendations[i % len(recommendations)], 'confidence': decision['confidence'],
+            'analysis_summary': decision['analysis'], 'reasoning': decision['reasoning'],
+            'support_levels': decision['support_levels'], 'resistance_levels': decision['resistance_levels'],
+            'position_action': 'CLOSE_PARTIAL' if i % 3 == 0 else 'HOLD',
+            'stop_adjustment': {'should_adjust': i % 2 == 0, 'new_take_profit': 2600.0 + i,
+                                'new_stop_loss': 2400.0 + i, 'reason': '波动放大，收紧止损'},
+            'urgent_action': i % 5 == 0, 'urgent_reason': '跌破关键支撑位',
+        })
+    return alerts
+
+
+def _mime_bytes(rendered) -> bytes:
+    return build_message(rendered, "bench@example.com", "receiver@example.com").as_bytes()
+
+
+def run(rounds: int, burst: int) -> Dict[str, float]:
+    alerts = _alerts(burst)
+    alert = alerts[0]
+    rendered = render_alert(alert)
+    burst_rounds = max(1, rounds // burst)
+    return {
+        'render': _time_per_op(lambda: render_alert(alert), rounds),
+        'mime': _time_per_op(lambda: _mime_bytes(rendered), rounds),
+        'burst_single': _time_per_op(lambda: [_mime_bytes(render_alert(a)) for a in alerts], burst_rounds),
+        'burst_digest': _time_per_op(lambda: _mime_bytes(render_digest(alerts)), burst_rounds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件渲染基准测试")
+    parser.add_argument('--rounds', type=int, default=2000, help="单条渲染重复次数")
+    parser.add_argument('--burst', type=int, default=20, help="同时触发提醒的交易对数")
+    args = parser.parse_args()
+
+    results = run(args.rounds, args.burst)
+    print(f"单条渲染:   {results['render']:>9.1f} 微秒  ({1e6 / results['render']:,.0f} 次/秒)")
+    print(f"MIME 构建:  {results['mime']:>9.1f} 微秒  ({1e6 / results['mime']:,.0f} 封/秒)")
+    print(f"{args.burst} 条同时触发:")
+    print(f"  逐条发送: {results['burst_single'] / 1000:>9.2f} 毫秒  ({args.burst} 封)")
+    print(f"  摘要邮件: {results['burst_digest'] / 1000:>9.2f} 毫秒  (1 封, "
+          f"{results['burst_single'] / results['burst_digest']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
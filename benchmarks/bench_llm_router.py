@@ -0,0 +1,112 @@
+"""
+LLM 路由基准测试
+
+启动若干本地替身服务，对比单一提供方与路由（失败转移 / 对冲）在以下场景的请求延迟和成功率:
+- slow_tail: 首选提供方偶发长尾延迟
+- outage: 首选提供方持续返回 503（验证熔断后不再等待它）
+- degraded: 首选提供方整体变慢（验证按 EWMA 延迟切换）
+
+用法:
+    python benchmarks/bench_llm_router.py --requests 40
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from llm_router import LLMProvider, LLMRouter, LLMRouterError
+from stub_llm_server import StubLLMServer
+
+PAYLOAD = {"messages": [{"role": "user", "content": "bench"}], "temperature": 0.3}
+
+# 场景: (首选服务参数, 备用服务参数)
+SCENARIOS = {
+    'slow_tail': ({'latency': 0.05, 'jitter': 0.0, 'tail_rate': 0.15, 'tail_latency': 1.5},
+                  {'latency': 0.12}),
+    'outage': ({'latency': 0.05, 'error_rate': 1.0}, {'latency': 0.12}),
+    'degraded': ({'latency': 0.6}, {'latency': 0.12}),
+}
+
+
+class TailStub(StubLLMServer):
+    """按概率出现长尾延迟的替身服务"""
+
+    def __init__(self, tail_rate: float = 0.0, tail_latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+
+    def next_response(self):
+        delay, status, body = super().next_response()
+        if self._random.random() < self.tail_rate:
+            delay += self.tail_latency
+        return delay, status, body
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _run_mode(router: LLMRouter, n_requests: int, timeout: float) -> Dict:
+    latencies, failures = [], 0
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        try:
+            router.complete(PAYLOAD, timeout=timeout)
+        except LLMRouterError:
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+    return {'p50': _percentile(latencies, 50), 'p95': _percentile(latencies, 95),
+            'max': max(latencies), 'failures': failures, 'hedged': router.hedged}
+
+
+def run(n_requests: int, timeout: float = 3.0) -> Dict[str, Dict[str, Dict]]:
+    results = {}
+    for scenario, (primary_args, backup_args) in SCENARIOS.items():
+        results[scenario] = {}
+        modes = {
+            'single': dict(use_backup=False, hedge=False),
+            'failover': dict(use_backup=True, hedge=False),
+            'hedged': dict(use_backup=True, hedge=True),
+        }
+        for mode, options in modes.items():
+            primary = TailStub(seed=1, **primary_args).start()
+            backup = TailStub(seed=2, **backup_args).start()
+            try:
+                providers = [LLMProvider('primary', primary.base_url, 'key', 'stub')]
+                if options['use_backup']:
+                    providers.append(LLMProvider('backup', backup.base_url, 'key', 'stub'))
+                router = LLMRouter(providers, hedge=options['hedge'], hedge_delay=0.3, min_hedge_delay=0.1,
+                                   failure_threshold=3, circuit_cooldown=30.0)
+                results[scenario][mode] = _run_mode(router, n_requests, timeout)
+                router.close()
+            finally:
+                primary.stop()
+                backup.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 路由基准测试")
+    parser.add_argument('--requests', type=int, default=40, help="每种模式的请求次数")
+    parser.add_argument('--timeout', type=float, default=3.0, help="单次请求截止时间（秒）")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    results = run(args.requests, args.timeout)
+    print(f"{'场景':<12}{'模式':<10}{'p50(ms)':>10}{'p95(ms)':>10}{'max(ms)':>10}{'失败':>6}{'对冲':>6}")
+    for scenario, modes in results.items():
+        for mode, r in modes.items():
+            print(f"{scenario:<12}{mode:<10}{r['p50'] * 1000:>10.0f}{r['p95'] * 1000:>10.0f}"
+                  f"{r['max'] * 1000:>10.0f}{r['failures']:>6}{r['hedged']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+序列化基准测试
+
+对每个已安装的 JSON 后端（orjson / msgspec / 标准库），测量一个分析周期中的三条序列化路径:
+- market_data: 完整市场数据编码为 market_data_json
+- record: 分析结果编码为 raw_response + 数据库行（支撑/阻力位列表）
+- decision: LLM 返回内容解码为 Decision（含校验和默认值）
+并与改造前的标准库写法（json.dumps / json.loads + 手工补字段）对比。
+
+用法:
+    python benchmarks/bench_serialization.py --rounds 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import serialization
+from fakes import LLM_FIXTURE, MARKET_FIXTURE, load_fixture
+from serialization import AnalysisRecord, available_backends, decode_decision, encode_market_data, set_backend
+
+
+def _time_per_op(op: Callable[[], object], rounds: int) -> float:
+    """单次操作的平均耗时（微秒）"""
+    op()  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        op()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def _extract_json(completion: Dict) -> str:
+    content = completion['choices'][0]['message']['content']
+    return content[content.find('{'):content.rfind('}') + 1]
+
+
+def _legacy_decision(text: str) -> Dict:
+    """改造前 _parse_analysis_response 的解码和补字段"""
+    result = json.loads(text)
+    for name in ('recommendation', 'confidence', 'analysis', 'reasoning'):
+        result.setdefault(name, "未知")
+    result.setdefault('position_action', 'HOLD')
+    result.setdefault('stop_adjustment', {'should_adjust': False, 'new_take_profit': None,
+                                          'new_stop_loss': None, 'reason': ''})
+    result.setdefault('urgent_action', False)
+    result.setdefault('urgent_reason', '')
+    return result
+
+
+def run(rounds: int) -> Dict[str, Dict[str, float]]:
+    market_data = load_fixture(MARKET_FIXTURE)
+    decision_json = _extract_json(load_fixture(LLM_FIXTURE)[0])
+    decision = decode_decision(decision_json).to_dict()
+    record = {
+        'inst_id': 'ETH-USDT-SWAP', 'current_price': float(market_data['ticker']['data'][0]['last']),
+        'recommendation': decision['recommendation'], 'confidence': decision['confidence'],
+        'analysis_summary': decision['analysis'], 'reasoning': decision['reasoning'],
+        'support_levels': decision['support_levels'], 'resistance_levels': decision['resistance_levels'],
+    }
+
+    results = {
+        'json (旧写法)': {
+            'market_data': _time_per_op(lambda: json.dumps(market_data), rounds),
+            'record': _time_per_op(lambda: (json.dumps(decision), json.dumps(record['support_levels']),
+                                            json.dumps(record['resistance_levels'])), rounds),
+            'decision': _time_per_op(lambda: _legacy_decision(decision_json), rounds),
+        }
+    }
+    original = serialization.BACKEND
+    try:
+        for backend in available_backends():
+            set_backend(backend)
+            results[backend] = {
+                'market_data': _time_per_op(lambda: encode_market_data(market_data), rounds),
+                'record': _time_per_op(lambda: (serialization.dumps(decision),
+                                                AnalysisRecord.from_dict(record).to_row()), rounds),
+                'decision': _time_per_op(lambda: decode_decision(decision_json), rounds),
+            }
+    finally:
+        set_backend(original)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="序列化基准测试")
+    parser.add_argument('--rounds', type=int, default=1000, help="每条路径重复次数")
+    args = parser.parse_args()
+
+    results = run(args.rounds)
+    print(f"{'后端':<14}{'market_data':>14}{'record':>12}{'decision':>12}{'每周期合计':>14}  (微秒)")
+    for backend, paths in results.items():
+        total = sum(paths.values())
+        print(f"{backend:<14}{paths['market_data']:>14.1f}{paths['record']:>12.1f}"
+              f"{paths['decision']:>12.1f}{total:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
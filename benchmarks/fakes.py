@@ -0,0 +1,119 @@
+"""
+基准测试用的本地替身
+
+用录制的 OKX 响应和 LLM 回复替代真实网络调用，保证每次测量的输入完全一致。
+"""
+import copy
+import itertools
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from email_notifier import EmailNotifier
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+MARKET_FIXTURE = os.path.join(FIXTURES_DIR, "okx_market_data.json")
+LLM_FIXTURE = os.path.join(FIXTURES_DIR, "llm_completions.json")
+
+
+def load_fixture(path: str):
+    """读取 JSON 夹具文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FixtureMarketData:
+    """回放录制的OKX响应，接口与 OKXMarketData 一致"""
+
+    def __init__(self, fixture_path: str = MARKET_FIXTURE, latency: float = 0.0):
+        """
+        Args:
+            fixture_path: 录制的市场数据文件
+            latency: 每次请求模拟的网络延迟（秒）
+        """
+        self.fixture = load_fixture(fixture_path)
+        self.latency = latency
+        self._per_inst: Dict[str, Dict] = {}
+
+    def _responses(self, inst_id: str) -> Dict:
+        """按交易对改写 instId，结果缓存以免把复制开销计入测量"""
+        if inst_id not in self._per_inst:
+            responses = copy.deepcopy(self.fixture)
+            for row in responses['ticker']['data']:
+                row['instId'] = inst_id
+            for row in responses['trades']['data']:
+                row['instId'] = inst_id
+            self._per_inst[inst_id] = responses
+        return self._per_inst[inst_id]
+
+    def _respond(self, inst_id: str, key: str) -> Dict:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._responses(inst_id)[key]
+
+    def get_ticker(self, inst_id: str) -> Dict:
+        return self._respond(inst_id, 'ticker')
+
+    def get_orderbook(self, inst_id: str, sz: str = "20") -> Dict:
+        return self._respond(inst_id, 'orderbook')
+
+    def get_candlesticks(self, inst_id: str, bar: str = "5m", limit: str = "200") -> Dict:
+        return self._respond(inst_id, 'candlesticks')
+
+    def get_trades(self, inst_id: str, limit: str = "200") -> Dict:
+        return self._respond(inst_id, 'trades')
+
+    def get_all_market_data(self, inst_id: str, config) -> Dict:
+        return {
+            'ticker': self.get_ticker(inst_id),
+            'orderbook': self.get_orderbook(inst_id),
+            'candlesticks': self.get_candlesticks(inst_id),
+            'trades': self.get_trades(inst_id)
+        }
+
+
+class FakeCompletionSource:
+    """按顺序循环返回录制的 chat completion，替换 DeepSeekAnalyzer._call_deepseek_api"""
+
+    def __init__(self, fixture_path: str = LLM_FIXTURE, latency: float = 0.0):
+        self.completions: List[Dict] = load_fixture(fixture_path)
+        self.latency = latency
+        self._cycle = itertools.cycle(self.completions)
+        self.calls = 0
+
+    def __call__(self, prompt: str, *args, **kwargs) -> Dict:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return next(self._cycle)
+
+
+class NullEmailNotifier(EmailNotifier):
+    """完整渲染邮件正文，但不连接SMTP服务器"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.sent: int = 0
+        self.last_body: Optional[str] = None
+
+    def _send_email(self, subject: str, body: str, text: str = "") -> bool:
+        self.sent += 1
+        self.last_body = body
+        return True
+
+
+_worker_market_data: Optional[FixtureMarketData] = None
+
+
+def fake_components(inst_id: str, config) -> Dict:
+    """协调模式的 component_factory: 工作进程内共享录制行情，每个交易对一个使用录制回复的分析器"""
+    global _worker_market_data
+    from deepseek_analyzer import DeepSeekAnalyzer  # 只在工作进程中加载
+
+    if _worker_market_data is None:
+        _worker_market_data = FixtureMarketData()
+    analyzer = DeepSeekAnalyzer(config)
+    analyzer.positions_file = os.path.join(FIXTURES_DIR, "no_positions.json")  # 不存在，按空仓处理
+    analyzer._call_deepseek_api = FakeCompletionSource()
+    return {'market_data': _worker_market_data, 'analyzer': analyzer}
@@ -0,0 +1,53 @@
+"""
+录制基准测试夹具
+
+从 OKX 拉取一次真实的 ticker/books/candles/trades 响应写入 fixtures/okx_market_data.json；
+加 --with-llm 时再用当前配置调用一次模型，把回复追加到 fixtures/llm_completions.json。
+
+用法:
+    python benchmarks/record_fixtures.py [--inst-id ETH-USDT-SWAP] [--with-llm]
+"""
+import argparse
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import get_config
+from market_data import OKXMarketData
+from fakes import MARKET_FIXTURE, LLM_FIXTURE, load_fixture
+
+
+def main():
+    config = get_config()
+    parser = argparse.ArgumentParser(description="录制基准测试夹具")
+    parser.add_argument('--inst-id', default=config.trading.inst_id)
+    parser.add_argument('--with-llm', action='store_true', help="同时录制一次LLM回复")
+    args = parser.parse_args()
+
+    market_data = OKXMarketData(flag="0").get_all_market_data(args.inst_id, config)
+    with open(MARKET_FIXTURE, 'w', encoding='utf-8') as f:
+        json.dump(market_data, f, ensure_ascii=False, indent=1)
+    print(f"市场数据已录制: {MARKET_FIXTURE}")
+
+    if args.with_llm:
+        from deepseek_analyzer import DeepSeekAnalyzer
+
+        analyzer = DeepSeekAnalyzer(config)
+        completion = analyzer._call_deepseek_api(analyzer._build_analysis_prompt(market_data, args.inst_id))
+        completions = load_fixture(LLM_FIXTURE) if os.path.exists(LLM_FIXTURE) else []
+        completions.append(completion)
+        with open(LLM_FIXTURE, 'w', encoding='utf-8') as f:
+            json.dump(completions, f, ensure_ascii=False, indent=1)
+        print(f"LLM回复已追加: {LLM_FIXTURE} (共 {len(completions)} 条)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+分析周期基准测试
+
+使用 fixtures/ 中录制的 OKX 响应和 LLM 回复，分别测量各环节的吞吐量和延迟:
+指标计算、提示词构建、响应解析、数据库写入、邮件正文渲染以及完整的 run_analysis_cycle。
+每个环节按 1/10/100 个交易对的规模运行，结果保存为 JSON 便于在不同提交之间比较。
+
+用法:
+    python benchmarks/run_benchmarks.py                       # 默认规模 1 10 100
+    python benchmarks/run_benchmarks.py -n 1 10 --rounds 5
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from audit_store import AuditStore
+from candle_store import CandleStore
+from config import get_config
+from db import TradingAnalysisDB
+from deepseek_analyzer import DeepSeekAnalyzer
+from email_templates import render_alert
+from trading_bot import TradingAnalysisBot
+from fakes import FixtureMarketData, FakeCompletionSource, NullEmailNotifier
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+class BenchEnvironment:
+    """N 个交易对共享同一套本地替身和临时数据库"""
+
+    def __init__(self, n_instruments: int, workdir: str):
+        self.inst_ids = ["ETH-USDT-SWAP"] + [f"BENCH{i}-USDT-SWAP" for i in range(1, n_instruments)]
+        self.market_data = FixtureMarketData()
+        self.completions = FakeCompletionSource()
+        self.database = TradingAnalysisDB(os.path.join(workdir, f"bench_{n_instruments}.db"))
+        self.audit_store = AuditStore(os.path.join(workdir, f"audit_{n_instruments}.db"))
+        self.candle_store = CandleStore(os.path.join(workdir, f"candles_{n_instruments}.db"))
+        self.notifier = NullEmailNotifier(get_config())
+        self.positions_file = os.path.join(workdir, "positions.json")  # 不存在，按空仓处理
+
+        self.bots: List[TradingAnalysisBot] = []
+        for inst_id in self.inst_ids:
+            analyzer = DeepSeekAnalyzer(get_config())
+            analyzer.positions_file = self.positions_file
+            analyzer._call_deepseek_api = self.completions
+            self.bots.append(TradingAnalysisBot(
+                inst_id=inst_id,
+                market_data=self.market_data,
+                analyzer=analyzer,
+                database=self.database,
+                email_notifier=self.notifier,
+                audit_store=self.audit_store,
+                candle_store=self.candle_store,
+            ))
+
+        self.snapshots = {inst_id: self.market_data.get_all_market_data(inst_id, get_config())
+                          for inst_id in self.inst_ids}
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.sample_record = self.bots[0].run_analysis_cycle()
+
+
+def _component_ops(env: BenchEnvironment) -> Dict[str, List[Callable[[], object]]]:
+    """每个环节对应一组操作，每个交易对一次"""
+    ops: Dict[str, List[Callable[[], object]]] = {
+        'indicators': [], 'prompt_build': [], 'response_parse': [],
+        'db_write': [], 'email_render': [], 'full_cycle': [],
+    }
+    record = dict(env.sample_record)
+    for bot in env.bots:
+        snapshot = env.snapshots[bot.inst_id]
+        analyzer = bot.analyzer
+        klines = snapshot['candlesticks']['data']
+        completion = env.completions.completions[0]
+        inst_record = dict(record, inst_id=bot.inst_id)
+
+        ops['indicators'].append(lambda a=analyzer, k=klines: a._calculate_technical_indicators(k))
+        ops['prompt_build'].append(lambda a=analyzer, s=snapshot, i=bot.inst_id: a._build_analysis_prompt(s, i))
+        ops['response_parse'].append(lambda a=analyzer, c=completion: a._parse_analysis_response(c))
+        ops['db_write'].append(lambda r=inst_record: env.database.save_analysis(r))
+        ops['email_render'].append(lambda r=inst_record: render_alert(r))
+        ops['full_cycle'].append(bot.run_analysis_cycle)
+    return ops
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(ops: List[Callable[[], object]], rounds: int) -> Dict:
+    """依次执行所有操作 rounds 轮，统计单次延迟和整体吞吐量"""
+    latencies: List[float] = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            for op in ops:
+                t0 = time.perf_counter()
+                op()
+                latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    to_ms = 1000.0
+    return {
+        'ops': len(latencies),
+        'total_s': round(total, 6),
+        'throughput_ops_s': round(len(latencies) / total, 2) if total > 0 else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * to_ms, 4),
+            'p50': round(_percentile(latencies, 50) * to_ms, 4),
+            'p95': round(_percentile(latencies, 95) * to_ms, 4),
+            'p99': round(_percentile(latencies, 99) * to_ms, 4),
+            'max': round(latencies[-1] * to_ms, 4),
+        },
+    }
+
+
+def run(instrument_counts: List[int], rounds: int, components: List[str] = None) -> Dict:
+    """运行所有规模下的基准测试"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="okx-bench-") as workdir:
+        for n in instrument_counts:
+            env = BenchEnvironment(n, workdir)
+            for name, ops in _component_ops(env).items():
+                if components and name not in components:
+                    continue
+                stats = measure(ops, rounds)
+                stats.update({'component': name, 'instruments': n})
+                results.append(stats)
+                print(f"{name:<16} n={n:<4} {stats['throughput_ops_s']:>10} ops/s  "
+                      f"p50={stats['latency_ms']['p50']:.3f}ms  p95={stats['latency_ms']['p95']:.3f}ms")
+
+    return {'meta': _metadata(rounds), 'results': results}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def _metadata(rounds: int) -> Dict:
+    return {
+        'commit': _git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'strategy': get_config().trading.strategy_name,
+        'rounds': rounds,
+    }
+
+
+def save_results(report: Dict, output_dir: str = RESULTS_DIR) -> str:
+    """结果文件名包含时间和提交号"""
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(output_dir, f"bench_{stamp}_{report['meta']['commit']}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def compare(baseline_path: str, current_path: str, threshold: float = 10.0) -> int:
+    """对比两次结果，p50 变慢超过 threshold% 视为回归，返回回归项数量"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    base_index = {(r['component'], r['instruments']): r for r in baseline['results']}
+    print(f"基准: {baseline['meta']['commit']}  当前: {current['meta']['commit']}")
+    regressions = 0
+    for row in current['results']:
+        base = base_index.get((row['component'], row['instruments']))
+        if not base:
+            continue
+        old_p50 = base['latency_ms']['p50']
+        new_p50 = row['latency_ms']['p50']
+        change = (new_p50 - old_p50) / old_p50 * 100 if old_p50 else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  ⚠️ 回归"
+            regressions += 1
+        print(f"{row['component']:<16} n={row['instruments']:<4} p50 {old_p50:.3f} -> {new_p50:.3f} ms "
+              f"({change:+.1f}%){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析周期基准测试")
+    parser.add_argument('-n', '--instruments', type=int, nargs='+', default=[1, 10, 100],
+                        help="交易对数量规模")
+    parser.add_argument('--rounds', type=int, default=3, help="每个规模重复的轮数")
+    parser.add_argument('--component', action='append', help="只运行指定环节（可重复）")
+    parser.add_argument('--output', default=RESULTS_DIR, help="结果输出目录")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="比较两次结果文件")
+    parser.add_argument('--threshold', type=float, default=10.0, help="回归判定阈值(%%)")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run(args.instruments, args.rounds, args.component)
+    path = save_results(report, args.output)
+    print(f"\n结果已保存: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+本地 LLM 替身服务
+
+OpenAI 兼容的 /chat/completions 接口，按顺序返回录制的 completion，
+延迟、抖动和错误率可配置，用于测试 LLM 路由的对冲、熔断和失败转移。
+
+用法:
+    python benchmarks/stub_llm_server.py --port 18001 --latency 0.5 --error-rate 0.1
+然后设置 LLM_PROVIDERS=stub，LLM_STUB_BASE_URL=http://127.0.0.1:18001/v1
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from fakes import LLM_FIXTURE, load_fixture
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """可配置延迟和错误率的 chat completion 服务（在后台线程运行）"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, completions: Optional[List[Dict]] = None, seed: Optional[int] = None):
+        """
+        Args:
+            port: 监听端口，0 表示自动分配
+            latency: 每次请求的基础延迟（秒），运行中可直接修改
+            jitter: 在基础延迟上增加 0~jitter 秒的随机延迟
+            error_rate: 返回错误状态码的概率，运行中可直接修改
+            error_status: 错误时返回的 HTTP 状态码
+            completions: 返回的 completion 列表，默认使用录制夹具
+        """
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._completions = itertools.cycle(completions or load_fixture(LLM_FIXTURE))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def next_response(self):
+        """返回 (延迟, 状态码, 响应体)"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if self._random.random() < self.error_rate:
+                return delay, self.error_status, {"error": {"message": "stub error"}}
+            return delay, 200, next(self._completions)
+
+    def start(self) -> 'StubLLMServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubLLMServer
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if not self.path.endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        delay, status, body = self.server.next_response()
+        time.sleep(delay)
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端已超时断开
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 LLM 替身服务")
+    parser.add_argument('--port', type=int, default=18001)
+    parser.add_argument('--latency', type=float, default=0.5, help="基础延迟（秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="随机附加延迟上限（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回错误的概率")
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    print(f"LLM 替身服务: {server.base_url} (延迟 {args.latency}s + 0~{args.jitter}s，错误率 {args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
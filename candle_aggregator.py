@@ -0,0 +1,203 @@
+"""
+多周期K线聚合
+
+由单一基础周期（如 1m/5m/15m）的K线在本地增量合成更高周期（15m/1H/4H/1D），
+不需要为每个周期单独调用 get_candlesticks。
+对齐规则与 OKX 一致: 6H/12H/1D 按香港时间(UTC+8)开盘对齐，带 utc 后缀或更短的周期按 UTC 对齐。
+"""
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from indicators import rsi, sma
+from market_model import parse_candles
+from strategy_config import bar_to_seconds
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGETS = ("15m", "1H", "4H", "1D")
+HK_ALIGNED_BARS = ("6H", "12H", "1D", "2D", "3D")
+HK_OFFSET_MS = 8 * 3600 * 1000
+
+# (ts, o, h, l, c, vol, volCcy, volCcyQuote)
+Bar = Tuple[int, float, float, float, float, float, float, float]
+
+
+def bucket_offset_ms(bar: str) -> int:
+    """返回周期对齐的时区偏移（毫秒）"""
+    return HK_OFFSET_MS if bar in HK_ALIGNED_BARS else 0
+
+
+def bucket_start(ts: int, size_ms: int, offset_ms: int = 0) -> int:
+    """ts 所在周期的开始时间"""
+    return (ts + offset_ms) // size_ms * size_ms - offset_ms
+
+
+def _merge(rows: List[Bar]) -> Bar:
+    return (
+        rows[0][0],
+        rows[0][1],
+        max(r[2] for r in rows),
+        min(r[3] for r in rows),
+        rows[-1][4],
+        sum(r[5] for r in rows),
+        sum(r[6] for r in rows),
+        sum(r[7] for r in rows),
+    )
+
+
+def _to_okx(bar: Bar, start: int, confirm: bool) -> List[str]:
+    return [str(start)] + [f"{v:.10g}" for v in bar[1:]] + ["1" if confirm else "0"]
+
+
+class CandleAggregator:
+    """增量合成高周期K线
+
+    ingest() 接收 OKX 格式K线（任意顺序，可重复，未收盘K线会被后续版本覆盖）；
+    高周期的一个桶在出现下一个桶的基础K线后才定稿，当前桶以未收盘(confirm=0)形式返回。
+    """
+
+    def __init__(self, base_bar: str, targets: Sequence[str] = DEFAULT_TARGETS, history: int = 200):
+        self.base_bar = base_bar
+        self.base_ms = bar_to_seconds(base_bar) * 1000
+        self.targets = [t for t in targets
+                        if bar_to_seconds(t) * 1000 > self.base_ms and bar_to_seconds(t) * 1000 % self.base_ms == 0]
+        self.size_ms = {t: bar_to_seconds(t) * 1000 for t in self.targets}
+        self.offset_ms = {t: bucket_offset_ms(t) for t in self.targets}
+
+        self._base: Dict[int, Tuple[Bar, bool]] = {}  # ts -> (K线, 是否收盘)
+        self._completed: Dict[str, Deque[List[str]]] = {t: deque(maxlen=history) for t in self.targets}
+        self._finalized_until: Dict[str, Optional[int]] = {t: None for t in self.targets}
+        self.latest_ts: Optional[int] = None
+        self.first_ts: Optional[int] = None  # 接入以来最早的基础K线
+
+    def ingest(self, candles: Union[Sequence[Sequence[str]], np.ndarray]) -> int:
+        """写入基础周期K线（OKX 原始格式或 CANDLE_DTYPE 数组），返回新定稿的高周期K线数量"""
+        if not isinstance(candles, np.ndarray):
+            candles = parse_candles(candles)
+        for row in candles.tolist():
+            ts = row[0]
+            if self._is_finalized(ts):
+                continue
+            self._base[ts] = (tuple(row[:8]), row[8])
+            if self.latest_ts is None or ts > self.latest_ts:
+                self.latest_ts = ts
+            if self.first_ts is None or ts < self.first_ts:
+                self.first_ts = ts
+
+        finalized = sum(self._roll(target) for target in self.targets)
+        self._prune()
+        return finalized
+
+    def _is_finalized(self, ts: int) -> bool:
+        """基础K线所在的桶是否在所有目标周期中都已定稿"""
+        if not self.targets:
+            return True
+        return all(until is not None and ts < until for until in self._finalized_until.values())
+
+    def _roll(self, target: str) -> int:
+        """把最新桶之前的所有桶定稿"""
+        if self.latest_ts is None:
+            return 0
+        size, offset = self.size_ms[target], self.offset_ms[target]
+        current = bucket_start(self.latest_ts, size, offset)
+        until = self._finalized_until[target]
+
+        buckets: Dict[int, List[Bar]] = {}
+        for ts in sorted(self._base):
+            if ts >= current or (until is not None and ts < until):
+                continue
+            buckets.setdefault(bucket_start(ts, size, offset), []).append(self._base[ts][0])
+
+        count = 0
+        for start in sorted(buckets):
+            rows = buckets[start]
+            # 接入时历史从桶中间开始，该桶数据不完整，丢弃
+            if start < self.first_ts:
+                logger.debug(f"{target} 首个桶 {start} 缺少开头的基础K线，跳过")
+                continue
+            self._completed[target].append(_to_okx(_merge(rows), start, True))
+            count += 1
+        self._finalized_until[target] = current
+        return count
+
+    def _prune(self):
+        """只保留尚未定稿的基础K线"""
+        if not self.targets or any(v is None for v in self._finalized_until.values()):
+            return
+        oldest_open = min(self._finalized_until.values())
+        for ts in [ts for ts in self._base if ts < oldest_open]:
+            del self._base[ts]
+
+    def export_state(self) -> Dict:
+        """未定稿的基础K线和已定稿的高周期K线（供检查点保存）"""
+        return {
+            'base_bar': self.base_bar,
+            'targets': list(self.targets),
+            'base': [[*bar, confirm] for _, (bar, confirm) in sorted(self._base.items())],
+            'completed': {t: list(rows) for t, rows in self._completed.items()},
+            'finalized_until': self._finalized_until,
+            'latest_ts': self.latest_ts,
+            'first_ts': self.first_ts,
+        }
+
+    def restore_state(self, state: Dict):
+        if state['base_bar'] != self.base_bar or state['targets'] != self.targets:
+            raise ValueError(f"K线周期不符: {state['base_bar']} {state['targets']}")
+        self._base = {row[0]: (tuple(row[:8]), bool(row[8])) for row in state['base']}
+        for target in self.targets:
+            self._completed[target].clear()
+            self._completed[target].extend(state['completed'][target])
+        self._finalized_until = dict(state['finalized_until'])
+        self.latest_ts = state['latest_ts']
+        self.first_ts = state['first_ts']
+
+    def current_bar(self, target: str) -> Optional[List[str]]:
+        """当前未收盘的高周期K线（由已到达的基础K线合成）"""
+        if self.latest_ts is None:
+            return None
+        size, offset = self.size_ms[target], self.offset_ms[target]
+        start = bucket_start(self.latest_ts, size, offset)
+        rows = [self._base[ts][0] for ts in sorted(self._base) if ts >= start]
+        if not rows or start < self.first_ts:
+            return None
+        last_ts, closed = rows[-1][0], self._base[rows[-1][0]][1]
+        complete = closed and last_ts + self.base_ms >= start + size
+        return _to_okx(_merge(rows), start, complete)
+
+    def bars(self, target: str, include_partial: bool = True) -> List[List[str]]:
+        """返回 OKX 格式K线，按时间从新到旧（与 get_candlesticks 一致）"""
+        result = list(self._completed[target])
+        if include_partial:
+            partial = self.current_bar(target)
+            if partial is not None:
+                result.append(partial)
+        result.reverse()
+        return result
+
+    def closes(self, target: str, include_partial: bool = True) -> np.ndarray:
+        bars = self.bars(target, include_partial)
+        return np.array([float(b[4]) for b in reversed(bars)], dtype=np.float64)
+
+
+def summarize_timeframes(aggregator: CandleAggregator) -> str:
+    """各高周期的简要趋势，写入提示词"""
+    lines = []
+    for target in aggregator.targets:
+        closes = aggregator.closes(target)
+        if len(closes) < 2:
+            lines.append(f"- {target}: 数据积累中 ({len(closes)} 根)")
+            continue
+        change = (closes[-1] - closes[-2]) / closes[-2] * 100
+        parts = [f"- {target}: 收 {closes[-1]:.6g} | 较上一根 {change:+.2f}%"]
+        sma20 = sma(closes, 20)[-1]
+        if not np.isnan(sma20):
+            parts.append(f"{'高于' if closes[-1] > sma20 else '低于'}SMA20({sma20:.6g})")
+        rsi14 = rsi(closes, 14)[-1]
+        if not np.isnan(rsi14):
+            parts.append(f"RSI14 {rsi14:.1f}")
+        parts.append(f"共 {len(closes)} 根")
+        lines.append(" | ".join(parts))
+    return "\n".join(lines) if lines else "无更高周期"
@@ -0,0 +1,107 @@
+"""
+本地K线存储
+
+每个分析周期把已收盘的K线写入 SQLite（按 交易对 + 周期 + 时间戳 去重），
+供信号评估等离线分析使用，不再额外调用 OKX 历史K线接口。
+也可以从行情录制文件回填。
+"""
+import logging
+import sqlite3
+import threading
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from market_model import CANDLE_DTYPE, parse_candles
+from market_recorder import iter_recording
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ('ts', 'o', 'h', 'l', 'c', 'vol', 'vol_ccy', 'vol_ccy_quote')
+
+
+class CandleStore:
+    """已收盘K线的本地存储"""
+
+    def __init__(self, db_path: str = "candles.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+    def _init_database(self):
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS candles (
+                inst_id TEXT NOT NULL,
+                bar TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                o REAL, h REAL, l REAL, c REAL,
+                vol REAL, vol_ccy REAL, vol_ccy_quote REAL,
+                PRIMARY KEY (inst_id, bar, ts)
+            ) WITHOUT ROWID
+        ''')
+        conn.commit()
+        conn.close()
+
+    def append(self, inst_id: str, bar: str, candles: Union[np.ndarray, Sequence[Sequence[str]]]) -> int:
+        """写入已收盘的K线（未收盘的忽略，已存在的跳过），返回新增条数"""
+        if not isinstance(candles, np.ndarray):
+            candles = parse_candles(candles)
+        confirmed = candles[candles['confirm']]
+        if len(confirmed) == 0:
+            return 0
+        rows = [(inst_id, bar, *values) for values in zip(*(confirmed[c].tolist() for c in _COLUMNS))]
+        with self._lock:
+            conn = self._connect()
+            try:
+                before = conn.total_changes
+                conn.executemany(f'''
+                    INSERT OR IGNORE INTO candles (inst_id, bar, {', '.join(_COLUMNS)})
+                    VALUES (?, ?, {', '.join('?' * len(_COLUMNS))})
+                ''', rows)
+                conn.commit()
+                return conn.total_changes - before
+            finally:
+                conn.close()
+
+    def load(self, inst_id: str, bar: str, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> np.ndarray:
+        """读取K线为 CANDLE_DTYPE 数组（时间升序，ts 为毫秒，start 含、end 不含）"""
+        conditions, params = ['inst_id = ?', 'bar = ?'], [inst_id, bar]
+        if start_ts is not None:
+            conditions.append('ts >= ?')
+            params.append(start_ts)
+        if end_ts is not None:
+            conditions.append('ts < ?')
+            params.append(end_ts)
+        with self._lock:
+            conn = self._connect()
+            try:
+                rows = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM candles WHERE {' AND '.join(conditions)} "
+                                    f"ORDER BY ts", params).fetchall()
+            finally:
+                conn.close()
+        candles = np.empty(len(rows), dtype=CANDLE_DTYPE)
+        if rows:
+            values = np.array(rows, dtype=np.float64)
+            candles['ts'] = values[:, 0].astype(np.int64)
+            for i, name in enumerate(_COLUMNS[1:], start=1):
+                candles[name] = values[:, i]
+        candles['confirm'] = True
+        return candles
+
+    def backfill_from_recording(self, path: str) -> int:
+        """从行情录制文件回填K线，返回新增条数"""
+        added = 0
+        for frame in iter_recording(path):
+            if frame.get('m') != 'get_candlesticks' or not frame.get('r'):
+                continue
+            params = frame.get('p') or {}
+            data = frame['r'].get('data') or []
+            if data and params.get('instId'):
+                added += self.append(params['instId'], params.get('bar', '1m'), data)
+        logger.info(f"从录制文件回填K线 {added} 根: {path}")
+        return added
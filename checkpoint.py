@@ -0,0 +1,150 @@
+"""
+运行状态检查点
+
+定期把机器人的运行时状态写入一个二进制文件，重启时恢复后直接接着上次的调度网格继续，
+不必运行启动自检，也不必立即拉取一轮完整行情:
+- 统计计数、周期序号、最近一次决策
+- 行情快照缓存（带获取时间，恢复后仍按最大年龄判断能否使用）
+- 多周期K线合成器、成交流窗口、市场状态跟踪器
+- 调度器相位和指标 / 事件触发器状态
+
+文件格式沿用 frame_codec: 文件头 + 一帧负载（msgpack/zstd 可选，未安装时回退到 json/zlib）。
+numpy 数组按原始字节保存（json 下转为 base64）。先写临时文件并 fsync，再用 os.replace 替换，
+进程在写入中途退出时旧检查点保持完整。
+
+负载中记录检查点版本、交易对和K线周期，任一不符时整个检查点被忽略；
+单个组件因参数变化（如窗口容量、K线周期）无法恢复时只跳过该组件。
+"""
+import base64
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from frame_codec import (FRAME_LEN, HEADER, SERIALIZER_JSON, FrameFormatError, compress, decode_header,
+                         decompress, default_compression, default_serializer, deserialize, encode_header,
+                         serialize)
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+def pack_array(array: np.ndarray) -> Dict[str, Any]:
+    array = np.ascontiguousarray(array)
+    return {'__nd__': array.dtype.str, 'shape': list(array.shape), 'data': array.tobytes()}
+
+
+def unpack_array(packed: Dict[str, Any]) -> np.ndarray:
+    return np.frombuffer(packed['data'], dtype=np.dtype(packed['__nd__'])).reshape(packed['shape']).copy()
+
+
+def _bytes_to_base64(obj: Any) -> Any:
+    if isinstance(obj, bytes):
+        return {'__b64__': base64.b64encode(obj).decode('ascii')}
+    if isinstance(obj, dict):
+        return {k: _bytes_to_base64(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_bytes_to_base64(v) for v in obj]
+    return obj
+
+
+def _base64_to_bytes(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        if len(obj) == 1 and '__b64__' in obj:
+            return base64.b64decode(obj['__b64__'])
+        return {k: _base64_to_bytes(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_base64_to_bytes(v) for v in obj]
+    return obj
+
+
+def restore_components(restorers: Dict[str, Callable[[Any], None]], states: Dict[str, Any]) -> List[str]:
+    """逐个恢复组件，返回已恢复的组件名；无法恢复的组件保持初始状态"""
+    restored = []
+    for name, restore in restorers.items():
+        if name not in states:
+            continue
+        try:
+            restore(states[name])
+            restored.append(name)
+        except Exception as e:
+            logger.warning(f"检查点组件 {name} 无法恢复，跳过: {e}")
+    return restored
+
+
+class CheckpointStore:
+    """单个检查点文件的原子写入和带版本检查的读取"""
+
+    def __init__(self, path: str, serializer: Optional[int] = None, compression: Optional[int] = None):
+        self.path = path
+        self.serializer = default_serializer() if serializer is None else serializer
+        self.compression = default_compression() if compression is None else compression
+        self._lock = threading.Lock()
+        self.saves = 0
+        self.last_size = 0
+        self.last_save_ms = 0.0
+
+    def save(self, inst_id: str, bar: str, components: Dict[str, Any]) -> int:
+        """写入检查点，返回文件字节数"""
+        started = time.perf_counter()
+        payload = {
+            'version': CHECKPOINT_VERSION,
+            'saved_at': time.time(),
+            'inst_id': inst_id,
+            'bar': bar,
+            'components': components,
+        }
+        if self.serializer == SERIALIZER_JSON:
+            payload = _bytes_to_base64(payload)
+        body = compress(serialize(payload, self.serializer), self.compression)
+        data = encode_header(self.serializer, self.compression) + FRAME_LEN.pack(len(body)) + body
+
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.saves += 1
+            self.last_size = len(data)
+            self.last_save_ms = (time.perf_counter() - started) * 1000
+        return len(data)
+
+    def load(self, inst_id: str, bar: str) -> Optional[Dict[str, Any]]:
+        """读取检查点；不存在、损坏或版本/交易对/K线周期不符时返回 None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            serializer, compression = decode_header(data)
+            (length,) = FRAME_LEN.unpack_from(data, HEADER.size)
+            start = HEADER.size + FRAME_LEN.size
+            if start + length > len(data):
+                raise FrameFormatError("负载不完整")
+            payload = deserialize(decompress(data[start:start + length], compression), serializer)
+            if serializer == SERIALIZER_JSON:
+                payload = _base64_to_bytes(payload)
+        except Exception as e:
+            logger.warning(f"检查点 {self.path} 无法读取，忽略: {e}")
+            return None
+
+        if payload.get('version') != CHECKPOINT_VERSION:
+            logger.warning(f"检查点版本 {payload.get('version')} 与当前版本 {CHECKPOINT_VERSION} 不符，忽略")
+            return None
+        if payload.get('inst_id') != inst_id or payload.get('bar') != bar:
+            logger.warning(f"检查点属于 {payload.get('inst_id')} {payload.get('bar')}，"
+                           f"与当前 {inst_id} {bar} 不符，忽略")
+            return None
+        return payload
+
+    def format_metrics(self) -> str:
+        return f"检查点: 已保存 {self.saves} 次，最近 {self.last_size / 1024:.1f}KB / {self.last_save_ms:.1f}ms"
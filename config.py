@@ -1,6 +1,7 @@
 import os
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from log_pipeline import parse_levels
 from strategy_config import get_strategy_params
 
 @dataclass
@@ -16,6 +17,7 @@ class EmailConfig:
     sender_email: str
     sender_password: str
     receiver_email: str
+    digest_max: int = 20  # 协调模式下积压的提醒合并为一封摘要邮件的最大条数（1=逐条发送）
 
 @dataclass
 class TradingConfig:
@@ -25,13 +27,164 @@ class TradingConfig:
     kline_bar: str = "5m"
     kline_limit: int = 100
     orderbook_size: int = 20
-    trades_limit: int = 50
+    trades_limit: int = 500  # OKX 单次最多返回500笔
     strategy_name: str = "balanced"  # 策略名称
+    strategy_file: Optional[str] = None  # 可热加载的策略文件（TOML/YAML）
     adjustment_threshold: float = 2.0  # 调整阈值
 
 @dataclass
 class DatabaseConfig:
-    db_path: str = "trading_analysis.db"
+    db_path: str = "trading_analysis.db"  # 按月分区为 trading_analysis_YYYYMM.db
+    downsample_after_days: float = 30.0  # 超过该天数只保留可操作信号和小时汇总，0 关闭
+    archive_after_days: float = 90.0  # 超过该天数的分区导出为 Parquet（或 JSON Lines），0 关闭
+    archive_dir: Optional[str] = None  # 默认为数据库目录下的 archive/
+    compaction_interval: float = 3600.0  # 后台整理间隔（秒）
+
+@dataclass
+class AuditConfig:
+    enabled: bool = True  # 记录每次 LLM 调用的提示词、原始回复、token 用量和延迟
+    db_path: str = "llm_audit.db"
+    retention_days: float = 30.0  # 保留天数
+    maintenance_interval: float = 21600.0  # 过期清理和重新压缩的间隔（秒）
+
+@dataclass
+class EvaluationConfig:
+    candle_store_path: Optional[str] = "candles.db"  # 每周期保存已收盘K线，供信号评估使用；为空关闭
+    horizons: List[str] = field(default_factory=lambda: ["15m", "1H", "4H", "1D"])  # 前瞻收益的时间窗口
+    outcomes_path: str = "signal_outcomes.db"  # 已评估信号的结果（增量评估）
+
+@dataclass
+class RegimeConfig:
+    enabled: bool = True  # 在提示词中加入市场状态和跨交易对相关性摘要
+    window: int = 288  # 计算相关性使用的最近K线数
+    min_periods: int = 20  # 两个交易对共同K线少于该数时不给出相关系数
+    trend_window: int = 20  # 判断趋势和近期波动率使用的K线数
+    trend_threshold: float = 0.35  # 效率比达到该值视为趋势
+    high_vol_ratio: float = 1.5  # ATR 或已实现波动率达到近期水平的该倍数视为高波动
+    scope: Optional[str] = None  # 相关性只覆盖部分交易对时的范围名称（协调模式由工作进程设置）
+
+@dataclass
+class CheckpointConfig:
+    path: Optional[str] = "bot_state.ckpt"  # 运行状态检查点文件；为空关闭
+    interval: float = 60.0  # 两次保存的最小间隔（秒），在周期结束后检查
+    max_age: float = 900.0  # 不超过该年龄的检查点才跳过启动自检；更旧的只恢复统计计数和增量状态
+
+@dataclass
+class PaperTradingConfig:
+    enabled: bool = False  # 按决策模拟成交并自动维护模拟持仓
+    positions_file: str = "paper_positions.json"  # 启用时分析器读取该文件作为持仓
+    trades_file: str = "paper_trades.jsonl"  # 已平仓的模拟交易
+    order_notional: float = 1000.0  # 每次开仓的名义金额（USDT）
+    leverage: float = 10.0
+    taker_fee_bps: float = 5.0  # 吃单手续费（bp）
+    tick_interval: float = 2.0  # 止盈止损轮询最新价的间隔（秒）
+
+@dataclass
+class DashboardConfig:
+    enabled: bool = False  # 进程内只读仪表盘/API（最新决策、历史、持仓盈亏、指标，SSE 推送）
+    host: str = "127.0.0.1"
+    port: int = 8080
+    history: int = 500  # 内存中保留的最近周期数
+
+@dataclass
+class LoggingConfig:
+    level: str = "INFO"
+    levels: Dict[str, str] = field(default_factory=dict)  # 按 logger 覆盖级别
+    log_dir: str = "logs"
+    max_bytes: int = 20 * 1024 * 1024  # 单个日志文件超过该大小或跨天时轮转
+    backup_count: int = 14
+    json: bool = True  # 同时写 JSON Lines（logs/trading_bot.jsonl）
+    rate_limit_interval: float = 60.0  # 重复告警的限流窗口（秒），0 关闭
+    rate_limit_burst: int = 5  # 每个窗口内同类告警最多输出条数
+
+@dataclass
+class CoordinatorConfig:
+    workers: int = 0  # 工作进程数，>0 时启用协调模式（按一致性哈希把交易对分到各进程）
+    inst_ids: List[str] = field(default_factory=list)  # 协调模式监控的交易对，为空时只监控 INST_ID
+    worker_threads: int = 4  # 每个工作进程同时执行的分析周期数
+    virtual_nodes: int = 64  # 每个工作进程在哈希环上的虚拟节点数
+    heartbeat_interval: float = 5.0  # 工作进程心跳间隔（秒）
+    heartbeat_timeout: float = 60.0  # 超过该时间没有心跳视为卡死，终止后重新分配
+    respawn_delay: float = 10.0  # 工作进程退出后重启的等待时间（秒），连续退出时翻倍
+
+@dataclass
+class FreshnessConfig:
+    # 某类数据获取失败时，可继续使用的缓存最大年龄（秒）
+    ticker_max_age: float = 120.0
+    orderbook_max_age: float = 120.0
+    candlesticks_max_age: float = 900.0
+    trades_max_age: float = 600.0
+    fetch_timeout: float = 10.0  # 单类数据等待时间，超时则先用缓存，后台继续刷新
+    
+    def max_age(self, data_type: str) -> float:
+        return getattr(self, f"{data_type}_max_age")
+
+@dataclass
+class RecordingConfig:
+    record_path: Optional[str] = None  # 录制市场数据到该文件
+    replay_path: Optional[str] = None  # 从该录制文件回放，代替实盘API
+    replay_speed: float = 1.0  # 回放倍速，0 表示不等待
+
+@dataclass
+class ScheduleConfig:
+    align_to_bar: bool = True  # 周期对齐到K线收盘，而不是启动时刻
+    close_offset: float = 3.0  # K线收盘后延迟多少秒开始分析（等待交易所确认收盘K线）
+    jitter: float = 0.0  # 多交易对错峰的最大相位抖动（秒），按交易对固定
+    overrun_policy: str = "skip"  # 周期超时: skip 跳过错过的周期，coalesce 立即补跑一次
+    cycle_deadline: Optional[float] = None  # 单周期截止时间（秒），默认等于分析间隔
+
+@dataclass
+class TriggerConfig:
+    mode: str = "interval"  # interval 固定间隔；event 事件驱动
+    poll_interval: float = 5.0  # 事件模式下轮询行情的间隔（秒）
+    price_move_pct: float = 0.5  # 较上次分析价格偏离超过该百分比时触发
+    atr_multiple: float = 1.0  # 偏离超过 N 倍 ATR 时触发，0 关闭
+    volume_spike_ratio: float = 3.0  # 当前K线成交量超过均量的倍数，0 关闭
+    tp_sl_proximity_pct: float = 0.3  # 距持仓止盈/止损在该百分比以内时触发，0 关闭
+    min_spacing: float = 60.0  # 同一交易对两次分析的最小间隔（秒）
+    heartbeat: float = 1800.0  # 无任何触发时的兜底分析间隔（秒）
+
+@dataclass
+class LLMProviderConfig:
+    name: str
+    base_url: str
+    api_key: str
+    model: str
+    fast_model: str = ""  # 级联模式第一阶段使用的小模型
+
+@dataclass
+class LLMRouterConfig:
+    providers: List[LLMProviderConfig] = field(default_factory=list)  # 第一个为默认提供方
+    hedge: bool = True  # 首选提供方超过其 p95 延迟仍未返回时，并行请求下一个
+    hedge_delay: float = 20.0  # 延迟样本不足时的对冲等待时间（秒）
+    min_hedge_delay: float = 2.0  # 对冲等待时间下限（秒）
+    failure_threshold: int = 3  # 连续失败多少次后熔断
+    circuit_cooldown: float = 60.0  # 熔断后多久允许一次试探请求（秒）
+    ewma_alpha: float = 0.2  # 延迟和错误率的指数加权系数
+
+@dataclass
+class CascadeConfig:
+    enabled: bool = False  # 先用小模型初判，只在信号较强时调用大模型确认
+    fast_model: str = "Qwen/Qwen2.5-7B-Instruct"  # 各提供方未单独配置时使用的小模型
+    confidence_margin: float = 10.0  # 小模型信心度达到 (阈值 - margin) 时升级到大模型
+    fast_timeout: float = 20.0  # 小模型请求的最长时间（秒），其余时间留给大模型
+
+def _llm_providers(deepseek: DeepSeekConfig, fast_model: str) -> List[LLMProviderConfig]:
+    """LLM_PROVIDERS=a,b 时按 LLM_<NAME>_BASE_URL/_API_KEY/_MODEL/_FAST_MODEL 读取各提供方，未配置的字段沿用 DeepSeek 配置"""
+    names = [n.strip() for n in os.getenv("LLM_PROVIDERS", "").split(",") if n.strip()]
+    if not names:
+        return [LLMProviderConfig("default", deepseek.base_url, deepseek.api_key, deepseek.model, fast_model)]
+    providers = []
+    for name in names:
+        prefix = f"LLM_{name.upper().replace('-', '_')}_"
+        providers.append(LLMProviderConfig(
+            name=name,
+            base_url=os.getenv(prefix + "BASE_URL", deepseek.base_url),
+            api_key=os.getenv(prefix + "API_KEY", deepseek.api_key),
+            model=os.getenv(prefix + "MODEL", deepseek.model),
+            fast_model=os.getenv(prefix + "FAST_MODEL", fast_model),
+        ))
+    return providers
 
 class Config:
     def __init__(self):
@@ -53,6 +206,7 @@ class Config:
             sender_email=os.getenv("SENDER_EMAIL", "your_email@gmail.com"),
             sender_password=os.getenv("SENDER_PASSWORD", "your_app_password"),
             receiver_email=os.getenv("RECEIVER_EMAIL", "receiver@gmail.com"),
+            digest_max=max(1, int(os.getenv("EMAIL_DIGEST_MAX", "20"))),
         )
         
         # 交易配置 - 优先使用策略参数，允许手动覆盖
@@ -62,14 +216,158 @@ class Config:
             confidence_threshold=float(os.getenv("CONFIDENCE_THRESHOLD", str(strategy_params['confidence_threshold']))),
             kline_bar=os.getenv("K_LINE_PERIOD", strategy_params['timeframe']),
             strategy_name=strategy_name,
+            strategy_file=os.getenv("STRATEGY_FILE") or None,
             adjustment_threshold=strategy_params['adjustment_threshold']
         )
         
         # 数据库配置
-        self.database = DatabaseConfig()
+        self.database = DatabaseConfig(
+            downsample_after_days=float(os.getenv("DB_DOWNSAMPLE_AFTER_DAYS", "30")),
+            archive_after_days=float(os.getenv("DB_ARCHIVE_AFTER_DAYS", "90")),
+            archive_dir=os.getenv("DB_ARCHIVE_DIR") or None,
+            compaction_interval=float(os.getenv("DB_COMPACTION_INTERVAL", "3600")),
+        )
+        
+        # LLM 调用审计配置
+        self.audit = AuditConfig(
+            enabled=os.getenv("AUDIT_ENABLED", "true").lower() == "true",
+            db_path=os.getenv("AUDIT_DB_PATH", "llm_audit.db"),
+            retention_days=float(os.getenv("AUDIT_RETENTION_DAYS", "30")),
+            maintenance_interval=float(os.getenv("AUDIT_MAINTENANCE_INTERVAL", "21600")),
+        )
+        
+        # 信号评估配置
+        self.evaluation = EvaluationConfig(
+            candle_store_path=os.getenv("CANDLE_STORE_PATH", "candles.db") or None,
+            horizons=[h.strip() for h in os.getenv("EVAL_HORIZONS", "15m,1H,4H,1D").split(",") if h.strip()],
+            outcomes_path=os.getenv("EVAL_OUTCOMES_PATH", "signal_outcomes.db"),
+        )
+        
+        # 市场状态与相关性配置
+        self.regime = RegimeConfig(
+            enabled=os.getenv("REGIME_ENABLED", "true").lower() == "true",
+            window=int(os.getenv("REGIME_WINDOW", "288")),
+            min_periods=int(os.getenv("REGIME_MIN_PERIODS", "20")),
+            trend_window=int(os.getenv("REGIME_TREND_WINDOW", "20")),
+            trend_threshold=float(os.getenv("REGIME_TREND_THRESHOLD", "0.35")),
+            high_vol_ratio=float(os.getenv("REGIME_HIGH_VOL_RATIO", "1.5")),
+        )
+        
+        # 运行状态检查点配置
+        self.checkpoint = CheckpointConfig(
+            path=os.getenv("CHECKPOINT_PATH", "bot_state.ckpt") or None,
+            interval=float(os.getenv("CHECKPOINT_INTERVAL", "60")),
+            max_age=float(os.getenv("CHECKPOINT_MAX_AGE", "900")),
+        )
+        
+        # 模拟交易配置
+        self.paper = PaperTradingConfig(
+            enabled=os.getenv("PAPER_TRADING", "false").lower() == "true",
+            positions_file=os.getenv("PAPER_POSITIONS_FILE", "paper_positions.json"),
+            trades_file=os.getenv("PAPER_TRADES_FILE", "paper_trades.jsonl"),
+            order_notional=float(os.getenv("PAPER_ORDER_NOTIONAL", "1000")),
+            leverage=float(os.getenv("PAPER_LEVERAGE", "10")),
+            taker_fee_bps=float(os.getenv("PAPER_TAKER_FEE_BPS", "5")),
+            tick_interval=float(os.getenv("PAPER_TICK_INTERVAL", "2")),
+        )
+        
+        # 仪表盘配置
+        self.dashboard = DashboardConfig(
+            enabled=os.getenv("DASHBOARD_ENABLED", "false").lower() == "true",
+            host=os.getenv("DASHBOARD_HOST", "127.0.0.1"),
+            port=int(os.getenv("DASHBOARD_PORT", "8080")),
+            history=int(os.getenv("DASHBOARD_HISTORY", "500")),
+        )
+        
+        # 日志配置
+        self.logging = LoggingConfig(
+            level=os.getenv("LOG_LEVEL", "INFO"),
+            levels=parse_levels(os.getenv("LOG_LEVELS", "")),
+            log_dir=os.getenv("LOG_DIR", "logs"),
+            max_bytes=int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024))),
+            backup_count=int(os.getenv("LOG_BACKUP_COUNT", "14")),
+            json=os.getenv("LOG_JSON", "true").lower() == "true",
+            rate_limit_interval=float(os.getenv("LOG_RATE_LIMIT_INTERVAL", "60")),
+            rate_limit_burst=int(os.getenv("LOG_RATE_LIMIT_BURST", "5")),
+        )
+        
+        # 多进程协调配置
+        self.coordinator = CoordinatorConfig(
+            workers=int(os.getenv("COORDINATOR_WORKERS", "0")),
+            inst_ids=[i.strip() for i in os.getenv("INST_IDS", "").split(",") if i.strip()],
+            worker_threads=int(os.getenv("WORKER_THREADS", "4")),
+            virtual_nodes=int(os.getenv("COORDINATOR_VIRTUAL_NODES", "64")),
+            heartbeat_interval=float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "5")),
+            heartbeat_timeout=float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "60")),
+            respawn_delay=float(os.getenv("WORKER_RESPAWN_DELAY", "10")),
+        )
+        
+        # 数据新鲜度配置
+        self.freshness = FreshnessConfig(
+            ticker_max_age=float(os.getenv("TICKER_MAX_AGE", "120")),
+            orderbook_max_age=float(os.getenv("ORDERBOOK_MAX_AGE", "120")),
+            candlesticks_max_age=float(os.getenv("CANDLESTICKS_MAX_AGE", "900")),
+            trades_max_age=float(os.getenv("TRADES_MAX_AGE", "600")),
+            fetch_timeout=float(os.getenv("FETCH_TIMEOUT", "10")),
+        )
+        
+        # 行情录制/回放配置
+        self.recording = RecordingConfig(
+            record_path=os.getenv("MARKET_RECORD_PATH") or None,
+            replay_path=os.getenv("MARKET_REPLAY_PATH") or None,
+            replay_speed=float(os.getenv("MARKET_REPLAY_SPEED", "1.0")),
+        )
+        
+        # 周期调度配置
+        self.schedule = ScheduleConfig(
+            align_to_bar=os.getenv("SCHEDULE_ALIGN_TO_BAR", "true").lower() == "true",
+            close_offset=float(os.getenv("SCHEDULE_CLOSE_OFFSET", "3")),
+            jitter=float(os.getenv("SCHEDULE_JITTER", "0")),
+            overrun_policy=os.getenv("SCHEDULE_OVERRUN_POLICY", "skip"),
+            cycle_deadline=float(os.getenv("CYCLE_DEADLINE")) if os.getenv("CYCLE_DEADLINE") else None,
+        )
+        
+        # 分析触发配置
+        self.trigger = TriggerConfig(
+            mode=os.getenv("TRIGGER_MODE", "interval"),
+            poll_interval=float(os.getenv("TRIGGER_POLL_INTERVAL", "5")),
+            price_move_pct=float(os.getenv("TRIGGER_PRICE_MOVE_PCT", "0.5")),
+            atr_multiple=float(os.getenv("TRIGGER_ATR_MULTIPLE", "1.0")),
+            volume_spike_ratio=float(os.getenv("TRIGGER_VOLUME_SPIKE_RATIO", "3.0")),
+            tp_sl_proximity_pct=float(os.getenv("TRIGGER_TP_SL_PROXIMITY_PCT", "0.3")),
+            min_spacing=float(os.getenv("TRIGGER_MIN_SPACING", "60")),
+            heartbeat=float(os.getenv("TRIGGER_HEARTBEAT", "1800")),
+        )
+        
+        # 模型级联配置
+        self.cascade = CascadeConfig(
+            enabled=os.getenv("CASCADE_ENABLED", "false").lower() == "true",
+            fast_model=os.getenv("CASCADE_FAST_MODEL", "Qwen/Qwen2.5-7B-Instruct"),
+            confidence_margin=float(os.getenv("CASCADE_CONFIDENCE_MARGIN", "10")),
+            fast_timeout=float(os.getenv("CASCADE_FAST_TIMEOUT", "20")),
+        )
+        
+        # LLM 多提供方路由配置
+        self.llm = LLMRouterConfig(
+            providers=_llm_providers(self.deepseek, self.cascade.fast_model),
+            hedge=os.getenv("LLM_HEDGE", "true").lower() == "true",
+            hedge_delay=float(os.getenv("LLM_HEDGE_DELAY", "20")),
+            min_hedge_delay=float(os.getenv("LLM_MIN_HEDGE_DELAY", "2")),
+            failure_threshold=int(os.getenv("LLM_FAILURE_THRESHOLD", "3")),
+            circuit_cooldown=float(os.getenv("LLM_CIRCUIT_COOLDOWN", "60")),
+        )
         
         # 保存策略参数供其他模块使用
         self.strategy = strategy_params
 
-# 全局配置实例
-config = Config()
+_config: Optional[Config] = None
+
+def load_config() -> Config:
+    """按当前环境变量构建配置（应在 load_dotenv 之后调用），并作为全局配置"""
+    global _config
+    _config = Config()
+    return _config
+
+def get_config() -> Config:
+    """返回全局配置，尚未构建时按当前环境变量构建"""
+    return _config if _config is not None else load_config()
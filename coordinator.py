@@ -0,0 +1,647 @@
+"""
+多进程水平扩展: 协调进程 + 分片工作进程
+
+交易对很多时，单进程中的指标计算和 JSON 处理受 GIL 限制。协调模式下:
+- 交易对按一致性哈希（每个工作进程若干虚拟节点）分配到 N 个工作进程；
+  某个进程退出或心跳超时后，只有它负责的交易对迁移到其余进程，重启后再迁回
+- 工作进程内一个调度循环按各交易对自己的网格点把分析周期分发到线程池
+- 分析记录、LLM 审计、K线、邮件和仪表盘事件经 multiprocessing 队列发回协调进程，
+  由唯一的写入线程写数据库、唯一的通知线程发邮件；工作进程的日志也由协调进程写出
+- 同一IP上的工作进程平分 OKX 限速预算
+
+工作进程用 spawn 启动并按继承的环境变量重新构建配置；市场数据源、分析器等可由
+component_factory 替换（须可 pickle 的模块级函数，基准测试用它注入本地替身）。
+模拟交易和仪表盘只在协调进程中有意义，工作进程中关闭。
+"""
+import bisect
+import contextlib
+import hashlib
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import Config, get_config, load_config
+from cycle_scheduler import CycleDeadline
+from dashboard import SUMMARY_FIELDS, CycleFeed, get_shared_feed, start_dashboard
+from email_notifier import EmailNotifier
+from log_pipeline import forward_worker_logs, setup_worker_logging
+from rate_limiter import set_budget_share
+from trading_bot import (TradingAnalysisBot, create_audit_store, create_candle_store, create_database,
+                         email_alert_record)
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH = 500  # 写入线程每次最多处理的结果数
+RECORD_ID_CACHE = 10000  # 工作进程临时ID -> 数据库记录ID 的映射保留条数
+MAX_RESPAWN_BACKOFF = 5  # 连续退出时重启等待最多翻倍的次数
+STABLE_AFTER = 300.0  # 工作进程连续运行超过该秒数后重置退出计数
+
+ComponentFactory = Callable[[str, Config], Dict[str, Any]]
+
+
+class HashRing:
+    """一致性哈希环（哈希值与进程无关，同一组工作进程总是得到相同的分配）"""
+
+    def __init__(self, virtual_nodes: int = 64):
+        self.virtual_nodes = virtual_nodes
+        self.nodes: Set[int] = set()
+        self._points: List[int] = []
+        self._owners: List[int] = []
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def _rebuild(self):
+        points = sorted((self._hash(f"worker-{node}#{i}"), node)
+                        for node in self.nodes for i in range(self.virtual_nodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def add(self, node: int):
+        self.nodes.add(node)
+        self._rebuild()
+
+    def remove(self, node: int):
+        self.nodes.discard(node)
+        self._rebuild()
+
+    def owner(self, key: str) -> int:
+        if not self._points:
+            raise LookupError("哈希环上没有工作进程")
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def assign(self, keys: Iterable[str]) -> Dict[int, List[str]]:
+        """工作进程 -> 负责的交易对"""
+        plan: Dict[int, List[str]] = {node: [] for node in self.nodes}
+        if self.nodes:
+            for key in keys:
+                plan[self.owner(key)].append(key)
+        return plan
+
+
+# ---- 工作进程中替代本地存储的转发器 ----
+
+class _Forwarder:
+    def __init__(self, results, worker_id: int):
+        self._results = results
+        self.worker_id = worker_id
+
+    def _send(self, kind: str, payload: Any):
+        self._results.put((kind, self.worker_id, payload))
+
+
+class RemoteDatabase(_Forwarder):
+    """分析记录交给协调进程写入，返回进程内的临时ID（协调进程映射为数据库ID）"""
+
+    def __init__(self, results, worker_id: int):
+        super().__init__(results, worker_id)
+        self._ids = itertools.count(1)
+
+    def save_analysis(self, analysis_data: Dict) -> int:
+        local_id = next(self._ids)
+        self._send('analysis', (local_id, analysis_data))
+        return local_id
+
+    def save_email_alert(self, alert_data: Dict) -> int:
+        return 0  # 协调进程实际发送邮件后写入
+
+    def mark_email_sent(self, record_id: int):
+        pass
+
+
+class RemoteNotifier(_Forwarder):
+    """邮件交给协调进程的通知线程发送，返回 True 表示已转交"""
+
+    def send_trading_alert(self, analysis_data: Dict) -> bool:
+        self._send('email', analysis_data)
+        return True
+
+
+class RemoteAuditStore(_Forwarder):
+    def record_calls(self, inst_id: str, calls, record_id: Optional[int] = None) -> List[int]:
+        if calls:
+            self._send('audit', (inst_id, list(calls), record_id))
+        return []
+
+
+class RemoteCandleStore(_Forwarder):
+    """只转发比上次更新的已收盘K线（每个周期的K线大多已经写过）"""
+
+    def __init__(self, results, worker_id: int):
+        super().__init__(results, worker_id)
+        self._last_ts: Dict[Tuple[str, str], int] = {}
+
+    def append(self, inst_id: str, bar: str, candles) -> int:
+        confirmed = candles[candles['confirm']]
+        newer = confirmed[confirmed['ts'] > self._last_ts.get((inst_id, bar), -1)]
+        if len(newer):
+            self._last_ts[(inst_id, bar)] = int(newer['ts'].max())
+            self._send('candles', (inst_id, bar, newer))
+        return len(newer)
+
+
+class RemoteFeed(_Forwarder):
+    """只转发仪表盘需要的摘要字段（不含原始行情）"""
+
+    def publish(self, analysis_data: Dict[str, Any]):
+        self._send('cycle', {k: analysis_data.get(k) for k in SUMMARY_FIELDS})
+
+    def register_metrics(self, name: str, provider):
+        pass  # 指标随心跳发送
+
+    def register_positions(self, name: str, provider):
+        pass
+
+
+# ---- 工作进程 ----
+
+@dataclass
+class WorkerSpec:
+    worker_id: int
+    n_workers: int
+    threads: int = 4
+    heartbeat_interval: float = 5.0
+    interval: Optional[float] = None  # 覆盖策略中的分析间隔（基准测试用）
+    immediate: bool = False  # 新分配的交易对立即执行第一个周期
+    quiet: bool = False  # 不输出每个周期的控制台摘要
+
+
+class ShardWorker:
+    """工作进程内的调度循环: 各交易对按自己的网格点把周期分发到线程池
+
+    调度状态只在主循环线程中修改；控制消息和周期完成事件都经 _inbox 送回主循环。
+    """
+
+    def __init__(self, spec: WorkerSpec, config: Config, control, results,
+                 component_factory: Optional[ComponentFactory] = None):
+        self.spec = spec
+        self.config = config
+        self.control = control
+        self.results = results
+        self.component_factory = component_factory
+        self.bots: Dict[str, TradingAnalysisBot] = {}
+        self.cycles = 0
+        self._heap: List[Tuple[float, int, str]] = []  # (计划时间, 序号, 交易对)
+        self._pending: Dict[str, int] = {}  # 交易对 -> 有效的堆条目序号（重新分配后旧条目作废）
+        self._seq = itertools.count()
+        self._running: Set[str] = set()
+        self._inbox: queue.Queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=spec.threads,
+                                            thread_name_prefix=f"worker{spec.worker_id}-cycle")
+        worker_id = spec.worker_id
+        self._sinks: Dict[str, Any] = {
+            'database': RemoteDatabase(results, worker_id),
+            'email_notifier': RemoteNotifier(results, worker_id),
+            'feed': RemoteFeed(results, worker_id),
+        }
+        if config.audit.enabled:
+            self._sinks['audit_store'] = RemoteAuditStore(results, worker_id)
+        if config.evaluation.candle_store_path:
+            self._sinks['candle_store'] = RemoteCandleStore(results, worker_id)
+        self._shared: Dict[str, Any] = {}  # 同一进程内各交易对共享的市场数据源和策略配置
+
+    def _read_control(self):
+        while True:
+            message = self.control.get()
+            self._inbox.put(message)
+            if message[0] == 'stop':
+                return
+
+    def run(self):
+        threading.Thread(target=self._read_control, name="worker-control", daemon=True).start()
+        next_heartbeat = 0.0
+        try:
+            while True:
+                now = time.time()
+                self._dispatch_due(now)
+                if now >= next_heartbeat:
+                    self._heartbeat()
+                    next_heartbeat = now + self.spec.heartbeat_interval
+                wake = min(next_heartbeat, self._heap[0][0]) if self._heap else next_heartbeat
+                try:
+                    message = self._inbox.get(timeout=max(0.0, wake - time.time()))
+                except queue.Empty:
+                    continue
+                if message[0] == 'stop':
+                    break
+                if message[0] == 'assign':
+                    self._assign(message[1])
+                elif message[0] == 'done':
+                    self._on_done(*message[1:])
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            logger.info(f"工作进程 {self.spec.worker_id} 停止，共执行 {self.cycles} 个周期")
+
+    def _schedule(self, inst_id: str, due: float):
+        seq = next(self._seq)
+        self._pending[inst_id] = seq
+        heapq.heappush(self._heap, (due, seq, inst_id))
+
+    def _assign(self, inst_ids: List[str]):
+        wanted = set(inst_ids)
+        removed = [inst_id for inst_id in self.bots if inst_id not in wanted]
+        for inst_id in removed:
+            del self.bots[inst_id]
+            self._pending.pop(inst_id, None)
+        added = 0
+        now = time.time()
+        for inst_id in inst_ids:
+            if inst_id in self.bots:
+                continue
+            try:
+                self._add(inst_id, now)
+                added += 1
+            except Exception as e:
+                logger.error(f"创建 {inst_id} 的分析机器人失败: {e}")
+        logger.info(f"工作进程 {self.spec.worker_id} 负责 {len(self.bots)} 个交易对（新增 {added}，移除 {len(removed)}）")
+
+    def _add(self, inst_id: str, now: float):
+        kwargs = dict(self._sinks)
+        kwargs.update(self._shared)
+        if self.component_factory is not None:
+            kwargs.update(self.component_factory(inst_id, self.config))
+        bot = TradingAnalysisBot(inst_id=inst_id, config=self.config, **kwargs)
+        if not self._shared:
+            self._shared = {'market_data': bot.market_data, 'strategy_store': bot.strategy_store}
+        bot.scheduler = bot._create_scheduler()
+        if self.spec.interval:
+            bot.scheduler.interval = self.spec.interval
+        self.bots[inst_id] = bot
+        self._schedule(inst_id, bot.scheduler.first_tick(now, self.spec.immediate))
+
+    def _dispatch_due(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            scheduled, seq, inst_id = heapq.heappop(self._heap)
+            bot = self.bots.get(inst_id)
+            if bot is None or self._pending.get(inst_id) != seq:
+                continue
+            self._running.add(inst_id)
+            self._executor.submit(self._cycle, inst_id, bot, scheduled)
+
+    def _cycle(self, inst_id: str, bot: TradingAnalysisBot, scheduled: float):
+        started = time.time()
+        deadline = CycleDeadline(bot.scheduler.deadline)
+        try:
+            bot.run_analysis_cycle(deadline)
+        except Exception as e:
+            logger.error(f"{inst_id} 分析周期异常: {e}")
+        self._inbox.put(('done', inst_id, bot, scheduled, started, time.time(), deadline.missed))
+
+    def _on_done(self, inst_id: str, bot: TradingAnalysisBot, scheduled: float, started: float,
+                 finished: float, missed: bool):
+        self._running.discard(inst_id)
+        self.cycles += 1
+        if self.bots.get(inst_id) is not bot:
+            return  # 周期执行期间交易对已迁移
+        if missed:
+            bot.scheduler.metrics.deadline_misses += 1
+        self._schedule(inst_id, bot.scheduler.plan_next(scheduled, started, finished))
+
+    def _heartbeat(self):
+        self.results.put(('heartbeat', self.spec.worker_id, {
+            'pid': os.getpid(),
+            'cycles': self.cycles,
+            'running': len(self._running),
+            'metrics': {inst_id: bot.dashboard_metrics() for inst_id, bot in self.bots.items()},
+        }))
+
+
+def _worker_main(spec: WorkerSpec, control, results, log_queue,
+                 component_factory: Optional[ComponentFactory] = None):
+    """工作进程入口"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由协调进程处理
+    if spec.quiet:
+        sys.stdout = open(os.devnull, 'w')
+    config = load_config()
+    setup_worker_logging(log_queue, config.logging)
+    set_budget_share(1.0 / spec.n_workers)
+    config.paper.enabled = False
+    config.dashboard.enabled = False
+    config.checkpoint.path = None  # 交易对会在进程间迁移，不保存单进程检查点
+    # 相关性跟踪器只看到分配到本进程的交易对，提示词中标明是分片而不是全市场
+    config.regime.scope = f"工作进程 {spec.worker_id + 1}/{spec.n_workers} 分片"
+    ShardWorker(spec, config, control, results, component_factory).run()
+
+
+# ---- 协调进程 ----
+
+@dataclass
+class WorkerHandle:
+    worker_id: int
+    process: Optional[multiprocessing.process.BaseProcess] = None
+    control: Any = None
+    assigned: List[str] = field(default_factory=list)
+    started_at: float = 0.0
+    last_seen: float = 0.0  # 最近一次心跳（monotonic）
+    respawn_at: float = 0.0
+    restarts: int = 0  # 连续退出次数
+    cycles: int = 0  # 协调进程收到的周期结果数
+
+
+class Coordinator:
+    """启动并监督工作进程；结果由单一写入线程写库、单一通知线程发邮件"""
+
+    def __init__(self, config: Optional[Config] = None, inst_ids: Optional[List[str]] = None,
+                 workers: Optional[int] = None, component_factory: Optional[ComponentFactory] = None,
+                 database=None, email_notifier=None, audit_store=None, candle_store=None,
+                 feed: Optional[CycleFeed] = None, interval: Optional[float] = None,
+                 immediate: bool = False, quiet: bool = False):
+        """
+        Args:
+            inst_ids: 监控的交易对，默认 INST_IDS（为空时为 INST_ID）
+            workers: 工作进程数，默认 COORDINATOR_WORKERS
+            component_factory: (inst_id, config) -> TradingAnalysisBot 的额外构造参数，在工作进程中调用
+            database/email_notifier/audit_store/candle_store/feed: 协调进程中的唯一写入端，默认按配置创建
+            interval: 覆盖策略中的分析间隔（基准测试用）
+            immediate: 新分配的交易对立即执行第一个周期
+            quiet: 工作进程不输出每个周期的控制台摘要
+        """
+        self.config = config or get_config()
+        settings = self.config.coordinator
+        self.settings = settings
+        self.inst_ids = list(inst_ids or settings.inst_ids or [self.config.trading.inst_id])
+        self.n_workers = workers or settings.workers or 1
+        self.component_factory = component_factory
+        self.interval = interval
+        self.immediate = immediate
+        self.quiet = quiet
+
+        self.database = database or create_database(self.config)
+        self.email_notifier = email_notifier or EmailNotifier(self.config)
+        self.audit_store = audit_store or create_audit_store(self.config)
+        self.candle_store = candle_store or create_candle_store(self.config)
+        self.feed = feed or (get_shared_feed(self.config.dashboard.history) if self.config.dashboard.enabled else None)
+        if self.config.paper.enabled:
+            logger.warning("协调模式不支持模拟交易（各进程的模拟持仓会互相覆盖），工作进程中已关闭")
+
+        self.ring = HashRing(settings.virtual_nodes)
+        self.workers: Dict[int, WorkerHandle] = {}
+        self.cycles = 0
+        self._context = multiprocessing.get_context('spawn')
+        self._results = self._context.Queue()
+        self._logs = self._context.Queue()
+        self._emails: queue.Queue = queue.Queue()
+        self._record_ids: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        self._inst_metrics: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()  # 保护 workers 和 ring（监督线程与写入线程）
+        self._threads: List[threading.Thread] = []
+        self._log_listener = None
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        self._log_listener = forward_worker_logs(self._logs)
+        for target, name in ((self._write_loop, "coordinator-writer"), (self._notify_loop, "coordinator-notifier")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        with self._lock:
+            for worker_id in range(self.n_workers):
+                self._spawn(worker_id)
+            self._rebalance()
+        if self.feed is not None:
+            self.feed.register_metrics('coordinator', self.metrics)
+            for inst_id in self.inst_ids:
+                self.feed.register_metrics(inst_id, lambda inst_id=inst_id: self._inst_metrics.get(inst_id, {}))
+        logger.info(f"协调模式启动: {len(self.inst_ids)} 个交易对，{self.n_workers} 个工作进程")
+
+    def run(self):
+        """启动并监督工作进程，直到 Ctrl+C"""
+        self.start()
+        if self.feed is not None and self.config.dashboard.enabled:
+            start_dashboard(self.feed, self.config.dashboard.host, self.config.dashboard.port)
+        start_compaction = getattr(self.database, 'start_background_compaction', None)
+        if start_compaction is not None:
+            start_compaction(self.config.database.compaction_interval)
+        if self.audit_store is not None:
+            self.audit_store.start_background_maintenance()
+        next_report = time.monotonic() + 60
+        try:
+            while True:
+                time.sleep(1.0)
+                self.check_workers()
+                if time.monotonic() >= next_report:
+                    logger.info(self.format_metrics())
+                    next_report = time.monotonic() + 60
+        except KeyboardInterrupt:
+            logger.info("用户中断，停止工作进程")
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 10.0):
+        with self._lock:
+            handles = [h for h in self.workers.values() if h.process is not None]
+            for handle in handles:
+                handle.control.put(('stop',))
+        for handle in handles:
+            handle.process.join(timeout)
+            if handle.process.is_alive():
+                handle.process.terminate()
+                handle.process.join(1.0)
+        self._emails.put(None)
+        self._results.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        if self._log_listener is not None:
+            self._log_listener.stop()
+        logger.info(self.format_metrics())
+
+    # ---- 工作进程管理（调用方持有 _lock） ----
+
+    def _spawn(self, worker_id: int):
+        handle = self.workers.setdefault(worker_id, WorkerHandle(worker_id))
+        spec = WorkerSpec(worker_id=worker_id, n_workers=self.n_workers, threads=self.settings.worker_threads,
+                          heartbeat_interval=self.settings.heartbeat_interval, interval=self.interval,
+                          immediate=self.immediate, quiet=self.quiet)
+        handle.control = self._context.Queue()
+        handle.process = self._context.Process(
+            target=_worker_main, name=f"worker-{worker_id}", daemon=True,
+            args=(spec, handle.control, self._results, self._logs, self.component_factory),
+        )
+        handle.process.start()
+        handle.assigned = []
+        handle.started_at = handle.last_seen = time.monotonic()
+        self.ring.add(worker_id)
+        logger.info(f"工作进程 {worker_id} 已启动 (pid {handle.process.pid})")
+
+    def _rebalance(self):
+        plan = self.ring.assign(self.inst_ids)
+        moved = 0
+        for worker_id, handle in self.workers.items():
+            if handle.process is None:
+                continue
+            assigned = plan.get(worker_id, [])
+            if assigned != handle.assigned:
+                moved += len(set(assigned) - set(handle.assigned))
+                handle.control.put(('assign', assigned))
+                handle.assigned = assigned
+        if moved:
+            sizes = ", ".join(f"{wid}:{len(h.assigned)}" for wid, h in sorted(self.workers.items())
+                              if h.process is not None)
+            logger.info(f"交易对分配更新，迁移 {moved} 个（进程:交易对数 {sizes}）")
+
+    def check_workers(self):
+        """发现退出或卡死的工作进程，把它的交易对迁到其余进程；到时间后重启并迁回"""
+        now = time.monotonic()
+        with self._lock:
+            changed = False
+            for worker_id, handle in self.workers.items():
+                if handle.process is None:
+                    if now >= handle.respawn_at:
+                        self._spawn(worker_id)
+                        changed = True
+                    continue
+                if handle.process.is_alive():
+                    if now - handle.last_seen <= self.settings.heartbeat_timeout:
+                        continue
+                    logger.error(f"工作进程 {worker_id} 超过 {self.settings.heartbeat_timeout:.0f} 秒没有心跳，终止")
+                    handle.process.terminate()
+                    handle.process.join(5.0)
+                else:
+                    logger.error(f"工作进程 {worker_id} 已退出 (exitcode {handle.process.exitcode})")
+                delay = self.settings.respawn_delay * 2 ** min(handle.restarts, MAX_RESPAWN_BACKOFF)
+                handle.process = None
+                handle.assigned = []
+                handle.restarts += 1
+                handle.respawn_at = now + delay
+                self.ring.remove(worker_id)
+                logger.warning(f"工作进程 {worker_id} 的交易对迁移到其余进程，{delay:.0f} 秒后重启")
+                changed = True
+            if changed:
+                self._rebalance()
+
+    # ---- 结果汇总（唯一写入线程） ----
+
+    def _write_loop(self):
+        """每次取出队列中已到达的全部结果（最多 WRITE_BATCH 条），分析记录和审计各用一个事务写入"""
+        while True:
+            batch = [self._results.get()]
+            with contextlib.suppress(queue.Empty):
+                while len(batch) < WRITE_BATCH and batch[-1] is not None:
+                    batch.append(self._results.get_nowait())
+            stop = batch[-1] is None
+            try:
+                self._write_batch([item for item in batch if item is not None])
+            except Exception as e:
+                logger.error(f"写入 {len(batch)} 条工作进程结果失败: {e}")
+            if stop:
+                return
+
+    def _record_id(self, worker_id: int, local_id: Optional[int]) -> Optional[int]:
+        return self._record_ids.get((worker_id, local_id))
+
+    def _write_batch(self, batch: List[Tuple[str, Optional[int], Any]]):
+        # 同一工作进程的消息按顺序到达，分析记录先写入后，同批的审计/邮件/事件即可映射记录ID
+        analyses = [(worker_id, payload) for kind, worker_id, payload in batch if kind == 'analysis']
+        if analyses:
+            record_ids = self.database.save_analyses([analysis_data for _, (_, analysis_data) in analyses])
+            for (worker_id, (local_id, _)), record_id in zip(analyses, record_ids):
+                self._record_ids[(worker_id, local_id)] = record_id
+            while len(self._record_ids) > RECORD_ID_CACHE:
+                self._record_ids.popitem(last=False)
+
+        audits = []
+        for kind, worker_id, payload in batch:
+            if kind == 'audit':
+                inst_id, calls, local_id = payload
+                audits.append((inst_id, calls, self._record_id(worker_id, local_id)))
+            elif kind != 'analysis':
+                try:
+                    self._handle_result(kind, worker_id, payload)
+                except Exception as e:
+                    logger.error(f"处理工作进程 {worker_id} 的 {kind} 结果失败: {e}")
+        if audits and self.audit_store is not None:
+            self.audit_store.record_batch(audits)
+
+    def _handle_result(self, kind: str, worker_id: Optional[int], payload: Any):
+        if kind == 'cycle':
+            payload['record_id'] = self._record_id(worker_id, payload.get('record_id'))
+            self.cycles += 1
+            handle = self.workers.get(worker_id)
+            if handle is not None:
+                handle.cycles += 1
+            if self.feed is not None:
+                self.feed.publish(payload)
+        elif kind == 'candles':
+            if self.candle_store is not None:
+                self.candle_store.append(*payload)
+        elif kind == 'email':
+            payload['record_id'] = self._record_id(worker_id, payload.get('record_id'))
+            self._emails.put(payload)
+        elif kind == 'email_result':
+            analysis_data, success = payload
+            self.database.save_email_alert(email_alert_record(analysis_data, success))
+            if success and analysis_data.get('record_id') is not None:
+                self.database.mark_email_sent(analysis_data['record_id'])
+        elif kind == 'heartbeat':
+            handle = self.workers.get(worker_id)
+            if handle is not None and handle.process is not None and handle.process.pid == payload['pid']:
+                handle.last_seen = time.monotonic()
+                if handle.last_seen - handle.started_at > STABLE_AFTER:
+                    handle.restarts = 0
+            self._inst_metrics.update(payload['metrics'])
+
+    def _notify_loop(self):
+        """发送邮件可能耗时数秒，不阻塞写库；发送结果交回写入线程记录
+
+        发送期间积压的提醒（多个交易对同时触发）合并为一封摘要邮件。
+        """
+        digest_max = self.config.email.digest_max
+        while True:
+            analysis_data = self._emails.get()
+            if analysis_data is None:
+                return
+            batch, stopping = [analysis_data], False
+            while len(batch) < digest_max:
+                try:
+                    analysis_data = self._emails.get_nowait()
+                except queue.Empty:
+                    break
+                if analysis_data is None:
+                    stopping = True
+                    break
+                batch.append(analysis_data)
+            success = self.email_notifier.send_digest(batch)
+            for analysis_data in batch:
+                self._results.put(('email_result', None, (analysis_data, success)))
+            if stopping:
+                return
+
+    # ---- 指标 ----
+
+    def assignments(self) -> Dict[int, List[str]]:
+        with self._lock:
+            return {worker_id: list(h.assigned) for worker_id, h in self.workers.items()}
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            workers = {
+                str(worker_id): {
+                    'alive': h.process is not None,
+                    'pid': h.process.pid if h.process is not None else None,
+                    'instruments': len(h.assigned),
+                    'cycles': h.cycles,
+                    'restarts': h.restarts,
+                }
+                for worker_id, h in sorted(self.workers.items())
+            }
+        return {'instruments': len(self.inst_ids), 'cycles': self.cycles, 'workers': workers}
+
+    def format_metrics(self) -> str:
+        m = self.metrics()
+        workers = " | ".join(f"#{wid} {'运行' if w['alive'] else '重启中'} {w['instruments']}个/{w['cycles']}周期"
+                             for wid, w in m['workers'].items())
+        return f"协调模式 {m['instruments']} 个交易对，已完成 {m['cycles']} 个周期: {workers}"
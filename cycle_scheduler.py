@@ -0,0 +1,195 @@
+"""
+分析周期调度
+
+按绝对时间网格（epoch 对齐）调度周期，不随每次执行耗时累积漂移；
+网格间隔整除K线周期时，每根K线收盘后 close_offset 秒必有一次分析。
+同一机器上的多个交易对按 inst_id 得到固定的相位抖动，避免同时请求 API。
+周期执行超时（跨过下一个网格点）时按策略跳过或合并错过的周期；
+每个周期带一个截止时间，超时后尚未开始的阶段被取消。
+"""
+import logging
+import math
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+from strategy_config import bar_to_seconds
+
+logger = logging.getLogger(__name__)
+
+OVERRUN_SKIP = "skip"  # 跳过错过的周期，等待下一个网格点
+OVERRUN_COALESCE = "coalesce"  # 错过的周期合并为一次，立即补跑
+
+
+class DeadlineExceeded(Exception):
+    """周期超过截止时间，后续阶段被取消"""
+
+
+class CycleDeadline:
+    """单个周期的截止时间，各阶段开始前调用 check()"""
+
+    def __init__(self, seconds: Optional[float]):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self.missed = False  # 是否有阶段因超时被取消
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, stage: str):
+        if self.expired():
+            self.missed = True
+            raise DeadlineExceeded(f"周期已超过 {self.seconds:g} 秒截止时间，取消阶段: {stage}")
+
+
+@dataclass
+class SchedulerMetrics:
+    ticks: int = 0  # 实际执行的周期数
+    skipped: int = 0  # 因超时被跳过/合并的网格点
+    overruns: int = 0  # 执行时间超过间隔的次数
+    deadline_misses: int = 0
+    last_lag: float = 0.0  # 实际开始时间 - 计划时间（秒）
+    max_lag: float = 0.0
+    avg_lag: float = 0.0  # 指数加权平均
+    last_duration: float = 0.0
+
+    def record_lag(self, lag: float):
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.avg_lag = lag if self.ticks == 0 else self.avg_lag * 0.9 + lag * 0.1
+
+
+def jitter_for(key: str, max_jitter: float) -> float:
+    """由 key 确定的固定抖动（0 ~ max_jitter 秒）"""
+    if max_jitter <= 0 or not key:
+        return 0.0
+    return (zlib.crc32(key.encode('utf-8')) % 10_000) / 10_000 * max_jitter
+
+
+class CycleScheduler:
+    """对齐到K线收盘的周期调度器"""
+
+    def __init__(self, interval: float, bar: Optional[str] = None, close_offset: float = 0.0,
+                 jitter: float = 0.0, jitter_key: str = "", overrun_policy: str = OVERRUN_SKIP,
+                 deadline: Optional[float] = None, align: bool = True):
+        """
+        Args:
+            interval: 周期间隔（秒）
+            bar: K线周期，用于检查间隔能否与收盘对齐
+            close_offset: 网格点相对K线收盘的延后秒数（等待交易所确认收盘K线）
+            jitter: 最大相位抖动（秒），实际抖动由 jitter_key 决定且固定不变
+            overrun_policy: skip 或 coalesce
+            deadline: 每个周期的截止时间（秒），None 表示不限
+            align: False 时以启动时刻为网格起点（不对齐收盘）
+        """
+        if overrun_policy not in (OVERRUN_SKIP, OVERRUN_COALESCE):
+            raise ValueError(f"未知的超时策略: {overrun_policy}")
+        self.interval = float(interval)
+        self.overrun_policy = overrun_policy
+        self.deadline = deadline
+        self.align = align
+        self.phase = close_offset + jitter_for(jitter_key, jitter)
+        self.metrics = SchedulerMetrics()
+        self._stop = threading.Event()
+        self._resumed = False  # 从检查点恢复: 第一个周期等到下一个网格点
+
+        if align and bar:
+            try:
+                bar_seconds = bar_to_seconds(bar)
+                if bar_seconds % self.interval and self.interval % bar_seconds:
+                    logger.warning(f"分析间隔 {interval}s 与K线周期 {bar} 不成整数倍，无法每次都对齐收盘")
+            except ValueError:
+                pass
+
+    def next_tick(self, after: float) -> float:
+        """after 之后（不含）的下一个网格点"""
+        k = math.floor((after - self.phase) / self.interval) + 1
+        return k * self.interval + self.phase
+
+    def stop(self):
+        self._stop.set()
+
+    def _sleep_until(self, target: float) -> bool:
+        """睡到 target（epoch 秒），被 stop() 唤醒时返回 False"""
+        remaining = target - time.time()
+        if remaining > 0:
+            return not self._stop.wait(remaining)
+        return not self._stop.is_set()
+
+    def export_state(self) -> Dict:
+        return {'interval': self.interval, 'phase': self.phase, 'metrics': asdict(self.metrics)}
+
+    def restore_state(self, state: Dict):
+        """恢复指标；不对齐收盘时沿用原网格起点（对齐时相位由配置决定）"""
+        self.metrics = SchedulerMetrics(**state['metrics'])
+        if not self.align and state['interval'] == self.interval:
+            self.phase = state['phase']
+        self._resumed = True
+
+    def first_tick(self, now: float, immediate: bool = False) -> float:
+        """第一个周期的计划时间（不对齐时以 now 为网格起点；从检查点恢复时为原网格的下一个点）"""
+        if self._resumed:
+            self._resumed = False
+            return self.next_tick(now)
+        if not self.align:
+            self.phase = now % self.interval
+        return now if immediate or not self.align else self.next_tick(now)
+
+    def plan_next(self, scheduled: float, started: float, finished: float) -> float:
+        """记录一个已完成周期的指标，按超时策略返回下一个周期的计划时间"""
+        self.metrics.record_lag(started - scheduled)
+        self.metrics.ticks += 1
+        self.metrics.last_duration = finished - started
+
+        following = self.next_tick(scheduled)
+        if finished <= following:
+            return following
+
+        # 执行时间跨过了一个或多个网格点
+        missed = math.floor((finished - following) / self.interval) + 1
+        self.metrics.overruns += 1
+        if self.overrun_policy == OVERRUN_COALESCE:
+            self.metrics.skipped += missed - 1
+            logger.warning(f"周期耗时 {self.metrics.last_duration:.1f}s 超过间隔，合并 {missed} 个错过的周期并立即执行")
+            return finished
+        self.metrics.skipped += missed
+        logger.warning(f"周期耗时 {self.metrics.last_duration:.1f}s 超过间隔，跳过 {missed} 个周期")
+        return self.next_tick(finished)
+
+    def run(self, cycle: Callable[[CycleDeadline], Any], max_cycles: Optional[int] = None,
+            immediate: bool = False):
+        """循环执行 cycle(deadline)，直到 stop() 或达到 max_cycles
+
+        immediate: 立即执行第一个周期，之后再回到网格（跳过启动自检时用）
+        """
+        scheduled = self.first_tick(time.time(), immediate)
+        start_ticks = self.metrics.ticks
+
+        while max_cycles is None or self.metrics.ticks - start_ticks < max_cycles:
+            wait = scheduled - time.time()
+            if wait > 0:
+                logger.info(f"等待 {wait:.1f} 秒后进行下一次分析...")
+            if not self._sleep_until(scheduled):
+                break
+
+            started = time.time()
+            deadline = CycleDeadline(self.deadline)
+            try:
+                cycle(deadline)
+            except DeadlineExceeded as e:
+                logger.warning(str(e))
+            if deadline.missed:
+                self.metrics.deadline_misses += 1
+            scheduled = self.plan_next(scheduled, started, time.time())
+
+    def format_metrics(self) -> str:
+        m = self.metrics
+        return (f"调度延迟 当前 {m.last_lag * 1000:.0f}ms / 平均 {m.avg_lag * 1000:.0f}ms / 最大 {m.max_lag * 1000:.0f}ms | "
+                f"超时 {m.overruns} 次，跳过 {m.skipped} 个周期，截止超时 {m.deadline_misses} 次")
@@ -0,0 +1,321 @@
+"""
+只读仪表盘 / API
+
+进程内嵌的 asyncio HTTP 服务（仅标准库），数据来自内存中最近周期的环形缓冲区，不读取 SQLite:
+- GET /                 简单页面（EventSource 实时刷新）
+- GET /api/latest       每个交易对最新的决策
+- GET /api/history      最近的周期（?inst_id=&limit=）
+- GET /api/positions    持仓及按最新价计算的浮动盈亏
+- GET /api/metrics      各机器人的统计和模块指标
+- GET /events           SSE 推送新周期（支持 Last-Event-ID 补发缓冲区内错过的事件）
+
+分析线程发布一个周期只做一次 deque 追加和 call_soon_threadsafe，序列化和推送都在服务线程完成，
+不影响周期耗时；推送跟不上的客户端丢弃旧事件而不是阻塞。
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# 周期摘要保留的字段（不含行情快照和原始回复）
+SUMMARY_FIELDS = ('record_id', 'inst_id', 'current_price', 'recommendation', 'confidence', 'analysis_summary',
+                  'reasoning', 'support_levels', 'resistance_levels', 'urgent_action', 'urgent_reason', 'email_sent')
+SSE_HEARTBEAT = 15.0  # 秒，保持连接的注释行
+SSE_QUEUE_SIZE = 100
+HISTORY_MAX_LIMIT = 1000  # /api/history 单次返回的最大周期数
+
+
+class CycleFeed:
+    """最近分析周期的内存环形缓冲区，多个机器人共享"""
+
+    def __init__(self, history: int = 500):
+        self._events: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=history)
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[int, Dict[str, Any]], None]] = []
+        self._metrics: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._positions: Dict[str, Callable[[], List[Dict[str, Any]]]] = {}
+
+    def publish(self, analysis_data: Dict[str, Any]):
+        """分析线程调用: 记录一个周期的摘要并通知订阅者"""
+        event = {k: analysis_data.get(k) for k in SUMMARY_FIELDS}
+        event['timestamp'] = time.time()
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._events.append((seq, event))
+            self._latest[event['inst_id']] = event
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(seq, event)
+
+    def subscribe(self, listener: Callable[[int, Dict[str, Any]], None]):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def since(self, seq: int) -> List[Tuple[int, Dict[str, Any]]]:
+        with self._lock:
+            return [(s, e) for s, e in self._events if s > seq]
+
+    def history(self, inst_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """最近的周期，新的在前"""
+        with self._lock:
+            events = [e for _, e in reversed(self._events) if inst_id is None or e['inst_id'] == inst_id]
+        return events[:limit]
+
+    def latest(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return dict(self._latest)
+
+    def register_metrics(self, name: str, provider: Callable[[], Dict[str, Any]]):
+        self._metrics[name] = provider
+
+    def register_positions(self, name: str, provider: Callable[[], List[Dict[str, Any]]]):
+        self._positions[name] = provider
+
+    def metrics(self) -> Dict[str, Any]:
+        result = {}
+        for name, provider in list(self._metrics.items()):
+            try:
+                result[name] = provider()
+            except Exception as e:
+                result[name] = {'error': str(e)}
+        return result
+
+    def positions(self) -> List[Dict[str, Any]]:
+        """所有来源的持仓，按各交易对最新周期价格计算浮动盈亏"""
+        latest = self.latest()
+        rows, seen = [], set()
+        for provider in list(self._positions.values()):
+            try:
+                positions = provider()
+            except Exception as e:
+                logger.debug(f"获取持仓失败: {e}")
+                continue
+            for position in positions:
+                key = (position.get('inst_id'), position.get('direction'), position.get('entry_price'),
+                       position.get('open_time'))
+                if key in seen:  # 多个机器人可能读取同一个持仓文件
+                    continue
+                seen.add(key)
+                rows.append(_with_pnl(position, (latest.get(position.get('inst_id')) or {}).get('current_price')))
+        return rows
+
+
+def _with_pnl(position: Dict[str, Any], price: Optional[float]) -> Dict[str, Any]:
+    row = dict(position)
+    row['mark_price'] = price
+    try:
+        entry, size = float(position['entry_price']), float(position['size'])
+        sign = 1 if position.get('direction') == 'long' else -1
+        leverage = float(position.get('leverage') or 1)
+    except (KeyError, TypeError, ValueError):
+        return row
+    if price:
+        row['pnl_amount'] = round((price - entry) * size * sign, 4)
+        row['pnl_percent'] = round((price - entry) / entry * 100 * leverage * sign, 2)
+    return row
+
+
+_PAGE = """<!doctype html>
+<html lang="zh"><head><meta charset="utf-8"><title>交易分析仪表盘</title>
+<style>body{font-family:sans-serif;margin:20px}table{border-collapse:collapse;margin-bottom:20px}
+td,th{border:1px solid #ccc;padding:4px 8px;font-size:14px}th{background:#f4f4f4}</style></head>
+<body><h2>最新决策</h2><table id="latest"></table><h2>持仓</h2><table id="positions"></table>
+<h2>最近周期</h2><table id="history"></table>
+<script>
+const esc = v => String(v ?? '').replace(/[&<>"]/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'}[c]));
+function render(id, rows, cols) {
+  const t = document.getElementById(id);
+  t.innerHTML = '<tr>' + cols.map(c => '<th>' + c + '</th>').join('') + '</tr>' +
+    rows.map(r => '<tr>' + cols.map(c => '<td>' + esc(r[c]) + '</td>').join('') + '</tr>').join('');
+}
+const cols = ['inst_id', 'current_price', 'recommendation', 'confidence', 'email_sent', 'analysis_summary'];
+async function refresh() {
+  render('latest', Object.values(await (await fetch('/api/latest')).json()), cols);
+  render('history', await (await fetch('/api/history?limit=30')).json(), cols);
+  render('positions', await (await fetch('/api/positions')).json(),
+         ['inst_id', 'direction', 'size', 'entry_price', 'mark_price', 'pnl_amount', 'pnl_percent',
+          'take_profit', 'stop_loss']);
+}
+refresh();
+new EventSource('/events').addEventListener('cycle', refresh);
+</script></body></html>
+"""
+
+
+class DashboardServer:
+    """在独立线程的事件循环中运行的只读 HTTP 服务"""
+
+    def __init__(self, feed: CycleFeed, host: str = "127.0.0.1", port: int = 8080):
+        self.feed = feed
+        self.host = host
+        self.port = port
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Set[asyncio.Queue] = set()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="dashboard", daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        if self._server is None:
+            logger.error(f"仪表盘启动失败（{self.host}:{self.port}），分析继续运行")
+            return
+        self.feed.subscribe(self._on_event)
+        logger.info(f"仪表盘已启动: http://{self.host}:{self.port}/")
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        except OSError as e:
+            logger.error(f"仪表盘监听失败: {e}")
+            self._ready.set()
+            self._loop.close()
+            return
+        self.port = self._server.sockets[0].getsockname()[1]  # port=0 时为实际端口
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.close()
+
+    def _on_event(self, seq: int, event: Dict[str, Any]):
+        """分析线程中调用，只把事件交给服务线程"""
+        if self._loop is not None and self._clients:
+            self._loop.call_soon_threadsafe(self._broadcast, seq, event)
+
+    def _broadcast(self, seq: int, event: Dict[str, Any]):
+        message = _sse(seq, event)  # 每个事件只序列化一次
+        for queue in self._clients:
+            if queue.full():
+                queue.get_nowait()  # 慢客户端丢弃最旧的事件
+            queue.put_nowait(message)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=10)
+            request_line, *header_lines = head.decode('latin-1').split("\r\n")
+            method, target, _ = request_line.split(" ", 2)
+            headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in header_lines if line)}
+            if method != "GET":
+                await self._respond(writer, 405, b'{"error": "method not allowed"}')
+                return
+            url = urlsplit(target)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path == "/events":
+                await self._stream(writer, _int_param(headers.get('last-event-id'), 0) or 0)
+                return
+            await self._route(writer, url.path, query)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        except Exception as e:
+            logger.error(f"仪表盘请求处理失败: {e}")
+        finally:
+            writer.close()
+
+    async def _route(self, writer: asyncio.StreamWriter, path: str, query: Dict[str, str]):
+        if path == "/":
+            await self._respond(writer, 200, _PAGE.encode('utf-8'), "text/html; charset=utf-8")
+        elif path == "/api/latest":
+            await self._respond(writer, 200, dumps(self.feed.latest()).encode('utf-8'))
+        elif path == "/api/history":
+            limit = _int_param(query.get('limit'), 100)
+            if limit is None or limit < 0:
+                await self._respond(writer, 400, b'{"error": "limit must be a non-negative integer"}')
+                return
+            limit = min(limit, HISTORY_MAX_LIMIT)
+            await self._respond(writer, 200, dumps(self.feed.history(query.get('inst_id'), limit)).encode('utf-8'))
+        elif path == "/api/positions":
+            # 持仓来源可能读文件，放到线程池，不阻塞事件循环
+            rows = await asyncio.get_running_loop().run_in_executor(None, self.feed.positions)
+            await self._respond(writer, 200, dumps(rows).encode('utf-8'))
+        elif path == "/api/metrics":
+            metrics = await asyncio.get_running_loop().run_in_executor(None, self.feed.metrics)
+            await self._respond(writer, 200, dumps(metrics).encode('utf-8'))
+        else:
+            await self._respond(writer, 404, b'{"error": "not found"}')
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: bytes,
+                       content_type: str = "application/json; charset=utf-8"):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}.get(status, "OK")
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nCache-Control: no-store\r\nConnection: close\r\n\r\n"
+                     .encode('latin-1') + body)
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter, last_seq: int):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-store\r\n"
+                     b"Connection: keep-alive\r\n\r\n")
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self._clients.add(queue)
+        try:
+            for seq, event in self.feed.since(last_seq)[-SSE_QUEUE_SIZE:]:
+                writer.write(_sse(seq, event))
+            await writer.drain()
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    message = b": keep-alive\n\n"
+                writer.write(message)
+                await writer.drain()
+        finally:
+            self._clients.discard(queue)
+
+
+def _int_param(value: Optional[str], default: int) -> Optional[int]:
+    """查询参数 / 请求头转为整数，缺失时返回默认值，格式错误返回 None"""
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _sse(seq: int, event: Dict[str, Any]) -> bytes:
+    return f"id: {seq}\nevent: cycle\ndata: {dumps(event)}\n\n".encode('utf-8')
+
+
+_shared_feed: Optional[CycleFeed] = None
+_shared_server: Optional[DashboardServer] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_feed(history: int = 500) -> CycleFeed:
+    """进程内共享的周期缓冲区（多个交易对的机器人发布到同一个仪表盘）"""
+    global _shared_feed
+    with _shared_lock:
+        if _shared_feed is None:
+            _shared_feed = CycleFeed(history)
+        return _shared_feed
+
+
+def start_dashboard(feed: CycleFeed, host: str, port: int) -> DashboardServer:
+    """启动仪表盘（进程内只启动一次）"""
+    global _shared_server
+    with _shared_lock:
+        if _shared_server is None:
+            _shared_server = DashboardServer(feed, host, port)
+            _shared_server.start()
+        return _shared_server
@@ -1,24 +1,145 @@
-import sqlite3
+"""
+交易分析数据库（按月分区）
+
+每个自然月（UTC）一个 SQLite 文件（trading_analysis_202610.db），写入只落在当月分区，
+整理旧分区不会阻塞分析周期:
+- 降采样: 超过 downsample_after_days 天的记录只保留可操作信号（开平仓建议或已发邮件），
+  其余记录汇总为按小时的 hourly_summaries
+- 归档: 超过 archive_after_days 天的分区导出为列式文件（安装 pyarrow 时为 Parquet，
+  否则为 gzip 压缩的 JSON Lines）后删除 SQLite 文件
+- 查询: query_records / query_hourly 同时覆盖在线分区和归档文件
+
+记录ID = 分区年月 × 10^9 + 分区内自增ID，可由ID定位分区。
+分区之前的单文件数据库（db_path 本身）作为 legacy 分区继续可读写。
+"""
+import glob
+import gzip
 import json
 import logging
-from datetime import datetime
-from typing import Dict
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+from serialization import AnalysisRecord
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # 可选依赖
+    pyarrow = None
 
 logger = logging.getLogger(__name__)
 
+PARTITION_ID_BASE = 10 ** 9
+LEGACY_PARTITION = "legacy"
+ACTIONABLE_RECOMMENDATIONS = ('BUY_LONG', 'BUY_SHORT', 'SELL')
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'  # 与 SQLite CURRENT_TIMESTAMP（UTC）一致
+
+RECORD_COLUMNS = ('id', 'timestamp', 'inst_id', 'current_price', 'recommendation', 'confidence',
+                  'analysis_summary', 'reasoning', 'support_levels', 'resistance_levels',
+                  'market_data_json', 'raw_response', 'email_sent')
+HOURLY_COLUMNS = ('hour', 'inst_id', 'records', 'open_price', 'close_price', 'min_price', 'max_price',
+                  'avg_confidence', 'recommendations')
+ALERT_COLUMNS = ('id', 'timestamp', 'inst_id', 'recommendation', 'confidence', 'current_price',
+                 'message', 'sent_successfully')
+
+TimeArg = Union[datetime, str, None]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _time_str(value: TimeArg) -> Optional[str]:
+    """datetime（naive 视为 UTC）或字符串 -> 'YYYY-MM-DD HH:MM:SS'"""
+    if value is None or isinstance(value, str):
+        return value
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime(TIME_FORMAT)
+
+
+def _month_range(key: str):
+    """分区 '202610' -> (月初, 下月初)"""
+    start = datetime(int(key[:4]), int(key[4:]), 1)
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
 class TradingAnalysisDB:
     """交易分析数据库"""
-    
-    def __init__(self, db_path: str = "trading_analysis.db"):
+
+    def __init__(self, db_path: str = "trading_analysis.db", downsample_after_days: float = 30.0,
+                 archive_after_days: float = 90.0, archive_dir: Optional[str] = None):
+        """
+        Args:
+            db_path: 数据库路径，分区文件为同目录下的 <文件名>_YYYYMM.db
+            downsample_after_days: 超过该天数的非操作记录汇总为小时统计后删除（0 关闭）
+            archive_after_days: 分区内全部记录超过该天数后导出为列式文件（0 关闭）
+            archive_dir: 归档目录，默认为数据库同目录下的 archive/
+        """
         self.db_path = db_path
-        self._init_database()
-        logger.info(f"数据库初始化完成: {db_path}")
-    
-    def _init_database(self):
+        directory = os.path.dirname(os.path.abspath(db_path))
+        self._prefix = os.path.join(directory, os.path.splitext(os.path.basename(db_path))[0])
+        self.archive_dir = archive_dir or os.path.join(directory, "archive")
+        self.downsample_after_days = downsample_after_days
+        self.archive_after_days = archive_after_days
+        self._initialized: set = set()
+        self._lock = threading.Lock()  # 保护分区文件的归档和删除
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+        self._connect(self._partition_for(_utcnow())).close()
+        logger.info(f"数据库初始化完成: {self._partition_path(self._partition_for(_utcnow()))}")
+
+    # ---- 分区 ----
+
+    @staticmethod
+    def _partition_for(moment: datetime) -> str:
+        return moment.strftime('%Y%m')
+
+    def _partition_path(self, key: str) -> str:
+        return self.db_path if key == LEGACY_PARTITION else f"{self._prefix}_{key}.db"
+
+    def hot_partitions(self) -> List[str]:
+        """在线的分区（按时间升序，legacy 在最前）"""
+        keys = []
+        if os.path.exists(self.db_path):
+            keys.append(LEGACY_PARTITION)
+        pattern = re.compile(re.escape(os.path.basename(self._prefix)) + r'_(\d{6})\.db$')
+        for path in sorted(glob.glob(f"{glob.escape(self._prefix)}_*.db")):
+            match = pattern.search(os.path.basename(path))
+            if match:
+                keys.append(match.group(1))
+        return keys
+
+    def _archive_path(self, key: str, table: str) -> str:
+        ext = "parquet" if pyarrow is not None else "jsonl.gz"
+        return os.path.join(self.archive_dir, f"{os.path.basename(self._prefix)}_{key}.{table}.{ext}")
+
+    def cold_partitions(self) -> List[str]:
+        keys = set()
+        pattern = re.compile(re.escape(os.path.basename(self._prefix)) + r'_(\w+?)\.(\w+)\.(parquet|jsonl\.gz)$')
+        for path in glob.glob(os.path.join(glob.escape(self.archive_dir), "*")):
+            match = pattern.search(os.path.basename(path))
+            if match:
+                keys.add(match.group(1))
+        return sorted(keys)
+
+    def _connect(self, key: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._partition_path(key))
+        if key not in self._initialized:
+            self._init_database(conn)
+            self._initialized.add(key)
+        return conn
+
+    def _init_database(self, conn: sqlite3.Connection):
         """初始化数据库表"""
-        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        
+
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS analysis_records (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -36,7 +157,7 @@ class TradingAnalysisDB:
                 email_sent BOOLEAN DEFAULT FALSE
             )
         ''')
-        
+
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS email_alerts (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -49,46 +170,82 @@ class TradingAnalysisDB:
                 sent_successfully BOOLEAN
             )
         ''')
-        
+
+        # 降采样后的小时汇总，recommendations 为各建议次数的 JSON
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS hourly_summaries (
+                hour TEXT NOT NULL,
+                inst_id TEXT NOT NULL,
+                records INTEGER,
+                open_price REAL,
+                close_price REAL,
+                min_price REAL,
+                max_price REAL,
+                avg_confidence REAL,
+                recommendations TEXT,
+                PRIMARY KEY (hour, inst_id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS partition_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+
         conn.commit()
-        conn.close()
-    
+
+    @staticmethod
+    def _global_id(key: str, local_id: int) -> int:
+        return local_id if key == LEGACY_PARTITION else int(key) * PARTITION_ID_BASE + local_id
+
+    @staticmethod
+    def _split_id(record_id: int):
+        """全局ID -> (分区, 分区内ID)"""
+        if record_id < PARTITION_ID_BASE:
+            return LEGACY_PARTITION, record_id
+        return str(record_id // PARTITION_ID_BASE), record_id % PARTITION_ID_BASE
+
+    # ---- 写入 ----
+
     def save_analysis(self, analysis_data: Dict) -> int:
         """保存分析结果到数据库，返回记录ID"""
-        conn = sqlite3.connect(self.db_path)
+        return self.save_analyses([analysis_data])[0]
+
+    def save_analyses(self, records: List[Dict]) -> List[int]:
+        """在一个事务中保存多条分析结果（协调模式的写入线程批量写入），返回记录ID"""
+        if not records:
+            return []
+        key = self._partition_for(_utcnow())
+        conn = self._connect(key)
         cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO analysis_records (
-                inst_id, current_price, recommendation, confidence,
-                analysis_summary, reasoning, support_levels, resistance_levels,
-                market_data_json, raw_response
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            analysis_data.get('inst_id'),
-            analysis_data.get('current_price'),
-            analysis_data.get('recommendation'),
-            analysis_data.get('confidence'),
-            analysis_data.get('analysis_summary'),
-            analysis_data.get('reasoning'),
-            json.dumps(analysis_data.get('support_levels', [])),
-            json.dumps(analysis_data.get('resistance_levels', [])),
-            analysis_data.get('market_data_json'),
-            analysis_data.get('raw_response')
-        ))
-        
-        record_id = cursor.lastrowid
+
+        record_ids = []
+        for analysis_data in records:
+            cursor.execute('''
+                INSERT INTO analysis_records (
+                    inst_id, current_price, recommendation, confidence,
+                    analysis_summary, reasoning, support_levels, resistance_levels,
+                    market_data_json, raw_response
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', AnalysisRecord.from_dict(analysis_data).to_row())
+            record_ids.append(self._global_id(key, cursor.lastrowid))
         conn.commit()
         conn.close()
-        
-        logger.info(f"分析结果已保存到数据库，记录ID: {record_id}")
-        return record_id
-    
+
+        if len(record_ids) == 1:
+            logger.info(f"分析结果已保存到数据库，记录ID: {record_ids[0]}")
+        else:
+            logger.info(f"{len(record_ids)} 条分析结果已保存到数据库，记录ID: {record_ids[0]}-{record_ids[-1]}")
+        return record_ids
+
     def save_email_alert(self, alert_data: Dict) -> int:
         """保存邮件提醒记录"""
-        conn = sqlite3.connect(self.db_path)
+        key = self._partition_for(_utcnow())
+        conn = self._connect(key)
         cursor = conn.cursor()
-        
+
         cursor.execute('''
             INSERT INTO email_alerts (
                 inst_id, recommendation, confidence, current_price, message, sent_successfully
@@ -101,25 +258,256 @@ class TradingAnalysisDB:
             alert_data.get('message'),
             alert_data.get('sent_successfully', False)
         ))
-        
-        alert_id = cursor.lastrowid
+
+        alert_id = self._global_id(key, cursor.lastrowid)
         conn.commit()
         conn.close()
-        
+
         logger.info(f"邮件提醒记录已保存，ID: {alert_id}")
         return alert_id
-    
+
     def mark_email_sent(self, record_id: int):
         """标记分析记录已发送邮件"""
-        conn = sqlite3.connect(self.db_path)
+        key, local_id = self._split_id(record_id)
+        if not os.path.exists(self._partition_path(key)):
+            logger.warning(f"记录 {record_id} 所在分区已归档，无法标记邮件已发送")
+            return
+        conn = self._connect(key)
         cursor = conn.cursor()
-        
+
         cursor.execute('''
-            UPDATE analysis_records 
-            SET email_sent = TRUE 
+            UPDATE analysis_records
+            SET email_sent = TRUE
             WHERE id = ?
-        ''', (record_id,))
-        
+        ''', (local_id,))
+
         conn.commit()
         conn.close()
         logger.debug(f"记录 {record_id} 已标记为邮件已发送")
+
+    # ---- 查询 ----
+
+    def query_records(self, inst_id: Optional[str] = None, start: TimeArg = None, end: TimeArg = None,
+                      recommendations: Optional[Iterable[str]] = None, limit: Optional[int] = None,
+                      include_cold: bool = True, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """查询分析记录（在线分区 + 归档），按时间升序；start 含、end 不含，时间为 UTC
+
+        columns: 只返回这些列（id、timestamp 始终返回），不需要 market_data_json 等大字段时可明显减少读取量
+        """
+        start, end = _time_str(start), _time_str(end)
+        if columns is not None:
+            unknown = set(columns) - set(RECORD_COLUMNS)
+            if unknown:
+                raise ValueError(f"未知的列: {', '.join(sorted(unknown))}")
+            wanted = {'id', 'timestamp', 'inst_id', 'recommendation', *columns}
+            columns = tuple(c for c in RECORD_COLUMNS if c in wanted)
+        recommendations = set(recommendations) if recommendations else None
+
+        def keep(row: Dict[str, Any]) -> bool:
+            return ((inst_id is None or row['inst_id'] == inst_id)
+                    and (start is None or row['timestamp'] >= start)
+                    and (end is None or row['timestamp'] < end))
+
+        rows = self._query('analysis_records', columns or RECORD_COLUMNS, 'timestamp', inst_id, start, end,
+                           include_cold, keep)
+        if columns is not None:
+            rows = [{c: row.get(c) for c in columns} for row in rows]  # 归档文件读出的是整行
+        if recommendations is not None:
+            rows = [row for row in rows if row['recommendation'] in recommendations]
+        rows.sort(key=lambda row: (row['timestamp'], row['id']))
+        return rows[:limit] if limit else rows
+
+    def query_hourly(self, inst_id: Optional[str] = None, start: TimeArg = None, end: TimeArg = None,
+                     include_cold: bool = True) -> List[Dict[str, Any]]:
+        """查询降采样后的小时汇总"""
+        start, end = _time_str(start), _time_str(end)
+
+        def keep(row: Dict[str, Any]) -> bool:
+            return ((inst_id is None or row['inst_id'] == inst_id)
+                    and (start is None or row['hour'] >= start) and (end is None or row['hour'] < end))
+
+        rows = self._query('hourly_summaries', HOURLY_COLUMNS, 'hour', inst_id, start, end, include_cold, keep)
+        for row in rows:
+            if isinstance(row['recommendations'], str):
+                row['recommendations'] = json.loads(row['recommendations'])
+        rows.sort(key=lambda row: (row['hour'], row['inst_id']))
+        return rows
+
+    def _overlaps(self, key: str, start: Optional[str], end: Optional[str]) -> bool:
+        if key == LEGACY_PARTITION:
+            return True
+        month_start, month_end = _month_range(key)
+        return ((end is None or month_start.strftime(TIME_FORMAT) < end)
+                and (start is None or month_end.strftime(TIME_FORMAT) > start))
+
+    def _query(self, table: str, columns, time_column: str, inst_id: Optional[str], start: Optional[str],
+               end: Optional[str], include_cold: bool, keep) -> List[Dict[str, Any]]:
+        conditions, params = [], []
+        if inst_id is not None:
+            conditions.append('inst_id = ?')
+            params.append(inst_id)
+        if start is not None:
+            conditions.append(f'{time_column} >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append(f'{time_column} < ?')
+            params.append(end)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        rows = []
+        with self._lock:
+            for key in self.hot_partitions():
+                if not self._overlaps(key, start, end):
+                    continue
+                conn = self._connect(key)
+                try:
+                    for values in conn.execute(f"SELECT {', '.join(columns)} FROM {table}{where}", params):
+                        row = dict(zip(columns, values))
+                        if 'id' in row:
+                            row['id'] = self._global_id(key, row['id'])
+                        rows.append(row)
+                finally:
+                    conn.close()
+            if include_cold:
+                for key in self.cold_partitions():
+                    if self._overlaps(key, start, end):
+                        rows.extend(row for row in self._read_archive(key, table) if keep(row))
+        return rows
+
+    # ---- 整理: 降采样与归档 ----
+
+    def start_background_compaction(self, interval: float = 3600.0):
+        """后台定期整理旧分区（守护线程）"""
+        if self._compactor is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"数据库整理失败: {e}")
+
+        self._compactor = threading.Thread(target=loop, name="db-compaction", daemon=True)
+        self._compactor.start()
+        logger.info(f"数据库后台整理已启动，间隔 {interval:.0f} 秒")
+
+    def stop_background_compaction(self):
+        self._stop.set()
+
+    def compact(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """降采样旧记录，归档冷分区；当前写入的分区不做 VACUUM"""
+        now = now or _utcnow()
+        current = self._partition_for(now)
+        stats = {'downsampled': 0, 'summaries': 0, 'archived_partitions': 0}
+        for key in self.hot_partitions():
+            if self.downsample_after_days > 0:
+                removed, summaries = self._downsample(key, now - timedelta(days=self.downsample_after_days),
+                                                      vacuum=key != current)
+                stats['downsampled'] += removed
+                stats['summaries'] += summaries
+            if self.archive_after_days > 0 and key not in (current, LEGACY_PARTITION):
+                if _month_range(key)[1] <= now - timedelta(days=self.archive_after_days):
+                    self._archive(key)
+                    stats['archived_partitions'] += 1
+        if any(stats.values()):
+            logger.info(f"数据库整理完成: 降采样删除 {stats['downsampled']} 条，生成小时汇总 {stats['summaries']} 条，"
+                        f"归档分区 {stats['archived_partitions']} 个")
+        return stats
+
+    def _downsample(self, key: str, cutoff: datetime, vacuum: bool):
+        """cutoff 之前（按整点）的非操作记录汇总为小时统计后删除，返回 (删除条数, 汇总条数)"""
+        cutoff_hour = _time_str(cutoff.replace(minute=0, second=0, microsecond=0))
+        conn = self._connect(key)
+        try:
+            row = conn.execute("SELECT value FROM partition_meta WHERE key = 'downsampled_until'").fetchone()
+            since = row[0] if row else ''
+            if since >= cutoff_hour:
+                return 0, 0
+
+            records = conn.execute('''
+                SELECT strftime('%Y-%m-%d %H:00:00', timestamp), inst_id, current_price, confidence, recommendation
+                FROM analysis_records WHERE timestamp >= ? AND timestamp < ? ORDER BY id
+            ''', (since, cutoff_hour)).fetchall()
+
+            hourly: Dict[tuple, Dict[str, Any]] = {}
+            for hour, inst_id, price, confidence, recommendation in records:
+                bucket = hourly.setdefault((hour, inst_id), {'prices': [], 'confidences': [], 'recommendations': Counter()})
+                if price is not None:
+                    bucket['prices'].append(price)
+                bucket['confidences'].append(confidence or 0.0)
+                bucket['recommendations'][recommendation or 'UNKNOWN'] += 1
+            for (hour, inst_id), bucket in hourly.items():
+                prices = bucket['prices'] or [None]
+                conn.execute('''
+                    INSERT OR REPLACE INTO hourly_summaries (
+                        hour, inst_id, records, open_price, close_price, min_price, max_price,
+                        avg_confidence, recommendations
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (hour, inst_id, len(bucket['confidences']), prices[0], prices[-1],
+                      min(prices) if bucket['prices'] else None, max(prices) if bucket['prices'] else None,
+                      sum(bucket['confidences']) / len(bucket['confidences']),
+                      json.dumps(dict(bucket['recommendations']), ensure_ascii=False)))
+
+            placeholders = ', '.join('?' * len(ACTIONABLE_RECOMMENDATIONS))
+            removed = conn.execute(f'''
+                DELETE FROM analysis_records
+                WHERE timestamp >= ? AND timestamp < ?
+                  AND email_sent = FALSE AND COALESCE(recommendation, '') NOT IN ({placeholders})
+            ''', (since, cutoff_hour, *ACTIONABLE_RECOMMENDATIONS)).rowcount
+            conn.execute("INSERT OR REPLACE INTO partition_meta (key, value) VALUES ('downsampled_until', ?)",
+                         (cutoff_hour,))
+            conn.commit()
+            if removed and vacuum:
+                conn.execute('VACUUM')  # 旧分区没有写入，VACUUM 不影响分析周期
+            if removed:
+                logger.info(f"分区 {key}: {len(records)} 条记录汇总为 {len(hourly)} 条小时统计，删除 {removed} 条非操作记录")
+            return removed, len(hourly)
+        finally:
+            conn.close()
+
+    def _archive(self, key: str):
+        """分区导出为列式文件后删除 SQLite 文件"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        conn = self._connect(key)
+        try:
+            tables = {table: [dict(zip(columns, values)) for values in
+                              conn.execute(f"SELECT {', '.join(columns)} FROM {table}")]
+                      for table, columns in (('analysis_records', RECORD_COLUMNS),
+                                             ('hourly_summaries', HOURLY_COLUMNS),
+                                             ('email_alerts', ALERT_COLUMNS))}
+        finally:
+            conn.close()
+        for table in ('analysis_records', 'email_alerts'):
+            for row in tables[table]:
+                row['id'] = self._global_id(key, row['id'])
+
+        for table, rows in tables.items():
+            if rows:
+                self._write_archive(self._archive_path(key, table), rows)
+        with self._lock:
+            os.remove(self._partition_path(key))
+            self._initialized.discard(key)
+        logger.info(f"分区 {key} 已归档到 {self.archive_dir}（{len(tables['analysis_records'])} 条记录）")
+
+    @staticmethod
+    def _write_archive(path: str, rows: List[Dict[str, Any]]):
+        tmp_path = path + ".tmp"
+        if pyarrow is not None:
+            pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), tmp_path, compression='zstd')
+        else:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+    def _read_archive(self, key: str, table: str) -> List[Dict[str, Any]]:
+        prefix = os.path.join(self.archive_dir, f"{os.path.basename(self._prefix)}_{key}.{table}.")
+        if os.path.exists(prefix + "parquet"):
+            if pyarrow is None:
+                raise RuntimeError(f"读取 {prefix}parquet 需要安装 pyarrow")
+            return pyarrow.parquet.read_table(prefix + "parquet").to_pylist()
+        if os.path.exists(prefix + "jsonl.gz"):
+            with gzip.open(prefix + "jsonl.gz", 'rt', encoding='utf-8') as f:
+                return [json.loads(line) for line in f]
+        return []
@@ -1,17 +1,130 @@
 import logging
-import requests
-import pandas as pd
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 import json
 import os
+import time
+
+import numpy as np
+
+from audit_store import LLMCall
+from candle_aggregator import CandleAggregator, summarize_timeframes
+from checkpoint import restore_components
+from cycle_scheduler import DeadlineExceeded
+from indicators import rsi, sma
+from llm_router import LLMRouter, get_shared_router
+from model_cascade import (STAGE_CONFIRMED, STAGE_FAST, STAGE_UNCONFIRMED, CascadeStats,
+                           downgrade_unconfirmed, should_escalate)
+from market_model import NormalizedMarketData, ensure_normalized, parse_candles
+from orderbook_analytics import compute_features, format_features
+from regime_detector import get_shared_tracker
+from serialization import decode_decision
+from strategy_config import bar_to_seconds
+from trade_flow import DEFAULT_WINDOW_SECONDS, TradeFlowTracker, format_stats
 
 logger = logging.getLogger(__name__)
 
+# 分析提示词的固定部分，每个周期变化的内容由 _build_prompt_variables 填入
+ANALYSIS_PROMPT_TEMPLATE = """
+你是一个专业的加密货币{timeframe_desc}分析师。
+
+策略类型: {strategy_name}
+K线周期: {timeframe}
+分析时间: {analysis_time}
+{data_freshness}
+## 当前市场价格: {current_price} USDT
+**重要**: 这是实时最新价格，请基于 {current_price} USDT 进行所有分析和计算。
+
+## 我的持仓状态:
+{position_info}
+
+{available_actions}
+
+## 实时行情:
+- 当前价格: {current_price} USDT
+- 24h 最高: {high_24h} | 最低: {low_24h}
+- 买一: {bid_px} ({bid_sz}) | 卖一: {ask_px} ({ask_sz})
+- 24h成交量: {vol_ccy_24h} USDT
+
+## 市场深度(全部{book_depth}档统计):
+{orderbook}
+
+## 技术指标({timeframe}):
+{tech_indicators}
+
+## 多周期概览(由{source_bar}K线合成):
+{multi_timeframe}
+
+## 市场状态与相关性({source_bar}):
+{market_regime}
+
+## 成交分析:
+{trade_flow}
+
+请基于{strategy_name}策略给出交易建议，JSON格式返回:
+{{
+  "recommendation": "BUY_LONG/BUY_SHORT/WATCH (空仓时) 或 SELL/ADJUST_STOPS/HOLD (持仓时)",
+  "confidence": 0-100,
+  "analysis": "市场分析(50字内)",
+  "reasoning": "详细理由(100字内)",
+  "support_levels": [支撑位1, 支撑位2],
+  "resistance_levels": [阻力位1, 阻力位2],
+  "stop_adjustment": {{
+    "should_adjust": true/false,
+    "new_take_profit": 价格或null,
+    "new_stop_loss": 价格或null,
+    "adjustment_percent": 调整幅度百分比,
+    "reason": "调整理由"
+  }},
+  "urgent_action": true/false,
+  "urgent_reason": "紧急原因"
+}}
+
+**重要规则**:
+1. 所有价格计算必须基于当前价格 {current_price} USDT
+2. 空仓时: BUY_LONG(做多)/BUY_SHORT(做空)/WATCH(观望)
+3. 持仓时: SELL(平仓)/ADJUST_STOPS(调整止盈止损)/HOLD(继续持仓)
+4. 调整止盈止损时，必须计算 adjustment_percent（相对当前价格的调整幅度%）
+5. 短线交易要果断，不要总是观望
+
+请用JSON格式返回，包含以下字段:
+{{
+  "recommendation": "BUY_LONG/BUY_SHORT/WATCH/SELL/ADJUST_STOPS/HOLD",
+  "confidence": 0-100,
+  "analysis": "短期市场分析",
+  "reasoning": "详细理由",
+  "support_levels": [支撑位],
+  "resistance_levels": [阻力位],
+  "take_profit": 止盈价或null,
+  "stop_loss": 止损价或null,
+  "adjustment_percent": 调整幅度%或null,
+  "urgent_action": true/false,
+  "urgent_reason": "如需紧急操作的原因"
+}}
+"""
+
+SYSTEM_PROMPT = "你是一个专业的加密货币交易分析师，专注于技术分析和市场趋势判断。请用JSON格式返回分析结果。"
+
+
+def render_prompt(variables: Dict[str, Any]) -> str:
+    return ANALYSIS_PROMPT_TEMPLATE.format(**variables)
+
+
+def _require_json_content(response: Dict):
+    """回复中没有 JSON 对象时视为无效，由路由改用其他提供方"""
+    content = response['choices'][0]['message']['content']
+    if '{' not in content or '}' not in content:
+        raise ValueError("回复中没有JSON")
+
+
 class DeepSeekAnalyzer:
     """DeepSeek API分析器"""
     
-    def __init__(self, config):
+    def __init__(self, config, router: Optional[LLMRouter] = None, fast_router: Optional[LLMRouter] = None):
+        """
+        Args:
+            router/fast_router: LLM 路由，默认使用进程内共享的路由（所有交易对共用提供方健康状态和熔断）
+        """
         self.config = config  # 保存配置对象
         self.api_key = config.deepseek.api_key
         self.base_url = config.deepseek.base_url
@@ -20,7 +133,23 @@ class DeepSeekAnalyzer:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.router = router or get_shared_router(config.llm)
+        # 级联模式: 小模型初判，信号较强时再由大模型确认
+        self.fast_router = fast_router or (get_shared_router(config.llm, fast=True) if config.cascade.enabled else None)
+        self.cascade_stats = CascadeStats()
+        self.last_calls: List[LLMCall] = []  # 最近一次分析的 LLM 调用，供审计存储保存
         self.positions_file = "positions.json"
+        
+        # 成交流窗口与K线周期一致
+        try:
+            self.trade_window_seconds = bar_to_seconds(config.trading.kline_bar)
+        except ValueError:
+            self.trade_window_seconds = DEFAULT_WINDOW_SECONDS
+        self.trade_flow = TradeFlowTracker(window_seconds=self.trade_window_seconds)
+        self.candle_aggregators: Dict[str, CandleAggregator] = {}
+        # 同一进程内的所有交易对写入同一个跟踪器，才能计算相互之间的相关性
+        self.regime_tracker = (get_shared_tracker(config.regime, config.trading.kline_bar)
+                               if config.regime.enabled else None)
         logger.info("DeepSeek分析器初始化完成")
     
     def _load_positions(self, inst_id: str) -> List[Dict]:
@@ -55,18 +184,31 @@ class DeepSeekAnalyzer:
             'pnl_amount': round(pnl_amount, 4)
         }
     
-    def analyze_market_data(self, market_data: Dict, inst_id: str) -> Dict:
+    def analyze_market_data(self, market_data: Union[NormalizedMarketData, Dict], inst_id: str,
+                            timeout: Optional[float] = None, strategy: Optional[Dict] = None) -> Dict:
         """
         分析市场数据并返回交易建议
+        
+        market_data: 规范化后的行情（也接受 get_all_market_data 的原始结果）
+        timeout: API 请求超时（秒），由周期截止时间的剩余时间决定，None 为默认60秒；
+                 剩余时间为 0 时不再调用 API，抛出 DeadlineExceeded（由分析周期按超时取消处理）
+        strategy: 本周期使用的策略参数（热加载后可能与启动时不同），默认 config.strategy
         """
-        prompt = self._build_analysis_prompt(market_data, inst_id)
+        variables = self._build_prompt_variables(market_data, inst_id, strategy)
+        prompt = render_prompt(variables)
+        self.last_calls = []
         
         try:
             logger.info("调用DeepSeek API进行分析...")
-            response = self._call_deepseek_api(prompt)
-            analysis_result = self._parse_analysis_response(response)
+            if self.fast_router is not None:
+                analysis_result = self._analyze_cascade(prompt, variables, timeout, strategy)
+            else:
+                response = self._call_llm(prompt, variables, "single", timeout)
+                analysis_result = self._parse_analysis_response(response)
             logger.info(f"DeepSeek分析完成，建议: {analysis_result.get('recommendation', 'UNKNOWN')}")
             return analysis_result
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"DeepSeek分析失败: {e}")
             return {
@@ -81,15 +223,67 @@ class DeepSeekAnalyzer:
                 "urgent_action": False
             }
     
-    def _build_analysis_prompt(self, market_data: Dict, inst_id: str) -> str:
+    def _analyze_cascade(self, prompt: str, variables: Dict[str, Any], timeout: Optional[float],
+                         strategy: Optional[Dict]) -> Dict:
+        """小模型初判，需要时由大模型确认；两次决策都记录在结果的 cascade 字段中"""
+        cascade_config = self.config.cascade
+        threshold = strategy['confidence_threshold'] if strategy else self.config.trading.confidence_threshold
+        deadline = time.monotonic() + (60 if timeout is None else timeout)
+        cascade = {'stage': STAGE_FAST, 'escalated': False, 'fast_decision': None}
+        
+        fast = None
+        start = time.monotonic()
+        try:
+            response = self._call_llm(prompt, variables, STAGE_FAST, min(cascade_config.fast_timeout, deadline - start),
+                                      router=self.fast_router)
+            fast = self._parse_analysis_response(response)
+            cascade['fast_decision'] = dict(fast)
+        except Exception as e:
+            logger.warning(f"小模型分析失败，直接调用大模型: {e}")
+        cascade['fast_latency'] = round(time.monotonic() - start, 3)
+        
+        reason = "小模型失败" if fast is None else should_escalate(fast, threshold, cascade_config.confidence_margin)
+        if reason is None:
+            result = fast
+        else:
+            logger.info(f"升级到大模型确认: {reason}")
+            cascade['escalated'] = True
+            cascade['escalation_reason'] = reason
+            start = time.monotonic()
+            try:
+                response = self._call_llm(prompt, variables, "big", deadline - start)
+                result = self._parse_analysis_response(response)
+                cascade['stage'] = STAGE_CONFIRMED
+                cascade['big_recommendation'] = result.get('recommendation')
+            except Exception as e:
+                if fast is None:
+                    raise
+                logger.warning(f"大模型确认失败，小模型结果降级使用: {e}")
+                result = downgrade_unconfirmed(fast, threshold)
+                cascade['stage'] = STAGE_UNCONFIRMED
+                cascade['error'] = str(e)
+            finally:
+                cascade['big_latency'] = round(time.monotonic() - start, 3)
+        
+        self.cascade_stats.record(cascade)
+        result['cascade'] = cascade
+        return result
+    
+    def _build_analysis_prompt(self, market_data: Union[NormalizedMarketData, Dict], inst_id: str,
+                               strategy: Optional[Dict] = None) -> str:
         """构建分析提示词"""
-        ticker = market_data['ticker']['data'][0]
-        orderbook = market_data['orderbook']['data'][0]
-        klines = market_data['candlesticks']['data']
-        trades = market_data['trades']['data']
+        return render_prompt(self._build_prompt_variables(market_data, inst_id, strategy))
+    
+    def _build_prompt_variables(self, market_data: Union[NormalizedMarketData, Dict], inst_id: str,
+                                strategy: Optional[Dict] = None) -> Dict[str, Any]:
+        """计算提示词模板中每个周期变化的部分"""
+        snapshot = ensure_normalized(inst_id, market_data)
+        ticker = snapshot.ticker
         
-        current_price = float(ticker['last'])
-        tech_indicators = self._calculate_technical_indicators(klines)
+        current_price = ticker.last
+        tech_indicators = self._calculate_technical_indicators(snapshot.candles)
+        multi_timeframe = self._summarize_timeframes(snapshot.candles, inst_id)
+        orderbook_features = compute_features(snapshot.bids, snapshot.asks, contract_value=ticker.contract_value)
         
         # 加载持仓信息
         positions = self._load_positions(inst_id)
@@ -97,7 +291,7 @@ class DeepSeekAnalyzer:
         has_position = len(positions) > 0
         
         # 获取策略参数
-        strategy = self.config.strategy
+        strategy = strategy or self.config.strategy
         timeframe_desc = {
             "5m": "5分钟级别的快速交易",
             "15m": "15分钟级别的平衡交易",
@@ -120,80 +314,46 @@ class DeepSeekAnalyzer:
 3. 【观望 WATCH】：暂不操作，仅在市场极度不明朗时使用
 """
         
-        prompt = f"""
-你是一个专业的加密货币{timeframe_desc}分析师。
-
-策略类型: {strategy['name']}
-K线周期: {strategy['timeframe']}
-分析时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-## 当前市场价格: {current_price} USDT
-**重要**: 这是实时最新价格，请基于 {current_price} USDT 进行所有分析和计算。
-
-## 我的持仓状态:
-{position_info}
-
-{available_actions}
-
-## 实时行情:
-- 当前价格: {current_price} USDT
-- 24h 最高: {ticker['high24h']} | 最低: {ticker['low24h']}
-- 买一: {ticker['bidPx']} ({ticker['bidSz']}) | 卖一: {ticker['askPx']} ({ticker['askSz']})
-- 24h成交量: {ticker['volCcy24h']} USDT
-
-## 市场深度(前5档):
-买盘: {self._format_orderbook_levels(orderbook['bids'][:5])}
-卖盘: {self._format_orderbook_levels(orderbook['asks'][:5])}
-
-## 技术指标({strategy['timeframe']}):
-{tech_indicators}
-
-## 成交分析:
-{self._analyze_trades(trades)}
-
-请基于{strategy['name']}策略给出交易建议，JSON格式返回:
-{{
-  "recommendation": "BUY_LONG/BUY_SHORT/WATCH (空仓时) 或 SELL/ADJUST_STOPS/HOLD (持仓时)",
-  "confidence": 0-100,
-  "analysis": "市场分析(50字内)",
-  "reasoning": "详细理由(100字内)",
-  "support_levels": [支撑位1, 支撑位2],
-  "resistance_levels": [阻力位1, 阻力位2],
-  "stop_adjustment": {{
-    "should_adjust": true/false,
-    "new_take_profit": 价格或null,
-    "new_stop_loss": 价格或null,
-    "adjustment_percent": 调整幅度百分比,
-    "reason": "调整理由"
-  }},
-  "urgent_action": true/false,
-  "urgent_reason": "紧急原因"
-}}
-
-**重要规则**:
-1. 所有价格计算必须基于当前价格 {current_price} USDT
-2. 空仓时: BUY_LONG(做多)/BUY_SHORT(做空)/WATCH(观望)
-3. 持仓时: SELL(平仓)/ADJUST_STOPS(调整止盈止损)/HOLD(继续持仓)
-4. 调整止盈止损时，必须计算 adjustment_percent（相对当前价格的调整幅度%）
-5. 短线交易要果断，不要总是观望
-
-请用JSON格式返回，包含以下字段:
-{{
-  "recommendation": "BUY_LONG/BUY_SHORT/WATCH/SELL/ADJUST_STOPS/HOLD",
-  "confidence": 0-100,
-  "analysis": "短期市场分析",
-  "reasoning": "详细理由",
-  "support_levels": [支撑位],
-  "resistance_levels": [阻力位],
-  "take_profit": 止盈价或null,
-  "stop_loss": 止损价或null,
-  "adjustment_percent": 调整幅度%或null,
-  "urgent_action": true/false,
-  "urgent_reason": "如需紧急操作的原因"
-}}
-"""
-        
-        return prompt
+        variables = {
+            'timeframe_desc': timeframe_desc,
+            'strategy_name': strategy['name'],
+            'timeframe': strategy['timeframe'],
+            'analysis_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'data_freshness': self._format_data_freshness(snapshot.meta),
+            'current_price': current_price,
+            'position_info': position_info,
+            'available_actions': available_actions,
+            'high_24h': ticker.high_24h,
+            'low_24h': ticker.low_24h,
+            'bid_px': ticker.bid_px,
+            'bid_sz': ticker.bid_sz,
+            'ask_px': ticker.ask_px,
+            'ask_sz': ticker.ask_sz,
+            'vol_ccy_24h': ticker.vol_ccy_24h,
+            'book_depth': len(snapshot.bids),
+            'orderbook': format_features(orderbook_features),
+            'tech_indicators': tech_indicators,
+            'source_bar': self.config.trading.kline_bar,
+            'multi_timeframe': multi_timeframe,
+            'market_regime': self._summarize_regime(snapshot.candles, inst_id),
+            'trade_flow': self._analyze_trades(snapshot.trades, inst_id),
+        }
+        return variables
+    
+    def _format_data_freshness(self, meta: Dict) -> str:
+        """有数据使用缓存或缺失时，在提示词中注明数据年龄"""
+        names = {'ticker': '行情', 'orderbook': '订单簿', 'candlesticks': 'K线', 'trades': '成交'}
+        notes = []
+        for data_type, info in meta.items():
+            if not info.get('stale'):
+                continue
+            if info.get('missing'):
+                notes.append(f"{names.get(data_type, data_type)}数据缺失")
+            else:
+                notes.append(f"{names.get(data_type, data_type)}为 {info['age']:.0f} 秒前的缓存")
+        if not notes:
+            return ""
+        return f"⚠️ 数据新鲜度: {'；'.join(notes)}（本次获取失败），请相应降低对这些数据的依赖。\n"
     
     def _format_position_info(self, positions: List[Dict], current_price: float) -> str:
         """格式化持仓信息"""
@@ -230,42 +390,29 @@ K线周期: {strategy['timeframe']}
         
         return "\n\n".join(info_lines)
     
-    def _format_orderbook_levels(self, levels: List) -> str:
-        """格式化订单簿层级"""
-        formatted = []
-        for i, level in enumerate(levels):
-            formatted.append(f"  档位{i+1}: 价格 {level[0]} | 数量 {level[1]}")
-        return "\n".join(formatted)
-    
-    def _calculate_technical_indicators(self, klines: List) -> str:
-        """计算技术指标"""
-        if not klines:
+    def _calculate_technical_indicators(self, candles: Union[np.ndarray, List]) -> str:
+        """计算技术指标（candles 为 CANDLE_DTYPE 数组，按时间升序）"""
+        if not isinstance(candles, np.ndarray):
+            candles = parse_candles(candles)
+        if len(candles) == 0:
             return "无K线数据"
         
         try:
-            df = pd.DataFrame(klines, columns=['ts', 'o', 'h', 'l', 'c', 'vol', 'volCcy', 'volCcyQuote', 'confirm'])
+            closes = candles['c'][~np.isnan(candles['c'])]
             
-            for col in ['o', 'h', 'l', 'c', 'vol', 'volCcy']:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-            df = df.dropna()
-            
-            if len(df) < 20:
+            if len(closes) < 20:
                 return "数据不足计算技术指标"
             
-            df['sma_10'] = df['c'].rolling(window=10).mean()
-            df['sma_20'] = df['c'].rolling(window=20).mean()
-            df = self._calculate_rsi(df, window=14)
-            
-            latest = df.iloc[-1]
-            prev = df.iloc[-2] if len(df) > 1 else latest
+            sma_10 = sma(closes, 10)
+            sma_20 = sma(closes, 20)
+            rsi_14 = rsi(closes, 14)
             
             indicators = f"""
-            - 当前价格: {latest['c']:.2f}
-            - 10周期SMA: {latest['sma_10']:.2f} {'↑' if latest['sma_10'] > prev['sma_10'] else '↓'}
-            - 20周期SMA: {latest['sma_20']:.2f} {'↑' if latest['sma_20'] > prev['sma_20'] else '↓'}
-            - RSI(14): {latest.get('rsi', 'N/A'):.2f}
-            - 价格趋势: {'上涨' if latest['c'] > prev['c'] else '下跌'}
+            - 当前价格: {closes[-1]:.2f}
+            - 10周期SMA: {sma_10[-1]:.2f} {'↑' if sma_10[-1] > sma_10[-2] else '↓'}
+            - 20周期SMA: {sma_20[-1]:.2f} {'↑' if sma_20[-1] > sma_20[-2] else '↓'}
+            - RSI(14): {rsi_14[-1]:.2f}
+            - 价格趋势: {'上涨' if closes[-1] > closes[-2] else '下跌'}
             """
             
             return indicators
@@ -273,36 +420,93 @@ K线周期: {strategy['timeframe']}
             logger.error(f"计算技术指标失败: {e}")
             return f"技术指标计算错误: {e}"
     
-    def _calculate_rsi(self, df: pd.DataFrame, window: int = 14) -> pd.DataFrame:
-        """计算RSI指标"""
-        delta = df['c'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-        rs = gain / loss
-        df['rsi'] = 100 - (100 / (1 + rs))
-        return df
+    def export_state(self, inst_id: str) -> Dict[str, Any]:
+        """该交易对的增量状态（多周期聚合、成交流窗口、市场状态跟踪器），供检查点保存"""
+        state: Dict[str, Any] = {}
+        aggregator = self.candle_aggregators.get(inst_id)
+        if aggregator is not None:
+            state['timeframes'] = aggregator.export_state()
+        if inst_id in self.trade_flow.windows:
+            state['trade_flow'] = self.trade_flow.windows[inst_id].export_state()
+        if self.regime_tracker is not None:
+            state['regime'] = self.regime_tracker.export_state()
+        return state
     
-    def _analyze_trades(self, trades: List) -> str:
-        """分析成交数据"""
-        if not trades:
+    def restore_state(self, inst_id: str, state: Dict[str, Any]) -> List[str]:
+        """恢复 export_state 的结果，返回已恢复的部分"""
+        def restore_timeframes(s):
+            aggregator = CandleAggregator(self.config.trading.kline_bar)
+            aggregator.restore_state(s)
+            self.candle_aggregators[inst_id] = aggregator
+        
+        restorers = {
+            'timeframes': restore_timeframes,
+            'trade_flow': lambda s: self.trade_flow.window(inst_id).restore_state(s),
+        }
+        if self.regime_tracker is not None:
+            restorers['regime'] = self.regime_tracker.restore_state
+        return restore_components(restorers, state)
+    
+    def _summarize_timeframes(self, candles: Union[np.ndarray, List], inst_id: str) -> str:
+        """把本周期K线写入聚合器，输出更高周期的概览（不额外请求API）"""
+        try:
+            aggregator = self.candle_aggregators.get(inst_id)
+            if aggregator is None:
+                aggregator = CandleAggregator(self.config.trading.kline_bar)
+                self.candle_aggregators[inst_id] = aggregator
+            aggregator.ingest(candles)
+            return summarize_timeframes(aggregator)
+        except Exception as e:
+            logger.error(f"多周期聚合失败: {e}")
+            return f"多周期聚合错误: {e}"
+    
+    def _summarize_regime(self, candles: Union[np.ndarray, List], inst_id: str) -> str:
+        """写入本周期K线后输出市场状态、相关性最高的交易对和全市场概况"""
+        if self.regime_tracker is None:
+            return "未启用"
+        try:
+            self.regime_tracker.update(inst_id, candles)
+            return self.regime_tracker.summary(inst_id)
+        except Exception as e:
+            logger.error(f"市场状态计算失败: {e}")
+            return f"市场状态计算错误: {e}"
+    
+    def _analyze_trades(self, trades: Union[np.ndarray, List], inst_id: str) -> str:
+        """分析成交数据（写入滚动窗口后输出成交流摘要）"""
+        if len(trades) == 0 and len(self.trade_flow.window(inst_id)) == 0:
             return "无成交数据"
         
         try:
-            buy_volume = sum(float(trade.get('sz', 0)) for trade in trades[:50] if trade.get('side') == 'buy')
-            sell_volume = sum(float(trade.get('sz', 0)) for trade in trades[:50] if trade.get('side') == 'sell')
-            
-            return f"买入量: {buy_volume:.2f} | 卖出量: {sell_volume:.2f}"
+            self.trade_flow.ingest(inst_id, trades)
+            return format_stats(self.trade_flow.stats(inst_id), self.trade_window_seconds)
         except Exception as e:
             return f"成交分析错误: {e}"
     
-    def _call_deepseek_api(self, prompt: str) -> Dict:
-        """调用DeepSeek API"""
+    def _call_llm(self, prompt: str, variables: Dict[str, Any], stage: str, timeout: Optional[float],
+                  router: Optional[LLMRouter] = None) -> Dict:
+        """调用 LLM 并记录提示词变量、原始回复和延迟（stage: single/fast/big）"""
+        if timeout is not None and timeout <= 0:
+            raise DeadlineExceeded(f"周期截止时间已到，取消 LLM 调用: {stage}")
+        call = LLMCall(stage, ANALYSIS_PROMPT_TEMPLATE, variables, SYSTEM_PROMPT)
+        self.last_calls.append(call)
+        start = time.monotonic()
+        try:
+            call.completion = self._call_deepseek_api(prompt, timeout=timeout, router=router)
+            return call.completion
+        except Exception as e:
+            call.error = str(e)
+            raise
+        finally:
+            call.latency = time.monotonic() - start
+    
+    def _call_deepseek_api(self, prompt: str, timeout: Optional[float] = None, router: Optional[LLMRouter] = None) -> Dict:
+        """调用DeepSeek API（router 默认为大模型路由）"""
         payload = {
             "model": self.model,
             "messages": [
                 {
                     "role": "system",
-                    "content": "你是一个专业的加密货币交易分析师，专注于技术分析和市场趋势判断。请用JSON格式返回分析结果。"
+                    "content": SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
@@ -313,28 +517,8 @@ K线周期: {strategy['timeframe']}
             "max_tokens": 2048
         }
         
-        try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=60
-            )
-            
-            # 记录详细的错误信息
-            if response.status_code != 200:
-                logger.error(f"API请求失败 - 状态码: {response.status_code}")
-                logger.error(f"响应内容: {response.text}")
-            
-            response.raise_for_status()
-            return response.json()
-            
-        except requests.exceptions.Timeout:
-            logger.error("API请求超时")
-            raise Exception("API请求超时，请检查网络连接")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API请求异常: {e}")
-            raise
+        # 在多个提供方之间路由（对冲、熔断、失败转移），只采用含 JSON 的回复
+        return (router or self.router).complete(payload, timeout=60 if timeout is None else timeout, validate=_require_json_content)
     
     def _parse_analysis_response(self, response: Dict) -> Dict:
         """解析DeepSeek API响应"""
@@ -346,30 +530,8 @@ K线周期: {strategy['timeframe']}
                 json_start = content.find('{')
                 json_end = content.rfind('}') + 1
                 json_str = content[json_start:json_end]
-                result = json.loads(json_str)
-                
-                # 验证必要字段
-                required_fields = ['recommendation', 'confidence', 'analysis', 'reasoning']
-                for field in required_fields:
-                    if field not in result:
-                        result[field] = "未知"
-                
-                # 确保新字段存在
-                if 'position_action' not in result:
-                    result['position_action'] = 'HOLD'
-                if 'stop_adjustment' not in result:
-                    result['stop_adjustment'] = {
-                        'should_adjust': False,
-                        'new_take_profit': None,
-                        'new_stop_loss': None,
-                        'reason': ''
-                    }
-                if 'urgent_action' not in result:
-                    result['urgent_action'] = False
-                if 'urgent_reason' not in result:
-                    result['urgent_reason'] = ''
-                
-                return result
+                # 解码、校验必要字段并补齐缺失字段
+                return decode_decision(json_str).to_dict()
             else:
                 return {
                     "analysis": content,
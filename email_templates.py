@@ -0,0 +1,382 @@
+"""
+交易提醒邮件模板
+
+模板在模块加载时编译一次: 去掉缩进空白，拆成静态片段和字段名，渲染时只做字段转义和一次拼接。
+页面外壳（样式、页头、风险提示）是常量，单条提醒和摘要邮件都只渲染随提醒变化的区块；
+摘要邮件把多条提醒放进同一个外壳，行情剧烈时多个交易对的提醒合并为一封发送。
+
+每封邮件同时生成纯文本和 HTML 两个版本（multipart/alternative）。
+"""
+import html
+import string
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+
+class _Template:
+    """编译后的模板: 静态片段与字段交替，render 时按字段名取值拼接（值需已转义）"""
+
+    __slots__ = ('_head', '_pairs')
+
+    def __init__(self, source: str, strip: bool = True):
+        if strip:
+            source = ''.join(line.strip() for line in source.splitlines())
+        literals, fields = [''], []
+        for literal, field, _, _ in string.Formatter().parse(source):
+            literals[-1] += literal  # '{{' '}}' 转义会把静态文本拆成多段
+            if field is not None:
+                fields.append(field)
+                literals.append('')
+        self._head = literals[0]
+        self._pairs = tuple(zip(fields, literals[1:]))
+
+    def render(self, values: Dict[str, str]) -> str:
+        parts = [self._head]
+        for field, literal in self._pairs:
+            parts.append(values[field])
+            parts.append(literal)
+        return ''.join(parts)
+
+class RecommendationStyle(NamedTuple):
+    emoji: str
+    label: str
+    banner: str
+    css: str
+
+
+# 覆盖分析器输出的全部建议类型；BUY 为旧版提示词的输出，保留兼容
+RECOMMENDATIONS: Dict[str, RecommendationStyle] = {
+    'BUY_LONG': RecommendationStyle('🟢', '买多', '🟢 建议买多（开多）', 'buy'),
+    'BUY_SHORT': RecommendationStyle('🔴', '买空', '🔴 建议买空（开空）', 'short'),
+    'SELL': RecommendationStyle('🟠', '卖出', '🟠 建议卖出平仓', 'sell'),
+    'ADJUST_STOPS': RecommendationStyle('🔵', '调整止盈止损', '🔵 建议调整止盈止损', 'adjust'),
+    'HOLD': RecommendationStyle('🟡', '继续持仓', '🟡 建议继续持仓', 'hold'),
+    'WATCH': RecommendationStyle('⚪', '观望', '⚪ 建议观望', 'watch'),
+    'BUY': RecommendationStyle('🟢', '买入', '🟢 建议买入', 'buy'),
+}
+
+POSITION_ACTIONS = {
+    'CLOSE_ALL': '🔴 建议全部平仓',
+    'CLOSE_PARTIAL': '🟠 建议部分平仓',
+    'ADD': '🟢 建议加仓',
+}
+
+RISK_NOTICE = "此分析仅为AI生成建议，不构成投资意见。加密货币交易风险极高，请谨慎决策。"
+
+
+def recommendation_style(recommendation: Any) -> RecommendationStyle:
+    """未知类型按原文显示，样式同观望"""
+    style = RECOMMENDATIONS.get(recommendation)
+    if style is None:
+        text = str(recommendation or 'UNKNOWN')
+        style = RecommendationStyle('⚪', text, f'⚪ {text}', 'watch')
+    return style
+
+
+_HEAD = _Template("""
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <style>
+            body { font-family: Arial, sans-serif; margin: 20px; }
+            .header { background-color: #f8f9fa; padding: 15px; border-radius: 5px; }
+            .recommendation { font-size: 24px; font-weight: bold; margin: 10px 0; }
+            .buy { color: #28a745; }
+            .short { color: #dc3545; }
+            .sell { color: #fd7e14; }
+            .adjust { color: #007bff; }
+            .hold { color: #ffc107; }
+            .watch { color: #6c757d; }
+            .info-box { background-color: #e9ecef; padding: 15px; border-radius: 5px; margin: 10px 0; }
+            .levels { display: flex; justify-content: space-between; }
+            .support, .resistance { width: 48%; padding: 10px; }
+            .support { background-color: #d4edda; }
+            .resistance { background-color: #f8d7da; }
+            .alert { border-top: 2px solid #dee2e6; margin-top: 25px; padding-top: 10px; }
+            table.digest { border-collapse: collapse; margin: 10px 0; }
+            table.digest th, table.digest td { border: 1px solid #dee2e6; padding: 6px 12px; text-align: left; }
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h2>{title}</h2>
+            <p>生成时间: {generated_at}</p>
+        </div>
+""".replace('{ ', '{{ ').replace(' }', ' }}'))
+
+_FOOT = ''.join(line.strip() for line in f"""
+        <div style="margin-top: 20px; padding: 10px; background-color: #fff3cd; border-radius: 5px;">
+            <p><strong>⚠️ 风险提示:</strong> {RISK_NOTICE}</p>
+        </div>
+    </body>
+    </html>
+""".splitlines())
+
+_URGENT = _Template("""
+    <div style="background-color: #ff6b6b; color: white; padding: 20px; border-radius: 5px; margin: 15px 0; text-align: center;">
+        <h2>🚨 紧急操作提醒 🚨</h2>
+        <p style="font-size: 18px; font-weight: bold;">{urgent_reason}</p>
+    </div>
+""")
+
+_POSITION = _Template("""
+    <div style="background-color: #fff3cd; padding: 15px; border-radius: 5px; margin: 10px 0; border-left: 4px solid #ffc107;">
+        <h3>📈 持仓操作建议</h3>
+        <p style="font-size: 16px; font-weight: bold;">{position_text}</p>
+    </div>
+""")
+
+_STOPS = _Template("""
+    <div style="background-color: #e7f3ff; padding: 15px; border-radius: 5px; margin: 10px 0; border-left: 4px solid #007bff;">
+        <h3>⚙️ 止盈止损调整建议</h3>
+        {stop_prices}
+        <p><strong>调整理由:</strong> {stop_reason}</p>
+    </div>
+""")
+
+_ALERT = _Template("""
+    <div class="alert" id="{anchor}">
+        {urgent}
+        <div class="recommendation {css}">{banner}</div>
+        {position}
+        {stops}
+        <div class="info-box">
+            <h3>📊 交易概览</h3>
+            <p><strong>交易对:</strong> {inst_id}</p>
+            <p><strong>当前价格:</strong> {price} USDT</p>
+            <p><strong>信心水平:</strong> {confidence}%</p>
+        </div>
+        <div class="info-box">
+            <h3>📈 市场分析</h3>
+            <p><strong>分析总结:</strong> {analysis_summary}</p>
+            <p><strong>详细理由:</strong> {reasoning}</p>
+        </div>
+        <div class="levels">
+            <div class="support">
+                <h4>💪 支撑位</h4>
+                <ul>{support}</ul>
+            </div>
+            <div class="resistance">
+                <h4>🚧 阻力位</h4>
+                <ul>{resistance}</ul>
+            </div>
+        </div>
+    </div>
+""")
+
+_DIGEST_ROW = _Template("""
+    <tr>
+        <td><a href="#{anchor}">{inst_id}</a></td>
+        <td class="{css}">{emoji} {label}</td>
+        <td>{confidence}%</td>
+        <td>{price}</td>
+        <td>{urgent}</td>
+    </tr>
+""")
+
+_DIGEST_TABLE = _Template("""
+    <table class="digest">
+        <tr><th>交易对</th><th>建议</th><th>信心度</th><th>价格 (USDT)</th><th>紧急</th></tr>
+        {rows}
+    </table>
+""")
+
+_TEXT = _Template("""{urgent}{banner}
+{position}{stops}交易对: {inst_id}
+当前价格: {price} USDT
+信心水平: {confidence}%
+
+分析总结: {analysis_summary}
+详细理由: {reasoning}
+
+支撑位: {support}
+阻力位: {resistance}
+""", strip=False)
+
+_SUBJECT = _Template("{emoji} {inst_id} 交易提醒: {label} | 信心度: {confidence}% | 价格: {price}", strip=False)
+
+_NO_LEVELS = '<li>无数据</li>'
+
+
+@dataclass
+class RenderedEmail:
+    subject: str
+    text: str
+    html: str
+
+
+def _esc(value: Any) -> str:
+    return html.escape(str(value), quote=True)
+
+
+def _levels_html(levels: Optional[Sequence]) -> str:
+    if not levels:
+        return _NO_LEVELS
+    return ''.join(f'<li>{_esc(level)}</li>' for level in levels[:5])
+
+
+def _levels_text(levels: Optional[Sequence]) -> str:
+    return ', '.join(str(level) for level in levels[:5]) if levels else '无数据'
+
+
+def _stop_parts(analysis_data: Dict) -> Optional[Dict]:
+    adjustment = analysis_data.get('stop_adjustment') or {}
+    if not adjustment.get('should_adjust', False):
+        return None
+    return {
+        'tp': adjustment.get('new_take_profit'),
+        'sl': adjustment.get('new_stop_loss'),
+        'reason': adjustment.get('reason', ''),
+    }
+
+
+def _anchor(analysis_data: Dict, index: int) -> str:
+    return _esc(f"alert-{index}-{analysis_data.get('inst_id', 'UNKNOWN')}")
+
+
+def render_subject(analysis_data: Dict) -> str:
+    style = recommendation_style(analysis_data.get('recommendation'))
+    return _SUBJECT.render({
+        'emoji': style.emoji,
+        'label': style.label,
+        'inst_id': str(analysis_data.get('inst_id', 'UNKNOWN')),
+        'confidence': str(analysis_data.get('confidence', 0)),
+        'price': str(analysis_data.get('current_price', 0)),
+    })
+
+
+def _render_alert_html(analysis_data: Dict, index: int = 0) -> str:
+    """单条提醒的正文区块（不含页面外壳）"""
+    style = recommendation_style(analysis_data.get('recommendation'))
+    urgent = ''
+    if analysis_data.get('urgent_action', False):
+        urgent = _URGENT.render({'urgent_reason': _esc(analysis_data.get('urgent_reason', ''))})
+    position = ''
+    position_action = analysis_data.get('position_action', 'HOLD')
+    if position_action and position_action != 'HOLD':
+        position = _POSITION.render({'position_text': _esc(POSITION_ACTIONS.get(position_action, position_action))})
+    stops = ''
+    stop = _stop_parts(analysis_data)
+    if stop is not None:
+        prices = ''
+        if stop['tp']:
+            prices += f"<p><strong>新止盈价:</strong> {_esc(stop['tp'])} USDT</p>"
+        if stop['sl']:
+            prices += f"<p><strong>新止损价:</strong> {_esc(stop['sl'])} USDT</p>"
+        stops = _STOPS.render({'stop_prices': prices, 'stop_reason': _esc(stop['reason'])})
+
+    return _ALERT.render({
+        'anchor': _anchor(analysis_data, index),
+        'urgent': urgent,
+        'css': style.css,
+        'banner': style.banner,
+        'position': position,
+        'stops': stops,
+        'inst_id': _esc(analysis_data.get('inst_id', 'UNKNOWN')),
+        'price': _esc(analysis_data.get('current_price', 0)),
+        'confidence': _esc(analysis_data.get('confidence', 0)),
+        'analysis_summary': _esc(analysis_data.get('analysis_summary', '')),
+        'reasoning': _esc(analysis_data.get('reasoning', '')),
+        'support': _levels_html(analysis_data.get('support_levels')),
+        'resistance': _levels_html(analysis_data.get('resistance_levels')),
+    })
+
+
+def render_text(analysis_data: Dict) -> str:
+    style = recommendation_style(analysis_data.get('recommendation'))
+    urgent = ''
+    if analysis_data.get('urgent_action', False):
+        urgent = f"🚨 紧急操作提醒: {analysis_data.get('urgent_reason', '')}\n"
+    position = ''
+    position_action = analysis_data.get('position_action', 'HOLD')
+    if position_action and position_action != 'HOLD':
+        position = f"持仓操作建议: {POSITION_ACTIONS.get(position_action, position_action)}\n"
+    stops = ''
+    stop = _stop_parts(analysis_data)
+    if stop is not None:
+        if stop['tp']:
+            stops += f"新止盈价: {stop['tp']} USDT\n"
+        if stop['sl']:
+            stops += f"新止损价: {stop['sl']} USDT\n"
+        stops += f"调整理由: {stop['reason']}\n"
+    if position or stops:
+        stops += '\n'
+
+    return _TEXT.render({
+        'urgent': urgent,
+        'banner': style.banner,
+        'position': position,
+        'stops': stops,
+        'inst_id': str(analysis_data.get('inst_id', 'UNKNOWN')),
+        'price': str(analysis_data.get('current_price', 0)),
+        'confidence': str(analysis_data.get('confidence', 0)),
+        'analysis_summary': str(analysis_data.get('analysis_summary', '')),
+        'reasoning': str(analysis_data.get('reasoning', '')),
+        'support': _levels_text(analysis_data.get('support_levels')),
+        'resistance': _levels_text(analysis_data.get('resistance_levels')),
+    })
+
+
+def _generated_at(now: Optional[datetime]) -> str:
+    return (now or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def render_alert(analysis_data: Dict, now: Optional[datetime] = None) -> RenderedEmail:
+    """单条交易提醒: 主题 + 纯文本 + HTML"""
+    generated_at = _generated_at(now)
+    head = _HEAD.render({'title': '🚀 加密货币交易提醒', 'generated_at': generated_at})
+    return RenderedEmail(
+        subject=render_subject(analysis_data),
+        text=f"加密货币交易提醒 ({generated_at})\n\n{render_text(analysis_data)}\n⚠️ 风险提示: {RISK_NOTICE}\n",
+        html=head + _render_alert_html(analysis_data) + _FOOT,
+    )
+
+
+def render_digest(alerts: List[Dict], now: Optional[datetime] = None) -> RenderedEmail:
+    """多条提醒合并为一封摘要邮件: 概览表 + 各条提醒正文；只有一条时等同 render_alert"""
+    if len(alerts) == 1:
+        return render_alert(alerts[0], now)
+    generated_at = _generated_at(now)
+    rows, bodies, texts, labels = [], [], [], []
+    for index, analysis_data in enumerate(alerts):
+        style = recommendation_style(analysis_data.get('recommendation'))
+        inst_id = str(analysis_data.get('inst_id', 'UNKNOWN'))
+        rows.append(_DIGEST_ROW.render({
+            'anchor': _anchor(analysis_data, index),
+            'inst_id': _esc(inst_id),
+            'css': style.css,
+            'emoji': style.emoji,
+            'label': style.label,
+            'confidence': _esc(analysis_data.get('confidence', 0)),
+            'price': _esc(analysis_data.get('current_price', 0)),
+            'urgent': '🚨' if analysis_data.get('urgent_action', False) else '',
+        }))
+        bodies.append(_render_alert_html(analysis_data, index))
+        texts.append(render_text(analysis_data))
+        labels.append(f"{inst_id} {style.label}")
+
+    shown = ', '.join(labels[:3]) + (" 等" if len(labels) > 3 else '')
+    urgent = '🚨 ' if any(a.get('urgent_action', False) for a in alerts) else ''
+    head = _HEAD.render({'title': f'🚀 加密货币交易提醒摘要（{len(alerts)} 条）', 'generated_at': generated_at})
+    separator = '\n' + '-' * 40 + '\n'
+    return RenderedEmail(
+        subject=f"{urgent}📬 {len(alerts)} 条交易提醒: {shown}",
+        text=(f"加密货币交易提醒摘要 ({generated_at})，共 {len(alerts)} 条\n{separator}"
+              + separator.join(texts) + f"{separator}⚠️ 风险提示: {RISK_NOTICE}\n"),
+        html=head + _DIGEST_TABLE.render({'rows': ''.join(rows)}) + ''.join(bodies) + _FOOT,
+    )
+
+
+def build_message(rendered: RenderedEmail, sender: str, receiver: str):
+    """multipart/alternative: 纯文本在前、HTML 在后（客户端优先显示最后一个能渲染的版本）"""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = rendered.subject
+    msg['From'] = sender
+    msg['To'] = receiver
+    msg.attach(MIMEText(rendered.text, 'plain', 'utf-8'))
+    msg.attach(MIMEText(rendered.html, 'html', 'utf-8'))
+    return msg
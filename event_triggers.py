@@ -0,0 +1,209 @@
+"""
+事件驱动的分析触发
+
+两次分析之间只轮询行情(ticker)和少量K线（成本远低于一次 LLM 调用），出现以下事件时才触发完整分析:
+- K线收盘: 出现新的已确认(confirm=1)K线
+- 价格偏离: 较上次分析价格变动超过 X% 或 N×ATR
+- 放量: 当前K线成交量超过近期已收盘K线均量的 N 倍
+- 接近止盈/止损: 价格距离持仓的止盈或止损价在阈值以内
+同一交易对两次分析至少间隔 min_spacing 秒，间隔内的触发合并到间隔结束后执行一次；
+超过 heartbeat 秒没有任何触发时也分析一次。
+"""
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from indicators import atr
+from market_model import parse_candles
+
+logger = logging.getLogger(__name__)
+
+TRIGGER_STARTUP = "startup"
+TRIGGER_CANDLE_CLOSE = "candle_close"
+TRIGGER_PRICE_MOVE = "price_move"
+TRIGGER_VOLUME_SPIKE = "volume_spike"
+TRIGGER_TP_SL = "tp_sl_proximity"
+TRIGGER_HEARTBEAT = "heartbeat"
+
+TRIGGER_NAMES = {
+    TRIGGER_STARTUP: "启动",
+    TRIGGER_CANDLE_CLOSE: "K线收盘",
+    TRIGGER_PRICE_MOVE: "价格偏离",
+    TRIGGER_VOLUME_SPIKE: "放量",
+    TRIGGER_TP_SL: "接近止盈止损",
+    TRIGGER_HEARTBEAT: "心跳",
+}
+
+
+@dataclass
+class TriggerEvent:
+    kind: str
+    detail: str = ""
+
+    def __str__(self) -> str:
+        name = TRIGGER_NAMES.get(self.kind, self.kind)
+        return f"{name}({self.detail})" if self.detail else name
+
+
+class TriggerEngine:
+    """单个交易对的触发判断（不负责轮询，调用方每次轮询后调用 evaluate）"""
+
+    def __init__(self, settings, atr_window: int = 14, volume_window: int = 20):
+        """
+        Args:
+            settings: TriggerConfig
+            atr_window: ATR 周期
+            volume_window: 放量判断的均量K线数
+        """
+        self.settings = settings
+        self.atr_window = atr_window
+        self.volume_window = volume_window
+
+        self.last_price: Optional[float] = None  # 上次分析时的价格
+        self.last_analysis_at: Optional[float] = None
+        self.last_confirmed_ts: Optional[int] = None
+        self._spike_bar_ts: Optional[int] = None  # 已触发过放量的K线，每根只触发一次
+        self._near_levels: Set[Tuple] = set()  # 已触发过接近提醒的止盈止损价
+        self._pending: List[TriggerEvent] = []  # 因最小间隔推迟的触发
+        self.counts: Counter = Counter()  # 各类触发实际引发分析的次数
+        self.deferred = 0
+
+    @property
+    def candles_needed(self) -> int:
+        """每次轮询需要的K线数量（含当前未收盘K线）"""
+        return max(self.atr_window, self.volume_window) + 2
+
+    def evaluate(self, ticker: Dict, candles: Union[Sequence[Sequence[str]], np.ndarray], positions: Sequence[Dict],
+                 now: Optional[float] = None) -> List[TriggerEvent]:
+        """返回本次应触发分析的事件，空列表表示不分析
+
+        candles 为 OKX 格式K线或 CANDLE_DTYPE 数组，positions 为持仓记录列表
+        """
+        now = time.time() if now is None else now
+        price = float(ticker['last'])
+        events: List[TriggerEvent] = []
+
+        if not isinstance(candles, np.ndarray):
+            candles = parse_candles(candles)
+        confirmed = candles[candles['confirm']]
+        events.extend(self._check_candle_close(confirmed))
+        events.extend(self._check_price_move(price, confirmed))
+        events.extend(self._check_volume_spike(candles, confirmed))
+        events.extend(self._check_tp_sl(price, positions))
+
+        if self.last_analysis_at is None:
+            events.insert(0, TriggerEvent(TRIGGER_STARTUP))
+
+        # 合并被推迟的触发，同类只保留最新一个
+        merged: Dict[str, TriggerEvent] = {e.kind: e for e in self._pending}
+        merged.update({e.kind: e for e in events})
+        events = list(merged.values())
+
+        since_last = None if self.last_analysis_at is None else now - self.last_analysis_at
+        if not events and since_last is not None and since_last >= self.settings.heartbeat:
+            events = [TriggerEvent(TRIGGER_HEARTBEAT, f"{since_last:.0f}秒无触发")]
+
+        if events and since_last is not None and since_last < self.settings.min_spacing:
+            if not self._pending:
+                self.deferred += 1
+                logger.info(f"触发 {', '.join(map(str, events))} 距上次分析仅 {since_last:.0f} 秒，推迟执行")
+            self._pending = events
+            return []
+
+        self._pending = []
+        self.counts.update(e.kind for e in events)
+        return events
+
+    def mark_analyzed(self, price: float, now: Optional[float] = None):
+        """记录一次分析完成，作为价格偏离和最小间隔的基准"""
+        self.last_price = price
+        self.last_analysis_at = time.time() if now is None else now
+
+    def export_state(self) -> Dict:
+        return {
+            'last_price': self.last_price,
+            'last_analysis_at': self.last_analysis_at,
+            'last_confirmed_ts': self.last_confirmed_ts,
+            'spike_bar_ts': self._spike_bar_ts,
+            'near_levels': [list(level) for level in self._near_levels],
+            'pending': [[e.kind, e.detail] for e in self._pending],
+            'counts': dict(self.counts),
+            'deferred': self.deferred,
+        }
+
+    def restore_state(self, state: Dict):
+        """恢复后按上次分析的价格和时间判断偏离、最小间隔和心跳，不会因重启触发 startup 分析"""
+        self.last_price = state['last_price']
+        self.last_analysis_at = state['last_analysis_at']
+        self.last_confirmed_ts = state['last_confirmed_ts']
+        self._spike_bar_ts = state['spike_bar_ts']
+        self._near_levels = {tuple(level) for level in state['near_levels']}
+        self._pending = [TriggerEvent(kind, detail) for kind, detail in state['pending']]
+        self.counts = Counter(state['counts'])
+        self.deferred = state['deferred']
+
+    def _check_candle_close(self, confirmed: np.ndarray) -> List[TriggerEvent]:
+        if len(confirmed) == 0:
+            return []
+        newest = int(confirmed['ts'][-1])
+        previous, self.last_confirmed_ts = self.last_confirmed_ts, max(newest, self.last_confirmed_ts or 0)
+        if previous is None or newest <= previous:
+            return []
+        return [TriggerEvent(TRIGGER_CANDLE_CLOSE, f"收 {float(confirmed['c'][-1]):g}")]
+
+    def _check_price_move(self, price: float, confirmed: np.ndarray) -> List[TriggerEvent]:
+        if not self.last_price:
+            return []
+        move = price - self.last_price
+        move_pct = abs(move) / self.last_price * 100
+        if self.settings.price_move_pct > 0 and move_pct >= self.settings.price_move_pct:
+            return [TriggerEvent(TRIGGER_PRICE_MOVE, f"{move / self.last_price * 100:+.2f}%")]
+
+        if self.settings.atr_multiple > 0 and len(confirmed) > self.atr_window:
+            current_atr = atr(confirmed['h'], confirmed['l'], confirmed['c'], self.atr_window)[-1]
+            if not np.isnan(current_atr) and current_atr > 0 and abs(move) >= self.settings.atr_multiple * current_atr:
+                return [TriggerEvent(TRIGGER_PRICE_MOVE, f"{move / current_atr:+.1f}×ATR")]
+        return []
+
+    def _check_volume_spike(self, candles: np.ndarray, confirmed: np.ndarray) -> List[TriggerEvent]:
+        if self.settings.volume_spike_ratio <= 0 or len(candles) == 0:
+            return []
+        current_ts = int(candles['ts'][-1])
+        history = confirmed['vol'][confirmed['ts'] < current_ts][-self.volume_window:]
+        if len(history) < self.volume_window or current_ts == self._spike_bar_ts:
+            return []
+        baseline = float(history.mean())
+        volume = float(candles['vol'][-1])
+        if baseline <= 0 or volume < self.settings.volume_spike_ratio * baseline:
+            return []
+        self._spike_bar_ts = current_ts
+        return [TriggerEvent(TRIGGER_VOLUME_SPIKE, f"{volume / baseline:.1f}倍均量")]
+
+    def _check_tp_sl(self, price: float, positions: Sequence[Dict]) -> List[TriggerEvent]:
+        proximity = self.settings.tp_sl_proximity_pct
+        if proximity <= 0:
+            return []
+        events = []
+        for position in positions:
+            for field, name in (('take_profit', '止盈'), ('stop_loss', '止损')):
+                level = position.get(field)
+                if not level:
+                    continue
+                key = (position.get('entry_price'), field, float(level))
+                distance = abs(price - float(level)) / price * 100
+                if distance <= proximity:
+                    if key not in self._near_levels:
+                        self._near_levels.add(key)
+                        events.append(TriggerEvent(TRIGGER_TP_SL, f"距{name} {level} 仅 {distance:.2f}%"))
+                elif distance > proximity * 2:
+                    # 远离后重新布防，避免在阈值附近来回触发
+                    self._near_levels.discard(key)
+        return events
+
+    def format_counts(self) -> str:
+        parts = [f"{TRIGGER_NAMES.get(k, k)} {n}" for k, n in self.counts.most_common()]
+        return f"触发统计: {', '.join(parts) or '无'} | 推迟 {self.deferred} 次"
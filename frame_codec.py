@@ -0,0 +1,226 @@
+"""
+追加写入的帧文件格式
+
+文件结构:
+    [文件头 8 字节] magic(4) | 版本(1) | 序列化方式(1) | 压缩方式(1) | 保留(1)
+    [帧]*           长度(4字节, 大端) | 负载(序列化后再压缩)
+
+每帧独立压缩，进程崩溃时最多丢失最后一帧（读取时自动忽略不完整的尾帧，
+再次打开写入时先截掉不完整的尾帧再追加）。
+读取端用 mmap 映射文件，按偏移量随机访问。
+msgpack / zstandard 为可选依赖，未安装时回退到标准库的 json / zlib。
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Iterator, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"OKXF"
+FORMAT_VERSION = 1
+HEADER = struct.Struct(">4sBBBx")
+FRAME_LEN = struct.Struct(">I")
+
+SERIALIZER_JSON = 0
+SERIALIZER_MSGPACK = 1
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+
+class FrameFormatError(Exception):
+    """文件头或帧格式不正确"""
+
+
+def default_serializer() -> int:
+    return SERIALIZER_MSGPACK if msgpack is not None else SERIALIZER_JSON
+
+
+def default_compression() -> int:
+    return COMPRESSION_ZSTD if zstandard is not None else COMPRESSION_ZLIB
+
+
+def serialize(obj: Any, serializer: int) -> bytes:
+    if serializer == SERIALIZER_MSGPACK:
+        if msgpack is None:
+            raise FrameFormatError("文件使用msgpack序列化，但未安装msgpack")
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def deserialize(data: bytes, serializer: int) -> Any:
+    if serializer == SERIALIZER_MSGPACK:
+        if msgpack is None:
+            raise FrameFormatError("文件使用msgpack序列化，但未安装msgpack")
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+
+def compress(data: bytes, compression: int, level: int = 3) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise FrameFormatError("文件使用zstd压缩，但未安装zstandard")
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(data, level)
+    return data
+
+
+def decompress(data: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise FrameFormatError("文件使用zstd压缩，但未安装zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+def encode_header(serializer: int, compression: int) -> bytes:
+    return HEADER.pack(MAGIC, FORMAT_VERSION, serializer, compression)
+
+
+def decode_header(data: bytes) -> Tuple[int, int]:
+    """返回 (序列化方式, 压缩方式)"""
+    if len(data) < HEADER.size:
+        raise FrameFormatError("文件头不完整")
+    magic, version, serializer, compression = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise FrameFormatError(f"文件标识不匹配: {magic!r}")
+    if version != FORMAT_VERSION:
+        raise FrameFormatError(f"不支持的格式版本: {version}")
+    return serializer, compression
+
+
+def _complete_length(f, size: int) -> int:
+    """按长度前缀逐帧跳过，返回最后一个完整帧结束的位置"""
+    pos = HEADER.size
+    while pos + FRAME_LEN.size <= size:
+        f.seek(pos)
+        (length,) = FRAME_LEN.unpack(f.read(FRAME_LEN.size))
+        if pos + FRAME_LEN.size + length > size:
+            break
+        pos += FRAME_LEN.size + length
+    return pos
+
+
+class FrameWriter:
+    """线程安全的追加写入器"""
+
+    def __init__(self, path: str, serializer: Optional[int] = None,
+                 compression: Optional[int] = None, fsync: bool = False):
+        """
+        Args:
+            path: 文件路径，已存在时沿用原文件头中的编码方式继续追加（先截掉上次崩溃留下的不完整尾帧）
+            serializer/compression: 新文件的编码方式，默认按已安装的依赖选择
+            fsync: 每帧写入后是否强制落盘
+        """
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'r+b') as f:
+                self.serializer, self.compression = decode_header(f.read(HEADER.size))
+                size = os.fstat(f.fileno()).st_size
+                end = _complete_length(f, size)
+                if end < size:
+                    # 否则新帧接在残缺的长度前缀之后，读取端会把之后的所有帧当作该帧的负载
+                    f.truncate(end)
+                    logger.warning(f"{path} 尾部存在不完整的帧，已截掉 {size - end} 字节后继续追加")
+            self._file = open(path, 'ab')
+        else:
+            self.serializer = default_serializer() if serializer is None else serializer
+            self.compression = default_compression() if compression is None else compression
+            self._file = open(path, 'ab')
+            self._file.write(encode_header(self.serializer, self.compression))
+            self._file.flush()
+
+    def append(self, obj: Any) -> int:
+        """追加一帧，返回负载字节数"""
+        payload = compress(serialize(obj, self.serializer), self.compression)
+        with self._lock:
+            self._file.write(FRAME_LEN.pack(len(payload)))
+            self._file.write(payload)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        return len(payload)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameReader:
+    """基于 mmap 的只读访问"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            self._file.close()
+            raise FrameFormatError(f"文件过短: {path}")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.serializer, self.compression = decode_header(self._mm[:HEADER.size])
+        self.offsets: List[int] = self._scan()
+
+    def _scan(self) -> List[int]:
+        """建立帧偏移索引，忽略写了一半的尾帧"""
+        offsets = []
+        pos = HEADER.size
+        end = len(self._mm)
+        while pos + FRAME_LEN.size <= end:
+            (length,) = FRAME_LEN.unpack_from(self._mm, pos)
+            if pos + FRAME_LEN.size + length > end:
+                logger.warning(f"{self.path} 尾部存在不完整的帧，已忽略 ({end - pos} 字节)")
+                break
+            offsets.append(pos)
+            pos += FRAME_LEN.size + length
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def read(self, index: int) -> Any:
+        pos = self.offsets[index]
+        (length,) = FRAME_LEN.unpack_from(self._mm, pos)
+        start = pos + FRAME_LEN.size
+        return deserialize(decompress(self._mm[start:start + length], self.compression), self.serializer)
+
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self.offsets)):
+            yield self.read(index)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,42 @@
+"""
+NumPy 技术指标
+
+输入均为按时间升序排列的 float64 数组，输出与输入等长，数据不足的位置为 NaN。
+"""
+import numpy as np
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """简单移动平均"""
+    out = np.full(len(values), np.nan)
+    if len(values) < window:
+        return out
+    cumsum = np.cumsum(np.insert(values, 0, 0.0))
+    out[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return out
+
+
+def rsi(closes: np.ndarray, window: int = 14) -> np.ndarray:
+    """RSI，使用涨跌幅的简单移动平均（与原 pandas 实现一致）"""
+    out = np.full(len(closes), np.nan)
+    if len(closes) <= window:
+        return out
+    delta = np.diff(closes)
+    avg_gain = sma(np.where(delta > 0, delta, 0.0), window)
+    avg_loss = sma(np.where(delta < 0, -delta, 0.0), window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+        out[1:] = 100 - 100 / (1 + rs)
+    return out
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """平均真实波幅（真实波幅的简单移动平均）"""
+    out = np.full(len(close), np.nan)
+    if len(close) <= window:
+        return out
+    prev_close = close[:-1]
+    true_range = np.maximum(high[1:] - low[1:],
+                            np.maximum(np.abs(high[1:] - prev_close), np.abs(low[1:] - prev_close)))
+    out[1:] = sma(true_range, window)
+    return out
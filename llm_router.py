@@ -0,0 +1,321 @@
+"""
+LLM 多提供方路由
+
+在多个 OpenAI 兼容接口之间路由 chat completion 请求:
+- 每个提供方维护延迟和错误率的指数加权均值（EWMA），按综合得分选择最快的健康提供方
+- 对冲请求: 首选提供方超过其 p95 延迟仍未返回时，并行请求下一个提供方，采用最先返回的有效结果
+- 熔断: 连续失败达到阈值后移出轮换，冷却后放行一次试探请求，成功则恢复
+- 失败转移: 请求失败（或返回内容无效）且截止时间未到时立即改用下一个提供方
+
+同一进程内的分析器通过 get_shared_router 共用路由，提供方的健康状态、连接和线程池只有一份。
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+LATENCY_SAMPLES = 100  # 计算 p95 使用的最近样本数
+MIN_P95_SAMPLES = 5  # 样本少于该数时使用配置的对冲等待时间
+ERROR_PENALTY = 4.0  # 得分 = 延迟 × (1 + ERROR_PENALTY × 错误率)
+SHARED_MAX_WORKERS = 32  # 共享路由的线程池上限（多个交易对并发分析，线程按需创建）
+
+
+class LLMRouterError(Exception):
+    """所有提供方均失败或超过截止时间"""
+
+
+@dataclass
+class ProviderStats:
+    calls: int = 0
+    failures: int = 0
+    wins: int = 0  # 结果被采用的次数
+    consecutive_failures: int = 0
+    ewma_latency: Optional[float] = None  # 只统计成功请求（秒）
+    last_sample: float = 0.0  # 最近一次完成请求的时间
+    ewma_error_rate: float = 0.0
+    circuit: str = CIRCUIT_CLOSED
+    open_until: float = 0.0
+    probe_in_flight: bool = False
+
+
+class LLMProvider:
+    """一个 OpenAI 兼容的 chat completion 接口"""
+
+    def __init__(self, name: str, base_url: str, api_key: str, model: str):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        self.stats = ProviderStats()
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._session = None
+
+    def post(self, payload: Dict[str, Any], timeout: float) -> Dict:
+        """发送请求（model 字段替换为本提供方的模型名）"""
+        import requests  # 首次调用时才加载
+        if self._session is None:
+            self._session = requests.Session()  # 复用连接
+        response = self._session.post(
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            json={**payload, "model": self.model},
+            timeout=timeout
+        )
+        if response.status_code != 200:
+            logger.debug(f"{self.name} 响应内容: {response.text[:500]}")
+        response.raise_for_status()
+        return response.json()
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < MIN_P95_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class LLMRouter:
+    """按延迟和健康状况在多个提供方之间路由请求"""
+
+    def __init__(self, providers: List[LLMProvider], hedge: bool = True, hedge_delay: float = 20.0,
+                 min_hedge_delay: float = 2.0, failure_threshold: int = 3, circuit_cooldown: float = 60.0,
+                 ewma_alpha: float = 0.2, explore_every: int = 20, default_timeout: float = 60.0,
+                 max_workers: Optional[int] = None):
+        """
+        Args:
+            providers: 提供方列表，顺序作为延迟未知时的优先级
+            hedge: 是否启用对冲请求
+            hedge_delay: 延迟样本不足时的对冲等待时间（秒）
+            min_hedge_delay: 对冲等待时间下限（秒），避免 p95 很小时几乎每次都发两个请求
+            failure_threshold: 连续失败多少次后熔断
+            circuit_cooldown: 熔断后多久允许一次试探请求（秒）
+            ewma_alpha: 延迟和错误率的指数加权系数
+            explore_every: 每 N 次请求把最久未使用的健康提供方排在最前，刷新其延迟估计（0 关闭）
+            default_timeout: 未指定 timeout 时整次请求的截止时间（秒）
+            max_workers: 线程池大小，默认每个提供方两个线程
+        """
+        if not providers:
+            raise ValueError("至少需要一个 LLM 提供方")
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.failure_threshold = failure_threshold
+        self.circuit_cooldown = circuit_cooldown
+        self.ewma_alpha = ewma_alpha
+        self.explore_every = explore_every
+        self.default_timeout = default_timeout
+        self._lock = threading.Lock()
+        # 被对冲掉的请求无法取消，会在后台继续运行到超时，因此每个提供方预留两个线程
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or max(2, len(providers) * 2),
+                                            thread_name_prefix="llm")
+        self.requests = 0
+        self.hedged = 0  # 发出对冲请求的次数
+        self.hedge_wins = 0  # 对冲请求先返回并被采用的次数
+        self.failovers = 0  # 因失败改用下一个提供方的次数
+
+    @classmethod
+    def from_config(cls, llm_config, fast: bool = False, max_workers: Optional[int] = None) -> 'LLMRouter':
+        """fast=True 时各提供方使用 fast_model（级联模式的第一阶段）"""
+        providers = [LLMProvider(p.name, p.base_url, p.api_key, p.fast_model if fast else p.model)
+                     for p in llm_config.providers]
+        return cls(providers, hedge=llm_config.hedge, hedge_delay=llm_config.hedge_delay,
+                   min_hedge_delay=llm_config.min_hedge_delay, failure_threshold=llm_config.failure_threshold,
+                   circuit_cooldown=llm_config.circuit_cooldown, ewma_alpha=llm_config.ewma_alpha,
+                   max_workers=max_workers)
+
+    def _score(self, provider: LLMProvider) -> float:
+        stats = provider.stats
+        if stats.ewma_latency is not None:
+            latency = stats.ewma_latency
+        else:
+            # 从未请求过的提供方优先获得样本；只失败过的按对冲等待时间估计
+            latency = 0.0 if stats.calls == 0 else self.hedge_delay
+        return latency * (1 + ERROR_PENALTY * stats.ewma_error_rate)
+
+    def ranked_providers(self, now: Optional[float] = None) -> List[LLMProvider]:
+        """可用的提供方，按得分排序；熔断中的提供方冷却结束后作为试探放在最前"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            probes, healthy = [], []
+            for provider in self.providers:
+                stats = provider.stats
+                if stats.circuit == CIRCUIT_CLOSED:
+                    healthy.append(provider)
+                elif now >= stats.open_until and not stats.probe_in_flight:
+                    probes.append(provider)
+            healthy.sort(key=self._score)
+            if self.explore_every and len(healthy) > 1 and self.requests % self.explore_every == self.explore_every - 1:
+                # 只走得分最高的提供方时，其他提供方的延迟估计不会更新（恢复后也不会被选中）
+                stale = min(healthy, key=lambda p: p.stats.last_sample)
+                healthy.remove(stale)
+                healthy.insert(0, stale)
+            candidates = probes[:1] + healthy
+            if not candidates:
+                # 全部熔断时仍尝试最早恢复的一个，而不是直接放弃本周期
+                candidates = [min(self.providers, key=lambda p: p.stats.open_until)]
+            return candidates
+
+    def _hedge_delay_for(self, provider: LLMProvider) -> float:
+        p95 = provider.p95()
+        return max(self.min_hedge_delay, p95 if p95 is not None else self.hedge_delay)
+
+    def _record(self, provider: LLMProvider, latency: Optional[float], error: Optional[BaseException]):
+        alpha = self.ewma_alpha
+        with self._lock:
+            stats = provider.stats
+            stats.calls += 1
+            stats.probe_in_flight = False
+            stats.last_sample = time.monotonic()
+            stats.ewma_error_rate = (1 - alpha) * stats.ewma_error_rate + alpha * (1.0 if error else 0.0)
+            if error is None:
+                provider.latencies.append(latency)
+                stats.ewma_latency = latency if stats.ewma_latency is None else \
+                    (1 - alpha) * stats.ewma_latency + alpha * latency
+                stats.consecutive_failures = 0
+                if stats.circuit != CIRCUIT_CLOSED:
+                    logger.info(f"LLM 提供方 {provider.name} 试探成功，恢复使用")
+                stats.circuit = CIRCUIT_CLOSED
+                return
+
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            if stats.circuit == CIRCUIT_HALF_OPEN or stats.consecutive_failures >= self.failure_threshold:
+                if stats.circuit != CIRCUIT_OPEN:
+                    logger.warning(f"LLM 提供方 {provider.name} 连续失败 {stats.consecutive_failures} 次，"
+                                   f"熔断 {self.circuit_cooldown:.0f} 秒: {error}")
+                stats.circuit = CIRCUIT_OPEN
+                stats.open_until = time.monotonic() + self.circuit_cooldown
+
+    def _attempt(self, provider: LLMProvider, payload: Dict[str, Any], timeout: float,
+                 validate: Optional[Callable[[Dict], Any]]) -> Dict:
+        start = time.monotonic()
+        try:
+            response = provider.post(payload, timeout)
+            if validate is not None:
+                validate(response)  # 内容无效同样计为失败
+        except BaseException as e:
+            self._record(provider, None, e)
+            raise
+        self._record(provider, time.monotonic() - start, None)
+        return response
+
+    def _launch(self, provider: LLMProvider, payload: Dict[str, Any], deadline: float,
+                validate: Optional[Callable[[Dict], Any]]) -> Future:
+        with self._lock:
+            if provider.stats.circuit == CIRCUIT_OPEN:
+                provider.stats.circuit = CIRCUIT_HALF_OPEN
+                provider.stats.probe_in_flight = True
+        return self._executor.submit(self._attempt, provider, payload, max(0.1, deadline - time.monotonic()), validate)
+
+    def complete(self, payload: Dict[str, Any], timeout: Optional[float] = None,
+                 validate: Optional[Callable[[Dict], Any]] = None) -> Dict:
+        """
+        发送 chat completion 请求，返回最先成功且通过 validate 的响应
+
+        Args:
+            payload: 请求体（model 字段由各提供方替换）
+            timeout: 整次请求（含对冲和失败转移）的截止时间（秒）
+            validate: 校验响应内容，抛出异常表示无效
+        """
+        deadline = time.monotonic() + (timeout or self.default_timeout)
+        candidates = self.ranked_providers()
+        self.requests += 1
+        pending: Dict[Future, LLMProvider] = {}
+        errors: List[str] = []
+        hedges = set()
+
+        first = candidates[0]
+        pending[self._launch(first, payload, deadline, validate)] = first
+        next_index = 1
+        hedge_at = time.monotonic() + self._hedge_delay_for(first) if self.hedge else float('inf')
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            can_hedge = next_index < len(candidates) and len(pending) == 1
+            wait_for = deadline - now
+            if can_hedge:
+                wait_for = min(wait_for, max(0.0, hedge_at - now))
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            if not done:
+                if can_hedge and time.monotonic() >= hedge_at:
+                    provider = candidates[next_index]
+                    next_index += 1
+                    future = self._launch(provider, payload, deadline, validate)
+                    pending[future] = provider
+                    hedges.add(future)
+                    self.hedged += 1
+                    hedge_at = float('inf')  # 同时最多两个请求
+                    logger.info(f"LLM 提供方 {first.name} 超过 {self._hedge_delay_for(first):.1f} 秒未返回，"
+                                f"对冲请求 {provider.name}")
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    errors.append(f"{provider.name}: {e}")
+                    logger.warning(f"LLM 提供方 {provider.name} 请求失败: {e}")
+                    continue
+                with self._lock:
+                    provider.stats.wins += 1
+                if future in hedges:
+                    self.hedge_wins += 1
+                return response
+
+            if not pending and next_index < len(candidates):
+                provider = candidates[next_index]
+                next_index += 1
+                self.failovers += 1
+                logger.info(f"改用 LLM 提供方 {provider.name}")
+                pending[self._launch(provider, payload, deadline, validate)] = provider
+
+        if pending:
+            errors.append(f"{', '.join(p.name for p in pending.values())}: 超过截止时间")
+        raise LLMRouterError("; ".join(errors) or "没有可用的 LLM 提供方")
+
+    def format_metrics(self) -> str:
+        lines = [f"LLM 请求 {self.requests} 次，对冲 {self.hedged} 次（对冲胜出 {self.hedge_wins}），"
+                 f"失败转移 {self.failovers} 次"]
+        for provider in self.providers:
+            stats = provider.stats
+            latency = f"{stats.ewma_latency:.2f}s" if stats.ewma_latency is not None else "-"
+            p95 = provider.p95()
+            lines.append(f"  {provider.name:<12} {stats.circuit:<9} 延迟EWMA {latency:>7} | "
+                         f"p95 {f'{p95:.2f}s' if p95 is not None else '-':>7} | "
+                         f"错误率 {stats.ewma_error_rate * 100:5.1f}% | 请求 {stats.calls} 失败 {stats.failures} "
+                         f"采用 {stats.wins}")
+        return "\n".join(lines)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+_shared_routers: Dict[bool, LLMRouter] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_router(llm_config, fast: bool = False) -> LLMRouter:
+    """进程内共享的路由（每个交易对各建一个时，每个路由都要各自失败到熔断才停止请求故障的提供方）
+
+    llm_config: LLMConfig；fast=True 为级联模式第一阶段使用的路由
+    """
+    with _shared_lock:
+        if fast not in _shared_routers:
+            _shared_routers[fast] = LLMRouter.from_config(llm_config, fast=fast, max_workers=SHARED_MAX_WORKERS)
+        return _shared_routers[fast]
@@ -0,0 +1,218 @@
+"""
+异步结构化日志
+
+根 logger 只挂一个 QueueHandler: 调用线程里只做上下文字段注入、重复告警限流和消息格式化，
+然后放入无界队列立即返回；QueueListener 线程负责写控制台和文件，分析周期不会等待磁盘 I/O。
+
+- 结构化: 每条日志附带 contextvars 中的 inst_id / cycle_id，文件为 JSON Lines
+- 轮转: 按大小或跨天轮转（先到者），保留 backup_count 个旧文件
+- 级别: 全局级别 + 按 logger 覆盖（如 llm_router=DEBUG,market_data=WARNING）
+- 限流: 同一 logger 的同类 WARNING 及以上消息（数字归一化后相同）每个窗口最多输出 burst 条，
+  被抑制的次数附在窗口结束后该消息再次出现的那一条上（之后不再出现则不补报）
+"""
+import atexit
+import contextlib
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+from serialization import dumps
+
+inst_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('inst_id', default=None)
+cycle_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('cycle_id', default=None)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(context)s%(message)s'
+
+_DIGITS = re.compile(r'\d+')
+
+
+@contextlib.contextmanager
+def log_context(inst_id: Optional[str] = None, cycle_id: Optional[str] = None) -> Iterator[None]:
+    """在 with 块内的日志附带交易对和周期ID"""
+    tokens = []
+    if inst_id is not None:
+        tokens.append((inst_id_var, inst_id_var.set(inst_id)))
+    if cycle_id is not None:
+        tokens.append((cycle_id_var, cycle_id_var.set(cycle_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """在调用线程中读取 contextvars（监听线程里已读不到）；工作进程转发来的记录保留原上下文"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if hasattr(record, 'context'):
+            return True
+        record.inst_id = inst_id_var.get()
+        record.cycle_id = cycle_id_var.get()
+        parts = [p for p in (record.inst_id, f"#{record.cycle_id}" if record.cycle_id else None) if p]
+        record.context = f"[{' '.join(parts)}] " if parts else ""
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """重复的告警/错误限流，避免 API 故障时同一条错误刷屏（在各个记录日志的线程中调用，加锁）"""
+
+    def __init__(self, interval: float = 60.0, burst: int = 5, min_level: int = logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.min_level = min_level
+        self._windows: Dict[Tuple, list] = {}  # key -> [窗口开始, 本窗口次数]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level or self.interval <= 0:
+            return True
+        key = (record.name, record.levelno, _DIGITS.sub('#', str(record.msg))[:200])
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and now - window[0] < self.interval:
+                window[1] += 1
+                return window[1] <= self.burst
+            suppressed = window[1] - self.burst if window is not None and window[1] > self.burst else 0
+            self._windows[key] = [now, 1]
+            if len(self._windows) > 10000:
+                self._evict(now)
+        if suppressed:
+            record.msg = f"{record.msg}（上一窗口 {self.interval:.0f} 秒内相同消息被抑制 {suppressed} 条）"
+        return True
+
+    def _evict(self, now: float):
+        """调用方持有 self._lock"""
+        for key in [k for k, w in self._windows.items() if now - w[0] >= self.interval]:
+            del self._windows[key]
+
+
+class JsonFormatter(logging.Formatter):
+    """一行一个 JSON 对象"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'inst_id': getattr(record, 'inst_id', None),
+            'cycle_id': getattr(record, 'cycle_id', None),
+            'thread': record.threadName,
+        }
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return dumps(entry)
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """入队前格式化消息和异常文本，保留上下文字段"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """超过 max_bytes 或跨天时轮转（文件名 .1 .2 ... 越大越旧）"""
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self._day = self._today()
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now().strftime('%Y%m%d')
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self._today() != self._day:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        self._day = self._today()
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """'llm_router=DEBUG,market_data=WARNING' -> {logger: 级别}"""
+    levels = {}
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _apply_levels(settings) -> logging.Logger:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(settings.level.upper())
+    for name, level in settings.levels.items():
+        logging.getLogger(name).setLevel(level)
+    return root
+
+
+def _queue_handler(log_queue, settings) -> ContextQueueHandler:
+    handler = ContextQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RateLimitFilter(settings.rate_limit_interval, settings.rate_limit_burst))
+    return handler
+
+
+def setup_logging(settings) -> logging.handlers.QueueListener:
+    """配置异步日志，返回已启动的 QueueListener（进程退出时自动停止并写完队列）
+
+    settings: LoggingConfig
+    """
+    os.makedirs(settings.log_dir, exist_ok=True)
+    text_handler = SizeAndTimeRotatingFileHandler(os.path.join(settings.log_dir, 'trading_bot.log'),
+                                                  settings.max_bytes, settings.backup_count)
+    text_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handlers = [console, text_handler]
+    if settings.json:
+        json_handler = SizeAndTimeRotatingFileHandler(os.path.join(settings.log_dir, 'trading_bot.jsonl'),
+                                                      settings.max_bytes, settings.backup_count)
+        json_handler.setFormatter(JsonFormatter())
+        handlers.append(json_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()  # 无界，put 从不阻塞
+    _apply_levels(settings).addHandler(_queue_handler(log_queue, settings))
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def setup_worker_logging(log_queue, settings):
+    """工作进程: 日志经 multiprocessing 队列交给协调进程写出（只有一个进程轮转日志文件）"""
+    _apply_levels(settings).addHandler(_queue_handler(log_queue, settings))
+
+
+class _Dispatch(logging.Handler):
+    def emit(self, record: logging.LogRecord):
+        logging.getLogger(record.name).handle(record)
+
+
+def forward_worker_logs(log_queue) -> logging.handlers.QueueListener:
+    """协调进程: 把工作进程的日志记录交给本进程的日志管道"""
+    listener = logging.handlers.QueueListener(log_queue, _Dispatch())
+    listener.start()
+    return listener
@@ -1,7 +1,13 @@
+import time
+
+_START = time.perf_counter()  # 启动计时从导入前开始
+
+import argparse
 import logging
 import os
 import sys
-from datetime import datetime
+import threading
+from typing import List, Tuple
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -10,36 +16,62 @@ load_dotenv()
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from config import load_config
+from log_pipeline import setup_logging
 from trading_bot import TradingAnalysisBot
 from strategy_config import print_strategy_info
 
-def setup_logging():
-    """配置日志"""
-    # 创建logs目录（如果不存在）
-    logs_dir = 'logs'
-    if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
+_IMPORTED = time.perf_counter()
+
+class StartupTimer:
+    """记录启动各阶段耗时"""
+    
+    def __init__(self, start: float):
+        self.start = start
+        self._last = start
+        self.stages: List[Tuple[str, float]] = []
     
-    # 生成带日期的日志文件名
-    log_date = datetime.now().strftime('%Y%m%d')
-    dated_log_file = os.path.join(logs_dir, f'trading_bot_{log_date}.log')
+    def mark(self, stage: str, at: float = None):
+        now = at or time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+    
+    def report(self) -> str:
+        parts = [f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in self.stages]
+        return f"启动耗时 {(self._last - self.start) * 1000:.0f}ms ({' | '.join(parts)})"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="智能交易分析系统")
+    selftest = parser.add_mutually_exclusive_group()
+    selftest.add_argument('--skip-selftest', action='store_true',
+                          help="跳过启动自检，直接开始监控（适合进程管理器重启）")
+    selftest.add_argument('--async-selftest', action='store_true',
+                          help="自检在后台线程运行，不阻塞监控启动，失败时只记录日志")
+    return parser.parse_args()
+
+def _run_selftest_in_background(bot: TradingAnalysisBot):
+    def selftest():
+        started = time.perf_counter()
+        if bot.run_analysis_cycle():
+            logger.info(f"✅ 后台自检成功 ({(time.perf_counter() - started) * 1000:.0f}ms)")
+        else:
+            logger.error("❌ 后台自检失败，监控继续运行，请检查配置和网络连接")
     
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('trading_bot.log', encoding='utf-8'),  # 通用日志文件
-            logging.FileHandler(dated_log_file, encoding='utf-8'),     # 按日期的日志文件
-            logging.StreamHandler()
-        ]
-    )
+    threading.Thread(target=selftest, name="selftest", daemon=True).start()
+
+logger = logging.getLogger(__name__)
 
 def main():
     """主函数"""
+    args = parse_args()
+    timer = StartupTimer(_START)
+    timer.mark("导入", _IMPORTED)
     print("🚀 智能交易分析系统启动中...")
     
-    # 设置日志
-    setup_logging()
+    # 设置日志（异步写入，分析周期不等待磁盘）
+    config = load_config()
+    setup_logging(config.logging)
+    timer.mark("配置")
     
     # 打印策略信息
     strategy = os.getenv('TRADING_STRATEGY', 'balanced')
@@ -56,20 +88,48 @@ def main():
             print(f"  {var}=your_value_here")
         return
     
+    if config.coordinator.workers > 0:
+        # 多进程协调模式: 交易对分片到各工作进程，本进程写库、发邮件（不运行启动自检）
+        # 只在协调模式下导入（multiprocessing 等模块不拖慢单进程启动）
+        from coordinator import Coordinator
+        
+        print(f"🧩 协调模式: {config.coordinator.workers} 个工作进程")
+        logger.info(timer.report())
+        Coordinator(config, immediate=args.skip_selftest).run()
+        return
+    
     try:
         # 创建交易机器人实例
-        bot = TradingAnalysisBot()
+        bot = TradingAnalysisBot(config=config)
+        timer.mark("初始化")
         
-        # 运行单次测试
-        print("运行单次分析测试...")
-        test_result = bot.run_analysis_cycle()
+        # 最近的检查点: 恢复状态后接着原调度网格运行，不再自检
+        checkpoint_age = bot.restore_checkpoint()
+        warm = checkpoint_age is not None and checkpoint_age <= config.checkpoint.max_age
+        if checkpoint_age is not None:
+            timer.mark("恢复检查点")
         
-        if test_result:
-            print("✅ 测试成功! 开始连续监控...")
-            # 开始连续分析
-            bot.start_continuous_analysis()
+        if warm:
+            print(f"♻️ 已从 {checkpoint_age:.0f} 秒前的检查点恢复，跳过启动自检")
+        elif args.skip_selftest:
+            print("⏭️ 跳过启动自检")
+        elif args.async_selftest:
+            print("运行后台自检...")
+            _run_selftest_in_background(bot)
         else:
-            print("❌ 测试失败，请检查配置和网络连接。")
+            # 运行单次测试
+            print("运行单次分析测试...")
+            test_result = bot.run_analysis_cycle()
+            timer.mark("自检")
+            if not test_result:
+                print("❌ 测试失败，请检查配置和网络连接。")
+                logger.info(timer.report())
+                return
+            print("✅ 测试成功! 开始连续监控...")
+        
+        logger.info(timer.report())
+        # 开始连续分析
+        bot.start_continuous_analysis(run_immediately=args.skip_selftest and not warm)
             
     except KeyboardInterrupt:
         print("\n👋 用户终止程序")
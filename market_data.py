@@ -1,27 +1,92 @@
+import contextvars
 import logging
-import okx.MarketData as MarketData
-from typing import Dict, List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional
+
+from rate_limiter import RequestScheduler, get_shared_scheduler
+from snapshot_cache import SnapshotCache
+
+# 获取失败且没有缓存时使用的空数据（行情数据除外）
+EMPTY_RESPONSES = {
+    'orderbook': {'code': '0', 'msg': '', 'data': [{'asks': [], 'bids': [], 'ts': '0'}]},
+    'candlesticks': {'code': '0', 'msg': '', 'data': []},
+    'trades': {'code': '0', 'msg': '', 'data': []},
+}
 
 logger = logging.getLogger(__name__)
 
+FETCH_WORKERS = 16  # 进程内共享的行情获取线程数（线程按需创建）
+
+_shared_executor: Optional[ThreadPoolExecutor] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_executor() -> ThreadPoolExecutor:
+    """进程内共享的行情获取线程池（每个交易对各建一个时线程数随交易对数增长）"""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="okx-fetch")
+        return _shared_executor
+
+
 class OKXMarketData:
     """OKX市场数据API封装类"""
     
-    def __init__(self, flag: str = "0"):
+    def __init__(self, flag: str = "0", api=None, scheduler: Optional[RequestScheduler] = None):
         """
         初始化市场数据API
         
         Args:
             flag: 环境标识，"0"表示实盘，"1"表示模拟盘
+            api: 可选的底层 MarketAPI 实现（如录制回放），默认使用 OKX SDK
+            scheduler: 限速调度器；使用 OKX SDK 时默认共享进程内调度器，
+                注入的 api 默认不做限速
         """
         self.flag = flag
-        self.api = MarketData.MarketAPI(flag=flag)
-        logger.info(f"OKX市场数据API初始化完成 (环境: {'实盘' if flag == '0' else '模拟盘'})")
+        self.scheduler = scheduler
+        self.snapshots = SnapshotCache()
+        self._executor = get_shared_executor()
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        if api is None:
+            import okx.MarketData as MarketData  # SDK 依赖较重，回放/注入 api 时不加载
+            
+            self.api = MarketData.MarketAPI(flag=flag)
+            if self.scheduler is None:
+                self.scheduler = get_shared_scheduler()
+            logger.info(f"OKX市场数据API初始化完成 (环境: {'实盘' if flag == '0' else '模拟盘'})")
+        else:
+            self.api = api
+            logger.info(f"OKX市场数据API初始化完成 (数据源: {type(api).__name__})")
+    
+    def _request(self, endpoint: str, **params) -> Dict:
+        """经调度器发出请求（限速、合并重复请求、限速时回退缓存）"""
+        def call() -> Dict:
+            return getattr(self.api, endpoint)(**params)
+        
+        if self.scheduler is None:
+            return call()
+        return self.scheduler.execute(endpoint, params, call)
     
     def get_ticker(self, inst_id: str) -> Dict:
         """获取单个产品行情信息"""
         try:
-            result = self.api.get_ticker(instId=inst_id)
+            result = self._request('get_ticker', instId=inst_id)
+            if result['code'] != '0':
+                logger.error(f"获取行情数据失败: {result}")
+                raise Exception(f"API错误: {result['msg']}")
+            return result
+        except Exception as e:
+            logger.error(f"获取行情数据异常: {e}")
+            raise
+    
+    def get_tickers(self, inst_type: str = "SWAP") -> Dict:
+        """获取某类产品的全部行情（一次请求覆盖多个交易对）"""
+        try:
+            result = self._request('get_tickers', instType=inst_type)
             if result['code'] != '0':
                 logger.error(f"获取行情数据失败: {result}")
                 raise Exception(f"API错误: {result['msg']}")
@@ -33,7 +98,7 @@ class OKXMarketData:
     def get_orderbook(self, inst_id: str, sz: str = "20") -> Dict:
         """获取产品深度"""
         try:
-            result = self.api.get_orderbook(instId=inst_id, sz=sz)
+            result = self._request('get_orderbook', instId=inst_id, sz=sz)
             if result['code'] != '0':
                 logger.error(f"获取深度数据失败: {result}")
                 raise Exception(f"API错误: {result['msg']}")
@@ -45,7 +110,7 @@ class OKXMarketData:
     def get_candlesticks(self, inst_id: str, bar: str = "5m", limit: str = "200") -> Dict:
         """获取K线数据"""
         try:
-            result = self.api.get_candlesticks(instId=inst_id, bar=bar, limit=limit)
+            result = self._request('get_candlesticks', instId=inst_id, bar=bar, limit=limit)
             if result['code'] != '0':
                 logger.error(f"获取K线数据失败: {result}")
                 raise Exception(f"API错误: {result['msg']}")
@@ -57,7 +122,7 @@ class OKXMarketData:
     def get_trades(self, inst_id: str, limit: str = "200") -> Dict:
         """获取交易产品公共成交数据"""
         try:
-            result = self.api.get_trades(instId=inst_id, limit=limit)
+            result = self._request('get_trades', instId=inst_id, limit=limit)
             if result['code'] != '0':
                 logger.error(f"获取成交数据失败: {result}")
                 raise Exception(f"API错误: {result['msg']}")
@@ -67,16 +132,78 @@ class OKXMarketData:
             raise
     
     def get_all_market_data(self, inst_id: str, config) -> Dict:
-        """获取所有市场数据"""
+        """获取所有市场数据
+        
+        四类数据并发获取。某一类失败或超过 fetch_timeout 时，改用未超过最大年龄的缓存快照，
+        并在后台继续刷新；结果中的 '_meta' 记录每类数据的年龄、是否为缓存以及失败原因。
+        只有行情数据既获取失败又没有可用缓存时才抛出异常。
+        """
         logger.info(f"开始获取 {inst_id} 的市场数据...")
+        freshness = config.freshness
         
-        return {
-            'ticker': self.get_ticker(inst_id),
-            'orderbook': self.get_orderbook(inst_id, sz=str(config.trading.orderbook_size)),
-            'candlesticks': self.get_candlesticks(
-                inst_id, 
-                bar=config.trading.kline_bar, 
+        fetchers = {
+            'ticker': lambda: self.get_ticker(inst_id),
+            'orderbook': lambda: self.get_orderbook(inst_id, sz=str(config.trading.orderbook_size)),
+            'candlesticks': lambda: self.get_candlesticks(
+                inst_id,
+                bar=config.trading.kline_bar,
                 limit=str(config.trading.kline_limit)
             ),
-            'trades': self.get_trades(inst_id, limit=str(config.trading.trades_limit))
+            'trades': lambda: self.get_trades(inst_id, limit=str(config.trading.trades_limit))
         }
+        futures = {data_type: self._submit(inst_id, data_type, fetch) for data_type, fetch in fetchers.items()}
+        deadline = time.monotonic() + freshness.fetch_timeout
+        
+        market_data, meta = {}, {}
+        for data_type, future in futures.items():
+            try:
+                market_data[data_type] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                meta[data_type] = {'age': 0.0, 'stale': False}
+                continue
+            except FutureTimeoutError:
+                # 任务仍在运行，完成后会自动写入缓存
+                reason = f"超过 {freshness.fetch_timeout:g} 秒未返回"
+            except Exception as e:
+                reason = str(e)
+                self._refresh_in_background(inst_id, data_type, fetchers[data_type])
+            
+            snapshot = self.snapshots.get(inst_id, data_type, max_age=freshness.max_age(data_type))
+            if snapshot is not None:
+                logger.warning(f"{inst_id} {data_type} 获取失败({reason})，使用 {snapshot.age:.0f} 秒前的缓存")
+                market_data[data_type] = snapshot.data
+                meta[data_type] = {'age': round(snapshot.age, 1), 'stale': True, 'error': reason}
+            elif data_type == 'ticker':
+                raise Exception(f"行情数据获取失败且无可用缓存: {reason}")
+            else:
+                logger.warning(f"{inst_id} {data_type} 获取失败({reason})且无可用缓存，本周期缺少该数据")
+                market_data[data_type] = EMPTY_RESPONSES[data_type]
+                meta[data_type] = {'age': None, 'stale': True, 'missing': True, 'error': reason}
+        
+        market_data['_meta'] = meta
+        return market_data
+    
+    def _submit(self, inst_id: str, data_type: str, fetch: Callable[[], Dict]):
+        """提交获取任务，成功后更新快照缓存"""
+        def task() -> Dict:
+            data = fetch()
+            self.snapshots.put(inst_id, data_type, data)
+            return data
+        # 在提交时的上下文中运行，获取线程的日志也带有交易对和周期ID
+        return self._executor.submit(contextvars.copy_context().run, task)
+    
+    def _refresh_in_background(self, inst_id: str, data_type: str, fetch: Callable[[], Dict]):
+        """失败后在后台重试一次，同一类数据同时只有一个刷新任务"""
+        key = (inst_id, data_type)
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        
+        def refresh() -> Dict:
+            try:
+                return fetch()
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(key)
+        
+        self._submit(inst_id, data_type, refresh)
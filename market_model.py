@@ -0,0 +1,161 @@
+"""
+行情数据规范化
+
+OKX 接口返回的数字都是字符串。获取数据后立即规范化一次，下游模块直接使用解析后的结构:
+- Ticker: __slots__ dataclass
+- K线: CANDLE_DTYPE 结构化数组，按时间升序（OKX 返回的是新到旧）
+- 成交: TRADE_DTYPE 结构化数组，按 tradeId 升序
+- 订单簿: (n, 2) float64 数组 [价格, 数量]，与 orderbook_analytics 一致
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+
+from orderbook_analytics import contract_value_from_volume, levels_to_array
+
+logger = logging.getLogger(__name__)
+
+CANDLE_DTYPE = np.dtype([
+    ('ts', np.int64),
+    ('o', np.float64),
+    ('h', np.float64),
+    ('l', np.float64),
+    ('c', np.float64),
+    ('vol', np.float64),
+    ('vol_ccy', np.float64),
+    ('vol_ccy_quote', np.float64),
+    ('confirm', np.bool_),
+])
+
+TRADE_DTYPE = np.dtype([
+    ('trade_id', np.int64),
+    ('ts', np.int64),
+    ('px', np.float64),
+    ('sz', np.float64),
+    ('side', np.int8),  # +1 主动买，-1 主动卖
+])
+
+
+def _num(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+@dataclass(slots=True)
+class Ticker:
+    inst_id: str
+    inst_type: str
+    last: float
+    bid_px: float
+    bid_sz: float
+    ask_px: float
+    ask_sz: float
+    open_24h: float
+    high_24h: float
+    low_24h: float
+    vol_24h: float  # 衍生品为张数，现货为币数
+    vol_ccy_24h: float  # 衍生品为币数，现货为计价货币数
+    ts: int
+
+    @classmethod
+    def from_okx(cls, row: Dict[str, str]) -> 'Ticker':
+        return cls(
+            inst_id=row.get('instId', ''),
+            inst_type=row.get('instType', ''),
+            last=float(row['last']),
+            bid_px=_num(row.get('bidPx')),
+            bid_sz=_num(row.get('bidSz')),
+            ask_px=_num(row.get('askPx')),
+            ask_sz=_num(row.get('askSz')),
+            open_24h=_num(row.get('open24h')),
+            high_24h=_num(row.get('high24h')),
+            low_24h=_num(row.get('low24h')),
+            vol_24h=_num(row.get('vol24h')),
+            vol_ccy_24h=_num(row.get('volCcy24h')),
+            ts=int(row.get('ts') or 0),
+        )
+
+    @property
+    def contract_value(self) -> float:
+        """每张合约对应的币数（衍生品由 24h 成交量推算，现货为 1）"""
+        return contract_value_from_volume(self.inst_id, self.inst_type, self.vol_24h, self.vol_ccy_24h)
+
+
+def parse_candles(rows: Sequence[Sequence[str]]) -> np.ndarray:
+    """OKX K线 -> CANDLE_DTYPE 数组（按时间升序，同一时间戳保留最后出现的一根）"""
+    if len(rows) == 0:
+        return np.empty(0, dtype=CANDLE_DTYPE)
+    values = np.array([row[:8] if len(row) >= 8 else list(row[:7]) + ['0'] for row in rows], dtype=np.float64)
+    candles = np.empty(len(rows), dtype=CANDLE_DTYPE)
+    candles['ts'] = values[:, 0].astype(np.int64)
+    for i, name in enumerate(('o', 'h', 'l', 'c', 'vol', 'vol_ccy', 'vol_ccy_quote'), start=1):
+        candles[name] = values[:, i]
+    candles['confirm'] = [len(row) <= 8 or row[8] == '1' for row in rows]
+
+    # 去重时保留后出现的版本（未收盘K线会被更新）
+    order = np.argsort(candles['ts'], kind='stable')
+    candles = candles[order]
+    keep = np.append(candles['ts'][1:] != candles['ts'][:-1], True)
+    return candles[keep]
+
+
+def parse_trades(rows: Sequence[Dict[str, str]]) -> np.ndarray:
+    """OKX 成交 -> TRADE_DTYPE 数组（按 tradeId 升序）"""
+    trades = np.empty(len(rows), dtype=TRADE_DTYPE)
+    if len(rows) == 0:
+        return trades
+    trades['trade_id'] = np.array([t['tradeId'] for t in rows], dtype=np.int64)
+    trades['ts'] = np.array([t['ts'] for t in rows], dtype=np.int64)
+    trades['px'] = np.array([t['px'] for t in rows], dtype=np.float64)
+    trades['sz'] = np.array([t['sz'] for t in rows], dtype=np.float64)
+    trades['side'] = [1 if t['side'] == 'buy' else -1 for t in rows]
+    return trades[np.argsort(trades['trade_id'], kind='stable')]
+
+
+@dataclass(slots=True)
+class NormalizedMarketData:
+    """一个交易对一次获取的全部行情（已解析）"""
+    inst_id: str
+    ticker: Ticker
+    bids: np.ndarray
+    asks: np.ndarray
+    candles: np.ndarray
+    trades: np.ndarray
+    meta: Dict[str, Any] = field(default_factory=dict)
+    raw: Optional[Dict[str, Any]] = None  # 原始响应，用于存储和录制
+
+    @property
+    def price(self) -> float:
+        return self.ticker.last
+
+    @property
+    def closes(self) -> np.ndarray:
+        return self.candles['c']
+
+
+def normalize_market_data(inst_id: str, market_data: Dict[str, Any]) -> NormalizedMarketData:
+    """把 get_all_market_data 的结果解析为 NormalizedMarketData"""
+    ticker = Ticker.from_okx(market_data['ticker']['data'][0])
+    book_data = market_data['orderbook'].get('data') or [{}]
+    book = book_data[0]
+    return NormalizedMarketData(
+        inst_id=inst_id,
+        ticker=ticker,
+        bids=levels_to_array(book.get('bids', [])),
+        asks=levels_to_array(book.get('asks', [])),
+        candles=parse_candles(market_data['candlesticks'].get('data', [])),
+        trades=parse_trades(market_data['trades'].get('data', [])),
+        meta=market_data.get('_meta', {}),
+        raw=market_data,
+    )
+
+
+def ensure_normalized(inst_id: str, data: Union[NormalizedMarketData, Dict[str, Any]]) -> NormalizedMarketData:
+    """兼容仍传入原始 dict 的调用方"""
+    if isinstance(data, NormalizedMarketData):
+        return data
+    return normalize_market_data(inst_id, data)
@@ -0,0 +1,177 @@
+"""
+市场数据录制与确定性回放
+
+录制: RecordingMarketAPI 包装 OKX SDK 的 MarketAPI，把每次原始响应连同接收时间
+追加写入帧文件（格式见 frame_codec）。
+回放: ReplayMarketData 是 OKXMarketData 的子类，底层 API 换成录制文件，
+可按 1x、N 倍速或不等待（speed=0）回放，上层逻辑与实盘完全一致。
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+from frame_codec import FrameReader, FrameWriter
+from market_data import OKXMarketData
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = ('get_ticker', 'get_orderbook', 'get_candlesticks', 'get_trades')
+
+
+class ReplayExhausted(Exception):
+    """录制文件中已没有该请求的后续响应"""
+
+
+class MarketDataRecorder:
+    """把原始响应写入追加式帧文件"""
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.writer = FrameWriter(path, fsync=fsync)
+        self.frames = 0
+        self.bytes_written = 0
+        logger.info(f"市场数据录制已开启: {path}")
+
+    def record(self, method: str, params: Dict, response: Any = None, error: Optional[Exception] = None):
+        """记录一次调用，t 为接收时间（epoch秒）"""
+        frame = {'t': time.time(), 'm': method, 'p': params, 'r': response}
+        if error is not None:
+            frame['e'] = str(error)
+        try:
+            self.bytes_written += self.writer.append(frame)
+            self.frames += 1
+        except Exception as e:
+            # 录制失败不能影响正常分析
+            logger.error(f"写入录制文件失败: {e}")
+
+    def close(self):
+        self.writer.close()
+        logger.info(f"录制结束: {self.path}，共 {self.frames} 帧，{self.bytes_written} 字节")
+
+
+class RecordingMarketAPI:
+    """包装 okx.MarketData.MarketAPI，透明记录四个行情接口的原始响应"""
+
+    def __init__(self, api, recorder: MarketDataRecorder):
+        self._api = api
+        self.recorder = recorder
+
+    def _call(self, method: str, **params) -> Dict:
+        try:
+            response = getattr(self._api, method)(**params)
+        except Exception as e:
+            self.recorder.record(method, params, error=e)
+            raise
+        self.recorder.record(method, params, response=response)
+        return response
+
+    def get_ticker(self, **params) -> Dict:
+        return self._call('get_ticker', **params)
+
+    def get_orderbook(self, **params) -> Dict:
+        return self._call('get_orderbook', **params)
+
+    def get_candlesticks(self, **params) -> Dict:
+        return self._call('get_candlesticks', **params)
+
+    def get_trades(self, **params) -> Dict:
+        return self._call('get_trades', **params)
+
+    def __getattr__(self, name):
+        # 其余接口直接透传，不录制
+        return getattr(self._api, name)
+
+
+def enable_recording(market_data: OKXMarketData, path: str, fsync: bool = False) -> MarketDataRecorder:
+    """为已有的 OKXMarketData 开启录制，返回录制器以便关闭"""
+    recorder = MarketDataRecorder(path, fsync=fsync)
+    market_data.api = RecordingMarketAPI(market_data.api, recorder)
+    return recorder
+
+
+def iter_recording(path: str) -> Iterator[Dict]:
+    """按录制顺序遍历所有帧，供回测直接消费"""
+    with FrameReader(path) as reader:
+        yield from reader
+
+
+class ReplayMarketAPI:
+    """按录制时间节奏返回响应的 MarketAPI 替身
+
+    每个 (接口, instId) 各自按录制顺序出队；bar/limit 等其他参数沿用录制时的值。
+    speed: 1.0 为原速，N 为 N 倍速，0 表示不等待、尽快回放。
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.path = path
+        self.speed = speed
+        self.reader = FrameReader(path)
+        self._cursor = 0
+        self._pending: Dict[Tuple[str, Optional[str]], Deque[Dict]] = {}
+        self._origin: Optional[Tuple[float, float]] = None  # (录制时间, 回放起点 monotonic)
+        self._lock = threading.Lock()  # OKXMarketData 并发获取各类数据
+        self.replayed = 0
+        logger.info(f"回放文件: {path}，共 {len(self.reader)} 帧，速度: {'最快' if speed <= 0 else f'{speed}x'}")
+
+    def _next_frame(self, key: Tuple[str, Optional[str]]) -> Dict:
+        queue = self._pending.get(key)
+        if queue:
+            return queue.popleft()
+        # 向前扫描，其他请求的帧暂存到各自队列
+        while self._cursor < len(self.reader):
+            frame = self.reader.read(self._cursor)
+            self._cursor += 1
+            frame_key = (frame['m'], frame['p'].get('instId'))
+            if frame_key == key:
+                return frame
+            self._pending.setdefault(frame_key, deque()).append(frame)
+        raise ReplayExhausted(f"录制中没有更多 {key[0]}({key[1]}) 的响应")
+
+    def _pace(self, recorded_at: float):
+        """按录制时间间隔等待，保持与录制时相同的节奏"""
+        if self.speed <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._origin is None:
+                self._origin = (recorded_at, now)
+                return
+        target = self._origin[1] + (recorded_at - self._origin[0]) / self.speed
+        if target > now:
+            time.sleep(target - now)
+
+    def _replay(self, method: str, **params) -> Dict:
+        with self._lock:
+            frame = self._next_frame((method, params.get('instId')))
+            self.replayed += 1
+        self._pace(frame['t'])
+        if 'e' in frame:
+            raise Exception(frame['e'])
+        return frame['r']
+
+    def get_ticker(self, **params) -> Dict:
+        return self._replay('get_ticker', **params)
+
+    def get_orderbook(self, **params) -> Dict:
+        return self._replay('get_orderbook', **params)
+
+    def get_candlesticks(self, **params) -> Dict:
+        return self._replay('get_candlesticks', **params)
+
+    def get_trades(self, **params) -> Dict:
+        return self._replay('get_trades', **params)
+
+    def close(self):
+        self.reader.close()
+
+
+class ReplayMarketData(OKXMarketData):
+    """用录制文件代替实盘 API 的 OKXMarketData"""
+
+    def __init__(self, path: str, speed: float = 1.0):
+        super().__init__(flag="0", api=ReplayMarketAPI(path, speed=speed))
+
+    def close(self):
+        self.api.close()
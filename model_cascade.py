@@ -0,0 +1,82 @@
+"""
+两级模型级联
+
+小模型先给出初判，只有信号足够强（信心度接近阈值、建议开平仓或标记紧急）时才调用大模型确认。
+多数周期只需小模型，平均延迟和调用成本明显下降；会触发提醒的决策仍由大模型给出。
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ACTIONABLE_RECOMMENDATIONS = ('BUY_LONG', 'BUY_SHORT', 'SELL')
+
+STAGE_FAST = "fast"  # 小模型结果即最终结果
+STAGE_CONFIRMED = "confirmed"  # 大模型确认后的结果
+STAGE_UNCONFIRMED = "unconfirmed"  # 需要确认但大模型失败，小模型结果已降级
+
+
+def should_escalate(decision: Dict[str, Any], confidence_threshold: float, margin: float) -> Optional[str]:
+    """返回升级到大模型的原因，不需要升级时返回 None"""
+    recommendation = str(decision.get('recommendation', '')).upper()
+    if recommendation in ACTIONABLE_RECOMMENDATIONS:
+        return f"建议 {recommendation}"
+    if decision.get('urgent_action'):
+        return "紧急操作"
+    confidence = decision.get('confidence') or 0.0
+    if confidence >= confidence_threshold - margin:
+        return f"信心度 {confidence:.0f}% 接近阈值 {confidence_threshold:.0f}%"
+    return None
+
+
+def downgrade_unconfirmed(decision: Dict[str, Any], confidence_threshold: float) -> Dict[str, Any]:
+    """大模型确认失败时，小模型结果不应触发提醒: 信心度压到阈值以下并取消紧急标记"""
+    result = dict(decision)
+    result['confidence'] = min(result.get('confidence') or 0.0, max(0.0, confidence_threshold - 1))
+    result['urgent_action'] = False
+    result['reasoning'] = f"{result.get('reasoning', '')}（大模型确认失败，小模型结果未经确认，信心度已下调）"
+    return result
+
+
+@dataclass
+class CascadeStats:
+    cycles: int = 0
+    escalated: int = 0  # 调用了大模型的周期
+    agreed: int = 0  # 大模型与小模型建议一致
+    overturned: int = 0  # 大模型改变了建议
+    escalation_failures: int = 0
+    fast_failures: int = 0  # 小模型失败，直接使用大模型
+    fast_seconds: float = 0.0
+    big_seconds: float = 0.0
+
+    def record(self, cascade: Dict[str, Any]):
+        self.cycles += 1
+        self.fast_seconds += cascade.get('fast_latency') or 0.0
+        self.big_seconds += cascade.get('big_latency') or 0.0
+        if cascade.get('fast_decision') is None:
+            self.fast_failures += 1
+        if not cascade.get('escalated'):
+            return
+        self.escalated += 1
+        if cascade['stage'] == STAGE_UNCONFIRMED:
+            self.escalation_failures += 1
+        elif cascade.get('fast_decision') is not None:
+            fast = cascade['fast_decision'].get('recommendation')
+            if fast == cascade.get('big_recommendation'):
+                self.agreed += 1
+            else:
+                self.overturned += 1
+
+    @property
+    def escalation_rate(self) -> float:
+        return self.escalated / self.cycles if self.cycles else 0.0
+
+    def format_metrics(self) -> str:
+        confirmed = self.agreed + self.overturned
+        agree_rate = self.agreed / confirmed * 100 if confirmed else 0.0
+        avg_fast = self.fast_seconds / self.cycles if self.cycles else 0.0
+        avg_big = self.big_seconds / self.escalated if self.escalated else 0.0
+        return (f"模型级联 {self.cycles} 个周期，升级 {self.escalated} 次 ({self.escalation_rate * 100:.0f}%) | "
+                f"大模型一致 {agree_rate:.0f}% / 改判 {self.overturned} 次 / 确认失败 {self.escalation_failures} 次 | "
+                f"平均耗时 小模型 {avg_fast:.1f}s，大模型 {avg_big:.1f}s")
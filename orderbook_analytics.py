@@ -0,0 +1,361 @@
+"""
+订单簿分析
+
+对全部已获取的档位做向量化计算，生成紧凑的特征摘要代替逐档文本:
+深度加权失衡、累计深度曲线、微观价格、价差、指定名义金额的冲击成本以及挂单墙识别。
+StreamingOrderBook 支持 OKX books 频道的增量更新。
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NOTIONALS = (10_000.0, 100_000.0, 1_000_000.0)  # USDT
+DEFAULT_DEPTH_BANDS_BPS = (2.0, 5.0, 10.0, 25.0)
+DEFAULT_DECAY_BPS = 5.0
+DEFAULT_WALL_MULTIPLE = 3.0
+
+
+@dataclass
+class SlippageEstimate:
+    notional: float
+    buy_bps: float  # 市价买入相对中间价的冲击成本
+    sell_bps: float
+    buy_filled: bool  # 已获取档位是否足以成交
+    sell_filled: bool
+
+
+@dataclass
+class OrderBookWall:
+    side: str  # bid / ask
+    price: float
+    size: float
+    distance_bps: float
+    multiple: float  # 相对该侧中位挂单量的倍数
+
+
+@dataclass
+class OrderBookFeatures:
+    best_bid: float
+    best_ask: float
+    mid: float
+    spread: float
+    spread_bps: float
+    microprice: float
+    top_imbalance: float  # 一档失衡 (-1 ~ 1，正数买盘占优)
+    weighted_imbalance: float  # 按距离指数衰减加权的全档失衡
+    bid_depth: float  # 全部买盘名义金额(USDT)
+    ask_depth: float
+    levels: int
+    depth_curve: Dict[float, Tuple[float, float]] = field(default_factory=dict)  # bps -> (买, 卖) 累计名义金额
+    slippage: List[SlippageEstimate] = field(default_factory=list)
+    walls: List[OrderBookWall] = field(default_factory=list)
+
+
+def levels_to_array(levels: Sequence) -> np.ndarray:
+    """OKX 档位 [价格, 数量, 废弃, 订单数] -> (n, 2) float64 数组 [价格, 数量]"""
+    if len(levels) == 0:
+        return np.empty((0, 2), dtype=np.float64)
+    return np.array([(level[0], level[1]) for level in levels], dtype=np.float64)
+
+
+def infer_contract_value(ticker: Dict) -> float:
+    """由 24h 成交量推算合约面值
+
+    衍生品的 volCcy24h 以币计、vol24h 以张计，两者之比即每张合约对应的币数；
+    现货的数量本身就是币，返回 1。
+    """
+    try:
+        vol = float(ticker['vol24h'])
+        vol_ccy = float(ticker['volCcy24h'])
+    except (KeyError, TypeError, ValueError):
+        return 1.0
+    return contract_value_from_volume(ticker.get('instId', ''), ticker.get('instType', ''), vol, vol_ccy)
+
+
+def contract_value_from_volume(inst_id: str, inst_type: str, vol: float, vol_ccy: float) -> float:
+    if not inst_id.endswith(('-SWAP', '-FUTURES')) and inst_type not in ('SWAP', 'FUTURES'):
+        return 1.0
+    if not vol > 0 or not vol_ccy > 0:
+        return 1.0
+    return float(f"{vol_ccy / vol:.6g}")
+
+
+def _slippage(prices: np.ndarray, sizes: np.ndarray, mid: float,
+              notionals: np.ndarray, side_sign: float) -> Tuple[np.ndarray, np.ndarray]:
+    """沿单侧档位吃单，返回每个名义金额的冲击成本(bp)和是否完全成交
+
+    side_sign: 买入为 +1（吃卖盘），卖出为 -1（吃买盘）
+    """
+    if len(prices) == 0 or mid <= 0:
+        return np.full(len(notionals), np.nan), np.zeros(len(notionals), dtype=bool)
+    level_notional = prices * sizes
+    cum_notional = np.cumsum(level_notional)
+    cum_size = np.cumsum(sizes)
+    filled = notionals <= cum_notional[-1]
+
+    # 成交跨越的最后一档及之前已完全吃掉的部分
+    idx = np.minimum(np.searchsorted(cum_notional, notionals), len(prices) - 1)
+    prev_notional = np.where(idx > 0, cum_notional[idx - 1], 0.0)
+    prev_size = np.where(idx > 0, cum_size[idx - 1], 0.0)
+    target = np.minimum(notionals, cum_notional[-1])
+    base_filled = prev_size + (target - prev_notional) / prices[idx]
+    avg_price = target / base_filled
+    return side_sign * (avg_price - mid) / mid * 1e4, filled
+
+
+def fill_market_order(levels: np.ndarray, quantity: float, contract_value: float = 1.0) -> Tuple[float, float]:
+    """市价单沿单侧档位吃单成交 quantity（币数），返回 (成交均价, 成交数量)
+
+    levels: (n, 2) [价格, 数量]，从最优价开始；深度不足时只成交已获取档位的数量
+    """
+    if len(levels) == 0 or quantity <= 0:
+        return float('nan'), 0.0
+    prices, sizes = levels[:, 0], levels[:, 1] * contract_value
+    cum_size = np.cumsum(sizes)
+    filled = min(quantity, float(cum_size[-1]))
+    if filled <= 0:
+        return float('nan'), 0.0
+    idx = min(int(np.searchsorted(cum_size, filled)), len(prices) - 1)
+    prev_size = cum_size[idx - 1] if idx > 0 else 0.0
+    cost = float(np.dot(prices[:idx], sizes[:idx])) + (filled - prev_size) * prices[idx]
+    return float(cost / filled), float(filled)
+
+
+def compute_features(bids: np.ndarray, asks: np.ndarray,
+                     contract_value: float = 1.0,
+                     notionals: Sequence[float] = DEFAULT_NOTIONALS,
+                     depth_bands_bps: Sequence[float] = DEFAULT_DEPTH_BANDS_BPS,
+                     decay_bps: float = DEFAULT_DECAY_BPS,
+                     wall_multiple: float = DEFAULT_WALL_MULTIPLE,
+                     max_walls: int = 3) -> Optional[OrderBookFeatures]:
+    """计算订单簿特征
+
+    Args:
+        bids: (n, 2) 买盘 [价格, 数量]，价格从高到低
+        asks: (n, 2) 卖盘 [价格, 数量]，价格从低到高
+        contract_value: 每单位数量对应的币数（合约面值），用于换算名义金额
+        notionals: 估算冲击成本的名义金额(USDT)
+        depth_bands_bps: 累计深度曲线的采样点（距中间价的 bp）
+        decay_bps: 深度加权失衡的衰减尺度，距离每增加 decay_bps 权重降为 1/e
+        wall_multiple: 挂单量超过该侧中位数的倍数视为挂单墙
+    """
+    if len(bids) == 0 or len(asks) == 0:
+        return None
+
+    bid_px, bid_sz = bids[:, 0], bids[:, 1] * contract_value
+    ask_px, ask_sz = asks[:, 0], asks[:, 1] * contract_value
+
+    best_bid, best_ask = bid_px[0], ask_px[0]
+    mid = (best_bid + best_ask) / 2
+    spread = best_ask - best_bid
+    top_total = bid_sz[0] + ask_sz[0]
+    microprice = (best_bid * ask_sz[0] + best_ask * bid_sz[0]) / top_total if top_total > 0 else mid
+    top_imbalance = (bid_sz[0] - ask_sz[0]) / top_total if top_total > 0 else 0.0
+
+    bid_dist = (mid - bid_px) / mid * 1e4
+    ask_dist = (ask_px - mid) / mid * 1e4
+    bid_weight = np.exp(-bid_dist / decay_bps) * bid_sz
+    ask_weight = np.exp(-ask_dist / decay_bps) * ask_sz
+    weighted_total = bid_weight.sum() + ask_weight.sum()
+    weighted_imbalance = (bid_weight.sum() - ask_weight.sum()) / weighted_total if weighted_total > 0 else 0.0
+
+    bid_cum = np.cumsum(bid_px * bid_sz)
+    ask_cum = np.cumsum(ask_px * ask_sz)
+    bands = np.asarray(depth_bands_bps, dtype=np.float64)
+    bid_at = np.searchsorted(bid_dist, bands, side='right')
+    ask_at = np.searchsorted(ask_dist, bands, side='right')
+    bid_band = np.where(bid_at > 0, bid_cum[np.maximum(bid_at - 1, 0)], 0.0)
+    ask_band = np.where(ask_at > 0, ask_cum[np.maximum(ask_at - 1, 0)], 0.0)
+    depth_curve = {float(b): (float(bv), float(av)) for b, bv, av in zip(bands, bid_band, ask_band)}
+
+    notional_arr = np.asarray(notionals, dtype=np.float64)
+    buy_bps, buy_filled = _slippage(ask_px, ask_sz, mid, notional_arr, 1.0)
+    sell_bps, sell_filled = _slippage(bid_px, bid_sz, mid, notional_arr, -1.0)
+    slippage = [
+        SlippageEstimate(float(n), float(b), float(s), bool(bf), bool(sf))
+        for n, b, s, bf, sf in zip(notional_arr, buy_bps, sell_bps, buy_filled, sell_filled)
+    ]
+
+    walls = _detect_walls(bid_px, bid_sz, bid_dist, 'bid', wall_multiple) + \
+        _detect_walls(ask_px, ask_sz, ask_dist, 'ask', wall_multiple)
+    walls.sort(key=lambda w: w.multiple, reverse=True)
+
+    return OrderBookFeatures(
+        best_bid=float(best_bid),
+        best_ask=float(best_ask),
+        mid=float(mid),
+        spread=float(spread),
+        spread_bps=float(spread / mid * 1e4),
+        microprice=float(microprice),
+        top_imbalance=float(top_imbalance),
+        weighted_imbalance=float(weighted_imbalance),
+        bid_depth=float(bid_cum[-1]),
+        ask_depth=float(ask_cum[-1]),
+        levels=int(min(len(bids), len(asks))),
+        depth_curve=depth_curve,
+        slippage=slippage,
+        walls=walls[:max_walls],
+    )
+
+
+def _detect_walls(prices: np.ndarray, sizes: np.ndarray, distances: np.ndarray,
+                  side: str, wall_multiple: float) -> List[OrderBookWall]:
+    median = np.median(sizes)
+    if median <= 0:
+        return []
+    multiples = sizes / median
+    idx = np.nonzero(multiples >= wall_multiple)[0]
+    return [OrderBookWall(side, float(prices[i]), float(sizes[i]), float(distances[i]), float(multiples[i]))
+            for i in idx]
+
+
+def analyze_orderbook(orderbook: Dict, ticker: Optional[Dict] = None, **kwargs) -> Optional[OrderBookFeatures]:
+    """直接对 OKX books 响应中的 data[0] 计算特征"""
+    contract_value = infer_contract_value(ticker) if ticker else 1.0
+    return compute_features(levels_to_array(orderbook.get('bids', [])),
+                            levels_to_array(orderbook.get('asks', [])),
+                            contract_value=contract_value, **kwargs)
+
+
+def _format_notional(value: float) -> str:
+    if value >= 1e6:
+        return f"{value / 1e6:.3g}M"
+    if value >= 1e3:
+        return f"{value / 1e3:.3g}K"
+    return f"{value:.0f}"
+
+
+def format_features(features: Optional[OrderBookFeatures]) -> str:
+    """生成写入提示词的紧凑文本"""
+    if features is None:
+        return "无深度数据"
+
+    def lean(value: float) -> str:
+        if value > 0.1:
+            return "买盘占优"
+        if value < -0.1:
+            return "卖盘占优"
+        return "均衡"
+
+    lines = [
+        f"- 价差: {features.spread:.4g} ({features.spread_bps:.2f}bp) | 中间价: {features.mid:.6g} | "
+        f"微观价格: {features.microprice:.6g}",
+        f"- 深度加权失衡({features.levels}档): {features.weighted_imbalance:+.2f} ({lean(features.weighted_imbalance)}) | "
+        f"一档失衡: {features.top_imbalance:+.2f}",
+        f"- 总深度(USDT): 买 {_format_notional(features.bid_depth)} / 卖 {_format_notional(features.ask_depth)}",
+    ]
+
+    curve = " | ".join(f"±{bps:g}bp 买{_format_notional(b)}/卖{_format_notional(a)}"
+                       for bps, (b, a) in features.depth_curve.items())
+    if curve:
+        lines.append(f"- 累计深度: {curve}")
+
+    costs = []
+    for est in features.slippage:
+        buy = f"{est.buy_bps:.1f}bp" + ("" if est.buy_filled else "(深度不足)")
+        sell = f"{est.sell_bps:.1f}bp" + ("" if est.sell_filled else "(深度不足)")
+        costs.append(f"{_format_notional(est.notional)} 买{buy}/卖{sell}")
+    if costs:
+        lines.append(f"- 冲击成本: {' | '.join(costs)}")
+
+    if features.walls:
+        walls = "; ".join(f"{'买' if w.side == 'bid' else '卖'}墙 {w.price:.6g} (量{w.size:.4g}, "
+                          f"距离{w.distance_bps:.1f}bp, {w.multiple:.1f}倍中位数)" for w in features.walls)
+        lines.append(f"- 挂单墙: {walls}")
+    else:
+        lines.append("- 挂单墙: 无")
+
+    return "\n".join(lines)
+
+
+class StreamingOrderBook:
+    """维护增量更新的订单簿
+
+    对应 OKX books 频道: action=snapshot 全量替换，action=update 时数量为 0 表示删除该价位。
+    两侧都以升序数组存储（买盘用负价格），批量增量通过 searchsorted 合并。
+    """
+
+    def __init__(self, inst_id: str, max_levels: int = 400):
+        self.inst_id = inst_id
+        self.max_levels = max_levels
+        self._bid_keys = np.empty(0)  # -价格，升序
+        self._bid_sizes = np.empty(0)
+        self._ask_keys = np.empty(0)  # 价格，升序
+        self._ask_sizes = np.empty(0)
+        self.seq_id: Optional[int] = None
+        self.ts: Optional[int] = None
+        self.needs_resync = True
+        self._features: Optional[OrderBookFeatures] = None
+        self._features_cv = 1.0
+
+    def apply_snapshot(self, book: Dict):
+        bids = levels_to_array(book.get('bids', []))
+        asks = levels_to_array(book.get('asks', []))
+        bid_order = np.argsort(-bids[:, 0]) if len(bids) else np.empty(0, dtype=int)
+        ask_order = np.argsort(asks[:, 0]) if len(asks) else np.empty(0, dtype=int)
+        self._bid_keys, self._bid_sizes = -bids[bid_order, 0], bids[bid_order, 1]
+        self._ask_keys, self._ask_sizes = asks[ask_order, 0], asks[ask_order, 1]
+        self._set_seq(book)
+        self.needs_resync = False
+        self._features = None
+
+    def apply_update(self, book: Dict):
+        """应用增量；序号不连续时标记需要重新获取快照"""
+        prev_seq = book.get('prevSeqId')
+        if self.needs_resync:
+            return
+        if prev_seq is not None and self.seq_id is not None and int(prev_seq) != self.seq_id:
+            logger.warning(f"{self.inst_id} 订单簿序号不连续 ({prev_seq} != {self.seq_id})，需要重新获取快照")
+            self.needs_resync = True
+            return
+        bids = levels_to_array(book.get('bids', []))
+        asks = levels_to_array(book.get('asks', []))
+        if len(bids):
+            self._bid_keys, self._bid_sizes = self._merge(self._bid_keys, self._bid_sizes, -bids[:, 0], bids[:, 1])
+        if len(asks):
+            self._ask_keys, self._ask_sizes = self._merge(self._ask_keys, self._ask_sizes, asks[:, 0], asks[:, 1])
+        self._set_seq(book)
+        self._features = None
+
+    def _merge(self, keys: np.ndarray, sizes: np.ndarray,
+               new_keys: np.ndarray, new_sizes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(new_keys, kind='stable')
+        new_keys, new_sizes = new_keys[order], new_sizes[order]
+        idx = np.searchsorted(keys, new_keys)
+        exists = (idx < len(keys)) & (keys[np.minimum(idx, len(keys) - 1)] == new_keys) if len(keys) else \
+            np.zeros(len(new_keys), dtype=bool)
+
+        sizes = sizes.copy()
+        sizes[idx[exists]] = new_sizes[exists]
+        insert = ~exists & (new_sizes > 0)
+        keys = np.insert(keys, idx[insert], new_keys[insert])
+        sizes = np.insert(sizes, idx[insert], new_sizes[insert])
+
+        keep = sizes > 0
+        keys, sizes = keys[keep], sizes[keep]
+        return keys[:self.max_levels], sizes[:self.max_levels]
+
+    def _set_seq(self, book: Dict):
+        if book.get('seqId') is not None:
+            self.seq_id = int(book['seqId'])
+        if book.get('ts') is not None:
+            self.ts = int(book['ts'])
+
+    @property
+    def bids(self) -> np.ndarray:
+        return np.column_stack((-self._bid_keys, self._bid_sizes))
+
+    @property
+    def asks(self) -> np.ndarray:
+        return np.column_stack((self._ask_keys, self._ask_sizes))
+
+    def features(self, contract_value: float = 1.0) -> Optional[OrderBookFeatures]:
+        """带缓存的特征计算，簿面未变化时直接复用"""
+        if self._features is None or self._features_cv != contract_value:
+            self._features = compute_features(self.bids, self.asks, contract_value=contract_value)
+            self._features_cv = contract_value
+        return self._features
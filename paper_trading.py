@@ -0,0 +1,457 @@
+"""
+模拟交易（纸面交易）
+
+把 run_analysis_cycle 的决策（BUY_LONG/BUY_SHORT/SELL/ADJUST_STOPS）按获取到的订单簿档位模拟成交，
+计入吃单滑点和手续费，自动维护持仓文件（与 positions.json 格式相同，分析器据此看到模拟持仓）。
+止盈止损按逐笔成交和行情轮询触发；每个交易对预先算好最近的上下触发价，
+每个价格只需两次比较，未触及时不加锁、不做其他计算，可以承受多交易对的高频行情。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from market_model import NormalizedMarketData
+from orderbook_analytics import fill_market_order
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+DIRECTION_LONG = "long"
+DIRECTION_SHORT = "short"
+
+EXIT_TAKE_PROFIT = "take_profit"
+EXIT_STOP_LOSS = "stop_loss"
+EXIT_SIGNAL = "signal"  # SELL 或反向开仓
+
+
+def inst_type_of(inst_id: str) -> str:
+    """由交易对ID推断产品类型（用于批量获取行情）"""
+    if inst_id.endswith('-SWAP'):
+        return "SWAP"
+    if inst_id.count('-') == 1:
+        return "SPOT"
+    return "FUTURES"
+
+
+def _price(value: Any) -> Optional[float]:
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if price > 0 else None
+
+
+@dataclass
+class PaperPosition:
+    """字段与 positions.json 一致，额外记录手续费和开仓时的滑点"""
+    inst_id: str
+    direction: str
+    size: float  # 币数
+    entry_price: float
+    leverage: float
+    take_profit: Optional[float]
+    stop_loss: Optional[float]
+    open_time: str
+    entry_fee: float = 0.0
+    exit_slippage_bps: float = 0.0  # 按最近一次订单簿估算的平仓滑点，止盈止损触发时使用
+    opened_ms: int = 0  # 开仓时间（毫秒时间戳），更早的逐笔成交不参与止盈止损判断
+
+    @property
+    def sign(self) -> int:
+        return 1 if self.direction == DIRECTION_LONG else -1
+
+    def triggered(self, price: float) -> Optional[str]:
+        if self.direction == DIRECTION_LONG:
+            if self.stop_loss is not None and price <= self.stop_loss:
+                return EXIT_STOP_LOSS
+            if self.take_profit is not None and price >= self.take_profit:
+                return EXIT_TAKE_PROFIT
+        else:
+            if self.stop_loss is not None and price >= self.stop_loss:
+                return EXIT_STOP_LOSS
+            if self.take_profit is not None and price <= self.take_profit:
+                return EXIT_TAKE_PROFIT
+        return None
+
+
+@dataclass
+class PaperTrade:
+    """一笔已平仓的模拟交易"""
+    inst_id: str
+    direction: str
+    size: float
+    entry_price: float
+    exit_price: float
+    open_time: str
+    close_time: str
+    reason: str
+    fees: float
+    pnl: float  # 扣除手续费后的盈亏（USDT）
+
+
+@dataclass
+class PaperStats:
+    opened: int = 0
+    closed: int = 0
+    wins: int = 0
+    realized_pnl: float = 0.0
+    fees: float = 0.0
+    slippage_cost: float = 0.0  # 相对中间价的滑点成本（USDT）
+    ignored: int = 0  # 信心度不足或已有同向持仓而未执行的决策
+    exits: Dict[str, int] = field(default_factory=dict)
+
+
+class PaperTradingEngine:
+    """模拟交易引擎，多个交易对（多个机器人）共享一个实例"""
+
+    def __init__(self, positions_file: str = "paper_positions.json", trades_file: str = "paper_trades.jsonl",
+                 order_notional: float = 1000.0, leverage: float = 10.0, taker_fee_bps: float = 5.0):
+        """
+        Args:
+            positions_file: 持仓文件（positions.json 格式），启动时加载已有的模拟持仓
+            trades_file: 已平仓交易，每行一笔 JSON
+            order_notional: 每次开仓的名义金额（USDT）
+            taker_fee_bps: 吃单手续费（bp），开平仓各收一次
+        """
+        self.positions_file = positions_file
+        self.trades_file = trades_file
+        self.order_notional = order_notional
+        self.leverage = leverage
+        self.taker_fee_bps = taker_fee_bps
+        self.stats = PaperStats()
+        self.marks: Dict[str, float] = {}  # 最近价格，用于计算浮动盈亏
+        self._positions: Dict[str, List[PaperPosition]] = {}
+        self._bounds: Dict[str, Tuple[float, float]] = {}  # 交易对 -> (最低的上方触发价, 最高的下方触发价)
+        self._last_trade_id: Dict[str, int] = {}  # 交易对 -> 已处理的最大 tradeId，每周期的成交有重叠
+        self._lock = threading.RLock()
+        self._tick_thread: Optional[threading.Thread] = None
+        self._load()
+
+    # ---- 持仓文件 ----
+
+    def _load(self):
+        if not os.path.exists(self.positions_file):
+            return
+        try:
+            with open(self.positions_file, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+            for row in rows:
+                position = PaperPosition(**{k: row.get(k) for k in PaperPosition.__dataclass_fields__ if k in row})
+                self._positions.setdefault(position.inst_id, []).append(position)
+            for inst_id in self._positions:
+                self._update_bounds(inst_id)
+            logger.info(f"加载模拟持仓 {len(rows)} 个: {self.positions_file}")
+        except Exception as e:
+            logger.error(f"加载模拟持仓失败: {e}")
+
+    def _save(self):
+        """整体写入临时文件后替换，分析器读取时不会看到写了一半的文件"""
+        rows = [asdict(p) for positions in self._positions.values() for p in positions]
+        tmp_path = self.positions_file + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.positions_file)
+
+    def _append_trade(self, trade: PaperTrade):
+        with open(self.trades_file, 'a', encoding='utf-8') as f:
+            f.write(dumps(asdict(trade)) + "\n")
+
+    def positions(self, inst_id: Optional[str] = None) -> List[PaperPosition]:
+        with self._lock:
+            if inst_id is not None:
+                return list(self._positions.get(inst_id, []))
+            return [p for positions in self._positions.values() for p in positions]
+
+    def watched(self) -> List[str]:
+        """有持仓、需要跟踪止盈止损的交易对"""
+        return list(self._bounds)
+
+    def _update_bounds(self, inst_id: str):
+        upper, lower = float('inf'), float('-inf')
+        for p in self._positions.get(inst_id, []):
+            above, below = (p.take_profit, p.stop_loss) if p.sign > 0 else (p.stop_loss, p.take_profit)
+            if above is not None:
+                upper = min(upper, above)
+            if below is not None:
+                lower = max(lower, below)
+        if upper == float('inf') and lower == float('-inf'):
+            self._bounds.pop(inst_id, None)
+        else:
+            self._bounds[inst_id] = (upper, lower)
+
+    # ---- 决策 ----
+
+    def on_decision(self, inst_id: str, decision: Dict[str, Any], market_data: NormalizedMarketData,
+                    strategy: Dict[str, Any], confidence_threshold: float) -> List[str]:
+        """执行一个分析决策，返回执行的动作说明（未执行时为空）"""
+        recommendation = str(decision.get('recommendation', '')).upper()
+        if recommendation not in ('BUY_LONG', 'BUY_SHORT', 'SELL', 'ADJUST_STOPS'):
+            return []
+        if (decision.get('confidence') or 0) < confidence_threshold and not decision.get('urgent_action'):
+            self.stats.ignored += 1
+            return []
+
+        actions = []
+        with self._lock:
+            self.marks[inst_id] = market_data.price
+            if recommendation == 'SELL':
+                actions += self._close_all(inst_id, market_data, EXIT_SIGNAL)
+            elif recommendation == 'ADJUST_STOPS':
+                actions += self._adjust_stops(inst_id, decision.get('stop_adjustment') or {}, market_data.price)
+            else:
+                direction = DIRECTION_LONG if recommendation == 'BUY_LONG' else DIRECTION_SHORT
+                opposite = [p for p in self._positions.get(inst_id, []) if p.direction != direction]
+                if opposite:
+                    actions += self._close(inst_id, opposite, market_data, EXIT_SIGNAL)
+                if any(p.direction == direction for p in self._positions.get(inst_id, [])):
+                    self.stats.ignored += 1  # 不加仓
+                else:
+                    actions += self._open(inst_id, direction, decision, market_data, strategy)
+            if actions:
+                self._update_bounds(inst_id)
+                self._save()
+        for action in actions:
+            logger.info(f"[模拟交易] {action}")
+        return actions
+
+    def _open(self, inst_id: str, direction: str, decision: Dict[str, Any],
+              market_data: NormalizedMarketData, strategy: Dict[str, Any]) -> List[str]:
+        sign = 1 if direction == DIRECTION_LONG else -1
+        levels = market_data.asks if sign > 0 else market_data.bids
+        contract_value = market_data.ticker.contract_value
+        quantity = self.order_notional / market_data.price
+        price, filled = fill_market_order(levels, quantity, contract_value)
+        if filled <= 0:
+            logger.warning(f"[模拟交易] {inst_id} 订单簿为空，按最新价 {market_data.price} 成交")
+            price, filled = market_data.price, quantity
+        elif filled < quantity:
+            logger.warning(f"[模拟交易] {inst_id} 已获取档位深度不足，只成交 {filled:.6g}/{quantity:.6g}")
+
+        take_profit, stop_loss = _price(decision.get('take_profit')), _price(decision.get('stop_loss'))
+        # LLM 给出的止盈止损在错误的一侧时按策略百分比计算
+        if not take_profit or (take_profit - price) * sign <= 0:
+            take_profit = price * (1 + sign * strategy['profit_target'] / 100)
+        if not stop_loss or (price - stop_loss) * sign <= 0:
+            stop_loss = price * (1 - sign * strategy['stop_loss'] / 100)
+
+        fee = price * filled * self.taker_fee_bps / 1e4
+        trades = market_data.trades
+        if len(trades):
+            # 开仓前（含本周期已获取）的成交不应触发新持仓的止盈止损
+            self._last_trade_id[inst_id] = max(self._last_trade_id.get(inst_id, 0), int(trades['trade_id'][-1]))
+        position = PaperPosition(
+            inst_id=inst_id, direction=direction, size=filled, entry_price=price, leverage=self.leverage,
+            take_profit=float(take_profit), stop_loss=float(stop_loss),
+            open_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), entry_fee=fee,
+            exit_slippage_bps=self._exit_slippage_bps(market_data, direction, filled),
+            opened_ms=max(int(time.time() * 1000), int(trades['ts'][-1]) if len(trades) else 0),
+        )
+        self._positions.setdefault(inst_id, []).append(position)
+        self.stats.opened += 1
+        self.stats.fees += fee
+        mid = self._mid(market_data)
+        self.stats.slippage_cost += abs(price - mid) * filled
+        return [f"开{'多' if sign > 0 else '空'} {inst_id} {filled:.6g} @ {price:.6g}"
+                f"（止盈 {take_profit:.6g} / 止损 {stop_loss:.6g}，手续费 {fee:.4f}）"]
+
+    def _adjust_stops(self, inst_id: str, adjustment: Dict[str, Any], price: float) -> List[str]:
+        actions = []
+        for p in self._positions.get(inst_id, []):
+            new_tp, new_sl = _price(adjustment.get('new_take_profit')), _price(adjustment.get('new_stop_loss'))
+            # 只接受在当前价格正确一侧的新价位，否则会立即触发
+            if new_tp and (new_tp - price) * p.sign > 0:
+                p.take_profit = new_tp
+            if new_sl and (price - new_sl) * p.sign > 0:
+                p.stop_loss = new_sl
+            actions.append(f"调整 {inst_id} {p.direction} 止盈 {p.take_profit:.6g} / 止损 {p.stop_loss:.6g}")
+        return actions
+
+    def _close_all(self, inst_id: str, market_data: NormalizedMarketData, reason: str) -> List[str]:
+        return self._close(inst_id, list(self._positions.get(inst_id, [])), market_data, reason)
+
+    def _close(self, inst_id: str, positions: Sequence[PaperPosition], market_data: NormalizedMarketData,
+               reason: str) -> List[str]:
+        actions = []
+        for p in positions:
+            levels = market_data.bids if p.sign > 0 else market_data.asks
+            price, filled = fill_market_order(levels, p.size, market_data.ticker.contract_value)
+            if filled <= 0:
+                price = market_data.price  # 订单簿为空；深度不足时剩余部分按已获取档位的均价估算
+            actions.append(self._record_exit(p, price, reason))
+        return actions
+
+    def _record_exit(self, position: PaperPosition, price: float, reason: str) -> str:
+        fee = price * position.size * self.taker_fee_bps / 1e4
+        fees = position.entry_fee + fee
+        pnl = (price - position.entry_price) * position.size * position.sign - fees
+        trade = PaperTrade(
+            inst_id=position.inst_id, direction=position.direction, size=position.size,
+            entry_price=position.entry_price, exit_price=price, open_time=position.open_time,
+            close_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), reason=reason, fees=fees, pnl=pnl,
+        )
+        self._positions[position.inst_id].remove(position)
+        if not self._positions[position.inst_id]:
+            del self._positions[position.inst_id]
+        self.stats.closed += 1
+        self.stats.wins += pnl > 0
+        self.stats.realized_pnl += pnl
+        self.stats.fees += fee
+        self.stats.exits[reason] = self.stats.exits.get(reason, 0) + 1
+        try:
+            self._append_trade(trade)
+        except Exception as e:
+            logger.error(f"写入模拟交易记录失败: {e}")
+        return (f"平{'多' if position.sign > 0 else '空'} {position.inst_id} {position.size:.6g} @ {price:.6g}"
+                f"（{reason}，盈亏 {pnl:+.4f} USDT）")
+
+    @staticmethod
+    def _mid(market_data: NormalizedMarketData) -> float:
+        if len(market_data.bids) and len(market_data.asks):
+            return (market_data.bids[0, 0] + market_data.asks[0, 0]) / 2
+        return market_data.price
+
+    def _exit_slippage_bps(self, market_data: NormalizedMarketData, direction: str, size: float) -> float:
+        """平仓时相对最优价的滑点（bp），止盈止损在行情轮询中触发时没有订单簿，按此估算"""
+        levels = market_data.bids if direction == DIRECTION_LONG else market_data.asks
+        price, filled = fill_market_order(levels, size, market_data.ticker.contract_value)
+        if filled <= 0:
+            return 0.0
+        return float(abs(price - levels[0, 0]) / levels[0, 0] * 1e4)
+
+    # ---- 行情 ----
+
+    def on_tick(self, inst_id: str, price: float, ts: Optional[int] = None) -> List[str]:
+        """逐个价格检查止盈止损（最新价或逐笔成交价）；ts 为成交时间，不早于开仓时间的持仓才参与判断"""
+        bounds = self._bounds.get(inst_id)
+        self.marks[inst_id] = price
+        if bounds is None or bounds[1] < price < bounds[0]:
+            return []
+        with self._lock:
+            actions = []
+            for p in list(self._positions.get(inst_id, [])):
+                if ts is not None and ts <= p.opened_ms:
+                    continue
+                reason = p.triggered(price)
+                if reason is None:
+                    continue
+                # 止盈止损触发后按市价平仓: 以触发价成交（跳空时为更差的当前价），再计入滑点
+                level = p.take_profit if reason == EXIT_TAKE_PROFIT else p.stop_loss
+                fill = min(price, level) if p.sign > 0 else max(price, level)
+                fill *= 1 - p.sign * p.exit_slippage_bps / 1e4
+                actions.append(self._record_exit(p, fill, reason))
+            if actions:
+                self._update_bounds(inst_id)
+                self._save()
+        for action in actions:
+            logger.info(f"[模拟交易] {action}")
+        return actions
+
+    def on_trades(self, inst_id: str, trades: np.ndarray) -> List[str]:
+        """
+        按 tradeId 升序的逐笔成交（TRADE_DTYPE）；每周期获取的最近成交与上一周期重叠，
+        只处理 tradeId 大于已处理值、且晚于最早持仓开仓时间的成交。
+        先用向量化判断整批是否越过触发价，只有越过时才逐笔处理。
+        """
+        if len(trades) == 0:
+            return []
+        last_id = self._last_trade_id.get(inst_id, 0)
+        self._last_trade_id[inst_id] = max(last_id, int(trades['trade_id'][-1]))
+        self.marks[inst_id] = float(trades['px'][-1])
+        bounds = self._bounds.get(inst_id)
+        if bounds is None:
+            return []
+        opened_ms = min((p.opened_ms for p in self._positions.get(inst_id, [])), default=0)
+        prices = trades['px']
+        crossed = np.flatnonzero((trades['trade_id'] > last_id) & (trades['ts'] > opened_ms)
+                                 & ((prices >= bounds[0]) | (prices <= bounds[1])))
+        actions = []
+        for i in crossed:
+            actions += self.on_tick(inst_id, float(prices[i]), int(trades['ts'][i]))
+            if inst_id not in self._bounds:
+                break
+        self.marks[inst_id] = float(prices[-1])
+        return actions
+
+    def start_tick_loop(self, fetch_tickers: Callable[[Iterable[str]], Dict[str, float]], interval: float = 2.0):
+        """后台轮询有持仓交易对的最新价（多个交易对共享一个线程，重复调用无效）"""
+        with self._lock:
+            if self._tick_thread is not None:
+                return
+            self._tick_thread = threading.Thread(target=self._tick_loop, args=(fetch_tickers, interval),
+                                                 name="paper-ticks", daemon=True)
+            self._tick_thread.start()
+        logger.info(f"模拟交易止盈止损轮询已启动，间隔 {interval}秒")
+
+    def _tick_loop(self, fetch_tickers: Callable[[Iterable[str]], Dict[str, float]], interval: float):
+        while True:
+            started = time.monotonic()
+            watched = self.watched()
+            if watched:
+                try:
+                    for inst_id, price in fetch_tickers(watched).items():
+                        self.on_tick(inst_id, price)
+                except Exception as e:
+                    logger.warning(f"模拟交易行情轮询失败: {e}")
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    # ---- 统计 ----
+
+    def unrealized_pnl(self) -> float:
+        with self._lock:
+            return sum((self.marks.get(p.inst_id, p.entry_price) - p.entry_price) * p.size * p.sign
+                       for positions in self._positions.values() for p in positions)
+
+    def format_metrics(self) -> str:
+        s = self.stats
+        win_rate = s.wins / s.closed * 100 if s.closed else 0.0
+        exits = ", ".join(f"{reason} {count}" for reason, count in s.exits.items()) or "无"
+        return (f"模拟交易: 开仓 {s.opened} / 平仓 {s.closed}（胜率 {win_rate:.0f}%，{exits}）| "
+                f"已实现 {s.realized_pnl:+.2f} USDT，浮动 {self.unrealized_pnl():+.2f} USDT | "
+                f"手续费 {s.fees:.2f}，滑点 {s.slippage_cost:.2f} | 持仓 {len(self.positions())} 个，未执行 {s.ignored}")
+
+
+def make_ticker_fetcher(market_data) -> Callable[[Iterable[str]], Dict[str, float]]:
+    """按产品类型批量获取最新价: 同类多个交易对只发一次 get_tickers，数据源不支持时逐个获取"""
+    def fetch(inst_ids: Iterable[str]) -> Dict[str, float]:
+        by_type: Dict[str, List[str]] = {}
+        for inst_id in inst_ids:
+            by_type.setdefault(inst_type_of(inst_id), []).append(inst_id)
+        prices: Dict[str, float] = {}
+        for inst_type, ids in by_type.items():
+            if len(ids) > 1 and hasattr(market_data, 'get_tickers'):
+                try:
+                    wanted = set(ids)
+                    for row in market_data.get_tickers(inst_type)['data']:
+                        if row.get('instId') in wanted:
+                            prices[row['instId']] = float(row['last'])
+                    continue
+                except Exception as e:
+                    logger.debug(f"批量获取行情失败，改为逐个获取: {e}")
+            for inst_id in ids:
+                prices[inst_id] = float(market_data.get_ticker(inst_id)['data'][0]['last'])
+        return prices
+
+    return fetch
+
+
+_shared_engine: Optional[PaperTradingEngine] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_engine(settings) -> PaperTradingEngine:
+    """进程内共享的模拟交易引擎（同一个持仓文件只能有一个写入者）"""
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None:
+            _shared_engine = PaperTradingEngine(
+                settings.positions_file, settings.trades_file, order_notional=settings.order_notional,
+                leverage=settings.leverage, taker_fee_bps=settings.taker_fee_bps,
+            )
+        return _shared_engine
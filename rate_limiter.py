@@ -0,0 +1,296 @@
+"""
+OKX 请求调度器
+
+每个接口一个令牌桶（按 OKX 公共接口限速设置），外加一个全局令牌桶；
+等待令牌时按优先级出队（行情 > 深度 > 成交 > K线），低优先级等待时间更短、更早回退到缓存。
+相同 (接口, 参数) 的并发请求合并为一次实际调用（合并等待有上限，发起请求的线程卡住时回退到缓存）。
+被限速（本地等待超时或 OKX 返回 50011）时返回该请求最近一次成功的结果。
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_CODES = ("50011", "50061")  # 请求过于频繁 / 子账户限速
+UTILIZATION_WINDOW = 10.0  # 计算预算使用率的时间窗口（秒）
+REQUEST_TIMEOUT = 10.0  # 合并等待时对单次实际请求耗时的估计上限（秒）
+
+
+class ThrottledError(Exception):
+    """请求被限速且没有可用的缓存结果"""
+
+
+@dataclass
+class EndpointBudget:
+    capacity: int  # 桶容量（突发上限）
+    refill_per_sec: float
+    priority: int  # 越小越优先
+    max_wait: float  # 等待令牌的最长时间（秒）
+    max_cache_age: float = 300.0  # 限速回退时可接受的缓存年龄（秒）
+
+
+# OKX 公共行情接口限速（按IP）: ticker/tickers 20次/2s，books 40次/2s，candles 40次/2s，trades 100次/2s
+DEFAULT_BUDGETS: Dict[str, EndpointBudget] = {
+    'get_ticker': EndpointBudget(capacity=20, refill_per_sec=10.0, priority=0, max_wait=2.0),
+    'get_tickers': EndpointBudget(capacity=20, refill_per_sec=10.0, priority=0, max_wait=2.0),
+    'get_orderbook': EndpointBudget(capacity=40, refill_per_sec=20.0, priority=1, max_wait=1.5),
+    'get_trades': EndpointBudget(capacity=100, refill_per_sec=50.0, priority=2, max_wait=1.0),
+    'get_candlesticks': EndpointBudget(capacity=40, refill_per_sec=20.0, priority=3, max_wait=0.5),
+}
+DEFAULT_GLOBAL_BUDGET = EndpointBudget(capacity=100, refill_per_sec=50.0, priority=0, max_wait=0.0)
+
+
+class TokenBucket:
+    """令牌桶（调用方负责加锁）"""
+
+    def __init__(self, capacity: int, refill_per_sec: float):
+        self.capacity = float(capacity)
+        self.refill_per_sec = refill_per_sec
+        self.tokens = float(capacity)
+        self._last = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self._last
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_sec)
+            self._last = now
+
+    def wait_time(self, now: float) -> float:
+        """还需要等待多久才有一个令牌"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_sec
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def drain(self, now: float, penalty: float = 1.0):
+        """服务端限速时清空令牌，并额外惩罚 penalty 秒"""
+        self._refill(now)
+        self.tokens = -penalty * self.refill_per_sec
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.local_throttled = 0  # 本地等待超时
+        self.remote_throttled = 0  # OKX 返回限速
+        self.cache_fallbacks = 0
+        self.errors = 0
+        self.wait_seconds = 0.0
+        self.recent: Deque[float] = deque()  # 最近实际发出请求的时间
+
+    def mark_sent(self, now: float):
+        self.recent.append(now)
+        while self.recent and self.recent[0] < now - UTILIZATION_WINDOW:
+            self.recent.popleft()
+
+
+def _request_key(endpoint: str, params: Dict) -> Tuple:
+    return (endpoint,) + tuple(sorted(params.items()))
+
+
+class RequestScheduler:
+    """线程安全的限速调度器，多个 OKXMarketData 实例可共享同一个调度器"""
+
+    def __init__(self, budgets: Optional[Dict[str, EndpointBudget]] = None,
+                 global_budget: Optional[EndpointBudget] = DEFAULT_GLOBAL_BUDGET,
+                 request_timeout: float = REQUEST_TIMEOUT):
+        """
+        Args:
+            request_timeout: 合并到其他线程请求上的调用最多等待 max_wait + request_timeout 秒，
+                发起请求的线程卡住时其余线程不会跟着无限等待
+        """
+        self.request_timeout = request_timeout
+        self.budgets = dict(budgets or DEFAULT_BUDGETS)
+        self._buckets = {name: TokenBucket(b.capacity, b.refill_per_sec) for name, b in self.budgets.items()}
+        self._global = TokenBucket(global_budget.capacity, global_budget.refill_per_sec) if global_budget else None
+        self._cond = threading.Condition()
+        self._waiters: List[Tuple[int, int, str]] = []  # (优先级, 序号, 接口)
+        self._seq = itertools.count()
+        self._inflight: Dict[Tuple, Future] = {}
+        self._cache: Dict[Tuple, Tuple[Any, float]] = {}
+        self._metrics: Dict[str, EndpointMetrics] = {name: EndpointMetrics() for name in self.budgets}
+
+    def _budget(self, endpoint: str) -> EndpointBudget:
+        if endpoint not in self.budgets:
+            # 未配置的接口使用最低优先级的默认预算
+            self.budgets[endpoint] = EndpointBudget(capacity=20, refill_per_sec=10.0, priority=9, max_wait=1.0)
+            self._buckets[endpoint] = TokenBucket(20, 10.0)
+            self._metrics[endpoint] = EndpointMetrics()
+        return self.budgets[endpoint]
+
+    def execute(self, endpoint: str, params: Dict, call: Callable[[], Dict]) -> Dict:
+        """按预算执行一次请求"""
+        key = _request_key(endpoint, params)
+        with self._cond:
+            budget = self._budget(endpoint)
+            metrics = self._metrics[endpoint]
+            metrics.requests += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                metrics.coalesced += 1
+                owner = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+
+        if not owner:
+            try:
+                return future.result(timeout=budget.max_wait + self.request_timeout)
+            except FutureTimeoutError:
+                with self._cond:
+                    metrics.errors += 1
+                return self._fallback(endpoint, key, budget, metrics, "合并的请求超时")
+
+        try:
+            result = self._execute(endpoint, key, budget, metrics, call)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._cond:
+                self._inflight.pop(key, None)
+
+    def _execute(self, endpoint: str, key: Tuple, budget: EndpointBudget,
+                 metrics: EndpointMetrics, call: Callable[[], Dict]) -> Dict:
+        if not self._acquire(endpoint, budget, metrics):
+            with self._cond:
+                metrics.local_throttled += 1
+            return self._fallback(endpoint, key, budget, metrics, "本地预算耗尽")
+
+        try:
+            result = call()
+        except Exception:
+            with self._cond:
+                metrics.errors += 1
+            raise
+
+        if isinstance(result, dict) and result.get('code') in THROTTLE_CODES:
+            with self._cond:
+                metrics.remote_throttled += 1
+                self._buckets[endpoint].drain(time.monotonic())
+            return self._fallback(endpoint, key, budget, metrics, f"OKX限速: {result.get('msg')}")
+
+        if isinstance(result, dict) and result.get('code') == '0':
+            with self._cond:
+                self._cache[key] = (result, time.time())
+        return result
+
+    def _fallback(self, endpoint: str, key: Tuple, budget: EndpointBudget,
+                  metrics: EndpointMetrics, reason: str) -> Dict:
+        with self._cond:
+            cached = self._cache.get(key)
+            if cached is not None and time.time() - cached[1] <= budget.max_cache_age:
+                metrics.cache_fallbacks += 1
+                logger.warning(f"{endpoint} 被限速({reason})，使用 {time.time() - cached[1]:.1f} 秒前的缓存结果")
+                return cached[0]
+        raise ThrottledError(f"{endpoint} 被限速({reason})且无可用缓存")
+
+    def _ready(self, endpoint: str, now: float) -> bool:
+        return self._buckets[endpoint].wait_time(now) == 0
+
+    def _acquire(self, endpoint: str, budget: EndpointBudget, metrics: EndpointMetrics) -> bool:
+        """等待令牌；有更高优先级的请求同样就绪时让其先行"""
+        start = time.monotonic()
+        deadline = start + budget.max_wait
+        with self._cond:
+            entry = (budget.priority, next(self._seq), endpoint)
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._buckets[endpoint].wait_time(now)
+                    if self._global is not None:
+                        wait = max(wait, self._global.wait_time(now))
+                    ahead = any(w < entry and self._ready(w[2], now) for w in self._waiters)
+                    if wait == 0 and not ahead:
+                        self._buckets[endpoint].consume(now)
+                        if self._global is not None:
+                            self._global.consume(now)
+                        metrics.wait_seconds += now - start
+                        metrics.executed += 1
+                        metrics.mark_sent(now)
+                        return True
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        metrics.wait_seconds += now - start
+                        return False
+                    self._cond.wait(min(wait if wait > 0 else 0.01, remaining))
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, Dict]:
+        """各接口的预算使用情况"""
+        now = time.monotonic()
+        report = {}
+        with self._cond:
+            for endpoint, m in self._metrics.items():
+                budget = self.budgets[endpoint]
+                while m.recent and m.recent[0] < now - UTILIZATION_WINDOW:
+                    m.recent.popleft()
+                bucket = self._buckets[endpoint]
+                bucket.wait_time(now)
+                report[endpoint] = {
+                    'requests': m.requests,
+                    'executed': m.executed,
+                    'coalesced': m.coalesced,
+                    'local_throttled': m.local_throttled,
+                    'remote_throttled': m.remote_throttled,
+                    'cache_fallbacks': m.cache_fallbacks,
+                    'errors': m.errors,
+                    'avg_wait_ms': round(m.wait_seconds / max(m.executed + m.local_throttled, 1) * 1000, 2),
+                    'tokens_available': round(max(bucket.tokens, 0.0), 2),
+                    'utilization': round(len(m.recent) / (budget.refill_per_sec * UTILIZATION_WINDOW), 4),
+                }
+        return report
+
+    def format_metrics(self) -> str:
+        lines = []
+        for endpoint, m in self.metrics().items():
+            lines.append(f"{endpoint}: 使用率 {m['utilization']:.1%} | 请求 {m['requests']} | 合并 {m['coalesced']} | "
+                         f"限速 {m['local_throttled'] + m['remote_throttled']} | 缓存回退 {m['cache_fallbacks']}")
+        return "\n".join(lines)
+
+
+_shared_scheduler: Optional[RequestScheduler] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_scheduler() -> RequestScheduler:
+    """进程内共享的调度器（OKX 限速按IP计算）"""
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = RequestScheduler()
+        return _shared_scheduler
+
+
+def _scaled(budget: EndpointBudget, share: float) -> EndpointBudget:
+    return replace(budget, capacity=max(1, int(budget.capacity * share)), refill_per_sec=budget.refill_per_sec * share)
+
+
+def set_budget_share(share: float):
+    """本进程只使用按IP限速预算的一部分（同一IP上的多个工作进程平分预算），须在创建市场数据源之前调用"""
+    global _shared_scheduler
+    with _shared_lock:
+        _shared_scheduler = RequestScheduler(
+            {name: _scaled(budget, share) for name, budget in DEFAULT_BUDGETS.items()},
+            _scaled(DEFAULT_GLOBAL_BUDGET, share),
+        )
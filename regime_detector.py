@@ -0,0 +1,366 @@
+"""
+跨交易对相关性与市场状态识别
+
+同一进程内监控的所有交易对共享一个 RegimeTracker:
+- 每个周期把已收盘K线的对数收益写入按K线时间对齐的环形矩阵（window 行 × 交易对列，缺失为 0 并记掩码）
+- 成对协方差/相关系数由四个累加矩阵得到（只统计两者都有数据的K线）；
+  写入一个收益只更新对应的一行一列（O(n)），K线槽位轮换时减去整行的贡献（O(n²)），
+  每轮换 window 行按原始数据重算一次以消除浮点累积误差，不必每个周期 O(n²·window) 重算
+- 各交易对的状态由自身K线判断: 高波动（ATR 或已实现波动率明显高于近期水平）、
+  趋势（效率比高，按方向分上升/下降）、否则为震荡
+- summary() 输出写入提示词的简短摘要: 本交易对状态、相关性最高的交易对、全市场概况
+"""
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from checkpoint import pack_array, unpack_array
+from indicators import atr
+from market_model import parse_candles
+from strategy_config import bar_to_seconds
+
+logger = logging.getLogger(__name__)
+
+REGIME_TREND_UP = "trend_up"
+REGIME_TREND_DOWN = "trend_down"
+REGIME_RANGE = "range"
+REGIME_HIGH_VOL = "high_vol"
+REGIME_NAMES = {
+    REGIME_TREND_UP: "上升趋势",
+    REGIME_TREND_DOWN: "下降趋势",
+    REGIME_RANGE: "震荡",
+    REGIME_HIGH_VOL: "高波动",
+}
+
+INITIAL_CAPACITY = 16  # 交易对列的初始容量，不够时翻倍
+
+
+@dataclass
+class InstrumentRegime:
+    regime: str
+    efficiency: float  # 效率比: |净变动| / 逐根变动之和，越接近 1 趋势越单边
+    atr_pct: float  # ATR 占价格的百分比
+    atr_ratio: float  # 当前 ATR / 窗口内 ATR 中位数
+    volatility: float  # 近期每根K线对数收益的标准差（%）
+    vol_ratio: float  # 近期已实现波动率 / 全部K线的已实现波动率
+
+
+def classify(candles: np.ndarray, trend_window: int = 20, trend_threshold: float = 0.35,
+             high_vol_ratio: float = 1.5) -> Optional[InstrumentRegime]:
+    """由一个交易对的K线（CANDLE_DTYPE，升序）判断市场状态，数据不足时返回 None"""
+    closes = candles['c']
+    if len(closes) <= trend_window + 1 or np.isnan(closes[-trend_window - 1:]).any():
+        return None
+    returns = np.diff(np.log(closes))
+    recent = returns[-trend_window:]
+    vol = float(np.std(recent))
+    vol_all = float(np.nanstd(returns))
+    vol_ratio = vol / vol_all if vol_all > 0 else 1.0
+
+    atr_values = atr(candles['h'], candles['l'], closes)
+    atr_median = float(np.nanmedian(atr_values)) if not np.isnan(atr_values).all() else float('nan')
+    atr_last = float(atr_values[-1])
+    atr_ratio = atr_last / atr_median if atr_median > 0 else 1.0
+    atr_pct = atr_last / closes[-1] * 100 if closes[-1] > 0 else 0.0
+
+    path = float(np.abs(np.diff(closes[-trend_window - 1:])).sum())
+    net = float(closes[-1] - closes[-trend_window - 1])
+    efficiency = abs(net) / path if path > 0 else 0.0
+
+    if max(atr_ratio, vol_ratio) >= high_vol_ratio:
+        regime = REGIME_HIGH_VOL
+    elif efficiency >= trend_threshold:
+        regime = REGIME_TREND_UP if net > 0 else REGIME_TREND_DOWN
+    else:
+        regime = REGIME_RANGE
+    return InstrumentRegime(regime, efficiency, atr_pct, atr_ratio, vol * 100, vol_ratio)
+
+
+class RegimeTracker:
+    """线程安全；同一进程内的所有交易对共享一个实例（见 get_shared_tracker）"""
+
+    def __init__(self, bar: str = "5m", window: int = 288, min_periods: int = 20, trend_window: int = 20,
+                 trend_threshold: float = 0.35, high_vol_ratio: float = 1.5, scope: Optional[str] = None):
+        """
+        Args:
+            bar: K线周期，收益按该周期的K线时间对齐
+            window: 计算相关性使用的最近K线数
+            min_periods: 两个交易对共同的K线少于该数时不给出相关系数
+            trend_window: 判断趋势和近期波动率使用的K线数
+            trend_threshold: 效率比达到该值视为趋势
+            high_vol_ratio: ATR 或已实现波动率达到近期水平的该倍数视为高波动
+            scope: 只覆盖部分交易对时（协调模式的一个工作进程）摘要中使用的范围名称，None 为全市场
+        """
+        self.bar_ms = bar_to_seconds(bar) * 1000
+        self.scope = scope
+        self.window = window
+        self.min_periods = min_periods
+        self.trend_window = trend_window
+        self.trend_threshold = trend_threshold
+        self.high_vol_ratio = high_vol_ratio
+        self._lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._last: Dict[str, Tuple[int, float]] = {}  # 交易对 -> 最近写入的收盘K线 (ts, 收盘价)
+        self._regimes: Dict[str, InstrumentRegime] = {}
+        self._slot_ts = np.full(window, -1, dtype=np.int64)
+        self._recycled = 0
+        self._version = 0
+        self._cached: Optional[Tuple[int, np.ndarray, Optional[float]]] = None  # (版本, 相关矩阵, 平均成对相关)
+        self._values = np.zeros((window, INITIAL_CAPACITY))  # 收益（缺失为 0）
+        self._mask = np.zeros((window, INITIAL_CAPACITY))  # 1 表示有数据
+        # 成对累加: 共同K线数、行交易对收益之和、收益平方之和、收益乘积之和
+        self._n = np.zeros((INITIAL_CAPACITY, INITIAL_CAPACITY))
+        self._sx = np.zeros((INITIAL_CAPACITY, INITIAL_CAPACITY))
+        self._sxx = np.zeros((INITIAL_CAPACITY, INITIAL_CAPACITY))
+        self._sxy = np.zeros((INITIAL_CAPACITY, INITIAL_CAPACITY))
+
+    # ---- 存储 ----
+
+    def _grow(self):
+        """交易对列的容量翻倍（保留已有数据）"""
+        old_capacity = self._values.shape[1]
+        capacity = old_capacity * 2
+        for name in ('_values', '_mask'):
+            grown = np.zeros((self.window, capacity))
+            grown[:, :old_capacity] = getattr(self, name)
+            setattr(self, name, grown)
+        for name in ('_n', '_sx', '_sxx', '_sxy'):
+            grown = np.zeros((capacity, capacity))
+            grown[:old_capacity, :old_capacity] = getattr(self, name)
+            setattr(self, name, grown)
+
+    def _column(self, inst_id: str) -> int:
+        column = self._index.get(inst_id)
+        if column is None:
+            column = len(self._names)
+            if column >= self._values.shape[1]:
+                self._grow()
+            self._index[inst_id] = column
+            self._names.append(inst_id)
+        return column
+
+    def _clear_row(self, slot: int):
+        """槽位轮换: 减去整行对累加矩阵的贡献"""
+        n = len(self._names)
+        x, m = self._values[slot, :n], self._mask[slot, :n]
+        if m.any():
+            self._n[:n, :n] -= np.outer(m, m)
+            self._sx[:n, :n] -= np.outer(x, m)
+            self._sxx[:n, :n] -= np.outer(x * x, m)
+            self._sxy[:n, :n] -= np.outer(x, x)
+        self._values[slot] = 0.0
+        self._mask[slot] = 0.0
+        self._recycled += 1
+        if self._recycled % self.window == 0:
+            self._recompute()
+
+    def _recompute(self):
+        """按原始数据重算累加矩阵（消除增减累积的浮点误差）"""
+        n = len(self._names)
+        x, m = self._values[:, :n], self._mask[:, :n]
+        self._n[:n, :n] = m.T @ m
+        self._sx[:n, :n] = x.T @ m
+        self._sxx[:n, :n] = (x * x).T @ m
+        self._sxy[:n, :n] = x.T @ x
+
+    @staticmethod
+    def _update_cell(matrix: np.ndarray, n: int, column: int, f: np.ndarray, g: np.ndarray,
+                     df: float, dg: float):
+        """f gᵀ 中 f、g 的第 column 个元素分别变化 df、dg 时的增量，只涉及一行一列"""
+        matrix[column, :n] += df * g
+        matrix[:n, column] += dg * f
+        matrix[column, column] += df * dg
+
+    def _put(self, column: int, ts: int, value: float):
+        slot = (ts // self.bar_ms) % self.window
+        if self._slot_ts[slot] != ts:
+            if self._slot_ts[slot] > ts:
+                return  # 早于窗口
+            self._clear_row(slot)
+            self._slot_ts[slot] = ts
+        n = len(self._names)
+        x, m = self._values[slot, :n], self._mask[slot, :n]
+        old_x, old_m = x[column], m[column]
+        dx, dm, dxx = value - old_x, 1.0 - old_m, value * value - old_x * old_x
+        self._update_cell(self._n, n, column, m, m, dm, dm)
+        self._update_cell(self._sx, n, column, x, m, dx, dm)
+        self._update_cell(self._sxx, n, column, x * x, m, dxx, dm)
+        self._update_cell(self._sxy, n, column, x, x, dx, dx)
+        x[column], m[column] = value, 1.0
+
+    # ---- 写入 ----
+
+    def update(self, inst_id: str, candles: Union[np.ndarray, List]) -> Optional[InstrumentRegime]:
+        """写入本周期的K线（只使用已收盘且比上次更新的部分），返回该交易对的市场状态"""
+        if not isinstance(candles, np.ndarray):
+            candles = parse_candles(candles)
+        regime = classify(candles, self.trend_window, self.trend_threshold, self.high_vol_ratio)
+        confirmed = candles[candles['confirm']]
+        with self._lock:
+            if regime is not None:
+                self._regimes[inst_id] = regime
+            column = self._column(inst_id)
+            last_ts, last_close = self._last.get(inst_id, (-1, np.nan))
+            fresh = confirmed[confirmed['ts'] > last_ts]
+            if len(fresh) == 0:
+                return regime
+            ts = np.concatenate(([last_ts], fresh['ts']))
+            closes = np.concatenate(([last_close], fresh['c']))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns = np.diff(np.log(closes))
+            valid = (np.diff(ts) == self.bar_ms) & np.isfinite(returns)
+            for bar_ts, value in zip(ts[1:][valid].tolist(), returns[valid].tolist()):
+                self._put(column, bar_ts, value)
+            self._last[inst_id] = (int(fresh['ts'][-1]), float(fresh['c'][-1]))
+            self._version += 1
+        return regime
+
+    # ---- 检查点 ----
+
+    def export_state(self) -> Dict:
+        with self._lock:
+            n = len(self._names)
+            return {
+                'bar_ms': self.bar_ms,
+                'window': self.window,
+                'names': list(self._names),
+                'last': {inst_id: list(last) for inst_id, last in self._last.items()},
+                'regimes': {inst_id: asdict(regime) for inst_id, regime in self._regimes.items()},
+                'slot_ts': pack_array(self._slot_ts),
+                'values': pack_array(self._values[:, :n]),
+                'mask': pack_array(self._mask[:, :n]),
+                'recycled': self._recycled,
+            }
+
+    def restore_state(self, state: Dict):
+        """只恢复到空的跟踪器（共享实例已有其他交易对写入时跳过），累加矩阵按原始数据重算"""
+        if state['bar_ms'] != self.bar_ms or state['window'] != self.window:
+            raise ValueError(f"K线周期或窗口不符: {state['bar_ms']}ms × {state['window']}")
+        with self._lock:
+            if self._names:
+                raise ValueError("跟踪器已有数据")
+            for inst_id in state['names']:
+                self._column(inst_id)
+            n = len(self._names)
+            self._values[:, :n] = unpack_array(state['values'])
+            self._mask[:, :n] = unpack_array(state['mask'])
+            self._slot_ts = unpack_array(state['slot_ts'])
+            self._last = {inst_id: (int(ts), float(close)) for inst_id, (ts, close) in state['last'].items()}
+            self._regimes = {inst_id: InstrumentRegime(**r) for inst_id, r in state['regimes'].items()}
+            self._recycled = state['recycled']
+            self._recompute()
+            self._version += 1
+
+    # ---- 查询 ----
+
+    def _correlation_locked(self) -> Tuple[np.ndarray, Optional[float]]:
+        """相关矩阵和平均成对相关（同一版本的数据只计算一次）"""
+        if self._cached is not None and self._cached[0] == self._version:
+            return self._cached[1], self._cached[2]
+        n = len(self._names)
+        count, sx = self._n[:n, :n], self._sx[:n, :n]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = self._sxy[:n, :n] - sx * sx.T / count
+            var = self._sxx[:n, :n] - sx * sx / count  # 行交易对在与列交易对共同K线上的方差
+            corr = cov / np.sqrt(var * var.T)
+        corr[(count < self.min_periods) | ~np.isfinite(corr)] = np.nan
+        np.clip(corr, -1.0, 1.0, out=corr)
+        upper = corr[np.triu_indices(n, k=1)]
+        upper = upper[~np.isnan(upper)]
+        average = float(upper.mean()) if len(upper) else None
+        self._cached = (self._version, corr, average)
+        return corr, average
+
+    def correlation(self) -> Tuple[List[str], np.ndarray]:
+        """(交易对列表, 成对相关系数矩阵)，样本不足为 NaN"""
+        with self._lock:
+            return list(self._names), self._correlation_locked()[0].copy()
+
+    def covariance(self) -> Tuple[List[str], np.ndarray]:
+        """(交易对列表, 成对样本协方差矩阵)，样本不足为 NaN"""
+        with self._lock:
+            n = len(self._names)
+            count, sx = self._n[:n, :n], self._sx[:n, :n]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cov = (self._sxy[:n, :n] - sx * sx.T / count) / (count - 1)
+            cov[count < self.min_periods] = np.nan
+            return list(self._names), cov
+
+    def regime(self, inst_id: str) -> Optional[InstrumentRegime]:
+        with self._lock:
+            return self._regimes.get(inst_id)
+
+    def market_regime(self) -> Dict[str, object]:
+        """全市场概况: 交易对数、平均成对相关、各状态的交易对数"""
+        with self._lock:
+            average = self._correlation_locked()[1]
+            counts = {name: 0 for name in REGIME_NAMES}
+            for state in self._regimes.values():
+                counts[state.regime] += 1
+            return {
+                'instruments': len(self._names),
+                'avg_correlation': average,
+                'regimes': counts,
+            }
+
+    def summary(self, inst_id: str, top: int = 3) -> str:
+        """写入提示词的市场状态摘要（设置了 scope 时注明只统计该范围内的交易对）"""
+        lines = []
+        state = self.regime(inst_id)
+        if state is None:
+            lines.append("- 本交易对: K线不足，无法判断市场状态")
+        else:
+            lines.append(f"- 本交易对: {REGIME_NAMES[state.regime]} (效率比 {state.efficiency:.2f}) | "
+                         f"ATR {state.atr_pct:.2f}% (为近期中位数的 {state.atr_ratio:.1f} 倍) | "
+                         f"波动率 {state.volatility:.2f}%/根 (为近期均值的 {state.vol_ratio:.1f} 倍)")
+
+        with self._lock:
+            column = self._index.get(inst_id)
+            names = list(self._names)
+            corr = self._correlation_locked()[0]
+            row = corr[column].copy() if column is not None else None
+            overlap = int(self._n[column, column]) if column is not None else 0
+        if row is not None and len(names) > 1:
+            row[column] = np.nan
+            strength = np.nan_to_num(np.abs(row), nan=-1.0)
+            ranked = [j for j in np.argsort(-strength)[:top] if strength[j] >= 0]
+            if ranked:
+                peers = ", ".join(f"{names[j]} {row[j]:+.2f}" for j in ranked)
+                where = f"（仅{self.scope}）" if self.scope else ""
+                lines.append(f"- 相关性最高{where}: {peers} (最近 {overlap} 根K线)")
+            else:
+                lines.append(f"- 相关性: 共同K线不足 {self.min_periods} 根")
+
+        market = self.market_regime()
+        if market['instruments'] > 1:
+            counts = market['regimes']
+            avg = market['avg_correlation']
+            where = f"{self.scope} ({market['instruments']} 个交易对，非全市场)" if self.scope \
+                else f"全市场 ({market['instruments']} 个交易对)"
+            lines.append(f"- {where}: "
+                         f"平均相关 {'无' if avg is None else f'{avg:.2f}'} | "
+                         + " / ".join(f"{REGIME_NAMES[k]} {v}" for k, v in counts.items()))
+        return "\n".join(lines)
+
+
+_shared_tracker: Optional[RegimeTracker] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_tracker(settings, bar: str) -> RegimeTracker:
+    """进程内共享的跟踪器（跨交易对相关性需要所有交易对写入同一个实例）
+
+    settings: RegimeConfig
+    """
+    global _shared_tracker
+    with _shared_lock:
+        if _shared_tracker is None:
+            _shared_tracker = RegimeTracker(bar, window=settings.window, min_periods=settings.min_periods,
+                                            trend_window=settings.trend_window,
+                                            trend_threshold=settings.trend_threshold,
+                                            high_vol_ratio=settings.high_vol_ratio, scope=settings.scope)
+        return _shared_tracker
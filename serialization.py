@@ -0,0 +1,239 @@
+"""
+JSON 序列化层
+
+按 orjson > msgspec > 标准库 json 的顺序选择后端（均为可选依赖，未安装时回退到标准库）。
+分析记录、市场快照和 LLM 决策使用带类型的 dataclass；安装 msgspec 时决策 JSON
+在一次解码中完成类型校验和默认值填充，否则解码后再逐字段宽松转换。
+"""
+import json
+import logging
+import math
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Dict, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # 可选依赖
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ORJSON = "orjson"
+BACKEND_MSGSPEC = "msgspec"
+BACKEND_STDLIB = "json"
+
+
+def available_backends() -> List[str]:
+    backends = []
+    if orjson is not None:
+        backends.append(BACKEND_ORJSON)
+    if msgspec is not None:
+        backends.append(BACKEND_MSGSPEC)
+    backends.append(BACKEND_STDLIB)
+    return backends
+
+
+def _stdlib_dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default)
+
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    raise TypeError(f"无法序列化 {type(obj).__name__}")
+
+
+def _make_codec(backend: str):
+    if backend == BACKEND_ORJSON:
+        return (lambda obj: orjson.dumps(obj, default=_default).decode('utf-8'), orjson.loads)
+    if backend == BACKEND_MSGSPEC:
+        encoder = msgspec.json.Encoder(enc_hook=_default)
+        decoder = msgspec.json.Decoder()
+        return (lambda obj: encoder.encode(obj).decode('utf-8'), decoder.decode)
+    return (_stdlib_dumps, json.loads)
+
+
+BACKEND = available_backends()[0]
+_dumps, _loads = _make_codec(BACKEND)
+
+
+def set_backend(backend: str):
+    """切换后端（基准测试对比用）"""
+    global BACKEND, _dumps, _loads
+    if backend not in available_backends():
+        raise ValueError(f"序列化后端不可用: {backend}")
+    BACKEND = backend
+    _dumps, _loads = _make_codec(backend)
+
+
+def dumps(obj: Any) -> str:
+    """序列化为紧凑的 JSON 字符串（保留中文，不转义）"""
+    return _dumps(obj)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    return _loads(data)
+
+
+def _to_float(value: Any, default: Optional[float] = 0.0) -> Optional[float]:
+    """宽松转换 LLM 返回的数字（"85"、"85%"、null）"""
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else default
+    if isinstance(value, str):
+        try:
+            return float(value.strip().rstrip('%'))
+        except ValueError:
+            return default
+    return default
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes', '是')
+    return bool(value)
+
+
+def _to_levels(value: Any) -> List[Union[float, str]]:
+    """价位列表，无法转换为数字的原样保留（如 "2500-2510"）"""
+    if not isinstance(value, list):
+        return []
+    return [v if (number := _to_float(v, None)) is None else number for v in value if v is not None]
+
+
+def _default_stop_adjustment() -> Dict[str, Any]:
+    return {'should_adjust': False, 'new_take_profit': None, 'new_stop_loss': None, 'reason': ''}
+
+
+@dataclass(slots=True)
+class Decision:
+    """LLM 返回的交易决策"""
+    recommendation: str = "未知"
+    confidence: float = 0.0
+    analysis: str = "未知"
+    reasoning: str = "未知"
+    support_levels: List[Union[float, str]] = field(default_factory=list)
+    resistance_levels: List[Union[float, str]] = field(default_factory=list)
+    position_action: str = "HOLD"
+    stop_adjustment: Optional[Dict[str, Any]] = field(default_factory=_default_stop_adjustment)
+    urgent_action: bool = False
+    urgent_reason: str = ""
+    # 空仓提示词中的顶层止盈止损字段
+    take_profit: Optional[float] = None
+    stop_loss: Optional[float] = None
+    adjustment_percent: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Decision':
+        """宽松转换: 类型不符的字段尽量转换，无法转换的使用默认值"""
+        decision = cls()
+        for name in ('recommendation', 'analysis', 'reasoning', 'position_action', 'urgent_reason'):
+            if data.get(name) is not None:
+                setattr(decision, name, str(data[name]))
+        decision.confidence = _to_float(data.get('confidence'), 0.0)
+        decision.support_levels = _to_levels(data.get('support_levels'))
+        decision.resistance_levels = _to_levels(data.get('resistance_levels'))
+        if 'stop_adjustment' in data:
+            adjustment = data['stop_adjustment']
+            decision.stop_adjustment = adjustment if isinstance(adjustment, dict) else None
+        decision.urgent_action = _to_bool(data.get('urgent_action', False))
+        for name in ('take_profit', 'stop_loss', 'adjustment_percent'):
+            setattr(decision, name, _to_float(data.get(name), None))
+        return decision
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f: getattr(self, f) for f in _DECISION_FIELDS}
+
+
+_DECISION_FIELDS = tuple(f.name for f in fields(Decision))
+
+
+@dataclass(slots=True)
+class AnalysisRecord:
+    """analysis_records 表的一行"""
+    inst_id: str
+    current_price: float
+    recommendation: str
+    confidence: float
+    analysis_summary: str = ""
+    reasoning: str = ""
+    support_levels: List[Union[float, str]] = field(default_factory=list)
+    resistance_levels: List[Union[float, str]] = field(default_factory=list)
+    market_data_json: Optional[str] = None
+    raw_response: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AnalysisRecord':
+        return cls(**{f: data[f] for f in _RECORD_FIELDS if f in data})
+
+    def to_row(self) -> tuple:
+        """按 INSERT 列顺序返回参数，价位列表序列化为 JSON"""
+        return (
+            self.inst_id, self.current_price, self.recommendation, self.confidence,
+            self.analysis_summary, self.reasoning,
+            dumps(self.support_levels), dumps(self.resistance_levels),
+            self.market_data_json, self.raw_response,
+        )
+
+
+_RECORD_FIELDS = tuple(f.name for f in fields(AnalysisRecord))
+
+
+@dataclass(slots=True)
+class MarketSnapshot:
+    """一次 get_all_market_data 的结果（OKX 原始响应）"""
+    ticker: Dict[str, Any]
+    orderbook: Dict[str, Any]
+    candlesticks: Dict[str, Any]
+    trades: Dict[str, Any]
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_market_data(cls, market_data: Dict[str, Any]) -> 'MarketSnapshot':
+        return cls(market_data['ticker'], market_data['orderbook'], market_data['candlesticks'],
+                   market_data['trades'], market_data.get('_meta', {}))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """与 get_all_market_data 相同的结构"""
+        data = {'ticker': self.ticker, 'orderbook': self.orderbook,
+                'candlesticks': self.candlesticks, 'trades': self.trades}
+        if self.meta:
+            data['_meta'] = self.meta
+        return data
+
+
+def encode_market_data(market_data: Dict[str, Any]) -> str:
+    return dumps(MarketSnapshot.from_market_data(market_data).to_dict())
+
+
+def decode_market_snapshot(data: Union[str, bytes]) -> MarketSnapshot:
+    return MarketSnapshot.from_market_data(loads(data))
+
+
+_typed_decision_decoder: Optional[Callable[[Union[str, bytes]], Decision]] = None
+if msgspec is not None:
+    # strict=False 允许 "85" -> 85.0 这类常见的 LLM 输出
+    _typed_decision_decoder = msgspec.json.Decoder(Decision, strict=False).decode
+
+
+def decode_decision(data: Union[str, bytes]) -> Decision:
+    """解码 LLM 返回的决策 JSON
+
+    有 msgspec 时一次完成解码和校验；校验失败（字段类型偏差较大）或无 msgspec 时
+    先解码为 dict 再宽松转换。JSON 语法错误向上抛出。
+    """
+    if _typed_decision_decoder is not None:
+        try:
+            return _typed_decision_decoder(data)
+        except msgspec.ValidationError as e:
+            logger.debug(f"决策字段类型不符，改用宽松转换: {e}")
+    parsed = loads(data)
+    if not isinstance(parsed, dict):
+        raise ValueError(f"决策应为 JSON 对象，实际为 {type(parsed).__name__}")
+    return Decision.from_dict(parsed)
@@ -0,0 +1,405 @@
+"""
+信号结果评估
+
+把每条分析记录（时间 + 当时价格）与本地K线存储中之后的K线对齐，计算:
+- 多个时间窗口的前瞻收益（开仓建议按方向取正负）
+- 按策略止盈/止损计算先触及止盈还是止损（同一根K线同时触及按止损计）
+- 信心度校准: 各信心度区间的实际胜率，以及不同阈值下的信号数、胜率和每个信号对应的 LLM 调用次数
+
+所有记录向量化计算（止盈止损按固定大小的分块，内存占用不随记录数增长）；结果保存在独立的 SQLite 中，
+再次运行只评估新的、且完整窗口已有K线覆盖的记录。
+"""
+import argparse
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from candle_store import CandleStore
+from db import TradingAnalysisDB
+from strategy_config import bar_to_seconds
+
+logger = logging.getLogger(__name__)
+
+# SELL 是平仓，方向取决于被平掉的持仓（记录中没有），不按方向评估
+DIRECTIONS = {'BUY_LONG': 1, 'BUY_SHORT': -1}
+
+OUTCOME_TP = "tp"
+OUTCOME_SL = "sl"
+OUTCOME_OPEN = "open"  # 窗口内未触及止盈止损
+OUTCOME_NONE = "none"  # 非开仓建议，不计算止盈止损
+OUTCOME_NO_DATA = "no_data"  # 记录时间没有K线覆盖（K线存储启用之前）或价格缺失
+
+CONFIDENCE_BINS = np.arange(0, 101, 10)
+DEFAULT_THRESHOLDS = (50, 60, 70, 80, 90)
+FIRST_HITS_CELLS = 1 << 20  # first_hits 每块最多处理的 (信号 × K线) 数
+
+
+def _horizon_column(horizon: str) -> str:
+    return f"ret_{horizon}"
+
+
+def timestamps_to_ms(timestamps: Sequence[str]) -> np.ndarray:
+    """'YYYY-MM-DD HH:MM:SS'（UTC） -> epoch 毫秒"""
+    return np.array(timestamps, dtype='datetime64[s]').astype(np.int64) * 1000
+
+
+def first_hits(high: np.ndarray, low: np.ndarray, start: np.ndarray, length: np.ndarray, width: int,
+               direction: np.ndarray, tp_price: np.ndarray, sl_price: np.ndarray):
+    """每条信号从 start 起 length 根K线内首次触及止盈/止损的位置，未触及为 width
+
+    用 sliding_window_view 取出信号的 (n, width) 价格窗口，不逐条循环；
+    按块处理，每块的窗口副本不超过 FIRST_HITS_CELLS 个元素。
+    """
+    pad = np.full(width, np.nan)
+    high_view = sliding_window_view(np.concatenate([high, pad]), width)
+    low_view = sliding_window_view(np.concatenate([low, pad]), width)
+    tp_first = np.full(len(start), width)
+    sl_first = np.full(len(start), width)
+    chunk = max(1, FIRST_HITS_CELLS // width)
+    for lo in range(0, len(start), chunk):
+        block = slice(lo, lo + chunk)
+        high_windows, low_windows = high_view[start[block]], low_view[start[block]]
+        valid = np.arange(width)[None, :] < length[block, None]
+        long = (direction[block] > 0)[:, None]
+        tp, sl = tp_price[block, None], sl_price[block, None]
+        tp_hit = np.where(long, high_windows >= tp, low_windows <= tp) & valid
+        sl_hit = np.where(long, low_windows <= sl, high_windows >= sl) & valid
+        tp_first[block] = np.where(tp_hit.any(axis=1), tp_hit.argmax(axis=1), width)
+        sl_first[block] = np.where(sl_hit.any(axis=1), sl_hit.argmax(axis=1), width)
+    return tp_first, sl_first
+
+
+class SignalEvaluator:
+    """分析记录的离线结果评估（增量）"""
+
+    def __init__(self, database: TradingAnalysisDB, candle_store: CandleStore, bar: str,
+                 horizons: Sequence[str] = ("15m", "1H", "4H", "1D"), profit_target: float = 3.0,
+                 stop_loss: float = 2.0, outcomes_path: str = "signal_outcomes.db"):
+        """
+        Args:
+            bar: K线存储中使用的周期，各时间窗口必须是它的整数倍
+            profit_target/stop_loss: 止盈/止损百分比（相对信号时价格）
+        """
+        self.database = database
+        self.candle_store = candle_store
+        self.bar = bar
+        self.bar_ms = bar_to_seconds(bar) * 1000
+        self.horizons = []
+        for horizon in horizons:
+            horizon_ms = bar_to_seconds(horizon) * 1000
+            if horizon_ms < self.bar_ms or horizon_ms % self.bar_ms:
+                logger.warning(f"时间窗口 {horizon} 不是K线周期 {bar} 的整数倍，已忽略")
+                continue
+            self.horizons.append(horizon)
+        if not self.horizons:
+            raise ValueError(f"没有可用的评估时间窗口（K线周期 {bar}）")
+        self.horizon_ms = np.array([bar_to_seconds(h) * 1000 for h in self.horizons], dtype=np.int64)
+        self.profit_target = profit_target
+        self.stop_loss = stop_loss
+        self.outcomes_path = outcomes_path
+        self._lock = threading.Lock()
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.outcomes_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS signal_outcomes (
+                record_id INTEGER PRIMARY KEY,
+                inst_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                recommendation TEXT,
+                direction INTEGER,
+                confidence REAL,
+                entry_price REAL,
+                outcome TEXT,
+                bars_to_outcome INTEGER
+            )
+        ''')
+        conn.execute('CREATE TABLE IF NOT EXISTS evaluator_state (scope TEXT PRIMARY KEY, pending_from TEXT)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_outcomes_inst_time ON signal_outcomes(inst_id, timestamp)')
+        existing = {row['name'] for row in conn.execute('PRAGMA table_info(signal_outcomes)')}
+        for horizon in self.horizons:
+            # 新增的时间窗口只对之后评估的记录有值
+            if _horizon_column(horizon) not in existing:
+                conn.execute(f'ALTER TABLE signal_outcomes ADD COLUMN "{_horizon_column(horizon)}" REAL')
+        conn.commit()
+        conn.close()
+
+    def _pending_from(self, conn: sqlite3.Connection, scope: str) -> Optional[str]:
+        row = conn.execute('SELECT pending_from FROM evaluator_state WHERE scope = ?', (scope,)).fetchone()
+        return row[0] if row else None
+
+    def evaluate(self, inst_id: Optional[str] = None) -> int:
+        """评估尚未评估且完整窗口已有K线的记录，返回新评估的记录数
+
+        evaluator_state 保存最早一条未评估记录的时间，下次只从这里开始读取记录。
+        """
+        scope = inst_id or ''
+        with self._lock:
+            conn = self._connect()
+            try:
+                pending_from = self._pending_from(conn, scope)
+                records = self.database.query_records(inst_id=inst_id, start=pending_from,
+                                                      columns=('current_price', 'confidence'))
+                if pending_from is not None:
+                    scored = {row[0] for row in conn.execute(
+                        'SELECT record_id FROM signal_outcomes WHERE timestamp >= ?', (pending_from,))}
+                    records = [r for r in records if r['id'] not in scored]
+
+                by_inst: Dict[str, List[Dict[str, Any]]] = {}
+                for record in records:
+                    by_inst.setdefault(record['inst_id'], []).append(record)
+
+                total = 0
+                pending = []
+                columns = ['record_id', 'inst_id', 'timestamp', 'recommendation', 'direction', 'confidence',
+                           'entry_price', 'outcome', 'bars_to_outcome'] + [_horizon_column(h) for h in self.horizons]
+                column_sql = ', '.join(f'"{c}"' for c in columns)
+                insert_sql = (f"INSERT OR REPLACE INTO signal_outcomes ({column_sql}) "
+                              f"VALUES ({', '.join('?' * len(columns))})")
+                for inst, inst_records in by_inst.items():
+                    rows, inst_pending = self._evaluate_inst(inst, inst_records)
+                    if inst_pending is not None:
+                        pending.append(inst_pending)
+                    if rows:
+                        conn.executemany(insert_sql, rows)
+                        total += len(rows)
+
+                if records:
+                    pending_from = min(pending) if pending else records[-1]['timestamp']
+                    conn.execute('INSERT OR REPLACE INTO evaluator_state (scope, pending_from) VALUES (?, ?)',
+                                 (scope, pending_from))
+                conn.commit()
+            finally:
+                conn.close()
+        if total:
+            logger.info(f"信号评估: 新评估 {total} 条记录")
+        return total
+
+    def _evaluate_inst(self, inst_id: str, records: List[Dict[str, Any]]):
+        """一个交易对的所有待评估记录（时间升序），向量化计算
+
+        Returns:
+            (可写入的行, 最早一条窗口尚未结束的记录时间 或 None)
+        """
+        rec_ts = timestamps_to_ms([r['timestamp'] for r in records])
+        max_horizon = int(self.horizon_ms.max())
+        candles = self.candle_store.load(inst_id, self.bar, start_ts=int(rec_ts.min()) - self.bar_ms,
+                                         end_ts=int(rec_ts.max()) + max_horizon + self.bar_ms)
+        entry = np.array([r['current_price'] or np.nan for r in records], dtype=np.float64)
+        direction = np.array([DIRECTIONS.get(str(r['recommendation']).upper(), 0) for r in records])
+        confidence = np.array([r['confidence'] if r['confidence'] is not None else np.nan for r in records],
+                              dtype=np.float64)
+
+        if len(candles) == 0:
+            return [], records[0]['timestamp']
+
+        open_ts = candles['ts']
+        close_ts = open_ts + self.bar_ms
+        close = candles['c']
+
+        # 窗口完整结束（最长窗口已有收盘K线）才评估
+        complete = rec_ts + max_horizon <= close_ts[-1]
+        # 信号时间所在的K线（对齐收盘调度时即刚开盘的那根）；找不到说明数据缺口（通常是K线存储启用之前）
+        start = np.searchsorted(open_ts, rec_ts, side='right') - 1
+        start_clipped = np.maximum(start, 0)
+        no_data = ((start < 0) | (rec_ts - open_ts[start_clipped] >= self.bar_ms) | ~(entry > 0)) & complete
+
+        # 各窗口结束时的收盘价: 收盘时间 <= 信号时间 + 窗口 的最后一根
+        end_idx = np.searchsorted(close_ts, rec_ts[:, None] + self.horizon_ms[None, :], side='right') - 1
+        end_clipped = np.clip(end_idx, 0, len(candles) - 1)
+        gap = close_ts[end_clipped] < rec_ts[:, None] + self.horizon_ms[None, :] - self.bar_ms
+        returns = (close[end_clipped] / entry[:, None] - 1) * 100
+        returns[gap | (end_idx < start[:, None]) | no_data[:, None]] = np.nan
+
+        # 止盈止损: 在最长窗口内首次触及
+        width = max_horizon // self.bar_ms
+        length = np.clip(end_idx[:, -1] - start + 1, 0, width)
+        tp_price = np.where(direction > 0, entry * (1 + self.profit_target / 100), entry * (1 - self.profit_target / 100))
+        sl_price = np.where(direction > 0, entry * (1 - self.stop_loss / 100), entry * (1 + self.stop_loss / 100))
+        tp_first, sl_first = first_hits(candles['h'], candles['l'], start_clipped, length, width,
+                                        direction, tp_price, sl_price)
+        outcome = np.where(sl_first <= tp_first,
+                           np.where(sl_first < width, OUTCOME_SL, OUTCOME_OPEN), OUTCOME_TP).astype(object)
+        bars = np.minimum(tp_first, sl_first) + 1
+        outcome[direction == 0] = OUTCOME_NONE
+        outcome[no_data] = OUTCOME_NO_DATA
+
+        incomplete = np.flatnonzero(~complete)
+        rows = []
+        for i in np.flatnonzero(complete):
+            hit = outcome[i] in (OUTCOME_TP, OUTCOME_SL)
+            rows.append((
+                records[i]['id'], inst_id, records[i]['timestamp'], records[i]['recommendation'], int(direction[i]),
+                None if np.isnan(confidence[i]) else float(confidence[i]),
+                None if np.isnan(entry[i]) else float(entry[i]),
+                outcome[i], int(bars[i]) if hit else None,
+                *(None if np.isnan(v) else float(v) for v in returns[i]),
+            ))
+        return rows, records[incomplete[0]]['timestamp'] if len(incomplete) else None
+
+    def _load_outcomes(self, inst_id: Optional[str]) -> Dict[str, np.ndarray]:
+        conn = self._connect()
+        try:
+            sql = 'SELECT * FROM signal_outcomes'
+            params = []
+            if inst_id:
+                sql += ' WHERE inst_id = ?'
+                params.append(inst_id)
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        columns = {
+            'recommendation': np.array([r['recommendation'] for r in rows], dtype=object),
+            'confidence': np.array([r['confidence'] if r['confidence'] is not None else np.nan for r in rows]),
+            'outcome': np.array([r['outcome'] for r in rows], dtype=object),
+        }
+        for horizon in self.horizons:
+            name = _horizon_column(horizon)
+            columns[name] = np.array([r[name] if r[name] is not None else np.nan for r in rows], dtype=np.float64)
+        return columns
+
+    def report(self, inst_id: Optional[str] = None,
+               thresholds: Sequence[float] = DEFAULT_THRESHOLDS) -> Dict[str, Any]:
+        """汇总已评估的记录: 按建议、信心度区间、信心度阈值统计"""
+        data = self._load_outcomes(inst_id)
+        scored = data['outcome'] != OUTCOME_NO_DATA
+        recommendation = data['recommendation'][scored]
+        # 方向按建议重新取，早期按 SELL 做空评估保存的记录也不计入方向统计
+        direction = np.array([DIRECTIONS.get(str(rec).upper(), 0) for rec in recommendation], dtype=np.int64)
+        confidence = data['confidence'][scored]
+        outcome = data['outcome'][scored]
+        outcome[direction == 0] = OUTCOME_NONE
+        # 开仓建议按方向取收益，其余建议（包括平仓）保留原始涨跌幅
+        sign = np.where(direction == 0, 1, direction)
+        returns = {h: data[_horizon_column(h)][scored] * sign for h in self.horizons}
+        main_horizon = self.horizons[-1]
+
+        def summarize(mask: np.ndarray) -> Dict[str, Any]:
+            count = int(mask.sum())
+            decided = mask & np.isin(outcome, (OUTCOME_TP, OUTCOME_SL, OUTCOME_OPEN))
+            main = returns[main_horizon][mask]
+            main = main[~np.isnan(main)]
+            return {
+                'count': count,
+                'mean_return': {h: float(np.nanmean(returns[h][mask])) if np.any(~np.isnan(returns[h][mask])) else None
+                                for h in self.horizons},
+                'win_rate': float((main > 0).mean()) if len(main) else None,
+                'tp_rate': float((outcome[decided] == OUTCOME_TP).mean()) if decided.any() else None,
+                'sl_rate': float((outcome[decided] == OUTCOME_SL).mean()) if decided.any() else None,
+            }
+
+        by_recommendation = {rec: summarize(recommendation == rec) for rec in sorted(set(recommendation))}
+
+        actionable = direction != 0
+        calibration = []
+        bins = np.clip(np.digitize(confidence, CONFIDENCE_BINS[1:-1]), 0, len(CONFIDENCE_BINS) - 2)
+        for i in range(len(CONFIDENCE_BINS) - 1):
+            mask = actionable & (bins == i) & ~np.isnan(confidence)
+            if mask.any():
+                calibration.append({'low': int(CONFIDENCE_BINS[i]), 'high': int(CONFIDENCE_BINS[i + 1]),
+                                    **summarize(mask)})
+
+        # 每条记录对应一个分析周期（一次 LLM 决策），用于衡量阈值提高后每个信号的成本
+        cycles = len(recommendation)
+        by_threshold = []
+        for threshold in thresholds:
+            mask = actionable & (confidence >= threshold)
+            summary = summarize(mask)
+            summary['threshold'] = threshold
+            summary['calls_per_signal'] = cycles / summary['count'] if summary['count'] else None
+            by_threshold.append(summary)
+
+        return {
+            'records': int(len(data['outcome'])),
+            'scored': cycles,
+            'no_data': int((~scored).sum()),
+            'horizons': list(self.horizons),
+            'main_horizon': main_horizon,
+            'profit_target': self.profit_target,
+            'stop_loss': self.stop_loss,
+            'by_recommendation': by_recommendation,
+            'calibration': calibration,
+            'by_threshold': by_threshold,
+        }
+
+    def format_report(self, inst_id: Optional[str] = None,
+                      thresholds: Sequence[float] = DEFAULT_THRESHOLDS) -> str:
+        report = self.report(inst_id, thresholds)
+
+        def pct(value: Optional[float], scale: float = 100.0, signed: bool = False) -> str:
+            if value is None:
+                return "-"
+            return f"{value * scale:+.2f}%" if signed else f"{value * scale:.0f}%"
+
+        horizons = report['horizons']
+        lines = [
+            f"信号评估: {report['scored']} 条记录（无K线覆盖 {report['no_data']} 条），"
+            f"止盈 {report['profit_target']}% / 止损 {report['stop_loss']}%，胜率按 {report['main_horizon']} 收益计算",
+            "",
+            "按建议: " + " | ".join(f"{h} 收益" for h in horizons) + " | 胜率 | 止盈 | 止损",
+        ]
+        for rec, s in report['by_recommendation'].items():
+            returns = " | ".join(pct(s['mean_return'][h], 1, signed=True) for h in horizons)
+            lines.append(f"  {rec:<14} {s['count']:>5} 条  {returns} | {pct(s['win_rate'])} | "
+                         f"{pct(s['tp_rate'])} | {pct(s['sl_rate'])}")
+
+        lines += ["", "信心度校准（开仓建议）:"]
+        for s in report['calibration']:
+            lines.append(f"  {s['low']:>3}-{s['high']:<3} {s['count']:>5} 条  胜率 {pct(s['win_rate'])}  "
+                         f"止盈 {pct(s['tp_rate'])}  {report['main_horizon']} 收益 "
+                         f"{pct(s['mean_return'][report['main_horizon']], 1, signed=True)}")
+
+        lines += ["", "信心度阈值:"]
+        for s in report['by_threshold']:
+            calls = f"{s['calls_per_signal']:.1f}" if s['calls_per_signal'] else "-"
+            lines.append(f"  >= {s['threshold']:<4} {s['count']:>5} 个信号  胜率 {pct(s['win_rate'])}  "
+                         f"止盈 {pct(s['tp_rate'])}  {report['main_horizon']} 收益 "
+                         f"{pct(s['mean_return'][report['main_horizon']], 1, signed=True)}  每信号 LLM 调用 {calls} 次")
+        return "\n".join(lines)
+
+
+def main():
+    from dotenv import load_dotenv
+
+    from config import load_config
+
+    load_dotenv()
+    config = load_config()
+    parser = argparse.ArgumentParser(description="评估历史分析信号的实际结果")
+    parser.add_argument('--inst-id', help="只评估该交易对，默认全部")
+    parser.add_argument('--bar', default=config.trading.kline_bar, help="K线周期")
+    parser.add_argument('--horizons', default=",".join(config.evaluation.horizons), help="前瞻时间窗口，逗号分隔")
+    parser.add_argument('--profit-target', type=float, default=config.strategy['profit_target'], help="止盈百分比")
+    parser.add_argument('--stop-loss', type=float, default=config.strategy['stop_loss'], help="止损百分比")
+    parser.add_argument('--backfill', metavar='RECORDING', help="先从行情录制文件回填K线")
+    parser.add_argument('--report-only', action='store_true', help="不评估新记录，只输出报告")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    candle_store = CandleStore(config.evaluation.candle_store_path or "candles.db")
+    if args.backfill:
+        candle_store.backfill_from_recording(args.backfill)
+    database = config.database
+    evaluator = SignalEvaluator(
+        TradingAnalysisDB(database.db_path, downsample_after_days=database.downsample_after_days,
+                          archive_after_days=database.archive_after_days, archive_dir=database.archive_dir),
+        candle_store, args.bar, horizons=[h.strip() for h in args.horizons.split(",") if h.strip()],
+        profit_target=args.profit_target, stop_loss=args.stop_loss, outcomes_path=config.evaluation.outcomes_path,
+    )
+    if not args.report_only:
+        evaluator.evaluate(args.inst_id)
+    print(evaluator.format_report(args.inst_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+市场数据快照缓存
+
+按 (交易对, 数据类型) 保存最近一次成功获取的数据及其获取时间，
+某一类数据获取失败或超时时，只要缓存未超过允许的最大年龄就继续使用（stale-while-revalidate）。
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+DATA_TYPES = ('ticker', 'orderbook', 'candlesticks', 'trades')
+
+
+@dataclass
+class Snapshot:
+    data: Dict
+    fetched_at: float  # epoch 秒
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class SnapshotCache:
+    """线程安全的快照缓存"""
+
+    def __init__(self):
+        self._snapshots: Dict[Tuple[str, str], Snapshot] = {}
+        self._lock = threading.Lock()
+
+    def put(self, inst_id: str, data_type: str, data: Dict, fetched_at: Optional[float] = None):
+        with self._lock:
+            self._snapshots[(inst_id, data_type)] = Snapshot(data, fetched_at or time.time())
+
+    def get(self, inst_id: str, data_type: str, max_age: Optional[float] = None) -> Optional[Snapshot]:
+        """返回快照；超过 max_age 时视为不可用"""
+        with self._lock:
+            snapshot = self._snapshots.get((inst_id, data_type))
+        if snapshot is None or (max_age is not None and snapshot.age > max_age):
+            return None
+        return snapshot
+
+    def export_state(self, inst_id: str) -> Dict[str, Dict]:
+        """该交易对各类数据的快照（供检查点保存）"""
+        with self._lock:
+            return {data_type: {'data': snapshot.data, 'fetched_at': snapshot.fetched_at}
+                    for (inst, data_type), snapshot in self._snapshots.items() if inst == inst_id}
+
+    def restore_state(self, inst_id: str, state: Dict[str, Dict]):
+        """恢复检查点中的快照，保留原获取时间（较新的现有快照不会被覆盖）"""
+        with self._lock:
+            for data_type, item in state.items():
+                current = self._snapshots.get((inst_id, data_type))
+                if current is None or current.fetched_at < item['fetched_at']:
+                    self._snapshots[(inst_id, data_type)] = Snapshot(item['data'], item['fetched_at'])
+
+    def ages(self, inst_id: str) -> Dict[str, Optional[float]]:
+        return {t: (s.age if (s := self.get(inst_id, t)) else None) for t in DATA_TYPES}
@@ -50,6 +50,22 @@ STRATEGY_PARAMS = {
 }
 
 
+# K线周期对应的秒数（OKX bar 参数）
+BAR_SECONDS = {
+    "1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800,
+    "1H": 3600, "2H": 7200, "4H": 14400, "6H": 21600, "12H": 43200,
+    "1D": 86400, "1W": 604800,
+}
+
+
+def bar_to_seconds(bar: str) -> int:
+    """将K线周期转换为秒数，忽略 UTC 后缀（如 6Hutc）"""
+    key = bar[:-3] if bar.endswith("utc") else bar
+    if key not in BAR_SECONDS:
+        raise ValueError(f"不支持的K线周期: {bar}")
+    return BAR_SECONDS[key]
+
+
 def get_strategy_params(strategy: str = "balanced") -> dict:
     """
     获取策略参数
@@ -0,0 +1,268 @@
+"""
+可热加载的策略配置
+
+策略参数可以写在 TOML（或安装 PyYAML 后的 YAML）文件中，运行期间修改文件无需重启:
+每个分析周期开始前按修改时间检查文件，变化后重新解析并校验，
+校验通过才整体替换（一次引用赋值），失败则继续使用旧配置。
+
+文件格式（TOML）:
+
+    strategy = "balanced"              # 默认策略，可选
+
+    [strategies.balanced]              # 覆盖内置策略的参数，也可定义新策略
+    confidence_threshold = 72
+
+    [instruments."BTC-USDT-SWAP"]      # 按交易对覆盖
+    strategy = "conservative"
+    confidence_threshold = 85
+"""
+import copy
+import logging
+import os
+import threading
+import time
+import tomllib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from strategy_config import BAR_SECONDS, STRATEGY_PARAMS
+
+try:
+    import yaml
+except ImportError:  # 可选依赖
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+# 参数名 -> 允许的类型
+PARAM_TYPES = {
+    'name': (str,),
+    'timeframe': (str,),
+    'analysis_interval': (int,),
+    'confidence_threshold': (int, float),
+    'rsi_overbought': (int, float),
+    'rsi_oversold': (int, float),
+    'profit_target': (int, float),
+    'stop_loss': (int, float),
+    'adjustment_threshold': (int, float),
+    'description': (str,),
+}
+# 修改后需要重启才生效的参数（K线周期决定了数据获取和聚合器状态）
+RESTART_ONLY_PARAMS = ('timeframe',)
+
+
+class StrategyConfigError(Exception):
+    """策略配置文件格式或取值不正确"""
+
+
+@dataclass(frozen=True)
+class StrategySnapshot:
+    """某一版本的策略配置（不可变，整体替换）"""
+    version: int
+    default_strategy: str
+    strategies: Dict[str, Dict[str, Any]]
+    instruments: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    source: Optional[str] = None
+    loaded_at: float = field(default_factory=time.time)
+
+    def params_for(self, inst_id: str) -> Dict[str, Any]:
+        """交易对的最终参数: 策略参数 + 交易对覆盖"""
+        overrides = self.instruments.get(inst_id, {})
+        strategy = overrides.get('strategy', self.default_strategy)
+        params = dict(self.strategies[strategy])
+        params.update({k: v for k, v in overrides.items() if k != 'strategy'})
+        return params
+
+
+def _validate_params(params: Dict[str, Any], where: str, complete: bool) -> List[str]:
+    errors = []
+    for key, value in params.items():
+        if key == 'strategy':
+            continue
+        if key not in PARAM_TYPES:
+            errors.append(f"{where}: 未知参数 {key}")
+        elif isinstance(value, bool) or not isinstance(value, PARAM_TYPES[key]):
+            errors.append(f"{where}: {key} 类型应为 {'/'.join(t.__name__ for t in PARAM_TYPES[key])}")
+    if errors:
+        return errors
+
+    if 'timeframe' in params and params['timeframe'] not in BAR_SECONDS:
+        errors.append(f"{where}: 不支持的K线周期 {params['timeframe']}")
+    if 'analysis_interval' in params and params['analysis_interval'] <= 0:
+        errors.append(f"{where}: analysis_interval 必须大于0")
+    if 'confidence_threshold' in params and not 0 <= params['confidence_threshold'] <= 100:
+        errors.append(f"{where}: confidence_threshold 应在 0-100 之间")
+    for key in ('profit_target', 'stop_loss', 'adjustment_threshold'):
+        if key in params and params[key] <= 0:
+            errors.append(f"{where}: {key} 必须大于0")
+    if 'rsi_overbought' in params and 'rsi_oversold' in params:
+        if not 0 < params['rsi_oversold'] < params['rsi_overbought'] < 100:
+            errors.append(f"{where}: 应满足 0 < rsi_oversold < rsi_overbought < 100")
+    if complete:
+        missing = [key for key in PARAM_TYPES if key not in params]
+        if missing:
+            errors.append(f"{where}: 缺少参数 {', '.join(missing)}")
+    return errors
+
+
+def parse_strategy_file(path: str) -> Dict[str, Any]:
+    """读取 TOML/YAML 文件为 dict"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.yaml', '.yml'):
+        if yaml is None:
+            raise StrategyConfigError("YAML 策略文件需要安装 PyYAML")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = yaml.safe_load(f) or {}
+        except yaml.YAMLError as e:
+            raise StrategyConfigError(f"YAML 格式错误: {e}")
+        except UnicodeDecodeError as e:
+            raise StrategyConfigError(f"文件不是 UTF-8 编码: {e}")
+    else:
+        with open(path, 'rb') as f:
+            try:
+                data = tomllib.load(f)
+            except UnicodeDecodeError as e:
+                raise StrategyConfigError(f"文件不是 UTF-8 编码: {e}")
+            except tomllib.TOMLDecodeError as e:
+                raise StrategyConfigError(f"TOML 格式错误: {e}")
+    if not isinstance(data, dict):
+        raise StrategyConfigError("策略文件顶层应为键值表")
+    return data
+
+
+def build_snapshot(data: Dict[str, Any], base: Dict[str, Dict[str, Any]], default_strategy: str,
+                   version: int, source: Optional[str] = None) -> StrategySnapshot:
+    """合并内置策略与文件内容并校验，失败时抛出 StrategyConfigError（列出全部问题）"""
+    unknown = set(data) - {'strategy', 'strategies', 'instruments'}
+    if unknown:
+        raise StrategyConfigError(f"未知的顶层配置: {', '.join(sorted(unknown))}")
+
+    for key in ('strategies', 'instruments'):
+        if not isinstance(data.get(key) or {}, dict):
+            raise StrategyConfigError(f"{key}: 应为键值表")
+    if not isinstance(data.get('strategy', default_strategy), str):
+        raise StrategyConfigError("strategy: 应为策略名称")
+
+    strategies = copy.deepcopy(base)
+    errors: List[str] = []
+    for name, overrides in (data.get('strategies') or {}).items():
+        if not isinstance(overrides, dict):
+            errors.append(f"strategies.{name}: 应为键值表")
+            continue
+        errors.extend(_validate_params(overrides, f"strategies.{name}", complete=False))
+        strategies[name] = {**strategies.get(name, {}), **overrides}
+
+    default = data.get('strategy', default_strategy)
+    if default not in strategies:
+        errors.append(f"strategy: 未定义的策略 {default}")
+
+    instruments = {}
+    for inst_id, overrides in (data.get('instruments') or {}).items():
+        if not isinstance(overrides, dict):
+            errors.append(f"instruments.{inst_id}: 应为键值表")
+            continue
+        if not isinstance(overrides.get('strategy', default), str):
+            errors.append(f"instruments.{inst_id}: strategy 应为策略名称")
+            continue
+        if overrides.get('strategy', default) not in strategies:
+            errors.append(f"instruments.{inst_id}: 未定义的策略 {overrides.get('strategy')}")
+        errors.extend(_validate_params(overrides, f"instruments.{inst_id}", complete=False))
+        instruments[inst_id] = dict(overrides)
+
+    if not errors:
+        for name, params in strategies.items():
+            errors.extend(_validate_params(params, f"strategies.{name}", complete=True))
+        for inst_id in instruments:
+            snapshot = StrategySnapshot(version, default, strategies, instruments)
+            errors.extend(_validate_params(snapshot.params_for(inst_id), f"instruments.{inst_id}", complete=True))
+    if errors:
+        raise StrategyConfigError("; ".join(errors))
+    return StrategySnapshot(version, default, strategies, instruments, source)
+
+
+class StrategyStore:
+    """持有当前策略快照，按文件修改时间热加载"""
+
+    def __init__(self, path: Optional[str], default_strategy: str = "balanced",
+                 base_overrides: Optional[Dict[str, Any]] = None, check_interval: float = 2.0):
+        """
+        Args:
+            path: 策略文件路径，None 表示只使用内置策略
+            default_strategy: 文件未指定 strategy 时的默认策略
+            base_overrides: 环境变量对默认策略的覆盖（如 CONFIDENCE_THRESHOLD）
+            check_interval: 两次检查文件修改时间的最小间隔（秒）
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._base = copy.deepcopy(STRATEGY_PARAMS)
+        if default_strategy in self._base and base_overrides:
+            self._base[default_strategy].update(base_overrides)
+        self._default_strategy = default_strategy if default_strategy in self._base else "balanced"
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None  # 最近一次成功加载的文件修改时间
+        self._failed_mtime: Optional[float] = None  # 最近一次加载失败的修改时间（同一版本只记一次错误）
+        self._last_check = 0.0
+        self.reload_count = 0
+        self.reload_errors = 0
+        self._snapshot = StrategySnapshot(0, self._default_strategy, self._base)
+        if path:
+            self.maybe_reload(force=True)
+
+    @property
+    def snapshot(self) -> StrategySnapshot:
+        return self._snapshot
+
+    def params_for(self, inst_id: str) -> Dict[str, Any]:
+        return self._snapshot.params_for(inst_id)
+
+    def maybe_reload(self, force: bool = False) -> bool:
+        """文件有变化时重新加载，返回是否替换了配置"""
+        if not self.path:
+            return False
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        with self._lock:
+            self._last_check = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                if self._mtime is not None or force:
+                    logger.warning(f"策略文件不存在: {self.path}，继续使用当前配置")
+                self._mtime = None
+                return False
+            if mtime == self._mtime and not force:
+                return False
+
+            # 任何解析或校验异常都保留旧配置；修改时间只在成功后记录，失败的文件在下次检查时重试
+            try:
+                data = parse_strategy_file(self.path)
+                snapshot = build_snapshot(data, self._base, self._default_strategy,
+                                          self._snapshot.version + 1, self.path)
+            except Exception as e:
+                if mtime != self._failed_mtime or force:
+                    self._failed_mtime = mtime
+                    self.reload_errors += 1
+                    logger.error(f"策略文件校验失败，继续使用版本 {self._snapshot.version}: {e}")
+                return False
+
+            self._mtime = mtime
+            self._failed_mtime = None
+            self._warn_restart_only(snapshot)
+            self._snapshot = snapshot
+            self.reload_count += 1
+            logger.info(f"策略配置已加载: {self.path} (版本 {snapshot.version}，默认策略 {snapshot.default_strategy}，"
+                        f"{len(snapshot.instruments)} 个交易对覆盖)")
+            return True
+
+    def _warn_restart_only(self, new: StrategySnapshot):
+        if self._snapshot.version == 0:
+            return
+        # 空字符串对应没有交易对覆盖的默认策略
+        for inst_id in sorted(set(new.instruments) | set(self._snapshot.instruments)) + [""]:
+            old_params, new_params = self._snapshot.params_for(inst_id), new.params_for(inst_id)
+            for key in RESTART_ONLY_PARAMS:
+                if old_params.get(key) != new_params.get(key):
+                    logger.warning(f"{inst_id or '默认策略'} 的 {key} 由 {old_params.get(key)} 改为 "
+                                   f"{new_params.get(key)}，需重启后生效")
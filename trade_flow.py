@@ -0,0 +1,258 @@
+"""
+成交流分析
+
+每个交易对维护一个按时间滚动的成交窗口（定长环形数组，内存有上限），
+跨多次拉取按 tradeId 去重，并增量维护 VWAP、累计主动成交差(CVD)、成交频率和大单识别。
+"""
+import logging
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Deque, Dict, List, Optional, Union
+
+import numpy as np
+
+from checkpoint import pack_array, unpack_array
+from market_model import parse_trades
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SECONDS = 900
+DEFAULT_CAPACITY = 4096
+DEFAULT_WHALE_SIGMA = 3.0
+RECOMPUTE_EVERY = 8192  # 累计淘汰多少笔后重新求和，消除浮点累积误差
+
+
+@dataclass
+class WhaleTrade:
+    trade_id: int
+    ts: int
+    price: float
+    size: float
+    side: str
+    sigma: float  # 超出窗口均值的标准差倍数
+
+
+@dataclass
+class TradeFlowStats:
+    count: int
+    span_seconds: float
+    vwap: float
+    last_price: float
+    buy_volume: float
+    sell_volume: float
+    delta: float  # 窗口内主动买入 - 主动卖出
+    cvd: float  # 自启动以来的累计主动成交差
+    intensity: float  # 笔/秒
+    whales: List[WhaleTrade] = field(default_factory=list)
+
+    @property
+    def buy_ratio(self) -> float:
+        total = self.buy_volume + self.sell_volume
+        return self.buy_volume / total if total > 0 else 0.5
+
+
+class TradeWindow:
+    """单个交易对的滚动成交窗口"""
+
+    def __init__(self, window_seconds: int = DEFAULT_WINDOW_SECONDS, capacity: int = DEFAULT_CAPACITY,
+                 whale_sigma: float = DEFAULT_WHALE_SIGMA, max_whales: int = 50):
+        self.window_ms = int(window_seconds * 1000)
+        self.capacity = capacity
+        self.whale_sigma = whale_sigma
+
+        self._ts = np.zeros(capacity, dtype=np.int64)
+        self._px = np.zeros(capacity, dtype=np.float64)
+        self._sz = np.zeros(capacity, dtype=np.float64)
+        self._side = np.zeros(capacity, dtype=np.int8)  # +1 主动买，-1 主动卖
+        self._id = np.zeros(capacity, dtype=np.int64)
+        self._head = 0  # 最早一笔的位置
+        self._count = 0
+
+        # 窗口内的滚动和
+        self._sum_pv = 0.0
+        self._sum_v = 0.0
+        self._sum_v2 = 0.0
+        self._sum_signed = 0.0
+        self._evicted_since_recompute = 0
+
+        self.cvd = 0.0
+        self.last_trade_id = -1
+        self.whales: Deque[WhaleTrade] = deque(maxlen=max_whales)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _indices(self, start: int, n: int) -> np.ndarray:
+        return (self._head + start + np.arange(n)) % self.capacity
+
+    def _evict(self, n: int):
+        """淘汰最早的 n 笔"""
+        if n <= 0:
+            return
+        idx = self._indices(0, n)
+        sz = self._sz[idx]
+        self._sum_pv -= float(np.dot(self._px[idx], sz))
+        self._sum_v -= float(sz.sum())
+        self._sum_v2 -= float(np.dot(sz, sz))
+        self._sum_signed -= float(np.dot(self._side[idx], sz))
+        self._head = (self._head + n) % self.capacity
+        self._count -= n
+        self._evicted_since_recompute += n
+        if self._evicted_since_recompute >= RECOMPUTE_EVERY:
+            self._recompute()
+
+    def _recompute(self):
+        idx = self._indices(0, self._count)
+        sz = self._sz[idx]
+        self._sum_pv = float(np.dot(self._px[idx], sz))
+        self._sum_v = float(sz.sum())
+        self._sum_v2 = float(np.dot(sz, sz))
+        self._sum_signed = float(np.dot(self._side[idx], sz))
+        self._evicted_since_recompute = 0
+
+    def ingest(self, trades: Union[List[Dict], np.ndarray]) -> int:
+        """写入一次拉取的成交（OKX 原始列表或 TRADE_DTYPE 数组），返回新增笔数"""
+        if not isinstance(trades, np.ndarray):
+            trades = parse_trades(trades)
+        if len(trades) == 0:
+            return 0
+        fresh = trades[trades['trade_id'] > self.last_trade_id]
+        if len(fresh) == 0:
+            return 0
+
+        # parse_trades 已按 tradeId 升序
+        ids, ts, px, sz, side = (fresh[name] for name in ('trade_id', 'ts', 'px', 'sz', 'side'))
+        if len(ids) > self.capacity:
+            ids, ts, px, sz, side = (a[-self.capacity:] for a in (ids, ts, px, sz, side))
+
+        self._detect_whales(ids, ts, px, sz, side)
+
+        self._evict(self._count + len(ids) - self.capacity)
+        idx = self._indices(self._count, len(ids))
+        self._ts[idx], self._px[idx], self._sz[idx], self._side[idx], self._id[idx] = ts, px, sz, side, ids
+        self._count += len(ids)
+
+        signed = float(np.dot(side, sz))
+        self._sum_pv += float(np.dot(px, sz))
+        self._sum_v += float(sz.sum())
+        self._sum_v2 += float(np.dot(sz, sz))
+        self._sum_signed += signed
+        self.cvd += signed
+        self.last_trade_id = int(ids[-1])
+
+        self._expire(int(ts.max()))
+        return len(ids)
+
+    def _expire(self, now_ms: int):
+        """按时间淘汰窗口外的成交"""
+        if self._count == 0:
+            return
+        cutoff = now_ms - self.window_ms
+        ts = self._ts[self._indices(0, self._count)]
+        self._evict(int(np.searchsorted(ts, cutoff, side='left')))
+        while self.whales and self.whales[0].ts < cutoff:
+            self.whales.popleft()
+
+    def _detect_whales(self, ids, ts, px, sz, side):
+        """以写入前的窗口均值/标准差为基准标记大单"""
+        if self._count < 20:
+            return
+        mean = self._sum_v / self._count
+        var = max(self._sum_v2 / self._count - mean * mean, 0.0)
+        std = var ** 0.5
+        if std <= 0:
+            return
+        sigma = (sz - mean) / std
+        for i in np.nonzero(sigma >= self.whale_sigma)[0]:
+            self.whales.append(WhaleTrade(int(ids[i]), int(ts[i]), float(px[i]), float(sz[i]),
+                                          'buy' if side[i] > 0 else 'sell', float(sigma[i])))
+
+    def export_state(self) -> Dict:
+        """窗口内的成交（按时间顺序）和累计量；滚动和在恢复时重算"""
+        idx = self._indices(0, self._count)
+        return {
+            'window_ms': self.window_ms,
+            'columns': {name: pack_array(getattr(self, f"_{name}")[idx]) for name in ('ts', 'px', 'sz', 'side', 'id')},
+            'cvd': self.cvd,
+            'last_trade_id': self.last_trade_id,
+            'whales': [asdict(w) for w in self.whales],
+        }
+
+    def restore_state(self, state: Dict):
+        if state['window_ms'] != self.window_ms:
+            raise ValueError(f"成交窗口长度不符: {state['window_ms']}ms")
+        columns = {name: unpack_array(packed) for name, packed in state['columns'].items()}
+        count = min(len(columns['ts']), self.capacity)
+        for name, values in columns.items():
+            getattr(self, f"_{name}")[:count] = values[len(values) - count:]
+        self._head, self._count = 0, count
+        self._recompute()
+        self.cvd = state['cvd']
+        self.last_trade_id = state['last_trade_id']
+        self.whales.clear()
+        self.whales.extend(WhaleTrade(**w) for w in state['whales'])
+
+    def stats(self) -> Optional[TradeFlowStats]:
+        if self._count == 0:
+            return None
+        newest = (self._head + self._count - 1) % self.capacity
+        span = (self._ts[newest] - self._ts[self._head]) / 1000.0
+        buy = (self._sum_v + self._sum_signed) / 2
+        sell = (self._sum_v - self._sum_signed) / 2
+        return TradeFlowStats(
+            count=self._count,
+            span_seconds=float(span),
+            vwap=self._sum_pv / self._sum_v if self._sum_v > 0 else float(self._px[newest]),
+            last_price=float(self._px[newest]),
+            buy_volume=buy,
+            sell_volume=sell,
+            delta=self._sum_signed,
+            cvd=self.cvd,
+            intensity=self._count / span if span > 0 else 0.0,
+            whales=list(self.whales),
+        )
+
+
+class TradeFlowTracker:
+    """按交易对管理成交窗口"""
+
+    def __init__(self, window_seconds: int = DEFAULT_WINDOW_SECONDS, capacity: int = DEFAULT_CAPACITY,
+                 whale_sigma: float = DEFAULT_WHALE_SIGMA):
+        self.window_seconds = window_seconds
+        self.capacity = capacity
+        self.whale_sigma = whale_sigma
+        self.windows: Dict[str, TradeWindow] = {}
+
+    def window(self, inst_id: str) -> TradeWindow:
+        if inst_id not in self.windows:
+            self.windows[inst_id] = TradeWindow(self.window_seconds, self.capacity, self.whale_sigma)
+        return self.windows[inst_id]
+
+    def ingest(self, inst_id: str, trades: Union[List[Dict], np.ndarray]) -> int:
+        return self.window(inst_id).ingest(trades)
+
+    def stats(self, inst_id: str) -> Optional[TradeFlowStats]:
+        return self.window(inst_id).stats()
+
+
+def format_stats(stats: Optional[TradeFlowStats], window_seconds: int) -> str:
+    """生成写入提示词的成交流摘要"""
+    if stats is None:
+        return "无成交数据"
+
+    vwap_diff = (stats.last_price - stats.vwap) / stats.vwap * 100 if stats.vwap else 0.0
+    lines = [
+        f"- 窗口: 最近{window_seconds // 60}分钟内 {stats.count} 笔 (覆盖 {stats.span_seconds:.0f} 秒)",
+        f"- VWAP: {stats.vwap:.6g} (最新成交价偏离 {vwap_diff:+.3f}%)",
+        f"- 主动买入: {stats.buy_volume:.6g} | 主动卖出: {stats.sell_volume:.6g} | 买入占比: {stats.buy_ratio:.0%}",
+        f"- 窗口净主动量: {stats.delta:+.6g} | 累计CVD: {stats.cvd:+.6g}",
+        f"- 成交频率: {stats.intensity:.2f} 笔/秒",
+    ]
+    if stats.whales:
+        buys = sum(1 for w in stats.whales if w.side == 'buy')
+        largest = max(stats.whales, key=lambda w: w.size)
+        lines.append(f"- 大单: {len(stats.whales)} 笔 (买{buys}/卖{len(stats.whales) - buys})，"
+                     f"最大 {'买' if largest.side == 'buy' else '卖'} {largest.size:.4g} @ {largest.price:.6g}")
+    else:
+        lines.append("- 大单: 无")
+    return "\n".join(lines)
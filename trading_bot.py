@@ -1,51 +1,221 @@
 import logging
+import threading
 import time
-import json
 from datetime import datetime
-from typing import Dict, Optional, List, Any
+from typing import TYPE_CHECKING, Dict, Optional, List, Any
 
-from config import config
+from config import Config, get_config
+from cycle_scheduler import CycleDeadline, CycleScheduler, DeadlineExceeded
+from event_triggers import TriggerEngine
+from log_pipeline import log_context
+from strategy_store import StrategyStore
 from market_data import OKXMarketData
+from market_model import normalize_market_data
+from market_recorder import ReplayMarketData, enable_recording
+from serialization import dumps, encode_market_data
 from deepseek_analyzer import DeepSeekAnalyzer
 from db import TradingAnalysisDB
+from audit_store import AuditStore
+from candle_store import CandleStore
+from checkpoint import CheckpointStore, restore_components
+from paper_trading import PaperTradingEngine, get_shared_engine, make_ticker_fetcher
 from email_notifier import EmailNotifier
 
+if TYPE_CHECKING:
+    from dashboard import CycleFeed
+
 logger = logging.getLogger(__name__)
 
+def create_database(config: Config) -> TradingAnalysisDB:
+    database = config.database
+    return TradingAnalysisDB(database.db_path, downsample_after_days=database.downsample_after_days,
+                             archive_after_days=database.archive_after_days, archive_dir=database.archive_dir)
+
+def create_audit_store(config: Config) -> Optional[AuditStore]:
+    audit = config.audit
+    if not audit.enabled:
+        return None
+    return AuditStore(audit.db_path, retention_days=audit.retention_days,
+                      maintenance_interval=audit.maintenance_interval)
+
+def create_candle_store(config: Config) -> Optional[CandleStore]:
+    path = config.evaluation.candle_store_path
+    return CandleStore(path) if path else None
+
+def email_alert_record(analysis_data: Dict, success: bool) -> Dict[str, Any]:
+    """邮件提醒记录（email_alerts 表）"""
+    return {
+        'inst_id': analysis_data['inst_id'],
+        'recommendation': analysis_data['recommendation'],
+        'confidence': analysis_data['confidence'],
+        'current_price': analysis_data['current_price'],
+        'message': f"{analysis_data['recommendation']} - {analysis_data['analysis_summary']}",
+        'sent_successfully': success
+    }
+
+# 检查点和仪表盘中保留的最近一次决策
+DECISION_FIELDS = ('record_id', 'current_price', 'recommendation', 'confidence', 'position_action',
+                   'urgent_action', 'email_sent')
+
 class TradingAnalysisBot:
     """交易分析机器人"""
     
-    def __init__(self):
-        self.config = config  # 保存配置对象
-        self.inst_id = config.trading.inst_id
-        self.confidence_threshold = config.trading.confidence_threshold
+    def __init__(self, inst_id: Optional[str] = None, market_data=None, analyzer=None,
+                 database=None, email_notifier=None, config: Optional[Config] = None,
+                 strategy_store: Optional[StrategyStore] = None, audit_store: Optional[AuditStore] = None,
+                 candle_store: Optional[CandleStore] = None, paper_engine: Optional[PaperTradingEngine] = None,
+                 feed: Optional['CycleFeed'] = None):
+        """
+        Args:
+            inst_id: 监控的交易对，默认使用配置中的 INST_ID
+            config: 配置对象，默认使用 get_config()
+            strategy_store: 策略配置（多个交易对可共享），默认按 STRATEGY_FILE 创建
+            audit_store: LLM 调用审计存储，默认按 AUDIT_* 配置创建（AUDIT_ENABLED=false 时不记录）
+            candle_store: 已收盘K线的本地存储（供信号评估），默认按 CANDLE_STORE_PATH 创建（为空时不保存）
+            paper_engine: 模拟交易引擎，PAPER_TRADING=true 时默认使用进程内共享的引擎
+            feed: 仪表盘的周期缓冲区，DASHBOARD_ENABLED=true 时默认使用进程内共享的缓冲区
+            market_data/analyzer/database/email_notifier: 可选注入的模块实例
+                （基准测试和离线回放时替换为本地实现），默认按配置创建
+        """
+        self.config = config or get_config()  # 保存配置对象
+        self.inst_id = inst_id or self.config.trading.inst_id
+        
+        self.scheduler: Optional[CycleScheduler] = None
+        self.trigger_engine: Optional[TriggerEngine] = None
+        
+        # 策略参数在每个周期开始前检查更新
+        self.strategy_store = strategy_store or self._create_strategy_store()
+        self._timeframe = self.config.strategy['timeframe']  # K线周期需重启才能修改
+        self._strategy_version = -1
+        self.strategy: Dict[str, Any] = {}
+        self.confidence_threshold = self.config.trading.confidence_threshold
+        self._refresh_strategy()
         
         # 初始化各个模块
-        self.market_data = OKXMarketData(flag="0")
-        self.analyzer = DeepSeekAnalyzer(config)
-        self.database = TradingAnalysisDB(config.database.db_path)
-        self.email_notifier = EmailNotifier(config)
+        self.recorder = None
+        self.market_data = market_data or self._create_market_data()
+        self.analyzer = analyzer or DeepSeekAnalyzer(self.config)
+        self.database = database or create_database(self.config)
+        self.email_notifier = email_notifier or EmailNotifier(self.config)
+        self.audit_store = audit_store or create_audit_store(self.config)
+        self.candle_store = candle_store or create_candle_store(self.config)
+        self.paper_engine = paper_engine or (get_shared_engine(self.config.paper) if self.config.paper.enabled else None)
+        if self.paper_engine is not None:
+            # 分析器看到的是模拟持仓
+            self.analyzer.positions_file = self.paper_engine.positions_file
         
         # 统计信息
         self.analysis_count = 0
         self.email_alerts_sent = 0
+        self.failed_cycles = 0
+        self.degraded_cycles = 0  # 部分数据使用缓存或缺失的周期
+        self.deadline_skips = 0  # 超过周期截止时间而取消分析的周期
+        self._cycle_lock = threading.Lock()
+        self._cycle_seq = 0  # 日志中的 cycle_id（包括失败和取消的周期）
         self.last_analysis_time = None
+        self.last_decision: Optional[Dict[str, Any]] = None
+        
+        checkpoint_path = self.config.checkpoint.path
+        self.checkpoint_store = CheckpointStore(checkpoint_path) if checkpoint_path else None
+        self._last_checkpoint = time.monotonic()
+        
+        if feed is None and self.config.dashboard.enabled:
+            # 仪表盘（asyncio HTTP 服务）只在启用时导入
+            from dashboard import get_shared_feed
+            feed = get_shared_feed(self.config.dashboard.history)
+        self.feed = feed
+        if self.feed is not None:
+            self.feed.register_metrics(self.inst_id, self.dashboard_metrics)
+            self.feed.register_positions(self.inst_id, self._get_positions)
         
         logger.info(f"交易分析机器人初始化完成，监控交易对: {self.inst_id}")
     
-    def run_analysis_cycle(self) -> Optional[Dict]:
-        """运行一次完整的分析周期"""
+    def _create_strategy_store(self) -> StrategyStore:
+        trading = self.config.trading
+        return StrategyStore(
+            trading.strategy_file,
+            default_strategy=trading.strategy_name,
+            # 环境变量对默认策略的手动覆盖
+            base_overrides={
+                'analysis_interval': trading.analysis_interval,
+                'confidence_threshold': trading.confidence_threshold,
+                'adjustment_threshold': trading.adjustment_threshold,
+            },
+        )
+    
+    def _refresh_strategy(self):
+        """在周期之间应用新版本的策略参数（整体替换）"""
+        self.strategy_store.maybe_reload()
+        snapshot = self.strategy_store.snapshot
+        if snapshot.version == self._strategy_version:
+            return
+        
+        params = snapshot.params_for(self.inst_id)
+        params['timeframe'] = self._timeframe
+        if self.strategy:
+            changed = {k: (self.strategy.get(k), v) for k, v in params.items() if self.strategy.get(k) != v}
+            if changed:
+                logger.info(f"{self.inst_id} 策略参数更新(版本 {snapshot.version}): "
+                            + ", ".join(f"{k} {old} -> {new}" for k, (old, new) in changed.items()))
+        
+        self.strategy = params
+        self._strategy_version = snapshot.version
+        self.confidence_threshold = float(params['confidence_threshold'])
+        if self.scheduler is not None:
+            self.scheduler.interval = float(params['analysis_interval'])
+            if not self.config.schedule.cycle_deadline:
+                self.scheduler.deadline = params['analysis_interval']
+    
+    def _create_market_data(self):
+        """按录制/回放配置创建市场数据源"""
+        recording = self.config.recording
+        if recording.replay_path:
+            logger.info(f"使用录制数据回放: {recording.replay_path}")
+            return ReplayMarketData(recording.replay_path, speed=recording.replay_speed)
+        
+        market_data = OKXMarketData(flag="0")
+        if recording.record_path:
+            self.recorder = enable_recording(market_data, recording.record_path)
+        return market_data
+    
+    def run_analysis_cycle(self, deadline: Optional[CycleDeadline] = None) -> Optional[Dict]:
+        """运行一次完整的分析周期
+        
+        deadline: 周期截止时间；获取数据后已超时则取消本次分析，
+            未超时则 DeepSeek 请求的超时不超过剩余时间。分析完成后的保存和提醒不受限制。
+        后台自检与调度周期可能同时调用，同一时间只执行一个周期。
+        """
+        with self._cycle_lock:
+            self._cycle_seq += 1
+            with log_context(inst_id=self.inst_id, cycle_id=f"{self._cycle_seq}"):
+                return self._run_analysis_cycle(deadline)
+    
+    def _run_analysis_cycle(self, deadline: Optional[CycleDeadline]) -> Optional[Dict]:
+        try:
+            self._refresh_strategy()
+        except Exception as e:
+            logger.error(f"策略配置刷新失败，继续使用当前参数: {e}")
         logger.info(f"开始分析周期 #{self.analysis_count + 1} - {self.inst_id}")
+        deadline = deadline or CycleDeadline(None)
         
         try:
             # 1. 获取市场数据
-            market_data = self.market_data.get_all_market_data(self.inst_id, config)
+            raw_market_data = self.market_data.get_all_market_data(self.inst_id, self.config)
+            market_data = normalize_market_data(self.inst_id, raw_market_data)
+            self._save_candles(market_data.candles)
+            self._paper_fills(market_data)
             
             # 2. 调用DeepSeek进行分析
-            analysis_result = self.analyzer.analyze_market_data(market_data, self.inst_id)
+            deadline.check("DeepSeek分析")
+            analysis_result = self.analyzer.analyze_market_data(market_data, self.inst_id,
+                                                                timeout=deadline.remaining(),
+                                                                strategy=self.strategy)
+            
+            if any(info.get('stale') for info in market_data.meta.values()):
+                self.degraded_cycles += 1
             
             # 3. 准备存储数据
-            current_price = float(market_data['ticker']['data'][0]['last'])
+            current_price = market_data.ticker.last
             analysis_data = {
                 'inst_id': self.inst_id,
                 'current_price': current_price,
@@ -59,13 +229,15 @@ class TradingAnalysisBot:
                 'stop_adjustment': analysis_result.get('stop_adjustment', {}),
                 'urgent_action': analysis_result.get('urgent_action', False),
                 'urgent_reason': analysis_result.get('urgent_reason', ''),
-                'market_data_json': json.dumps(market_data),
-                'raw_response': json.dumps(analysis_result)
+                'market_data_json': encode_market_data(raw_market_data),
+                'raw_response': dumps(analysis_result)
             }
             
             # 4. 保存到数据库
             record_id = self.database.save_analysis(analysis_data)
             analysis_data['record_id'] = record_id
+            self._save_audit(record_id)
+            self._paper_trade(analysis_result, market_data)
             
             # 5. 检查是否需要发送邮件提醒
             should_send_email = self._should_send_email_alert(analysis_result)
@@ -81,13 +253,58 @@ class TradingAnalysisBot:
             # 更新统计
             self.analysis_count += 1
             self.last_analysis_time = datetime.now()
+            self.last_decision = {k: analysis_data[k] for k in DECISION_FIELDS}
+            if self.feed is not None:
+                self.feed.publish(analysis_data)
             
             return analysis_data
             
+        except DeadlineExceeded as e:
+            self.deadline_skips += 1
+            logger.warning(f"{e}，本周期不产生分析结果")
+            return None
         except Exception as e:
+            self.failed_cycles += 1
             logger.error(f"分析周期执行失败: {e}")
             return None
     
+    def _save_candles(self, candles):
+        """保存已收盘K线供之后的信号评估（失败不影响分析周期）"""
+        if self.candle_store is None:
+            return
+        try:
+            self.candle_store.append(self.inst_id, self.config.trading.kline_bar, candles)
+        except Exception as e:
+            logger.error(f"保存K线失败: {e}")
+    
+    def _paper_fills(self, market_data):
+        """先按本周期的逐笔成交处理模拟持仓的止盈止损，分析器再读取持仓"""
+        if self.paper_engine is None:
+            return
+        try:
+            self.paper_engine.on_trades(self.inst_id, market_data.trades)
+        except Exception as e:
+            logger.error(f"模拟交易止盈止损检查失败: {e}")
+    
+    def _paper_trade(self, analysis_result: Dict[str, Any], market_data):
+        """按决策模拟成交（失败不影响分析周期）"""
+        if self.paper_engine is None:
+            return
+        try:
+            self.paper_engine.on_decision(self.inst_id, analysis_result, market_data, self.strategy,
+                                          self.confidence_threshold)
+        except Exception as e:
+            logger.error(f"模拟交易执行失败: {e}")
+    
+    def _save_audit(self, record_id: int):
+        """保存本周期的 LLM 调用（审计失败不影响分析周期）"""
+        if self.audit_store is None:
+            return
+        try:
+            self.audit_store.record_calls(self.inst_id, getattr(self.analyzer, 'last_calls', []), record_id)
+        except Exception as e:
+            logger.error(f"保存LLM审计记录失败: {e}")
+    
     def _should_send_email_alert(self, result: Dict[str, Any]) -> bool:
         """判断是否应该发送邮件提醒
         
@@ -122,7 +339,7 @@ class TradingAnalysisBot:
         if recommendation == 'ADJUST_STOPS':
             stop_adjustment = result.get('stop_adjustment', {})
             adjustment_percent = stop_adjustment.get('adjustment_percent')
-            threshold = self.config.trading.adjustment_threshold
+            threshold = self.strategy['adjustment_threshold']
             
             if adjustment_percent:
                 adj_value = abs(float(adjustment_percent))
@@ -192,16 +409,7 @@ class TradingAnalysisBot:
             success = self.email_notifier.send_trading_alert(analysis_data)
             
             # 保存邮件提醒记录
-            alert_data = {
-                'inst_id': analysis_data['inst_id'],
-                'recommendation': analysis_data['recommendation'],
-                'confidence': analysis_data['confidence'],
-                'current_price': analysis_data['current_price'],
-                'message': f"{analysis_data['recommendation']} - {analysis_data['analysis_summary']}",
-                'sent_successfully': success
-            }
-            
-            self.database.save_email_alert(alert_data)
+            self.database.save_email_alert(email_alert_record(analysis_data, success))
             
             if success:
                 self.database.mark_email_sent(analysis_data['record_id'])
@@ -296,46 +504,265 @@ class TradingAnalysisBot:
         print(f"📋 分析总结: {summary}")
         print("="*70 + "\n")
     
-    def start_continuous_analysis(self):
-        """开始连续分析"""
-        interval = config.trading.analysis_interval
+    def _create_scheduler(self) -> CycleScheduler:
+        """按调度配置创建周期调度器"""
+        schedule = self.config.schedule
+        interval = self.strategy['analysis_interval']
+        return CycleScheduler(
+            interval=interval,
+            bar=self.config.trading.kline_bar,
+            close_offset=schedule.close_offset,
+            jitter=schedule.jitter,
+            jitter_key=self.inst_id,
+            overrun_policy=schedule.overrun_policy,
+            deadline=schedule.cycle_deadline or interval,
+            align=schedule.align_to_bar,
+        )
+    
+    def _scheduled_cycle(self, deadline: CycleDeadline):
+        """调度器每个网格点执行的周期"""
+        self.run_analysis_cycle(deadline)
+        self._maybe_checkpoint()
+        
+        # 打印统计信息
+        if self.analysis_count % 10 == 0:
+            self._print_statistics()
+    
+    def _poll_triggers(self) -> Optional[float]:
+        """事件模式下的一次轮询，触发时执行分析，返回本次轮询到的价格"""
+        ticker = self.market_data.get_ticker(self.inst_id)['data'][0]
+        candles = self.market_data.get_candlesticks(
+            self.inst_id,
+            bar=self.config.trading.kline_bar,
+            limit=str(self.trigger_engine.candles_needed)
+        )['data']
+        if self.paper_engine is not None:
+            self.paper_engine.on_tick(self.inst_id, float(ticker['last']))
+        events = self.trigger_engine.evaluate(ticker, candles, self._get_positions())
+        if not events:
+            return float(ticker['last'])
+        
+        logger.info(f"触发分析: {', '.join(map(str, events))}")
+        schedule = self.config.schedule
+        result = self.run_analysis_cycle(CycleDeadline(schedule.cycle_deadline or self.strategy['analysis_interval']))
+        price = result['current_price'] if result else float(ticker['last'])
+        self.trigger_engine.mark_analyzed(price)
+        self._maybe_checkpoint()
+        
+        if self.analysis_count % 10 == 0:
+            self._print_statistics()
+        return price
+    
+    def _run_event_driven(self):
+        """事件驱动模式: 轮询行情，只在触发条件满足时分析"""
+        poll_interval = self.config.trigger.poll_interval
+        while True:
+            started = time.monotonic()
+            try:
+                self._poll_triggers()
+            except Exception as e:
+                # 轮询失败不影响后续轮询，心跳会兜底
+                logger.warning(f"轮询行情失败: {e}")
+            time.sleep(max(0.0, poll_interval - (time.monotonic() - started)))
+    
+    def start_continuous_analysis(self, run_immediately: bool = False):
+        """开始连续分析
+        
+        run_immediately: 立即执行第一次分析，而不是等到下一个对齐时间点
+        """
+        # 旧分区的降采样和归档、审计记录的过期清理和重新压缩在后台线程进行，不占用分析周期
+        start_compaction = getattr(self.database, 'start_background_compaction', None)
+        if start_compaction is not None:
+            start_compaction(self.config.database.compaction_interval)
+        start_maintenance = getattr(self.audit_store, 'start_background_maintenance', None)
+        if start_maintenance is not None:
+            start_maintenance()
+        if self.feed is not None and self.config.dashboard.enabled:
+            from dashboard import start_dashboard
+            start_dashboard(self.feed, self.config.dashboard.host, self.config.dashboard.port)
+        if self.paper_engine is not None:
+            self.paper_engine.start_tick_loop(make_ticker_fetcher(self.market_data), self.config.paper.tick_interval)
+        
+        if self.config.trigger.mode == "event":
+            self.trigger_engine = self.trigger_engine or TriggerEngine(self.config.trigger)
+            trigger = self.config.trigger
+            logger.info(f"开始事件驱动分析，轮询间隔: {trigger.poll_interval}秒，信心阈值: {self.confidence_threshold}%")
+            print(f"\n🚀 开始监控 {self.inst_id}（事件驱动）")
+            print(f"📊 触发条件: {self.config.trading.kline_bar} K线收盘 | 偏离 {trigger.price_move_pct}% 或 "
+                  f"{trigger.atr_multiple}×ATR | {trigger.volume_spike_ratio}倍放量 | 距止盈止损 {trigger.tp_sl_proximity_pct}%")
+            print(f"⏱️ 最小间隔: {trigger.min_spacing:.0f}秒 | 心跳: {trigger.heartbeat:.0f}秒")
+            print(f"🎯 信心阈值: {self.confidence_threshold}%")
+            print("="*50)
+            try:
+                self._run_event_driven()
+            except KeyboardInterrupt:
+                logger.info("用户中断分析过程")
+                self.save_checkpoint()
+                self._print_final_statistics()
+            return
+        
+        interval = self.strategy['analysis_interval']
+        self.scheduler = self.scheduler or self._create_scheduler()
         
         logger.info(f"开始连续分析，间隔: {interval}秒，信心阈值: {self.confidence_threshold}%")
         print(f"\n🚀 开始监控 {self.inst_id}")
-        print(f"📊 分析间隔: {interval}秒")
+        print(f"📊 分析间隔: {interval}秒" + (f"（对齐 {self.config.trading.kline_bar} K线收盘 +{self.scheduler.phase:.1f}秒）"
+                                          if self.config.schedule.align_to_bar else ""))
         print(f"🎯 信心阈值: {self.confidence_threshold}%")
         print(f"📧 邮件提醒: 已启用")
         print("="*50)
         
         try:
-            while True:
-                start_time = time.time()
-                
-                # 执行分析周期
-                self.run_analysis_cycle()
-                
-                # 打印统计信息
-                if self.analysis_count % 10 == 0:
-                    self._print_statistics()
-                
-                # 计算等待时间
-                elapsed = time.time() - start_time
-                wait_time = max(1, interval - elapsed)
-                
-                logger.info(f"等待 {wait_time:.1f} 秒后进行下一次分析...")
-                time.sleep(wait_time)
+            self.scheduler.run(self._scheduled_cycle, immediate=run_immediately)
                 
         except KeyboardInterrupt:
             logger.info("用户中断分析过程")
+            self.save_checkpoint()
             self._print_final_statistics()
         except Exception as e:
             logger.error(f"连续分析过程出错: {e}")
+            self.save_checkpoint()
             self._print_final_statistics()
             raise
     
+    def export_state(self) -> Dict[str, Any]:
+        """运行时状态（统计、最近决策、行情快照、分析器增量状态、调度/触发器），供检查点保存"""
+        components: Dict[str, Any] = {
+            'stats': {
+                'analysis_count': self.analysis_count,
+                'email_alerts_sent': self.email_alerts_sent,
+                'failed_cycles': self.failed_cycles,
+                'degraded_cycles': self.degraded_cycles,
+                'deadline_skips': self.deadline_skips,
+                'cycle_seq': self._cycle_seq,
+                'last_analysis_time': self.last_analysis_time.timestamp() if self.last_analysis_time else None,
+                'last_decision': self.last_decision,
+            },
+        }
+        snapshots = getattr(self.market_data, 'snapshots', None)
+        if snapshots is not None:
+            components['snapshots'] = snapshots.export_state(self.inst_id)
+        if hasattr(self.analyzer, 'export_state'):
+            components['analyzer'] = self.analyzer.export_state(self.inst_id)
+        if self.scheduler is not None:
+            components['scheduler'] = self.scheduler.export_state()
+        if self.trigger_engine is not None:
+            components['triggers'] = self.trigger_engine.export_state()
+        return components
+    
+    def save_checkpoint(self) -> bool:
+        """原子写入检查点（与分析周期互斥，保存的是两个周期之间的一致状态）"""
+        if self.checkpoint_store is None:
+            return False
+        try:
+            with self._cycle_lock:
+                components = self.export_state()
+            self.checkpoint_store.save(self.inst_id, self.config.trading.kline_bar, components)
+            self._last_checkpoint = time.monotonic()
+            return True
+        except Exception as e:
+            logger.error(f"保存检查点失败: {e}")
+            return False
+    
+    def _maybe_checkpoint(self):
+        if (self.checkpoint_store is not None
+                and time.monotonic() - self._last_checkpoint >= self.config.checkpoint.interval):
+            self.save_checkpoint()
+    
+    def _restore_stats(self, stats: Dict[str, Any]):
+        self.analysis_count = stats['analysis_count']
+        self.email_alerts_sent = stats['email_alerts_sent']
+        self.failed_cycles = stats['failed_cycles']
+        self.degraded_cycles = stats['degraded_cycles']
+        self.deadline_skips = stats['deadline_skips']
+        self._cycle_seq = stats['cycle_seq']
+        last_time = stats['last_analysis_time']
+        self.last_analysis_time = datetime.fromtimestamp(last_time) if last_time else None
+        self.last_decision = stats['last_decision']
+    
+    def _restore_scheduler(self, state: Dict[str, Any]):
+        self.scheduler = self.scheduler or self._create_scheduler()
+        self.scheduler.restore_state(state)
+    
+    def _restore_triggers(self, state: Dict[str, Any]):
+        self.trigger_engine = self.trigger_engine or TriggerEngine(self.config.trigger)
+        self.trigger_engine.restore_state(state)
+    
+    def restore_checkpoint(self) -> Optional[float]:
+        """从检查点恢复运行时状态，返回检查点的年龄（秒）；没有可用检查点时返回 None
+        
+        统计计数和增量状态总是恢复；调度相位和触发器状态只在检查点不超过 CHECKPOINT_MAX_AGE 时恢复
+        （恢复后第一个周期等到原网格的下一个点，而不是立即执行）。
+        """
+        if self.checkpoint_store is None:
+            return None
+        started = time.perf_counter()
+        payload = self.checkpoint_store.load(self.inst_id, self.config.trading.kline_bar)
+        if payload is None:
+            return None
+        age = max(0.0, time.time() - payload['saved_at'])
+        components = payload['components']
+        
+        restorers = {'stats': self._restore_stats}
+        snapshots = getattr(self.market_data, 'snapshots', None)
+        if snapshots is not None:
+            restorers['snapshots'] = lambda state: snapshots.restore_state(self.inst_id, state)
+        if age <= self.config.checkpoint.max_age:
+            if self.config.trigger.mode == "event":
+                restorers['triggers'] = self._restore_triggers
+            else:
+                restorers['scheduler'] = self._restore_scheduler
+        with self._cycle_lock:
+            restored = restore_components(restorers, components)
+            if 'analyzer' in components and hasattr(self.analyzer, 'restore_state'):
+                restored += self.analyzer.restore_state(self.inst_id, components['analyzer'])
+        
+        logger.info(f"从 {age:.0f} 秒前的检查点恢复: {', '.join(restored) or '无'} "
+                    f"({(time.perf_counter() - started) * 1000:.1f}ms)")
+        return age
+    
     def _print_statistics(self):
         """打印统计信息"""
-        print(f"\n📈 统计信息 (分析次数: {self.analysis_count}, 邮件提醒: {self.email_alerts_sent})")
+        print(f"\n📈 统计信息 (分析次数: {self.analysis_count}, 邮件提醒: {self.email_alerts_sent}, "
+              f"降级周期: {self.degraded_cycles}, 失败周期: {self.failed_cycles}, 超时取消: {self.deadline_skips})")
+        for metrics in self._module_metrics():
+            logger.info(metrics)
+    
+    def _module_metrics(self) -> List[str]:
+        """各模块的指标摘要"""
+        lines = []
+        if self.scheduler is not None:
+            lines.append(self.scheduler.format_metrics())
+        if self.trigger_engine is not None:
+            lines.append(self.trigger_engine.format_counts())
+        router = getattr(self.analyzer, 'router', None)
+        if router is not None:
+            lines.append(router.format_metrics())
+        if self.paper_engine is not None:
+            lines.append(self.paper_engine.format_metrics())
+        if self.checkpoint_store is not None and self.checkpoint_store.saves:
+            lines.append(self.checkpoint_store.format_metrics())
+        if getattr(self.analyzer, 'fast_router', None) is not None:
+            lines.append(self.analyzer.fast_router.format_metrics())
+            lines.append(self.analyzer.cascade_stats.format_metrics())
+        scheduler = getattr(self.market_data, 'scheduler', None)
+        if scheduler is not None:
+            lines.append(f"OKX请求预算:\n{scheduler.format_metrics()}")
+        return lines
+    
+    def dashboard_metrics(self) -> Dict[str, Any]:
+        """仪表盘 /api/metrics 中本交易对的部分"""
+        return {
+            'analysis_count': self.analysis_count,
+            'email_alerts_sent': self.email_alerts_sent,
+            'degraded_cycles': self.degraded_cycles,
+            'failed_cycles': self.failed_cycles,
+            'deadline_skips': self.deadline_skips,
+            'last_analysis_time': self.last_analysis_time.strftime('%Y-%m-%d %H:%M:%S') if self.last_analysis_time else None,
+            'confidence_threshold': self.confidence_threshold,
+            'last_decision': self.last_decision,
+            'modules': self._module_metrics(),
+        }
     
     def _print_final_statistics(self):
         """打印最终统计信息"""